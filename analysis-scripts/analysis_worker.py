@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+分析工作进程 - 常驻进程，按行接收分析任务
+
+每次启动 analyze_pcap.py / analyze_har.py 都要付出解释器启动和导入Scapy的开销，
+对小文件来说这部分占了大半耗时。工作进程启动时导入一次，之后逐个处理任务：
+
+  任务: {"id": 1, "type": "pcap", "file": "/path/a.pcap", "config": {...}}
+  结果: {"id": 1, "result": {...}} 或 {"id": 1, "error": {"message": "..."}}
+
+type 为 pcap（pcap/pcapng）或 har。每个任务一行JSON，每个结果一行JSON，按任务顺序
+输出；单个任务失败不影响之后的任务。
+
+用法：
+  analysis_worker.py                  从标准输入读取任务，结果写到标准输出
+  analysis_worker.py --socket <路径>  在Unix套接字上监听，每个连接同样按行收发
+"""
+
+import os
+import sys
+import json
+import signal
+import socketserver
+
+from analyze_pcap import analyze_pcap, prepare_engine
+from analyze_har import analyze_har
+
+# 任务类型 -> 分析函数
+JOB_HANDLERS = {
+    "pcap": analyze_pcap,
+    "har": analyze_har
+}
+
+def warm_up():
+    """预先导入首个任务才会用到的模块（Scapy协议层、向量化统计依赖的numpy等）"""
+    prepare_engine("scapy", vectorized=True)
+
+def run_job(line):
+    """执行一行任务，返回一行结果JSON"""
+    job_id = None
+    try:
+        try:
+            job = json.loads(line)
+        except ValueError:
+            raise Exception("无效的任务JSON")
+        if not isinstance(job, dict):
+            raise Exception("任务必须是JSON对象")
+        job_id = job.get("id")
+        handler = JOB_HANDLERS.get(job.get("type"))
+        if handler is None:
+            raise Exception(f"不支持的任务类型: {job.get('type')}")
+        if not job.get("file"):
+            raise Exception("任务缺少file")
+        response = {"id": job_id, "result": handler(job["file"], job.get("config") or {})}
+    except Exception as e:
+        response = {"id": job_id, "error": {"message": str(e)}}
+    return json.dumps(response, ensure_ascii=False)
+
+def serve_lines(reader, writer):
+    """逐行处理任务直到输入结束"""
+    for line in reader:
+        if not line.strip():
+            continue
+        writer.write(run_job(line) + "\n")
+        writer.flush()
+
+class WriterAdapter:
+    """把文本写入套接字的字节流"""
+
+    def __init__(self, wfile):
+        self.wfile = wfile
+
+    def write(self, text):
+        self.wfile.write(text.encode('utf-8'))
+
+    def flush(self):
+        self.wfile.flush()
+
+class JobHandler(socketserver.StreamRequestHandler):
+    """Unix套接字连接：与标准输入模式相同的按行协议"""
+
+    def handle(self):
+        reader = (line.decode('utf-8', errors='replace') for line in self.rfile)
+        writer = WriterAdapter(self.wfile)
+        serve_lines(reader, writer)
+
+def serve_socket(path):
+    """在Unix套接字上监听；同一时间只处理一个任务，并发由多个工作进程提供"""
+    if os.path.exists(path):
+        os.unlink(path)
+    # 被进程池终止时也删除套接字文件
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    with socketserver.UnixStreamServer(path, JobHandler) as server:
+        try:
+            server.serve_forever()
+        finally:
+            os.unlink(path)
+
+def main():
+    args = sys.argv[1:]
+    if not (len(args) == 0 or len(args) == 2 and args[0] == "--socket"):
+        print(json.dumps({"error": {"message": "参数错误"}}))
+        sys.exit(1)
+
+    warm_up()
+    if args:
+        serve_socket(args[1])
+    else:
+        serve_lines(sys.stdin, sys.stdout)
+
+if __name__ == "__main__":
+    main()
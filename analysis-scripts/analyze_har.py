@@ -3,219 +3,578 @@
 HAR文件分析脚本
 """
 
+import os
+import re
 import sys
 import json
-from datetime import datetime
+from datetime import date, datetime
 from collections import Counter, defaultdict
 from urllib.parse import urlparse
 
+from result_cache import cached_analysis, analyzer_version
+from sketches import DDSketch
+from har_stream import iter_entries, iter_entry_positions
+from scan_progress import ScanProgress
+from batch import run_batch
+
 def analyze_har(file_path, config):
-    """分析HAR文件"""
+    """分析HAR文件；配置了cache时相同内容和配置的结果直接取自缓存"""
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            har_data = json.load(f)
-        
-        if 'log' not in har_data or 'entries' not in har_data['log']:
-            raise Exception("无效的HAR文件格式")
-        
-        entries = har_data['log']['entries']
-        if not entries:
-            raise Exception("HAR文件中没有网络请求记录")
-        
-        results = {
-            "summary": analyze_summary(entries),
-            "protocols": analyze_protocols(entries),
-            "domains": analyze_domains(entries),
-            "methods": analyze_methods(entries),
-            "status_codes": analyze_status_codes(entries),
-            "performance": analyze_performance(entries),
-            "anomalies": detect_anomalies(entries)
-        }
-        
-        return results
-        
+        config = config or {}
+        return cached_analysis("har", analyzer_version(("analyze_har.py", "har_stream.py", "har_columnar.py", "sketches.py")), file_path, config,
+                               lambda: scan_har(file_path, config))
+
     except Exception as e:
         raise Exception(f"HAR分析失败: {str(e)}")
 
-def analyze_summary(entries):
-    """基础统计"""
-    total_requests = len(entries)
-    total_size = sum(
-        entry.get('response', {}).get('bodySize', 0) + 
-        entry.get('request', {}).get('bodySize', 0) 
-        for entry in entries
-    )
+def scan_har(file_path, config):
+    """读取HAR文件并生成结果"""
+    return dict(iter_har_sections(file_path, config))
+
+def stream_har(file_path, config, emit):
+    """流式分析：读取时按与PCAP流式分析相同的节奏输出进度事件（见 scan_progress.py），
+    每个分析段算完就输出一个分析段事件"""
+    try:
+        progress = ScanProgress(emit, os.path.getsize(file_path))
+        for name, result in iter_har_sections(file_path, config or {}, progress):
+            emit({"type": "section", "name": name, "result": result})
+
+    except Exception as e:
+        raise Exception(f"HAR分析失败: {str(e)}")
+
+def iter_har_sections(file_path, config, progress=None):
+    """流式读取HAR文件（见 har_stream.py），所有分析段在一次遍历中完成，按结果JSON中的顺序逐个产出 (分析段名, 结果)
     
-    # 计算时间跨度
-    timestamps = []
+    progress 为 ScanProgress 时按读到的文件位置输出进度，读完后再输出一次。
+    """
+    accumulators = create_accumulators(config)
+    feeders = [accumulator.feed for accumulator in accumulators.values()]
+    if progress is None:
+        entries = iter_entries(file_path)
+    else:
+        entries = progress.track_positions(iter_entry_positions(file_path))
+    total = 0
     for entry in entries:
-        if 'startedDateTime' in entry:
-            try:
-                timestamp = datetime.fromisoformat(entry['startedDateTime'].replace('Z', '+00:00'))
-                timestamps.append(timestamp.timestamp())
-            except:
-                continue
-    
-    duration = max(timestamps) - min(timestamps) if timestamps else 0
-    
-    return {
-        "totalRequests": total_requests,
-        "totalBytes": total_size,
-        "duration": duration,
-        "avgRequestSize": total_size / total_requests if total_requests > 0 else 0,
-        "requestsPerSecond": total_requests / duration if duration > 0 else 0
-    }
+        record = har_record(entry)
+        for feed in feeders:
+            feed(record)
+        total += 1
+    if progress is not None:
+        progress.report()
+    if not total:
+        raise Exception("HAR文件中没有网络请求记录")
 
-def analyze_protocols(entries):
-    """协议分析"""
-    protocol_counts = Counter()
-    
+    for name, accumulator in accumulators.items():
+        yield name, accumulator.result()
+
+def create_accumulators(config):
+    """按配置创建要输出的分析段的累加器（顺序即结果JSON中的顺序）"""
+    accumulators = {}
+    for name in requested_sections(config):
+        factory = ANALYZERS[name]
+        if name in SECTION_OPTIONS:
+            accumulators[name] = factory(section_options(config, name))
+        else:
+            accumulators[name] = factory()
+    return accumulators
+
+def run_section(name, entries, options=None):
+    """对已加载的请求记录列表运行单个分析段"""
+    factory = ANALYZERS[name]
+    if name in SECTION_OPTIONS:
+        accumulator = factory(options or SECTION_OPTIONS[name])
+    else:
+        accumulator = factory()
     for entry in entries:
-        url = entry.get('request', {}).get('url', '')
+        accumulator.feed(har_record(entry))
+    return accumulator.result()
+
+def requested_sections(config):
+    """sections 配置：要输出的分析段（按结果JSON中的顺序），未设置时为全部（没有numpy时不含 NUMPY_SECTIONS）"""
+    sections = config.get("sections")
+    for name in config.get("options") or {}:
+        if name not in SECTION_OPTIONS:
+            raise Exception(f"分析段没有可配置的选项: {name}")
+    if sections is None:
+        if numpy_available():
+            return tuple(ANALYZERS)
+        return tuple(name for name in ANALYZERS if name not in NUMPY_SECTIONS)
+    if isinstance(sections, str) or not sections:
+        raise Exception(f"无效的sections配置: {sections}")
+    for name in sections:
+        if name not in ANALYZERS:
+            raise Exception(f"未知的分析段: {name}")
+    return tuple(name for name in ANALYZERS if name in sections)
+
+def numpy_available():
+    try:
+        import numpy
+    except ImportError:
+        return False
+    return True
+
+def section_options(config, name):
+    """分析段的选项：配置中的 options.<分析段> 覆盖默认值"""
+    defaults = SECTION_OPTIONS[name]
+    overrides = (config.get("options") or {}).get(name) or {}
+    for key in overrides:
+        if key not in defaults:
+            raise Exception(f"未知的分析段选项: {name}.{key}")
+    return dict(defaults, **overrides)
+
+class HarRecord:
+    """单个请求记录中分析段用到的字段：每个记录只提取一次，由所有分析段共享"""
+    __slots__ = ('ts', 'time', 'url', 'method', 'status', 'request_size', 'response_size', 'timings', 'pageref')
+
+def har_record(entry):
+    """从解码后的请求记录中提取字段（缺省值与各分析段原来的 .get() 默认值相同），开始时间转为Unix时间"""
+    request = entry.get('request', {})
+    response = entry.get('response', {})
+    record = HarRecord()
+    started = entry.get('startedDateTime')
+    record.ts = None if started is None else parse_timestamp(started)
+    record.time = entry.get('time', 0)
+    record.url = request.get('url', '')
+    record.method = request.get('method', 'UNKNOWN')
+    record.request_size = request.get('bodySize', 0)
+    record.status = response.get('status', 0)
+    record.response_size = response.get('bodySize', 0)
+    record.timings = entry.get('timings')
+    record.pageref = entry.get('pageref')
+    return record
+
+# HAR中常见的固定格式时间戳：YYYY-MM-DDTHH:MM:SS[.ffffff](Z|±HH:MM)，分组为 (到分钟的前缀, 秒, 小数部分, 时区)
+_ISO_TIMESTAMP = re.compile(
+    r'([0-9]{4}-[0-9]{2}-[0-9]{2}T[0-9]{2}:[0-9]{2}):([0-9]{2})(?:\.([0-9]{1,6}))?(Z|[+-][0-9]{2}:[0-9]{2})')
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+# (到分钟的前缀, 时区) -> 该分钟开始的Unix时间，无效的日期/时间为False
+_minute_starts = {}
+MINUTE_CACHE_SIZE = 65536
+
+def minute_start(minute, zone):
+    """YYYY-MM-DDTHH:MM 加时区对应的Unix时间（整数秒），日期、时间或时区无效时返回False"""
+    year, month, day, hour, minute = int(minute[:4]), int(minute[5:7]), int(minute[8:10]), int(minute[11:13]), int(minute[14:16])
+    offset = 0
+    if zone != 'Z':
+        offset_hours, offset_minutes = int(zone[1:3]), int(zone[4:6])
+        if offset_hours >= 24 or offset_minutes >= 60:
+            return False
+        offset = (offset_hours * 60 + offset_minutes) * 60
+        if zone[0] == '-':
+            offset = -offset
+    if hour >= 24 or minute >= 60:
+        return False
+    try:
+        days = date(year, month, day).toordinal() - _EPOCH_ORDINAL
+    except ValueError:
+        return False
+    return days * 86400 + hour * 3600 + minute * 60 - offset
+
+def parse_timestamp(value):
+    """ISO-8601时间戳转为Unix时间（秒），无法解析时返回None。
+    带时区的固定格式时间戳直接计算（每分钟的开始时间缓存），与 datetime.fromisoformat(...).timestamp() 结果相同；
+    其他格式（包括不带时区、按本地时间解释的时间戳）交给 datetime.fromisoformat"""
+    match = _ISO_TIMESTAMP.fullmatch(value) if isinstance(value, str) else None
+    if match:
+        minute, second, fraction, zone = match.groups()
+        key = (minute, zone)
+        start = _minute_starts.get(key)
+        if start is None:
+            start = minute_start(minute, zone)
+            if len(_minute_starts) >= MINUTE_CACHE_SIZE:
+                _minute_starts.clear()
+            _minute_starts[key] = start
+        if start is not False and second < '60':
+            # 与 timedelta.total_seconds() 相同：整数微秒除以10^6
+            return ((start + int(second)) * 1000000 + (int(fraction.ljust(6, '0')) if fraction else 0)) / 1000000
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+    except:
+        return None
+
+class SummaryAccumulator:
+    """基础统计累加器"""
+
+    def __init__(self):
+        self.total_requests = 0
+        self.total_size = 0
+        self.min_ts = None
+        self.max_ts = None
+
+    def feed(self, record):
+        self.total_requests += 1
+        self.total_size += record.response_size + record.request_size
+        ts = record.ts
+        if ts is not None:
+            if self.min_ts is None or ts < self.min_ts:
+                self.min_ts = ts
+            if self.max_ts is None or ts > self.max_ts:
+                self.max_ts = ts
+
+    def result(self):
+        total_requests = self.total_requests
+        total_size = self.total_size
+        duration = self.max_ts - self.min_ts if self.min_ts is not None else 0
+
+        return {
+            "totalRequests": total_requests,
+            "totalBytes": total_size,
+            "duration": duration,
+            "avgRequestSize": total_size / total_requests if total_requests > 0 else 0,
+            "requestsPerSecond": total_requests / duration if duration > 0 else 0
+        }
+
+class ProtocolAccumulator:
+    """协议分析累加器"""
+
+    def __init__(self):
+        self.protocol_counts = Counter()
+        self.total = 0
+
+    def feed(self, record):
+        url = record.url
+        self.total += 1
         if url.startswith('https://'):
-            protocol_counts['HTTPS'] += 1
+            self.protocol_counts['HTTPS'] += 1
         elif url.startswith('http://'):
-            protocol_counts['HTTP'] += 1
+            self.protocol_counts['HTTP'] += 1
         elif url.startswith('ws://'):
-            protocol_counts['WebSocket'] += 1
+            self.protocol_counts['WebSocket'] += 1
         elif url.startswith('wss://'):
-            protocol_counts['WebSocket Secure'] += 1
+            self.protocol_counts['WebSocket Secure'] += 1
         else:
-            protocol_counts['Other'] += 1
-    
-    total = len(entries)
-    return [
-        {
-            "name": protocol,
-            "requests": count,
-            "percentage": (count / total * 100) if total > 0 else 0
-        }
-        for protocol, count in protocol_counts.most_common()
-    ]
+            self.protocol_counts['Other'] += 1
 
-def analyze_domains(entries):
-    """域名分析"""
-    domain_counts = Counter()
-    domain_sizes = defaultdict(int)
-    
-    for entry in entries:
-        url = entry.get('request', {}).get('url', '')
+    def result(self):
+        total = self.total
+        return [
+            {
+                "name": protocol,
+                "requests": count,
+                "percentage": (count / total * 100) if total > 0 else 0
+            }
+            for protocol, count in self.protocol_counts.most_common()
+        ]
+
+# 域名缓存的最大条目数（超过后清空重建）和缓存的URL前缀的最大长度
+HOST_CACHE_SIZE = 65536
+HOST_PREFIX_BYTES = 256
+
+def url_host(hosts, url):
+    """与 urlparse(url).netloc 相同，结果按URL前缀缓存在 hosts 中：
+    netloc 不会越过第三个 /，对 URL 截到该处的前缀解析结果不变"""
+    cut = url.find('/')
+    if cut != -1:
+        cut = url.find('/', cut + 1)
+    if cut != -1:
+        cut = url.find('/', cut + 1)
+    prefix = url if cut == -1 else url[:cut]
+    host = hosts.get(prefix)
+    if host is None:
+        host = urlparse(prefix).netloc
+        # data: 等不含路径的长URL不缓存
+        if len(prefix) <= HOST_PREFIX_BYTES:
+            if len(hosts) >= HOST_CACHE_SIZE:
+                hosts.clear()
+            hosts[prefix] = host
+    return host
+
+class DomainAccumulator:
+    """域名分析累加器（域名按URL前缀缓存，同一站点的请求只解析一次）"""
+
+    def __init__(self, options=None):
+        self.top_n = (options or SECTION_OPTIONS["domains"])["top_n"]
+        self.domain_counts = Counter()
+        self.domain_sizes = defaultdict(int)
+        self.hosts = {}
+
+    def feed(self, record):
+        url = record.url
         if url:
             try:
-                domain = urlparse(url).netloc
-                domain_counts[domain] += 1
-                
-                response_size = entry.get('response', {}).get('bodySize', 0)
-                domain_sizes[domain] += response_size
+                domain = url_host(self.hosts, url)
+                self.domain_counts[domain] += 1
+                self.domain_sizes[domain] += record.response_size
             except:
-                continue
-    
-    return [
-        {
-            "domain": domain,
-            "requests": count,
-            "totalBytes": domain_sizes[domain]
+                pass
+
+    def result(self):
+        return [
+            {
+                "domain": domain,
+                "requests": count,
+                "totalBytes": self.domain_sizes[domain]
+            }
+            for domain, count in self.domain_counts.most_common(self.top_n)
+        ]
+
+class MethodAccumulator:
+    """HTTP方法分析累加器"""
+
+    def __init__(self):
+        self.method_counts = Counter()
+        self.total = 0
+
+    def feed(self, record):
+        self.method_counts[record.method] += 1
+        self.total += 1
+
+    def result(self):
+        total = self.total
+        return [
+            {
+                "method": method,
+                "requests": count,
+                "percentage": (count / total * 100) if total > 0 else 0
+            }
+            for method, count in self.method_counts.most_common()
+        ]
+
+class StatusCodeAccumulator:
+    """状态码分析累加器"""
+
+    def __init__(self):
+        self.status_counts = Counter()
+
+    def feed(self, record):
+        self.status_counts[record.status] += 1
+
+    def result(self):
+        return [
+            {
+                "statusCode": status,
+                "requests": count
+            }
+            for status, count in self.status_counts.most_common()
+        ]
+
+class PerformanceAccumulator:
+    """性能分析累加器（响应时间用分位数草图，内存不随请求数增长）"""
+
+    def __init__(self):
+        self.response_times = DDSketch()
+        self.size_count = 0
+        self.size_sum = 0
+
+    def feed(self, record):
+        # 响应时间
+        if record.time > 0:
+            self.response_times.add(record.time)
+
+        # 响应大小
+        size = record.response_size
+        if size > 0:
+            self.size_count += 1
+            self.size_sum += size
+
+    def result(self):
+        response_times = self.response_times
+        count = response_times.count
+        avg_response_time = response_times.sum / count if count else 0
+        max_response_time = response_times.max if count else 0
+        min_response_time = response_times.min if count else 0
+
+        avg_size = self.size_sum / self.size_count if self.size_count else 0
+
+        return {
+            "avgResponseTime": avg_response_time,
+            "maxResponseTime": max_response_time,
+            "minResponseTime": min_response_time,
+            "responseTimePercentiles": response_times.percentiles(),
+            "avgResponseSize": avg_size
         }
-        for domain, count in domain_counts.most_common(10)
-    ]
+
+class TimingAccumulator:
+    """时间分段分析累加器：请求写入列式表（见 har_columnar.py），结束后向量化统计"""
+
+    def __init__(self, options=None):
+        try:
+            from har_columnar import HarColumns
+        except ImportError:
+            raise Exception("缺少numpy包: pip install numpy")
+        self.options = options or SECTION_OPTIONS["timings"]
+        self.columns = HarColumns()
+        self.hosts = {}
+
+    def feed(self, record):
+        url = record.url
+        try:
+            domain = url_host(self.hosts, url) if url else ""
+        except:
+            domain = ""
+        self.columns.feed(record.ts, record.time, record.timings, domain, record.pageref)
+
+    def result(self):
+        from har_columnar import timing_stats
+        return timing_stats(self.columns.frozen(), self.options)
+
+class AnomalyAccumulator:
+    """异常检测累加器"""
+
+    def __init__(self, options=None):
+        self.thresholds = options or SECTION_OPTIONS["anomalies"]
+        self.total = 0
+        self.error_count = 0
+        self.slow_count = 0
+
+    def feed(self, record):
+        self.total += 1
+        if record.status >= 400:
+            self.error_count += 1
+        if record.time > self.thresholds["slow_request_ms"]:  # 默认超过5秒
+            self.slow_count += 1
+
+    def result(self):
+        anomalies = []
+
+        # 检测高错误率
+        error_rate = (self.error_count / self.total) * 100 if self.total else 0
+
+        if error_rate > self.thresholds["error_rate"]:
+            anomalies.append({
+                "type": "high_error_rate",
+                "severity": "high",
+                "description": f"高错误率: {error_rate:.2f}%",
+                "details": {"errorCount": self.error_count, "totalRequests": self.total}
+            })
+
+        # 检测慢请求
+        if self.slow_count:
+            anomalies.append({
+                "type": "slow_requests",
+                "severity": "medium",
+                "description": f"发现 {self.slow_count} 个慢请求",
+                "details": {"slowRequestCount": self.slow_count}
+            })
+
+        return anomalies
+
+def analyze_summary(entries):
+    """基础统计"""
+    return run_section("summary", entries)
+
+def analyze_protocols(entries):
+    """协议分析"""
+    return run_section("protocols", entries)
+
+def analyze_domains(entries, options=None):
+    """域名分析"""
+    return run_section("domains", entries, options)
 
 def analyze_methods(entries):
     """HTTP方法分析"""
-    method_counts = Counter()
-    
-    for entry in entries:
-        method = entry.get('request', {}).get('method', 'UNKNOWN')
-        method_counts[method] += 1
-    
-    total = len(entries)
-    return [
-        {
-            "method": method,
-            "requests": count,
-            "percentage": (count / total * 100) if total > 0 else 0
-        }
-        for method, count in method_counts.most_common()
-    ]
+    return run_section("methods", entries)
 
 def analyze_status_codes(entries):
     """状态码分析"""
-    status_counts = Counter()
-    
-    for entry in entries:
-        status = entry.get('response', {}).get('status', 0)
-        status_counts[status] += 1
-    
-    return [
-        {
-            "statusCode": status,
-            "requests": count
-        }
-        for status, count in status_counts.most_common()
-    ]
+    return run_section("status_codes", entries)
 
 def analyze_performance(entries):
     """性能分析"""
-    response_times = []
-    sizes = []
-    
-    for entry in entries:
-        # 响应时间
-        time_data = entry.get('time', 0)
-        if time_data > 0:
-            response_times.append(time_data)
-        
-        # 响应大小
-        size = entry.get('response', {}).get('bodySize', 0)
-        if size > 0:
-            sizes.append(size)
-    
-    avg_response_time = sum(response_times) / len(response_times) if response_times else 0
-    max_response_time = max(response_times) if response_times else 0
-    min_response_time = min(response_times) if response_times else 0
-    
-    avg_size = sum(sizes) / len(sizes) if sizes else 0
-    
+    return run_section("performance", entries)
+
+def analyze_timings(entries, options=None):
+    """时间分段分析"""
+    return run_section("timings", entries, options)
+
+def detect_anomalies(entries, options=None):
+    """异常检测"""
+    return run_section("anomalies", entries, options)
+
+# 分析段：名称 -> 累加器，顺序即结果JSON中的顺序
+ANALYZERS = {
+    "summary": SummaryAccumulator,
+    "protocols": ProtocolAccumulator,
+    "domains": DomainAccumulator,
+    "methods": MethodAccumulator,
+    "status_codes": StatusCodeAccumulator,
+    "performance": PerformanceAccumulator,
+    "timings": TimingAccumulator,
+    "anomalies": AnomalyAccumulator
+}
+
+# 需要numpy的分析段：没有numpy时默认不输出，在 sections 中明确请求时报错
+NUMPY_SECTIONS = ("timings",)
+
+# 分析段选项的默认值，可由配置中的 options.<分析段> 覆盖
+SECTION_OPTIONS = {
+    "domains": {"top_n": 10},
+    "timings": {"top_n": 10, "timeline_points": 200, "max_pages": 20, "critical_path_steps": 50},
+    "anomalies": {"error_rate": 10, "slow_request_ms": 5000}
+}
+
+def batch_summary(result):
+    """单个文件结果中跨文件汇总用到的部分"""
+    summary = result.get("summary") or {}
     return {
-        "avgResponseTime": avg_response_time,
-        "maxResponseTime": max_response_time,
-        "minResponseTime": min_response_time,
-        "avgResponseSize": avg_size
+        "requests": summary.get("totalRequests", 0),
+        "bytes": summary.get("totalBytes", 0),
+        "methods": [(method["method"], method["requests"]) for method in result.get("methods") or []],
+        "status_codes": [(status["statusCode"], status["requests"]) for status in result.get("status_codes") or []],
+        "anomalies": [anomaly.get("type") for anomaly in result.get("anomalies") or []]
     }
 
-def detect_anomalies(entries):
-    """异常检测"""
-    anomalies = []
-    
-    # 检测高错误率
-    error_count = sum(1 for entry in entries 
-                     if entry.get('response', {}).get('status', 0) >= 400)
-    error_rate = (error_count / len(entries)) * 100 if entries else 0
-    
-    if error_rate > 10:
-        anomalies.append({
-            "type": "high_error_rate",
-            "severity": "high",
-            "description": f"高错误率: {error_rate:.2f}%",
-            "details": {"errorCount": error_count, "totalRequests": len(entries)}
-        })
-    
-    # 检测慢请求
-    slow_requests = [
-        entry for entry in entries 
-        if entry.get('time', 0) > 5000  # 超过5秒
-    ]
-    
-    if slow_requests:
-        anomalies.append({
-            "type": "slow_requests",
-            "severity": "medium",
-            "description": f"发现 {len(slow_requests)} 个慢请求",
-            "details": {"slowRequestCount": len(slow_requests)}
-        })
-    
-    return anomalies
+def aggregate_batch(summaries):
+    """跨文件汇总：请求数、字节数求和，HTTP方法、状态码和异常类型按文件合并"""
+    total_requests = sum(summary["requests"] for summary in summaries)
+    method_counts = Counter()
+    status_counts = Counter()
+    anomaly_counts = Counter()
+    for summary in summaries:
+        for method, count in summary["methods"]:
+            method_counts[method] += count
+        for status, count in summary["status_codes"]:
+            status_counts[status] += count
+        anomaly_counts.update(summary["anomalies"])
+
+    return {
+        "totalRequests": total_requests,
+        "totalBytes": sum(summary["bytes"] for summary in summaries),
+        "methods": [
+            {
+                "method": method,
+                "requests": count,
+                "percentage": (count / total_requests * 100) if total_requests > 0 else 0
+            }
+            for method, count in method_counts.most_common()
+        ],
+        "statusCodes": [
+            {"statusCode": status, "requests": count}
+            for status, count in status_counts.most_common()
+        ],
+        "anomalies": [
+            {"type": anomaly_type, "count": count}
+            for anomaly_type, count in anomaly_counts.most_common()
+        ]
+    }
+
+def emit_event(event):
+    """流式输出一行JSON事件，立即刷新以便调用方实时读取"""
+    print(json.dumps(event, ensure_ascii=False), flush=True)
 
 def main():
+    # 用法：
+    #   analyze_har.py <HAR文件> <配置JSON>
+    #   analyze_har.py --stream <HAR文件> <配置JSON>   逐行输出JSON事件（进度、各分析段结果）
+    #   analyze_har.py --batch <清单JSON文件>          批量分析，逐行输出每个文件的结果（见 batch.py）
+    if len(sys.argv) == 3 and sys.argv[1] == "--batch":
+        try:
+            run_batch(sys.argv[2], analyze_har, emit_event, summarize=batch_summary, aggregate=aggregate_batch)
+            emit_event({"type": "done"})
+        except Exception as e:
+            emit_event({"type": "error", "error": {"message": str(e)}})
+            sys.exit(1)
+        return
+
+    if len(sys.argv) == 4 and sys.argv[1] == "--stream":
+        try:
+            stream_har(sys.argv[2], json.loads(sys.argv[3]), emit_event)
+            emit_event({"type": "done"})
+        except Exception as e:
+            emit_event({"type": "error", "error": {"message": str(e)}})
+            sys.exit(1)
+        return
+
     if len(sys.argv) != 3:
         print(json.dumps({"error": {"message": "参数错误"}}))
         sys.exit(1)
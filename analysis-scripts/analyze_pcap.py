@@ -3,55 +3,712 @@
 PCAP文件分析脚本 - 简化版
 """
 
+import os
 import sys
 import json
 import time
+import math
+import heapq
+import importlib
+from array import array
 from datetime import datetime
-from collections import Counter, defaultdict
-
-try:
-    from scapy.all import rdpcap, IP, TCP, UDP, ICMP, ARP, IPv6, DNS, Raw
-except ImportError:
-    print(json.dumps({
-        "error": {
-            "code": "IMPORT_ERROR",
-            "message": "缺少scapy包: pip install scapy"
-        }
-    }))
-    sys.exit(1)
+from bisect import bisect_right
+from collections import Counter, defaultdict, deque
+from itertools import repeat
+
+from fast_dissector import (
+    PacketRecord, iter_fast_records, iter_frame_records, iter_mmap_records, dissect_frame, plan_shards,
+    record_span, SCAPY_APP_LAYERS, SCAPY_TCP_APP_PORTS, SCAPY_UDP_APP_PORTS
+)
+from flow_table import FlowTable, unpack_flow_key
+from http_reassembly import HttpReassembler, FLOW_IDLE_TIMEOUT
+from result_cache import cached_analysis, analyzer_version
+from sketches import (
+    SpaceSaving, CountMinSketch, HyperLogLog, DistinctValues, DistinctPorts, DDSketch, PORT_SET_LIMIT,
+    hash64, histogram_percentiles
+)
+from batch import run_batch
+from scan_progress import ScanProgress
+from timeseries import (
+    PYRAMID_STEPS_MS, pyramid_levels, build_pyramid, merge_buckets, bucket_width_ms, OnlineTrafficEvents
+)
+from pcap_partial import (
+    write_partial, read_partial, encode_counter, decode_counter,
+    encode_array, decode_array, encode_bytes, decode_bytes, capture_fingerprint, write_checkpoint, read_checkpoint
+)
+
+# 多进程分片：每个分片至少这么多字节，小文件直接单进程分析
+MIN_SHARD_BYTES = 16 * 1024 * 1024
+
+# 分析器版本由这些源文件决定，代码改动后缓存的结果和检查点失效；
+# 并行度和是否向量化不影响结果，不参与缓存键
+ANALYZER_SOURCES = ("analyze_pcap.py", "fast_dissector.py", "flow_table.py",
+                    "http_reassembly.py", "pcap_columnar.py", "sketches.py", "timeseries.py")
+CACHE_NEUTRAL_KEYS = ("workers", "vectorized")
+# 检查点：检查点文件路径本身也不影响累加器状态
+CHECKPOINT_NEUTRAL_KEYS = CACHE_NEUTRAL_KEYS + ("cache", "checkpoint")
+
+# 未配置 vectorized 时，小于这个大小的抓包不启用向量化统计（省去导入numpy）
+MIN_VECTORIZED_BYTES = 4 * 1024 * 1024
+
+# Scapy按需导入（load_scapy）：只有scapy引擎需要解析帧内容时才导入用到的层
+PcapReader = IP = TCP = UDP = ICMP = ARP = IPv6 = DNS = Raw = TCPerror = UDPerror = conf = None
+
+# 冷启动预算（毫秒）：导入模块到可以开始读包的耗时，--startup-profile 对照检查
+STARTUP_BUDGET_MS = {"fast": 100, "scapy": 900}
+
+# 分析段需要的解析深度：只读时间戳和长度 / 解析L2-L4头部 / 还需要载荷和DNS识别
+DISSECT_FRAME = 0
+DISSECT_HEADERS = 1
+DISSECT_PAYLOAD = 2
 
 def analyze_pcap(file_path, config):
-    """分析PCAP文件"""
+    """分析PCAP文件（流式单遍扫描）；配置了cache时相同内容和配置的结果直接取自缓存"""
     try:
-        packets = rdpcap(file_path)
-        if len(packets) == 0:
-            raise Exception("PCAP文件中没有数据包")
-        
-        results = {
-            "summary": analyze_summary(packets),
-            "protocols": analyze_protocols(packets),
-            "network": analyze_network(packets),
-            "transport": analyze_transport(packets),
-            "temporal": analyze_temporal(packets),  # 新增：时间线分析
-            "connections": analyze_connections(packets),
-            "http_sessions": analyze_http_sessions(packets),  # 新增HTTP会话分析
-            "anomalies": detect_anomalies(packets),
-            "smart_insights": analyze_smart_insights(packets)  # 新增智能诊断引擎
+        config = config or {}
+        return cached_analysis("pcap", analyzer_version(ANALYZER_SOURCES), file_path, config,
+                               lambda: scan_pcap(file_path, config), CACHE_NEUTRAL_KEYS)
+
+    except Exception as e:
+        raise Exception(f"分析失败: {str(e)}")
+
+def scan_pcap(file_path, config):
+    """扫描抓包文件并生成结果"""
+    if config.get("checkpoint"):
+        accumulators = resume_accumulators(file_path, config)
+    else:
+        accumulators = collect_accumulators(file_path, config)
+    return build_results(accumulators, requested_sections(config))
+
+def resume_accumulators(file_path, config):
+    """checkpoint 配置：从检查点继续扫描追加写入的抓包，扫描后把新的检查点写回
+    
+    检查点保存已扫描到的文件偏移和全部累加器状态（含未结束的流和未拼完的HTTP报文），
+    恢复后只扫描之后新增的完整记录，结果与从头扫描相同。分析代码或配置变化、文件被
+    截断或轮转（指纹不符）时从头扫描。检查点模式单进程逐包扫描。
+    """
+    checkpoint_path = config["checkpoint"]
+    config = dict(config, vectorized=False, workers=1)
+    version = analyzer_version(ANALYZER_SOURCES)
+    settings = analysis_settings(config)
+    
+    accumulators = create_accumulators(config)
+    start = state = None
+    resumed = False
+    checkpoint = read_checkpoint(checkpoint_path)
+    if (checkpoint and checkpoint["analyzer"] == version and checkpoint["config"] == settings
+            and os.path.getsize(file_path) >= checkpoint["offset"]
+            and capture_fingerprint(file_path, checkpoint["offset"]) == checkpoint["fingerprint"]):
+        for name, accumulator in accumulators.items():
+            accumulator.load_state(checkpoint["sections"][name])
+        start, state = checkpoint["offset"], checkpoint["state"]
+        resumed = True
+    
+    start, end, start_state, end_state = record_span(file_path, start, state)
+    records = iter_records(file_path, config, dissection_level(config, accumulators),
+                           (start, end, start_state))
+    run_accumulators(records, accumulators.values())
+    if resumed and end == start:
+        # 没有新增记录，检查点不变
+        return accumulators
+    
+    write_checkpoint(checkpoint_path, {
+        "analyzer": version,
+        "config": settings,
+        "offset": end,
+        "state": end_state,
+        "fingerprint": capture_fingerprint(file_path, end),
+        "sections": {
+            name: accumulator.dump_state()
+            for name, accumulator in accumulators.items()
         }
+    })
+    return accumulators
+
+def stream_pcap(file_path, config, emit):
+    """流式分析：扫描中定期输出进度事件，每个分析段的结果一确定就输出分析段事件
+    
+    不需要载荷的分析段（基础统计、时间线等）先单独扫描一遍并立即输出，需要载荷的
+    （协议识别、HTTP会话重建等）在第二遍扫描后输出，界面不必等HTTP重建完成。
+    在线流量事件检测时，每个流量事件在扫描到它之后就输出（traffic_event 事件）。
+    流式分析单进程扫描；配置了cache或checkpoint时照常分析，完成后逐段输出。
+    """
+    try:
+        config = config or {}
+        sections = requested_sections(config)
+        if config.get("cache") or config.get("checkpoint"):
+            for name, result in analyze_pcap(file_path, config).items():
+                emit({"type": "section", "name": name, "result": result})
+            return
         
-        return results
+        size = os.path.getsize(file_path)
+        config = dict(scan_config(config, size), workers=1)
+        stages = stream_stages(config, sections)
+        for stage, stage_sections in enumerate(stages, 1):
+            accumulators = create_accumulators(config, stage_sections)
+            progress = ScanProgress(emit, size, stage, len(stages))
+            records = progress.track(
+                iter_records(file_path, config, dissection_level(config, accumulators)))
+            if "temporal" in stage_sections:
+                options = section_options(config, "temporal")
+                if online_event_detection(options):
+                    live = OnlineTrafficEvents(
+                        options, lambda event: emit({"type": "traffic_event", "event": event}))
+                    records = live.track(records)
+            run_accumulators(records, accumulators.values())
+            progress.report()
+            if accumulators["summary"].total_packets == 0:
+                raise Exception("PCAP文件中没有数据包")
+            for name in stage_sections:
+                emit({"type": "section", "name": name, "result": accumulators[name].result()})
         
     except Exception as e:
         raise Exception(f"分析失败: {str(e)}")
 
-def analyze_summary(packets):
-    """基础统计"""
-    total_packets = len(packets)
-    total_bytes = sum(len(pkt) for pkt in packets)
+def stream_stages(config, sections):
+    """流式分析的扫描阶段：按分析段（含依赖）需要的解析深度分为不需要载荷和需要载荷两组"""
+    registry = analyzer_registry(config)
+    
+    def level(name):
+        _, dependencies, own_level = registry[name]
+        return max([own_level] + [level(dependency) for dependency in dependencies])
+    
+    early = [name for name in sections if level(name) < DISSECT_PAYLOAD]
+    late = [name for name in sections if level(name) == DISSECT_PAYLOAD]
+    return [stage for stage in (early, late) if stage]
+
+def build_results(accumulators, sections=None):
+    """由扫描（或合并）完成的累加器生成 sections（默认全部）中各分析段的结果"""
+    if accumulators["summary"].total_packets == 0:
+        raise Exception("PCAP文件中没有数据包")
+    
+    results = {}
+    for name in sections or RESULT_SECTIONS:
+        results[name] = accumulators[name].result()
+    return results
+
+def requested_sections(config):
+    """sections 配置：要输出的分析段（按结果JSON中的顺序），未设置时为全部"""
+    sections = config.get("sections")
+    for name in config.get("options") or {}:
+        if name not in SECTION_OPTIONS:
+            raise Exception(f"分析段没有可配置的选项: {name}")
+    if sections is None:
+        return RESULT_SECTIONS
+    if isinstance(sections, str) or not sections:
+        raise Exception(f"无效的sections配置: {sections}")
+    for name in sections:
+        if name not in RESULT_SECTIONS:
+            raise Exception(f"未知的分析段: {name}")
+    return tuple(name for name in RESULT_SECTIONS if name in sections)
+
+def section_options(config, name):
+    """分析段的选项（前N项数量、阈值等）：配置中的 options.<分析段> 覆盖默认值"""
+    defaults = SECTION_OPTIONS[name]
+    overrides = (config.get("options") or {}).get(name) or {}
+    for key in overrides:
+        if key not in defaults:
+            raise Exception(f"未知的分析段选项: {name}.{key}")
+    return dict(defaults, **overrides)
+
+def analysis_settings(config):
+    """决定累加器状态的配置项（去掉并行度、向量化、缓存和检查点路径），用于判断状态能否续用或合并"""
+    return {
+        name: value for name, value in config.items()
+        if name not in CHECKPOINT_NEUTRAL_KEYS
+    }
+
+def analyze_pcap_partial(file_path, config, output_path):
+    """分析PCAP文件，只把累加器状态写入中间结果文件，供之后与其他抓包合并"""
+    try:
+        # 中间结果只保存逐包累加器的状态，与是否启用向量化无关
+        accumulators = collect_accumulators(file_path, dict(config or {}, vectorized=False))
+        write_partial(output_path, {
+            name: accumulator.dump_state()
+            for name, accumulator in accumulators.items()
+        }, source=os.path.basename(file_path), config=config)
+        return {
+            "partial": output_path,
+            "totalPackets": accumulators["summary"].total_packets
+        }
+        
+    except Exception as e:
+        raise Exception(f"分析失败: {str(e)}")
+
+def merge_partials(paths):
+    """按给定顺序合并多个中间结果文件，生成最终结果"""
+    try:
+        accumulators = settings = None
+        for path in paths:
+            sections, partial_config = read_partial(path)
+            if accumulators is None:
+                # 输出的分析段和选项以第一个中间结果的配置为准，其余中间结果的配置必须与之一致
+                config = dict(partial_config, vectorized=False)
+                settings = analysis_settings(partial_config)
+            elif analysis_settings(partial_config) != settings:
+                raise Exception(f"中间结果的分析配置与第一个文件不一致: {os.path.basename(path)}")
+            partial = create_accumulators(config)
+            for name, accumulator in partial.items():
+                if name not in sections:
+                    raise Exception(f"中间结果缺少分析段: {name}")
+                accumulator.load_state(sections[name])
+            
+            if accumulators is None:
+                accumulators = partial
+            else:
+                merge_accumulators(accumulators, partial)
+        
+        return build_results(accumulators, requested_sections(config))
+        
+    except Exception as e:
+        raise Exception(f"合并失败: {str(e)}")
+
+def dissect_packet(pkt, payloads=True):
+    """将Scapy数据包转换为PacketRecord；payloads为False时不查找DNS和Raw层"""
+    rec = PacketRecord()
+    rec.ts = float(pkt.time)
+    rec.length = len(pkt)
+    rec.src = rec.dst = None
+    rec.sport = rec.dport = 0
+    rec.flags = rec.seq = 0
+    rec.is_arp = False
+    
+    # 网络层
+    if IP in pkt:
+        ip = pkt[IP]
+        rec.ip_version = 4
+        rec.src = ip.src
+        rec.dst = ip.dst
+    elif IPv6 in pkt:
+        ip = pkt[IPv6]
+        rec.ip_version = 6
+        rec.src = ip.src
+        rec.dst = ip.dst
+    else:
+        rec.ip_version = 0
+        rec.is_arp = ARP in pkt
+    
+    # 传输层（优先级与各分析器一致：TCP > UDP > ICMP）
+    if TCP in pkt:
+        tcp = pkt[TCP]
+        rec.proto = 6
+        rec.sport = tcp.sport
+        rec.dport = tcp.dport
+        rec.flags = int(tcp.flags)
+        rec.seq = tcp.seq
+    elif UDP in pkt:
+        udp = pkt[UDP]
+        rec.proto = 17
+        rec.sport = udp.sport
+        rec.dport = udp.dport
+    elif ICMP in pkt:
+        rec.proto = 1
+    else:
+        rec.proto = 0
+    
+    if payloads:
+        rec.is_dns = DNS in pkt
+        rec.payload = pkt[Raw].load if Raw in pkt else None
+        # 应用层端口的载荷解析失败时Scapy会整体退回为Raw层（是否失败因内容而异），
+        # 与快速解析器一致，这些端口上不返回载荷；ICMP差错报文按其引用的TCP/UDP头部判断
+        proto, sport, dport = rec.proto, rec.sport, rec.dport
+        if rec.payload is not None and proto == 1:
+            if TCPerror in pkt:
+                proto, sport, dport = 6, pkt[TCPerror].sport, pkt[TCPerror].dport
+            elif UDPerror in pkt:
+                proto, sport, dport = 17, pkt[UDPerror].sport, pkt[UDPerror].dport
+        if rec.payload is not None and (
+                proto == 6 and (sport in SCAPY_TCP_APP_PORTS or dport in SCAPY_TCP_APP_PORTS) or
+                proto == 17 and (sport in SCAPY_UDP_APP_PORTS or dport in SCAPY_UDP_APP_PORTS)):
+            rec.payload = None
+    else:
+        rec.is_dns = False
+        rec.payload = None
+    return rec
+
+def load_scapy():
+    """导入scapy引擎用到的Scapy模块：inet/inet6/l2/dns 层，不加载 scapy.all
+    
+    scapy.all 会加载全部协议层和contrib模块，导入约需1秒；统计分析只需要这几层、
+    承载IP的PPP层，以及 fast_dissector.SCAPY_APP_LAYERS 中按端口解析应用层协议的层：
+    这些端口（NTP、NetBIOS、SMB、IKE、Kerberos等）的载荷在 scapy.all 下按应用层协议解析，
+    不导入它们时载荷成为Raw层，会被当作HTTP候选，与快速解析器和原实现不一致。
+    """
+    global PcapReader, IP, TCP, UDP, ICMP, ARP, IPv6, DNS, Raw, TCPerror, UDPerror, conf
+    if conf is not None:
+        return
+    try:
+        from scapy.config import conf as scapy_conf
+        from scapy.packet import Raw as raw_layer
+        from scapy.utils import PcapReader as pcap_reader
+        from scapy.layers.l2 import ARP as arp_layer
+        from scapy.layers.inet import IP as ip_layer, TCP as tcp_layer, UDP as udp_layer, ICMP as icmp_layer
+        from scapy.layers.inet import TCPerror as tcp_error_layer, UDPerror as udp_error_layer
+        from scapy.layers.inet6 import IPv6 as ipv6_layer
+        from scapy.layers.dns import DNS as dns_layer
+        # PPPoE承载IP，需要其层绑定才能解析到网络层
+        import scapy.layers.ppp
+        for module in SCAPY_APP_LAYERS:
+            importlib.import_module(module)
+    except ImportError:
+        raise Exception("缺少scapy包: pip install scapy")
+    PcapReader, Raw, ARP, DNS = pcap_reader, raw_layer, arp_layer, dns_layer
+    IP, TCP, UDP, ICMP, IPv6 = ip_layer, tcp_layer, udp_layer, icmp_layer, ipv6_layer
+    TCPerror, UDPerror = tcp_error_layer, udp_error_layer
+    conf = scapy_conf
+
+def prepare_engine(engine, vectorized=False):
+    """导入解析引擎开始读包前需要的模块：scapy引擎的Scapy层，vectorized 时还有numpy"""
+    if engine not in ("scapy", "fast"):
+        raise Exception(f"不支持的解析引擎: {engine}")
+    if engine == "scapy":
+        load_scapy()
+    if vectorized:
+        analyzer_registry({})
+
+def startup_profile(engine):
+    """在新的解释器中测量小文件的冷启动：导入本脚本并准备解析引擎，报告每个模块的导入耗时"""
+    import subprocess
+    if engine not in STARTUP_BUDGET_MS:
+        raise Exception(f"不支持的解析引擎: {engine}")
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    code = f"import analyze_pcap; analyze_pcap.prepare_engine({engine!r})"
+    started = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                          cwd=script_dir, capture_output=True, text=True)
+    wall_ms = (time.perf_counter() - started) * 1000
+    if proc.returncode != 0:
+        raise Exception(f"启动测量失败: {proc.stderr.strip().splitlines()[-1:]}")
+    
+    # -X importtime 输出：import time: 自身耗时(us) | 累计耗时(us) | 模块（缩进表示嵌套）
+    modules = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue
+        name = fields[2][1:].rstrip()
+        if name.startswith(" "):
+            continue  # 只统计顶层导入，嵌套导入已计入累计耗时
+        modules.append({
+            "module": name,
+            "selfMs": int(fields[0]) / 1000,
+            "cumulativeMs": int(fields[1]) / 1000
+        })
+    
+    import_ms = sum(module["cumulativeMs"] for module in modules)
+    budget_ms = STARTUP_BUDGET_MS[engine]
+    return {
+        "engine": engine,
+        "importMs": import_ms,
+        "processMs": wall_ms,
+        "budgetMs": budget_ms,
+        "withinBudget": import_ms <= budget_ms,
+        "modules": sorted(modules, key=lambda module: module["cumulativeMs"], reverse=True)[:20]
+    }
+
+def iter_packet_records(file_path, payloads=True):
+    """逐包读取PCAP/PCAPNG文件，内存占用与文件大小无关"""
+    with PcapReader(file_path) as reader:
+        for pkt in reader:
+            yield dissect_packet(pkt, payloads)
+
+def iter_records(file_path, config, level=DISSECT_PAYLOAD, shard=None):
+    """按配置选择解析引擎：scapy（默认，完整解析）或 fast（struct直接解析头部）
+    
+    level 为所选分析段需要的解析深度：只需要时间戳和长度时两种引擎都只读记录头，
+    不需要载荷时不提取载荷。shard 为 plan_shards 划分的分片，None 表示整个文件。
+    """
+    engine = config.get("engine", "scapy")
+    if engine not in ("scapy", "fast"):
+        raise Exception(f"不支持的解析引擎: {engine}")
+    if level == DISSECT_FRAME:
+        return iter_frame_records(file_path, shard)
+    
+    payloads = level == DISSECT_PAYLOAD
+    if engine == "fast":
+        return iter_fast_records(file_path, shard, payloads)
+    load_scapy()
+    if shard is None:
+        return iter_packet_records(file_path, payloads)
+    return (dissect_packet(scapy_frame(data, linktype, ts), payloads)
+            for ts, linktype, data in iter_mmap_records(file_path, shard))
+
+def scan_config(config, size):
+    """按文件大小补全扫描配置"""
+    if "vectorized" not in config and size < MIN_VECTORIZED_BYTES:
+        # 小文件逐包统计已经足够快，不值得为向量化导入numpy
+        config = dict(config, vectorized=False)
+    return config
+
+def collect_accumulators(file_path, config):
+    """扫描抓包文件，返回填充完毕的累加器；配置了多个worker时按分片并行扫描后合并"""
+    size = os.path.getsize(file_path)
+    config = scan_config(config or {}, size)
+    workers = worker_count(config)
+    shards = []
+    if workers > 1:
+        shards = plan_shards(file_path, min(workers, max(1, size // MIN_SHARD_BYTES)))
+    
+    if len(shards) <= 1:
+        accumulators = create_accumulators(config)
+        records = iter_records(file_path, config, dissection_level(config, accumulators))
+        run_accumulators(records, accumulators.values())
+        return accumulators
+    
+    # 各分片的时间线网格统一以第一个包的时间戳为起点，合并时按桶对齐
+    origin = next(iter_frame_records(file_path, shards[0])).ts
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=len(shards)) as pool:
+        partials = pool.map(analyze_shard, repeat(file_path), shards, repeat(config), repeat(origin))
+        accumulators = next(partials)
+        # 按文件顺序合并，Counter等结构的首次出现顺序与单进程扫描一致
+        for partial in partials:
+            merge_accumulators(accumulators, partial)
+    return accumulators
+
+def worker_count(config):
+    """workers 配置：整数或 "auto"（CPU核数），默认1即单进程"""
+    workers = config.get("workers", 1)
+    if workers == "auto":
+        return os.cpu_count() or 1
+    try:
+        return max(1, int(workers))
+    except (TypeError, ValueError):
+        raise Exception(f"无效的workers配置: {workers}")
+
+def analyze_shard(file_path, shard, config, origin=None):
+    """在子进程中扫描一个分片，返回未计算结果的累加器（origin 为时间线网格的起点）"""
+    accumulators = create_accumulators(config)
+    temporal = accumulators.get("temporal")
+    if origin is not None and isinstance(temporal, TemporalAccumulator):
+        temporal.anchor(origin)
+    records = iter_records(file_path, config, dissection_level(config, accumulators), shard)
+    run_accumulators(records, accumulators.values())
+    return accumulators
+
+def scapy_frame(data, linktype, ts):
+    """与PcapReader相同的方式把一帧数据解析为Scapy数据包"""
+    data = bytes(data)
+    try:
+        pkt = conf.l2types.num2layer[linktype](data)
+    except Exception:
+        pkt = conf.raw_layer(data)
+    pkt.time = ts
+    return pkt
+
+def merge_accumulators(accumulators, other):
+    """把另一个分片（文件中位于其后）的累加器合并进来"""
+    for name, accumulator in accumulators.items():
+        accumulator.merge(other[name])
+
+def analyzer_registry(config):
+    """当前配置下的分析段注册表"""
+    registry = dict(ANALYZERS)
+    if use_vectorized(config):
+        # 向量化模式：三个统计段共享一张列式数据包表
+        registry.update(columnar_analyzers())
+    # 近似模式：Top-K列表由内存有界的概要结构给出，不再依赖流表
+    if section_options(config, "network")["approximate"]:
+        registry["network"] = (SketchNetworkAccumulator, (), DISSECT_HEADERS)
+    if section_options(config, "transport")["approximate"]:
+        registry["transport"] = (SketchTransportAccumulator, (), DISSECT_HEADERS)
+    if section_options(config, "anomalies")["approximate"]:
+        registry["anomalies"] = (SketchAnomalyAccumulator, (), DISSECT_HEADERS)
+    return registry
+
+def create_accumulators(config=None, sections=None):
+    """按注册表创建分析段（sections 为空时创建配置中选择的输出段），依赖的分析段先创建且只创建一次
+    
+    返回的字典按依赖顺序排列，扫描时被依赖的共享数据（流表等）先于依赖它的分析段更新。
+    基础统计段总是创建，用于判断抓包是否为空。
+    """
+    config = config or {}
+    registry = analyzer_registry(config)
+    
+    accumulators = {}
+    resolving = set()
+    
+    def build(name):
+        if name in accumulators:
+            return accumulators[name]
+        if name not in registry:
+            raise Exception(f"未知的分析段: {name}")
+        if name in resolving:
+            raise Exception(f"分析段存在循环依赖: {name}")
+        resolving.add(name)
+        factory, dependencies, _ = registry[name]
+        arguments = [build(dependency) for dependency in dependencies]
+        if name in SECTION_OPTIONS:
+            accumulator = factory(*arguments, options=section_options(config, name))
+        else:
+            accumulator = factory(*arguments)
+        resolving.discard(name)
+        accumulators[name] = accumulator
+        return accumulator
+    
+    build("summary")
+    for name in sections or requested_sections(config):
+        build(name)
+    return accumulators
+
+def dissection_level(config, accumulators):
+    """已创建的分析段中最深的解析需求"""
+    registry = analyzer_registry(config)
+    return max(registry[name][2] for name in accumulators)
+
+def use_vectorized(config):
+    """vectorized 配置：未设置时有numpy即启用（小文件除外，见 collect_accumulators），true时必须有numpy，false时关闭"""
+    option = config.get("vectorized")
+    if option is False:
+        return False
+    try:
+        import numpy
+    except ImportError:
+        if option:
+            raise Exception("缺少numpy包: pip install numpy")
+        return False
+    return True
+
+def columnar_analyzers():
+    """向量化模式下替换的分析段（基础统计逐包只做几次加法，保留逐包累加器，只需要记录头）"""
+    from pcap_columnar import PacketColumns
+    return {
+        "packet_columns": (PacketColumns, (), DISSECT_HEADERS),
+        "transport": (lambda columns, options: ColumnarSection(columns, columnar_transport, options),
+                      ("packet_columns",), DISSECT_FRAME),
+        "temporal": (lambda columns, options: ColumnarSection(columns, columnar_temporal, options),
+                     ("packet_columns",), DISSECT_FRAME),
+        "anomalies": (lambda columns, options: ColumnarSection(columns, columnar_anomalies, options),
+                      ("packet_columns",), DISSECT_FRAME)
+    }
+
+class ColumnarSection:
+    """向量化统计段：不单独接收数据包，结果由共享的列式数据包表计算"""
+    feed = None
+    
+    def __init__(self, columns, compute, options):
+        self.columns = columns
+        self.compute = compute
+        self.options = options
+    
+    def merge(self, other):
+        # 共享的列式数据包表作为独立条目合并
+        pass
+    
+    def result(self):
+        return self.compute(self.columns.frozen(), self.options)
+
+def columnar_transport(cols, options):
+    from pcap_columnar import transport_stats
+    return build_transport(**transport_stats(cols), top_n=options["top_n"])
+
+def columnar_temporal(cols, options):
+    from pcap_columnar import temporal_buckets
+    if not len(cols):
+        return build_temporal(None, None, 0, [], [], [])
+    start_time = float(cols.ts.min())
+    end_time = float(cols.ts.max())
+    bucket_size, num_buckets = temporal_bucket_layout(
+        end_time - start_time, options["max_buckets"], options["min_bucket_seconds"])
+    time_buckets, byte_buckets, protocol_buckets = temporal_buckets(
+        cols, start_time, bucket_size, num_buckets, TIMELINE_PROTOCOLS)
+    traffic_events = None
+    if online_event_detection(options):
+        from pcap_columnar import event_buckets
+        online = OnlineTrafficEvents(options)
+        for index, packet_count, byte_count in zip(*event_buckets(cols, online.bucket_ms)):
+            online.feed_bucket(index, packet_count, byte_count)
+        traffic_events = online.finish()
+    result = build_temporal(start_time, end_time, bucket_size, time_buckets, byte_buckets,
+                            protocol_buckets, options, traffic_events)
+    if options["pyramid"]:
+        from pcap_columnar import pyramid_levels
+        levels = pyramid_levels(cols, PYRAMID_STEPS_MS, len(TIMELINE_PROTOCOLS))
+        result["pyramid"] = build_pyramid(levels, TIMELINE_PROTOCOLS, start_time, end_time,
+                                          options["pyramid_max_buckets"])
+    return result
+
+def columnar_anomalies(cols, options):
+    from pcap_columnar import anomaly_stats
+    stats = anomaly_stats(cols)
+    stats["source_packets"] = source_packet_stats(stats.pop("ip_packet_count"))
+    return build_anomalies(**stats, thresholds=options)
+
+def run_accumulators(records, accumulators):
+    """单遍扫描：每个数据包依次送入所有累加器"""
+    feeds = [acc.feed for acc in accumulators if acc.feed is not None]
+    for rec in records:
+        for feed in feeds:
+            feed(rec)
+
+def run_section(name, packets):
+    """对已加载的Scapy数据包列表运行单个分析段（及其依赖）"""
+    load_scapy()
+    accumulators = create_accumulators({"vectorized": False}, [name])
+    run_accumulators((dissect_packet(pkt) for pkt in packets), accumulators.values())
+    return accumulators[name].result()
+
+def decode_payload_prefix(payload, limit):
+    """与 payload.decode('utf-8', errors='ignore')[:limit] 等价，纯ASCII时只解码前缀"""
+    head = payload[:limit]
+    if head.isascii():
+        return head.decode('ascii')
+    return payload.decode('utf-8', errors='ignore')[:limit]
+
+class SummaryAccumulator:
+    """基础统计累加器（包长度取值有限，用直方图计算精确分位数）"""
+    
+    def __init__(self):
+        self.total_packets = 0
+        self.total_bytes = 0
+        self.min_ts = None
+        self.max_ts = None
+        self.packet_sizes = Counter()
+    
+    def feed(self, rec):
+        self.total_packets += 1
+        self.total_bytes += rec.length
+        self.packet_sizes[rec.length] += 1
+        ts = rec.ts
+        if self.min_ts is None or ts < self.min_ts:
+            self.min_ts = ts
+        if self.max_ts is None or ts > self.max_ts:
+            self.max_ts = ts
+    
+    def merge(self, other):
+        self.total_packets += other.total_packets
+        self.total_bytes += other.total_bytes
+        self.packet_sizes.update(other.packet_sizes)
+        if other.min_ts is not None:
+            self.min_ts = other.min_ts if self.min_ts is None else min(self.min_ts, other.min_ts)
+            self.max_ts = other.max_ts if self.max_ts is None else max(self.max_ts, other.max_ts)
+    
+    def dump_state(self):
+        return {
+            "total_packets": self.total_packets,
+            "total_bytes": self.total_bytes,
+            "min_ts": self.min_ts,
+            "max_ts": self.max_ts,
+            "packet_sizes": encode_counter(self.packet_sizes)
+        }
+    
+    def load_state(self, state):
+        self.total_packets = state["total_packets"]
+        self.total_bytes = state["total_bytes"]
+        self.min_ts = state["min_ts"]
+        self.max_ts = state["max_ts"]
+        self.packet_sizes = decode_counter(state["packet_sizes"])
     
-    timestamps = [float(pkt.time) for pkt in packets if hasattr(pkt, 'time')]
-    if timestamps:
-        duration = max(timestamps) - min(timestamps)
+    def result(self):
+        return build_summary(self.total_packets, self.total_bytes, self.min_ts, self.max_ts,
+                             self.packet_sizes)
+
+def build_summary(total_packets, total_bytes, min_ts, max_ts, packet_sizes):
+    """由聚合值生成基础统计结果（packet_sizes 为包长度直方图）"""
+    if min_ts is not None:
+        duration = max_ts - min_ts
         packets_per_sec = total_packets / duration if duration > 0 else 0
     else:
         duration = 0
@@ -62,165 +719,304 @@ def analyze_summary(packets):
         "totalBytes": total_bytes,
         "duration": duration,
         "avgPacketSize": total_bytes / total_packets if total_packets > 0 else 0,
+        "packetSizePercentiles": histogram_percentiles(packet_sizes),
         "packetsPerSecond": packets_per_sec
     }
 
-def analyze_protocols(packets):
-    """协议分析 - 增强版"""
-    protocol_counts = Counter()
+def analyze_summary(packets):
+    """基础统计"""
+    return run_section("summary", packets)
+
+# 应用层协议端口映射
+WELL_KNOWN_PORTS = {
+    20: "FTP-DATA", 21: "FTP", 22: "SSH", 23: "Telnet",
+    25: "SMTP", 53: "DNS", 67: "DHCP", 68: "DHCP",
+    80: "HTTP", 110: "POP3", 143: "IMAP", 161: "SNMP",
+    443: "HTTPS", 993: "IMAPS", 995: "POP3S"
+}
+
+class ProtocolAccumulator:
+    """协议分析累加器"""
     
-    # 应用层协议端口映射
-    well_known_ports = {
-        20: "FTP-DATA", 21: "FTP", 22: "SSH", 23: "Telnet",
-        25: "SMTP", 53: "DNS", 67: "DHCP", 68: "DHCP",
-        80: "HTTP", 110: "POP3", 143: "IMAP", 161: "SNMP",
-        443: "HTTPS", 993: "IMAPS", 995: "POP3S"
-    }
+    def __init__(self):
+        self.protocol_counts = Counter()
+        self.total = 0
     
-    for pkt in packets:
+    def feed(self, rec):
+        protocol_counts = self.protocol_counts
+        self.total += 1
+        
         # 网络层协议
-        if IP in pkt:
+        if rec.ip_version == 4:
             protocol_counts["IPv4"] += 1
             
-            # 传输层协议 + 应用层协议识别
-            if TCP in pkt:
-                protocol_counts["TCP"] += 1
-                # 基于端口识别应用层协议
-                dport = pkt[TCP].dport
-                sport = pkt[TCP].sport
-                
-                if dport in well_known_ports:
-                    protocol_counts[well_known_ports[dport]] += 1
-                elif sport in well_known_ports:
-                    protocol_counts[well_known_ports[sport]] += 1
+            # 传输层协议 + 应用层协议识别（基于端口）
+            if rec.proto == 6 or rec.proto == 17:
+                protocol_counts["TCP" if rec.proto == 6 else "UDP"] += 1
+                if rec.dport in WELL_KNOWN_PORTS:
+                    protocol_counts[WELL_KNOWN_PORTS[rec.dport]] += 1
+                elif rec.sport in WELL_KNOWN_PORTS:
+                    protocol_counts[WELL_KNOWN_PORTS[rec.sport]] += 1
                     
-            elif UDP in pkt:
-                protocol_counts["UDP"] += 1
-                # 基于端口识别应用层协议
-                dport = pkt[UDP].dport
-                sport = pkt[UDP].sport
-                
-                if dport in well_known_ports:
-                    protocol_counts[well_known_ports[dport]] += 1
-                elif sport in well_known_ports:
-                    protocol_counts[well_known_ports[sport]] += 1
-                    
-            elif ICMP in pkt:
+            elif rec.proto == 1:
                 protocol_counts["ICMP"] += 1
                 
-        elif IPv6 in pkt:
+        elif rec.ip_version == 6:
             protocol_counts["IPv6"] += 1
             
-        elif ARP in pkt:
+        elif rec.is_arp:
             protocol_counts["ARP"] += 1
             
         # 基于包内容的协议识别
-        if DNS in pkt:
+        if rec.is_dns:
             protocol_counts["DNS"] += 1
             
         # HTTP识别（检查Raw层是否包含HTTP特征）
-        if Raw in pkt:
-            payload = pkt[Raw].load
-            if isinstance(payload, bytes):
-                payload_str = payload.decode('utf-8', errors='ignore')
-                if any(method in payload_str[:50] for method in ['GET ', 'POST ', 'PUT ', 'DELETE ', 'HEAD ']):
-                    protocol_counts["HTTP"] += 1
-                elif 'HTTP/' in payload_str[:100]:
-                    protocol_counts["HTTP"] += 1
-    
-    total = len(packets)
-    return [
-        {
-            "name": protocol,
-            "packets": count,
-            "percentage": (count / total * 100) if total > 0 else 0
+        payload = rec.payload
+        if payload:
+            payload_str = decode_payload_prefix(payload, 100)
+            if any(method in payload_str[:50] for method in ['GET ', 'POST ', 'PUT ', 'DELETE ', 'HEAD ']):
+                protocol_counts["HTTP"] += 1
+            elif 'HTTP/' in payload_str:
+                protocol_counts["HTTP"] += 1
+    
+    def merge(self, other):
+        self.protocol_counts.update(other.protocol_counts)
+        self.total += other.total
+    
+    def dump_state(self):
+        return {
+            "protocol_counts": encode_counter(self.protocol_counts),
+            "total": self.total
         }
-        for protocol, count in protocol_counts.most_common()
-    ]
-
-def analyze_network(packets):
-    """网络层分析 - 增强版"""
-    src_ips = Counter()
-    dst_ips = Counter()
-    ip_pairs = Counter()
-    bytes_per_ip = defaultdict(int)
-    
-    ipv4_count = 0
-    ipv6_count = 0
-    
-    for pkt in packets:
-        if IP in pkt:
-            ipv4_count += 1
-            src_ip = pkt[IP].src
-            dst_ip = pkt[IP].dst
-            pkt_size = len(pkt)
-            
-            src_ips[src_ip] += 1
-            dst_ips[dst_ip] += 1
-            bytes_per_ip[src_ip] += pkt_size
-            bytes_per_ip[dst_ip] += pkt_size
-            
-            # 记录通信对
-            ip_pair = f"{src_ip} <-> {dst_ip}"
-            ip_pairs[ip_pair] += 1
-            
-        elif IPv6 in pkt:
-            ipv6_count += 1
-            
-    return {
-        "ipv4Packets": ipv4_count,
-        "ipv6Packets": ipv6_count,
-        "uniqueSourceIPs": len(src_ips),
-        "uniqueDestinationIPs": len(dst_ips),
-        "topSources": [
-            {
-                "ip": ip, 
-                "packets": count,
-                "bytes": bytes_per_ip[ip]
-            } 
-            for ip, count in src_ips.most_common(5)
-        ],
-        "topDestinations": [
+    
+    def load_state(self, state):
+        self.protocol_counts = decode_counter(state["protocol_counts"])
+        self.total = state["total"]
+    
+    def result(self):
+        total = self.total
+        return [
             {
-                "ip": ip, 
+                "name": protocol,
                 "packets": count,
-                "bytes": bytes_per_ip[ip]
-            } 
-            for ip, count in dst_ips.most_common(5)
-        ],
-        "topCommunications": [
-            {
-                "pair": pair,
-                "packets": count
+                "percentage": (count / total * 100) if total > 0 else 0
             }
-            for pair, count in ip_pairs.most_common(5)
+            for protocol, count in self.protocol_counts.most_common()
         ]
-    }
 
-def analyze_transport(packets):
-    """传输层分析 - 增强版"""
-    tcp_count = udp_count = icmp_count = 0
-    tcp_flags = Counter()
-    port_counts = Counter()
-    port_services = {}
-    tcp_bytes = udp_bytes = 0
-    
-    # 常见服务端口映射
-    service_names = {
-        20: "FTP-DATA", 21: "FTP", 22: "SSH", 23: "Telnet", 25: "SMTP",
-        53: "DNS", 67: "DHCP", 68: "DHCP", 80: "HTTP", 110: "POP3",
-        143: "IMAP", 161: "SNMP", 443: "HTTPS", 993: "IMAPS", 995: "POP3S"
-    }
+def analyze_protocols(packets):
+    """协议分析 - 增强版"""
+    return run_section("protocols", packets)
+
+# 精确统计的不同源/目的IP数，超过后为HyperLogLog估计
+IP_SET_LIMIT = 65536
+
+class NetworkAccumulator:
+    """网络层分析（从共享流表聚合，只格式化前N项）
+    
+    不同源/目的IP的数量用 DistinctValues 统计：不超过 IP_SET_LIMIT 个时精确，超过后为
+    HyperLogLog估计（精度同 options.network.hll_precision）。
+    """
+    feed = None
+    
+    def __init__(self, flows, options=None):
+        options = options or SECTION_OPTIONS["network"]
+        self.flows = flows
+        self.top_n = options["top_n"]
+        self.hll_precision = options["hll_precision"]
+    
+    def merge(self, other):
+        # 流表作为独立条目合并
+        pass
+    
+    def dump_state(self):
+        return {}
+    
+    def load_state(self, state):
+        pass
+    
+    def result(self):
+        src_ips = Counter()
+        dst_ips = Counter()
+        ip_pairs = Counter()
+        bytes_per_ip = defaultdict(int)
+        ipv4_count = ipv6_count = 0
+        addresses = self.flows.addresses
+        unique_sources = DistinctValues(IP_SET_LIMIT, self.hll_precision)
+        unique_destinations = DistinctValues(IP_SET_LIMIT, self.hll_precision)
+        
+        for key, flow in self.flows.flows.items():
+            if flow.ip_version == 4:
+                src_id, dst_id = key >> 72, (key >> 40) & 0xFFFFFFFF
+                ipv4_count += flow.packets
+                if src_id not in src_ips:
+                    unique_sources.add(addresses[src_id])
+                if dst_id not in dst_ips:
+                    unique_destinations.add(addresses[dst_id])
+                src_ips[src_id] += flow.packets
+                dst_ips[dst_id] += flow.packets
+                bytes_per_ip[src_id] += flow.bytes
+                bytes_per_ip[dst_id] += flow.bytes
+                # 记录通信对
+                ip_pairs[(src_id, dst_id)] += flow.packets
+            else:
+                ipv6_count += flow.packets
+        
+        top_n = self.top_n
+        return {
+            "ipv4Packets": ipv4_count,
+            "ipv6Packets": ipv6_count,
+            "uniqueSourceIPs": unique_sources.count(),
+            "uniqueDestinationIPs": unique_destinations.count(),
+            "topSources": [
+                {
+                    "ip": addresses[ip], 
+                    "packets": count,
+                    "bytes": bytes_per_ip[ip]
+                } 
+                for ip, count in src_ips.most_common(top_n)
+            ],
+            "topDestinations": [
+                {
+                    "ip": addresses[ip], 
+                    "packets": count,
+                    "bytes": bytes_per_ip[ip]
+                } 
+                for ip, count in dst_ips.most_common(top_n)
+            ],
+            "topCommunications": [
+                {
+                    "pair": f"{addresses[src_id]} <-> {addresses[dst_id]}",
+                    "packets": count
+                }
+                for (src_id, dst_id), count in ip_pairs.most_common(top_n)
+            ]
+        }
+
+class SketchNetworkAccumulator:
+    """网络层分析的近似模式（options.network.approximate）：不依赖流表，内存有界
+    
+    源IP、目的IP、通信对各用一个Space-Saving摘要找出包数最多的键，每个IP的字节数
+    （作为源和作为目的之和）由Count-Min草图估计，不同IP的数量由HyperLogLog估计。
+    结果的每一项带有包数的最大高估量，approximation 中给出各项的误差上界。
+    """
+    
+    def __init__(self, options=None):
+        options = options or SECTION_OPTIONS["network"]
+        self.top_n = options["top_n"]
+        counters = options["sketch_counters"]
+        self.ipv4_count = self.ipv6_count = 0
+        self.source_ips = HyperLogLog(options["hll_precision"])
+        self.destination_ips = HyperLogLog(options["hll_precision"])
+        self.sources = SpaceSaving(counters)
+        self.destinations = SpaceSaving(counters)
+        self.pairs = SpaceSaving(counters)
+        self.ip_bytes = CountMinSketch(options["count_min_width"], options["count_min_depth"])
+    
+    def feed(self, rec):
+        if rec.ip_version == 4:
+            src = rec.src
+            dst = rec.dst
+            src_hash = hash64(src)
+            dst_hash = hash64(dst)
+            self.ipv4_count += 1
+            self.source_ips.add_hashed(src_hash)
+            self.destination_ips.add_hashed(dst_hash)
+            self.sources.add(src)
+            self.destinations.add(dst)
+            self.pairs.add(f"{src} <-> {dst}")
+            self.ip_bytes.add_hashed(src_hash, rec.length)
+            self.ip_bytes.add_hashed(dst_hash, rec.length)
+        elif rec.ip_version == 6:
+            self.ipv6_count += 1
+    
+    def merge(self, other):
+        self.ipv4_count += other.ipv4_count
+        self.ipv6_count += other.ipv6_count
+        self.source_ips.merge(other.source_ips)
+        self.destination_ips.merge(other.destination_ips)
+        self.sources.merge(other.sources)
+        self.destinations.merge(other.destinations)
+        self.pairs.merge(other.pairs)
+        self.ip_bytes.merge(other.ip_bytes)
+    
+    def dump_state(self):
+        return {
+            "ipv4_count": self.ipv4_count,
+            "ipv6_count": self.ipv6_count,
+            "source_ips": self.source_ips.dump_state(),
+            "destination_ips": self.destination_ips.dump_state(),
+            "sources": self.sources.dump_state(),
+            "destinations": self.destinations.dump_state(),
+            "pairs": self.pairs.dump_state(),
+            "ip_bytes": self.ip_bytes.dump_state()
+        }
     
-    for pkt in packets:
-        if TCP in pkt:
-            tcp_count += 1
-            tcp_bytes += len(pkt)
-            dport = pkt[TCP].dport
-            port_counts[dport] += 1
-            
+    def load_state(self, state):
+        self.ipv4_count = state["ipv4_count"]
+        self.ipv6_count = state["ipv6_count"]
+        self.source_ips.load_state(state["source_ips"])
+        self.destination_ips.load_state(state["destination_ips"])
+        self.sources.load_state(state["sources"])
+        self.destinations.load_state(state["destinations"])
+        self.pairs.load_state(state["pairs"])
+        self.ip_bytes.load_state(state["ip_bytes"])
+    
+    def result(self):
+        top_n = self.top_n
+        ip_bytes = self.ip_bytes
+        return {
+            "ipv4Packets": self.ipv4_count,
+            "ipv6Packets": self.ipv6_count,
+            "uniqueSourceIPs": round(self.source_ips.estimate()),
+            "uniqueDestinationIPs": round(self.destination_ips.estimate()),
+            "topSources": [
+                {"ip": ip, "packets": count, "bytes": ip_bytes.estimate(ip), "packetsError": error}
+                for ip, count, error in self.sources.top(top_n)
+            ],
+            "topDestinations": [
+                {"ip": ip, "packets": count, "bytes": ip_bytes.estimate(ip), "packetsError": error}
+                for ip, count, error in self.destinations.top(top_n)
+            ],
+            "topCommunications": [
+                {"pair": pair, "packets": count, "packetsError": error}
+                for pair, count, error in self.pairs.top(top_n)
+            ],
+            "approximation": {
+                "method": "space-saving/count-min",
+                "counters": self.sources.capacity,
+                "packetsErrorBound": {
+                    "topSources": self.sources.error_bound(top_n),
+                    "topDestinations": self.destinations.error_bound(top_n),
+                    "topCommunications": self.pairs.error_bound(top_n)
+                },
+                "bytesErrorBound": ip_bytes.error_bound(),
+                "bytesConfidence": ip_bytes.confidence(),
+                "uniqueIPsRelativeError": self.source_ips.relative_error()
+            }
+        }
+
+def analyze_network(packets):
+    """网络层分析 - 增强版"""
+    return run_section("network", packets)
+
+# 常见服务端口映射
+SERVICE_NAMES = WELL_KNOWN_PORTS
+
+class TransportAccumulator:
+    """传输层分析累加器（包数、字节数和端口从共享流表聚合，逐包只统计TCP标志）"""
+    
+    def __init__(self, flows, options=None):
+        self.flows = flows
+        self.top_n = (options or SECTION_OPTIONS["transport"])["top_n"]
+        self.tcp_flags = Counter()
+    
+    def feed(self, rec):
+        if rec.proto == 6:
             # 记录TCP标志
-            flags = pkt[TCP].flags
+            flags = rec.flags
+            tcp_flags = self.tcp_flags
             if flags & 0x02:  # SYN
                 tcp_flags["SYN"] += 1
             if flags & 0x10:  # ACK
@@ -229,30 +1025,130 @@ def analyze_transport(packets):
                 tcp_flags["FIN"] += 1
             if flags & 0x04:  # RST
                 tcp_flags["RST"] += 1
-                
-            # 记录端口对应的服务
-            if dport in service_names:
-                port_services[dport] = service_names[dport]
-                
-        elif UDP in pkt:
-            udp_count += 1
-            udp_bytes += len(pkt)
-            dport = pkt[UDP].dport
-            port_counts[dport] += 1
-            
-            if dport in service_names:
-                port_services[dport] = service_names[dport]
-                
-        elif ICMP in pkt:
-            icmp_count += 1
     
+    def merge(self, other):
+        self.tcp_flags.update(other.tcp_flags)
+    
+    def dump_state(self):
+        return {"tcp_flags": encode_counter(self.tcp_flags)}
+    
+    def load_state(self, state):
+        self.tcp_flags = decode_counter(state["tcp_flags"])
+    
+    def result(self):
+        tcp_count = udp_count = icmp_count = 0
+        tcp_bytes = udp_bytes = 0
+        port_counts = Counter()
+        
+        for key, flow in self.flows.flows.items():
+            proto = key & 0xFF
+            if proto == 6:
+                tcp_count += flow.packets
+                tcp_bytes += flow.bytes
+                port_counts[(key >> 8) & 0xFFFF] += flow.packets
+            elif proto == 17:
+                udp_count += flow.packets
+                udp_bytes += flow.bytes
+                port_counts[(key >> 8) & 0xFFFF] += flow.packets
+            elif proto == 1:
+                icmp_count += flow.packets
+        
+        return build_transport(tcp_count, udp_count, icmp_count,
+                               tcp_bytes, udp_bytes, port_counts, self.tcp_flags, self.top_n)
+
+class SketchTransportAccumulator:
+    """传输层分析的近似模式（options.transport.approximate）：不依赖流表
+    
+    协议包数和字节数逐包精确累加，目的端口用Space-Saving摘要找出包数最多的端口，
+    不同端口的数量用65536位的位图精确统计。
+    """
+    
+    def __init__(self, options=None):
+        options = options or SECTION_OPTIONS["transport"]
+        self.top_n = options["top_n"]
+        self.tcp_count = self.udp_count = self.icmp_count = 0
+        self.tcp_bytes = self.udp_bytes = 0
+        self.ports = SpaceSaving(options["sketch_counters"])
+        self.seen_ports = bytearray(8192)
+        self.tcp_flags = Counter()
+    
+    def feed(self, rec):
+        if not rec.ip_version:
+            return
+        proto = rec.proto
+        if proto == 6:
+            self.tcp_count += 1
+            self.tcp_bytes += rec.length
+            flags = rec.flags
+            tcp_flags = self.tcp_flags
+            if flags & 0x02:  # SYN
+                tcp_flags["SYN"] += 1
+            if flags & 0x10:  # ACK
+                tcp_flags["ACK"] += 1
+            if flags & 0x01:  # FIN
+                tcp_flags["FIN"] += 1
+            if flags & 0x04:  # RST
+                tcp_flags["RST"] += 1
+        elif proto == 17:
+            self.udp_count += 1
+            self.udp_bytes += rec.length
+        else:
+            if proto == 1:
+                self.icmp_count += 1
+            return
+        port = rec.dport
+        self.ports.add(port)
+        self.seen_ports[port >> 3] |= 1 << (port & 7)
+    
+    def merge(self, other):
+        self.tcp_count += other.tcp_count
+        self.udp_count += other.udp_count
+        self.icmp_count += other.icmp_count
+        self.tcp_bytes += other.tcp_bytes
+        self.udp_bytes += other.udp_bytes
+        self.ports.merge(other.ports)
+        self.seen_ports = bytearray(a | b for a, b in zip(self.seen_ports, other.seen_ports))
+        self.tcp_flags.update(other.tcp_flags)
+    
+    def dump_state(self):
+        return {
+            "counts": [self.tcp_count, self.udp_count, self.icmp_count, self.tcp_bytes, self.udp_bytes],
+            "ports": self.ports.dump_state(),
+            "seen_ports": encode_bytes(self.seen_ports),
+            "tcp_flags": encode_counter(self.tcp_flags)
+        }
+    
+    def load_state(self, state):
+        self.tcp_count, self.udp_count, self.icmp_count, self.tcp_bytes, self.udp_bytes = state["counts"]
+        self.ports.load_state(state["ports"])
+        self.seen_ports = bytearray(decode_bytes(state["seen_ports"]))
+        self.tcp_flags = decode_counter(state["tcp_flags"])
+    
+    def result(self):
+        top_ports = self.ports.top(self.top_n)
+        result = build_transport(self.tcp_count, self.udp_count, self.icmp_count,
+                                 self.tcp_bytes, self.udp_bytes,
+                                 Counter({port: count for port, count, _ in top_ports}),
+                                 self.tcp_flags, self.top_n)
+        result["uniquePorts"] = sum(bin(byte).count("1") for byte in self.seen_ports)
+        for port_info, (_, _, error) in zip(result["topPorts"], top_ports):
+            port_info["packetsError"] = error
+        result["approximation"] = {
+            "method": "space-saving",
+            "counters": self.ports.capacity,
+            "packetsErrorBound": {"topPorts": self.ports.error_bound(self.top_n)}
+        }
+        return result
+
+def build_transport(tcp_count, udp_count, icmp_count, tcp_bytes, udp_bytes, port_counts, tcp_flags, top_n=10):
+    """由聚合值生成传输层分析结果（port_counts/tcp_flags 为按首次出现顺序插入的Counter）"""
     # 构建端口统计（包含服务名）
     top_ports = []
-    for port, count in port_counts.most_common(10):
+    for port, count in port_counts.most_common(top_n):
         port_info = {
             "port": port,
             "packets": count,
-            "service": port_services.get(port, "Unknown")
+            "service": SERVICE_NAMES.get(port, "Unknown")
         }
         top_ports.append(port_info)
     
@@ -269,22 +1165,289 @@ def analyze_transport(packets):
         "connectionResets": tcp_flags.get("RST", 0)
     }
 
-def analyze_temporal(packets):
-    """时间线分析 - 第二阶段核心功能"""
-    import math
-    from datetime import datetime
-    
-    timestamps = []
-    time_data = []
-    protocol_timeline = defaultdict(list)
-    traffic_timeline = []
+def analyze_transport(packets):
+    """传输层分析 - 增强版"""
+    return run_section("transport", packets)
+
+# 时间线协议分类（下标即TemporalAccumulator中存储的协议编码）
+TIMELINE_PROTOCOLS = ("Other", "TCP", "UDP", "ICMP", "ARP")
+_TIMELINE_PROTOCOL_CODES = {6: 1, 17: 2, 1: 3}
+
+# 时间线逐包保留精确时间戳的最多包数（约13MB）；超过后改为按毫秒偏移累加的网格
+TIMELINE_EXACT_PACKETS = 1 << 20
+# 时间线网格的最多桶数，超过后分辨率放大10倍
+TIMELINE_GRID_BUCKETS = 1 << 16
+
+class TemporalAccumulator:
+    """时间线分析累加器
+    
+    输出的时间桶从第一个包（start_time）开始，桶宽 max(min_bucket_seconds, 时长/max_buckets)，
+    扫描结束前无法确定。包数不超过 TIMELINE_EXACT_PACKETS 时逐包保留时间戳、长度和协议编码，
+    结果与一次性读入全部包时完全相同；超过后改为以 origin 为起点、按毫秒偏移分桶的网格
+    （桶编号 = floor((时间戳 - origin) * 1000) // resolution），每个桶为 [包数, 字节数, 各协议包数...]，
+    桶数超过 TIMELINE_GRID_BUCKETS 时分辨率放大10倍，内存有上限。origin 为抓包第一个包的时间戳，
+    分片扫描时由主进程统一设置，检查点中一并保存，因此各分片的网格可直接按桶合并。网格中的桶整体
+    计入包含其起点的输出桶：时长不超过 max_buckets * min_bucket_seconds（且 origin 为最早的包）时
+    输出桶边界与网格边界重合，结果仍然精确，否则只有跨越输出桶边界的网格桶（不超过网格分辨率）
+    可能计入相邻的桶。
+    
+    在线事件检测和时间序列金字塔另外累加按绝对时间对齐的固定宽度基础桶（桶编号 =
+    floor(毫秒时间戳 / 基础桶宽)，见 temporal_base_step）；启用 pyramid 选项时还累加比基础桶
+    更细的金字塔级别，桶数超过 pyramid_max_buckets 的级别不再保留（见 timeseries.py）。
+    """
+    
+    def __init__(self, options=None):
+        self.options = options or SECTION_OPTIONS["temporal"]
+        self.step = temporal_base_step(self.options)
+        self.width = len(TIMELINE_PROTOCOLS) + 2
+        self.start_time = math.inf
+        self.end_time = -math.inf
+        # 精确时间线：逐包的时间戳、长度和协议编码；转为网格后为None
+        self.times = array('d')
+        self.lengths = array('Q')
+        self.codes = array('B')
+        self.origin = None
+        self.resolution = 1
+        self.grid = None
+        steps = [step for step in PYRAMID_STEPS_MS if step < self.step] if self.options["pyramid"] else []
+        # 分辨率毫秒数 -> 桶编号->计数 字典；超过上限被略去的细级别为None
+        self.levels = {step: {} for step in steps + [self.step]}
+        self.active = list(self.levels.items())
+    
+    def feed(self, rec):
+        # 协议分类
+        if rec.ip_version == 4:
+            code = _TIMELINE_PROTOCOL_CODES.get(rec.proto, 0) + 2
+        elif rec.is_arp:
+            code = 6
+        else:
+            code = 2
+        ts = rec.ts
+        if ts < self.start_time:
+            self.start_time = ts
+        if ts > self.end_time:
+            self.end_time = ts
+        if self.grid is None:
+            self.times.append(ts)
+            self.lengths.append(rec.length)
+            self.codes.append(code)
+            if len(self.times) > TIMELINE_EXACT_PACKETS:
+                self.to_grid()
+        else:
+            self.add_to_grid(ts, rec.length, code)
+        ms = math.floor(ts * 1000)
+        for step, buckets in self.active:
+            bucket = buckets.get(ms // step)
+            if bucket is None:
+                bucket = buckets[ms // step] = [0] * self.width
+                if step != self.step and len(buckets) > self.options["pyramid_max_buckets"]:
+                    self.drop(step)
+            bucket[0] += 1
+            bucket[1] += rec.length
+            bucket[code] += 1
+    
+    def anchor(self, origin):
+        """设置时间线网格的起点（分片扫描时为整个抓包第一个包的时间戳）"""
+        self.origin = origin
+    
+    def add_to_grid(self, ts, length, code):
+        index = math.floor((ts - self.origin) * 1000) // self.resolution
+        bucket = self.grid.get(index)
+        if bucket is None:
+            bucket = self.grid[index] = [0] * self.width
+            if len(self.grid) > TIMELINE_GRID_BUCKETS:
+                self.coarsen(self.resolution * 10)
+                bucket = self.grid[index // 10]
+        bucket[0] += 1
+        bucket[1] += length
+        bucket[code] += 1
+    
+    def to_grid(self):
+        """精确时间线转为网格（未设置起点时取已见到的最早时间戳）"""
+        if self.origin is None:
+            self.origin = self.start_time
+        self.grid = {}
+        for ts, length, code in zip(self.times, self.lengths, self.codes):
+            self.add_to_grid(ts, length, code)
+        self.times = self.lengths = self.codes = None
+    
+    def coarsen(self, resolution):
+        """把网格分辨率放大到 resolution 毫秒（必须是当前分辨率的整数倍）"""
+        factor = resolution // self.resolution
+        grid = {}
+        for index, counts in self.grid.items():
+            merge_buckets(grid, {index // factor: counts}, self.width)
+        self.grid = grid
+        self.resolution = resolution
+    
+    def drop(self, step):
+        """细级别的桶数超过上限时不再保留（结果中的金字塔也会略去这一级）"""
+        self.levels[step] = None
+        self.active = [(level, buckets) for level, buckets in self.levels.items() if buckets is not None]
+    
+    def merge(self, other):
+        if other.start_time < self.start_time:
+            self.start_time = other.start_time
+        if other.end_time > self.end_time:
+            self.end_time = other.end_time
+        self.merge_timeline(other)
+        for step, buckets in other.levels.items():
+            if self.levels[step] is None:
+                continue
+            if buckets is None:
+                self.drop(step)
+                continue
+            merge_buckets(self.levels[step], buckets, self.width)
+            if step != self.step and len(self.levels[step]) > self.options["pyramid_max_buckets"]:
+                self.drop(step)
+    
+    def merge_timeline(self, other):
+        if self.origin is None:
+            self.origin = other.origin
+        if self.grid is None and other.grid is None:
+            self.times.extend(other.times)
+            self.lengths.extend(other.lengths)
+            self.codes.extend(other.codes)
+            if len(self.times) > TIMELINE_EXACT_PACKETS:
+                self.to_grid()
+            return
+        
+        if self.grid is None:
+            if other.origin is not None:
+                self.origin = other.origin
+            self.to_grid()
+        if other.grid is None:
+            for ts, length, code in zip(other.times, other.lengths, other.codes):
+                self.add_to_grid(ts, length, code)
+            return
+        
+        if other.resolution > self.resolution:
+            self.coarsen(other.resolution)
+        # 起点不同（如合并不同抓包文件的中间结果）时按毫秒偏移换算，误差不超过1毫秒
+        shift = (other.origin - self.origin) * 1000
+        for index, counts in other.grid.items():
+            offset = index * other.resolution
+            if shift:
+                offset = math.floor(offset + shift)
+            merge_buckets(self.grid, {offset // self.resolution: counts}, self.width)
+        while len(self.grid) > TIMELINE_GRID_BUCKETS:
+            self.coarsen(self.resolution * 10)
+    
+    def dump_state(self):
+        if self.grid is None:
+            timeline = {
+                "times": encode_array(self.times),
+                "lengths": encode_array(self.lengths),
+                "codes": encode_array(self.codes)
+            }
+        else:
+            timeline = {
+                "resolution": self.resolution,
+                "buckets": [[index] + counts for index, counts in self.grid.items()]
+            }
+        return {
+            "start_time": self.start_time if self.start_time != math.inf else None,
+            "end_time": self.end_time if self.end_time != -math.inf else None,
+            "origin": self.origin,
+            "timeline": timeline,
+            "levels": {
+                str(step): None if buckets is None else [[index] + counts for index, counts in buckets.items()]
+                for step, buckets in self.levels.items()
+            }
+        }
     
-    # 收集所有时间戳
-    for pkt in packets:
-        if hasattr(pkt, 'time'):
-            timestamps.append(float(pkt.time))
+    def load_state(self, state):
+        if state["start_time"] is not None:
+            self.start_time = state["start_time"]
+            self.end_time = state["end_time"]
+        self.origin = state["origin"]
+        timeline = state["timeline"]
+        if "buckets" in timeline:
+            self.times = self.lengths = self.codes = None
+            self.resolution = timeline["resolution"]
+            self.grid = {row[0]: row[1:] for row in timeline["buckets"]}
+        else:
+            self.times = decode_array(timeline["times"])
+            self.lengths = decode_array(timeline["lengths"])
+            self.codes = decode_array(timeline["codes"])
+            self.grid = None
+        for step, rows in state["levels"].items():
+            self.levels[int(step)] = None if rows is None else {row[0]: row[1:] for row in rows}
+        self.active = [(step, buckets) for step, buckets in self.levels.items() if buckets is not None]
+    
+    def result(self):
+        if self.start_time == math.inf:
+            return build_temporal(None, None, 0, [], [], [])
+        
+        start_time = self.start_time
+        end_time = self.end_time
+        options = self.options
+        bucket_size, num_buckets = temporal_bucket_layout(
+            end_time - start_time, options["max_buckets"], options["min_bucket_seconds"])
+        
+        # 逐包（或按网格桶）计入输出的时间桶
+        time_buckets = [0] * num_buckets
+        byte_buckets = [0] * num_buckets
+        protocol_counts = [[0] * len(TIMELINE_PROTOCOLS) for _ in range(num_buckets)]
+        last = num_buckets - 1
+        if self.grid is None:
+            for ts, length, code in zip(self.times, self.lengths, self.codes):
+                bucket_index = min(int((ts - start_time) / bucket_size), last)
+                time_buckets[bucket_index] += 1
+                byte_buckets[bucket_index] += length
+                protocol_counts[bucket_index][code - 2] += 1
+        else:
+            offset = self.origin - start_time
+            for index, bucket in self.grid.items():
+                bucket_index = min(max(int((offset + index * self.resolution / 1000) / bucket_size), 0), last)
+                time_buckets[bucket_index] += bucket[0]
+                byte_buckets[bucket_index] += bucket[1]
+                counts = protocol_counts[bucket_index]
+                for code in range(len(counts)):
+                    counts[code] += bucket[code + 2]
+        protocol_buckets = [
+            {name: count for name, count in zip(TIMELINE_PROTOCOLS, counts) if count}
+            for counts in protocol_counts
+        ]
+        
+        traffic_events = None
+        if online_event_detection(options):
+            online = OnlineTrafficEvents(options)
+            factor = online.bucket_ms // self.step
+            for index, bucket in sorted(self.levels[self.step].items()):
+                online.feed_bucket(index // factor, bucket[0], bucket[1])
+            traffic_events = online.finish()
+        
+        result = build_temporal(start_time, end_time, bucket_size, time_buckets, byte_buckets,
+                                protocol_buckets, options, traffic_events)
+        if options["pyramid"]:
+            levels = pyramid_levels(self.levels, len(TIMELINE_PROTOCOLS))
+            result["pyramid"] = build_pyramid(levels, TIMELINE_PROTOCOLS, start_time, end_time,
+                                              options["pyramid_max_buckets"])
+        return result
+
+def temporal_base_step(options):
+    """基础桶宽（毫秒）：能整除事件检测桶宽的最大一级金字塔分辨率（不超过1秒）"""
+    width = bucket_width_ms(options["event_bucket_seconds"])
+    for step in (1000, 100, 10):
+        if width % step == 0:
+            return step
+    return 1
+
+def temporal_bucket_layout(duration, max_buckets=100, min_bucket_seconds=5.0):
+    """输出时间桶的宽度（秒）和桶数：每5秒一个桶，最多约100个桶（第一个桶从 start_time 开始）"""
+    if duration > 0:
+        bucket_size = max(min_bucket_seconds, duration / max_buckets)  # 至少5秒一个桶
+        return bucket_size, int(duration / bucket_size) + 1
+    return min_bucket_seconds, 1
+
+def build_temporal(start_time, end_time, bucket_size, time_buckets, byte_buckets, protocol_buckets,
+                   thresholds=None, traffic_events=None):
+    """由时间桶生成时间线分析结果（protocol_buckets 为每个桶的 协议->包数 字典）
     
-    if not timestamps:
+    traffic_events 为在线检测得到的流量事件，为None时按全局平均值规则检测。
+    """
+    if start_time is None:
         return {
             "startTime": None,
             "endTime": None,
@@ -295,46 +1458,8 @@ def analyze_temporal(packets):
             "trafficEvents": []
         }
     
-    # 计算时间范围
-    start_time = min(timestamps)
-    end_time = max(timestamps)
     duration = end_time - start_time
-    
-    # 创建时间桶（每5秒一个桶，最多100个桶）
-    if duration > 0:
-        bucket_size = max(5.0, duration / 100)  # 至少5秒一个桶
-        num_buckets = int(duration / bucket_size) + 1
-    else:
-        bucket_size = 5.0
-        num_buckets = 1
-    
-    # 初始化时间桶
-    time_buckets = [0] * num_buckets
-    byte_buckets = [0] * num_buckets
-    protocol_buckets = [defaultdict(int) for _ in range(num_buckets)]
-    
-    # 填充时间桶数据
-    for pkt in packets:
-        if hasattr(pkt, 'time'):
-            pkt_time = float(pkt.time)
-            bucket_index = min(int((pkt_time - start_time) / bucket_size), num_buckets - 1)
-            
-            time_buckets[bucket_index] += 1
-            byte_buckets[bucket_index] += len(pkt)
-            
-            # 协议分类
-            protocol = "Other"
-            if IP in pkt:
-                if TCP in pkt:
-                    protocol = "TCP"
-                elif UDP in pkt:
-                    protocol = "UDP"
-                elif ICMP in pkt:
-                    protocol = "ICMP"
-            elif ARP in pkt:
-                protocol = "ARP"
-            
-            protocol_buckets[bucket_index][protocol] += 1
+    num_buckets = len(time_buckets)
     
     # 构建时间线数据
     timeline_data = []
@@ -359,17 +1484,18 @@ def analyze_temporal(packets):
         })
     
     # 检测流量事件（异常高峰、安静期等）
-    traffic_events = detect_traffic_events(timeline_data, bucket_size)
+    if traffic_events is None:
+        traffic_events = detect_traffic_events(timeline_data, bucket_size, thresholds)
     
     # 构建协议时间线
     protocol_timeline_data = {}
     for protocol in ["TCP", "UDP", "ICMP", "ARP"]:
         protocol_timeline_data[protocol] = [
             {
-                "timestamp": bucket_time,
+                "timestamp": start_time + (i * bucket_size),
                 "packets": protocol_buckets[i].get(protocol, 0)
             }
-            for i, bucket_time in enumerate([start_time + (i * bucket_size) for i in range(num_buckets)])
+            for i in range(num_buckets)
         ]
     
     return {
@@ -393,22 +1519,39 @@ def analyze_temporal(packets):
         "trafficEvents": traffic_events
     }
 
-def detect_traffic_events(timeline_data, bucket_size):
-    """检测流量事件"""
+def analyze_temporal(packets):
+    """时间线分析 - 第二阶段核心功能"""
+    return run_section("temporal", packets)
+
+def online_event_detection(options):
+    """event_detector 选项：online（在线EWMA检测，默认）或 global（与全局平均值比较的兼容模式）"""
+    detector = options["event_detector"]
+    if detector not in ("online", "global"):
+        raise Exception(f"未知的流量事件检测方式: {detector}")
+    return detector == "online"
+
+def detect_traffic_events(timeline_data, bucket_size, thresholds=None):
+    """检测流量事件：每个时间桶与全局平均值比较（event_detector 为 global 时使用）"""
     if len(timeline_data) < 3:
         return []
     
+    thresholds = thresholds or SECTION_OPTIONS["temporal"]
+    spike_ratio = thresholds["spike_ratio"]
+    high_spike_ratio = thresholds["high_spike_ratio"]
+    quiet_ratio = thresholds["quiet_ratio"]
+    quiet_min_buckets = thresholds["quiet_min_buckets"]
+    
     events = []
     rates = [data["rate"] for data in timeline_data]
     avg_rate = sum(rates) / len(rates)
     
-    # 检测高峰事件（超过平均值2倍）
+    # 检测高峰事件（默认超过平均值2倍）
     for i, data in enumerate(timeline_data):
-        if data["rate"] > avg_rate * 2 and avg_rate > 0:
+        if data["rate"] > avg_rate * spike_ratio and avg_rate > 0:
             events.append({
                 "type": "traffic_spike",
                 "timestamp": data["timestamp"],
-                "severity": "high" if data["rate"] > avg_rate * 5 else "medium",
+                "severity": "high" if data["rate"] > avg_rate * high_spike_ratio else "medium",
                 "description": f"流量突增：{data['rate']:.1f} bytes/sec（平均值的{data['rate']/avg_rate:.1f}倍）",
                 "details": {
                     "rate": data["rate"],
@@ -417,14 +1560,14 @@ def detect_traffic_events(timeline_data, bucket_size):
                 }
             })
     
-    # 检测安静期（低于平均值的20%，且持续多个时间桶）
+    # 检测安静期（默认低于平均值的20%，且持续多个时间桶）
     quiet_start = None
     for i, data in enumerate(timeline_data):
-        if data["rate"] < avg_rate * 0.2:
+        if data["rate"] < avg_rate * quiet_ratio:
             if quiet_start is None:
                 quiet_start = i
         else:
-            if quiet_start is not None and (i - quiet_start) >= 3:
+            if quiet_start is not None and (i - quiet_start) >= quiet_min_buckets:
                 events.append({
                     "type": "quiet_period",
                     "timestamp": timeline_data[quiet_start]["timestamp"],
@@ -439,126 +1582,409 @@ def detect_traffic_events(timeline_data, bucket_size):
     
     return events
 
+class ConnectionAccumulator:
+    """连接分析（IPv4 TCP流来自共享流表，只格式化前N个连接）"""
+    feed = None
+    
+    def __init__(self, flows, options=None):
+        self.flows = flows
+        self.top_n = (options or SECTION_OPTIONS["connections"])["top_n"]
+    
+    def merge(self, other):
+        # 流表作为独立条目合并
+        pass
+    
+    def dump_state(self):
+        return {}
+    
+    def load_state(self, state):
+        pass
+    
+    def result(self):
+        connections = [
+            (key, flow.packets)
+            for key, flow in self.flows.flows.items()
+            if flow.ip_version == 4 and key & 0xFF == 6
+        ]
+        addresses = self.flows.addresses
+        top_connections = []
+        for key, count in heapq.nlargest(self.top_n, connections, key=lambda x: x[1]):
+            src_id, dst_id, src_port, dst_port, _ = unpack_flow_key(key)
+            top_connections.append({
+                "connection": f"{addresses[src_id]}:{src_port}->{addresses[dst_id]}:{dst_port}",
+                "packets": count
+            })
+        
+        return {
+            "totalConnections": len(connections),
+            "topConnections": top_connections
+        }
+
 def analyze_connections(packets):
     """连接分析"""
-    connections = defaultdict(int)
-    
-    for pkt in packets:
-        if IP in pkt and TCP in pkt:
-            conn_key = f"{pkt[IP].src}:{pkt[TCP].sport}->{pkt[IP].dst}:{pkt[TCP].dport}"
-            connections[conn_key] += 1
+    return run_section("connections", packets)
+
+# 开始窗口内最多暂存的报文数，超过时提前在本分片内配对
+MAX_CARRIED_MESSAGES = 65536
+
+class HttpSessionAccumulator:
+    """HTTP会话流重建累加器
+    
+    TCP流按序列号重组后切分出HTTP报文，同一流上的请求进入FIFO队列，响应依次与
+    队首请求配对（支持pipelining和keep-alive）。配对完成的会话计入有界摘要
+    （HttpSessionDigest），状态中只有未结束的流和等待配对的报文。
+    
+    扫描开始后 FLOW_IDLE_TIMEOUT 秒内（开始窗口），中途开始（没有看到SYN）的流上的报文
+    按到达顺序暂存而不配对：分片扫描时这些流可能接着上一分片的连接，其响应应先与上一
+    分片未配对的请求配对，合并时再按顺序处理。窗口结束（或暂存的报文过多）时在本分片
+    内按顺序配对（之前没有请求的响应仍保留到合并时配对），单进程扫描的配对结果不变。
+    """
+    
+    def __init__(self, options=None):
+        self.top_n = (options or SECTION_OPTIONS["http_sessions"])["top_n"]
+        self.reassembler = HttpReassembler(self.on_message, self.on_close)
+        self.digest = HttpSessionDigest(self.top_n)  # 已配对完成的会话
+        self.pending = {}  # 流键 -> 等待响应的请求队列（请求解析失败时为None占位）
+        self.carrying = True  # 是否仍在开始窗口内
+        self.carried = []  # 开始窗口内中途开始的流上的报文 (流键, 类型, 内容, 时间戳)，按到达顺序
+        self.continued = set()  # 开始窗口内中途开始的流键
+        self.opened = set()  # 开始窗口内由本分片看到的SYN建立的流键
+        self.orphans = {}  # 流键 -> 开始窗口内在该流任何请求之前出现的响应 [(方向信息, 报文, 时间戳)]
+        self.first_ts = None
+    
+    def feed(self, rec):
+        if rec.ip_version == 4 and rec.proto == 6:
+            if self.first_ts is None:
+                self.first_ts = rec.ts
+            elif self.carrying and rec.ts - self.first_ts > FLOW_IDLE_TIMEOUT:
+                self.settle()
+            self.reassembler.feed(rec)
+    
+    def on_message(self, flow_key, info, is_request, payload_str, timestamp):
+        if is_request:
+            # 解析HTTP请求
+            request_data = parse_http_request(payload_str, info)
+            if request_data:
+                request_data['flow_key'] = str(flow_key)
+                request_data['request_timestamp'] = timestamp
+            if self.carrying and self.carried_flow(flow_key):
+                self.carry((flow_key, "request", request_data, timestamp))
+            else:
+                self.pending.setdefault(flow_key, deque()).append(request_data)
+        elif self.carrying and self.carried_flow(flow_key):
+            self.carry((flow_key, "response", (info, payload_str), timestamp))
+        else:
+            self.on_response(flow_key, info, payload_str, timestamp)
+    
+    def on_response(self, flow_key, info, payload_str, timestamp):
+        queue = self.pending.get(flow_key)
+        if queue is None:
+            # 扫描开始不久、且之前没有请求的响应可能属于上一分片中的请求，合并时再配对
+            if self.first_ts is not None and timestamp - self.first_ts <= FLOW_IDLE_TIMEOUT:
+                self.orphans.setdefault(flow_key, []).append((info, payload_str, timestamp))
+        elif queue:
+            request_data = queue.popleft()
+            if request_data is not None and not self.complete_session(request_data, payload_str, info, timestamp):
+                queue.appendleft(request_data)
+    
+    def complete_session(self, current_session, payload_str, info, timestamp):
+        # 解析HTTP响应
+        response_data = parse_http_response(payload_str, info)
+        if not response_data:
+            return False
+        current_session.update(response_data)
+        current_session['response_timestamp'] = timestamp
+        current_session['response_time'] = (
+            timestamp - current_session['request_timestamp']
+        ) * 1000  # 转换为毫秒
+        
+        # 会话完成，计入摘要
+        self.digest.add(current_session)
+        return True
+    
+    def on_close(self, flow_key):
+        # 连接已关闭，之后同一流键上的报文属于新连接
+        if self.carrying and flow_key in self.continued:
+            self.carry((flow_key, "close", None, None))
+        else:
+            self.pending.pop(flow_key, None)
+    
+    def carried_flow(self, flow_key):
+        """开始窗口内流键第一次出现报文时判断：没有看到SYN的流是中途开始的"""
+        if flow_key in self.continued:
+            return True
+        if flow_key in self.opened:
+            return False
+        flow = self.reassembler.flows.get(flow_key)
+        if flow is not None and any(half is not None and half.isn is not None for half in flow.halves):
+            self.opened.add(flow_key)
+            return False
+        self.continued.add(flow_key)
+        return True
+    
+    def carry(self, message):
+        self.carried.append(message)
+        if len(self.carried) >= MAX_CARRIED_MESSAGES:
+            self.settle()
+    
+    def settle(self):
+        """结束开始窗口：暂存的报文按到达顺序在本分片内配对"""
+        self.carrying = False
+        carried, self.carried = self.carried, []
+        self.replay(carried)
+    
+    def replay(self, messages):
+        for flow_key, kind, content, timestamp in messages:
+            if kind == "request":
+                self.pending.setdefault(flow_key, deque()).append(content)
+            elif kind == "response":
+                self.on_response(flow_key, content[0], content[1], timestamp)
+            else:
+                self.pending.pop(flow_key, None)
+    
+    def finish(self):
+        self.reassembler.finish()
+    
+    def merge(self, other):
+        # 本分片结束时仍在等待的请求排在下一分片同一流上的请求之前，与下一分片开始窗口内
+        # 暂存的响应依次配对；下一分片中由SYN建立的流是新连接，本分片同一流键上的请求不会再有响应
+        self.finish()
+        other.finish()
+        if self.carrying:
+            self.settle()
+        for flow_key in other.opened:
+            self.pending.pop(flow_key, None)
+        for flow_key, responses in other.orphans.items():
+            for info, payload_str, timestamp in responses:
+                self.on_response(flow_key, info, payload_str, timestamp)
+        self.replay(other.carried)
+        self.digest.merge(other.digest)
+        for flow_key, queue in other.pending.items():
+            self.pending.setdefault(flow_key, deque()).extend(queue)
+    
+    def dump_state(self):
+        # 未结束的流一并保存：作为检查点恢复后可以继续重组，合并时再结束
+        return {
+            "digest": self.digest.dump_state(),
+            "first_ts": self.first_ts,
+            "pending": [[flow_key, list(queue)] for flow_key, queue in self.pending.items()],
+            "carrying": self.carrying,
+            "carried": self.carried,
+            "continued": list(self.continued),
+            "opened": list(self.opened),
+            "orphans": [[flow_key, responses] for flow_key, responses in self.orphans.items()],
+            "reassembler": self.reassembler.dump_state()
+        }
     
-    top_connections = [
-        {
-            "connection": conn,
-            "packets": count
+    def load_state(self, state):
+        self.digest.load_state(state["digest"])
+        self.first_ts = state["first_ts"]
+        self.pending = {
+            flow_key_from_state(flow_key): deque(queue)
+            for flow_key, queue in state["pending"]
         }
-        for conn, count in sorted(connections.items(), key=lambda x: x[1], reverse=True)[:10]
-    ]
+        self.carrying = state["carrying"]
+        self.carried = [
+            (flow_key_from_state(flow_key), kind, tuple(content) if kind == "response" else content, timestamp)
+            for flow_key, kind, content, timestamp in state["carried"]
+        ]
+        self.continued = {flow_key_from_state(flow_key) for flow_key in state["continued"]}
+        self.opened = {flow_key_from_state(flow_key) for flow_key in state["opened"]}
+        self.orphans = {
+            flow_key_from_state(flow_key): [tuple(response) for response in responses]
+            for flow_key, responses in state["orphans"]
+        }
+        self.reassembler.load_state(state["reassembler"])
     
-    return {
-        "totalConnections": len(connections),
-        "topConnections": top_connections
-    }
-
-def analyze_http_sessions(packets):
-    """HTTP会话流重建 - 杀手级功能"""
-    import re
-    from collections import defaultdict
-    
-    http_sessions = []
-    tcp_streams = defaultdict(list)  # 按TCP流分组
-    
-    # 第一步：按TCP流分组数据包
-    for pkt in packets:
-        if IP in pkt and TCP in pkt and Raw in pkt:
-            src_ip = pkt[IP].src
-            dst_ip = pkt[IP].dst
-            src_port = pkt[TCP].sport
-            dst_port = pkt[TCP].dport
-            
-            # 创建双向流标识
-            flow_key = tuple(sorted([(src_ip, src_port), (dst_ip, dst_port)]))
-            tcp_streams[flow_key].append({
-                'packet': pkt,
-                'timestamp': float(pkt.time),
-                'src_ip': src_ip,
-                'dst_ip': dst_ip,
-                'src_port': src_port,
-                'dst_port': dst_port,
-                'payload': pkt[Raw].load
-            })
+    def finished(self):
+        """结束未关闭的流，返回全部已配对会话的摘要"""
+        self.finish()
+        if self.carrying:
+            self.settle()
+        return self.digest
     
-    # 第二步：从TCP流中提取HTTP会话
-    for flow_key, stream_packets in tcp_streams.items():
-        # 按时间排序
-        stream_packets.sort(key=lambda x: x['timestamp'])
+    def result(self):
+        digest = self.finished()
         
-        # 检查是否包含HTTP流量
-        http_packets = []
-        for pkt_info in stream_packets:
-            try:
-                payload = pkt_info['payload']
-                if isinstance(payload, bytes):
-                    payload_str = payload.decode('utf-8', errors='ignore')
-                    
-                    # 检测HTTP请求/响应
-                    if (payload_str.startswith(('GET ', 'POST ', 'PUT ', 'DELETE ', 'HEAD ', 'OPTIONS ', 'PATCH ')) or
-                        payload_str.startswith('HTTP/')):
-                        http_packets.append(pkt_info)
-                        
-            except:
-                continue
+        return {
+            "total_sessions": digest.counts["total"],
+            "sessions": digest.samples["earliest"].values,  # 只返回前N个会话，避免数据过大
+            "summary": {
+                "unique_hosts": digest.hosts.count(),
+                "methods": list(digest.methods),
+                "status_codes": list(digest.status_codes),
+                "response_time_percentiles": digest.response_times.percentiles()
+            }
+        }
+
+# 会话摘要中跟踪请求次数的不同URL数、精确统计的不同域名数（超过后分别为近似计数和估计值）
+URL_COUNTER_CAPACITY = 4096
+HOST_SET_LIMIT = 4096
+SLOW_RESPONSE_MS = 2000
+LARGE_RESPONSE_BYTES = 100000
+SENSITIVE_URL_KEYWORDS = ('password', 'key', 'token', 'secret', 'auth')
+
+class OrderedSample:
+    """按排序键保留最前面的 limit 个值（键相同时先加入的在前），可合并"""
+    
+    def __init__(self, limit):
+        self.limit = limit
+        self.keys = []
+        self.values = []
+    
+    def add(self, key, value):
+        keys = self.keys
+        if len(keys) >= self.limit and (not keys or not key < keys[-1]):
+            return
+        position = bisect_right(keys, key)
+        keys.insert(position, key)
+        self.values.insert(position, value)
+        if len(keys) > self.limit:
+            keys.pop()
+            self.values.pop()
+    
+    def merge(self, other):
+        for key, value in zip(other.keys, other.values):
+            self.add(key, value)
+    
+    def dump_state(self):
+        return {"keys": self.keys, "values": self.values}
+    
+    def load_state(self, state):
+        # JSON中的元组键为列表
+        self.keys = [tuple(key) if isinstance(key, list) else key for key in state["keys"]]
+        self.values = state["values"]
+
+class HttpSessionDigest:
+    """已配对会话的有界摘要：HTTP会话段和智能诊断规则需要的计数、响应时间草图和少量样本
+    
+    会话配对完成时即计入摘要，不保存全部会话，状态大小与会话数无关。样本保留请求时间
+    最早的若干个（与全部会话按请求时间排序后取前几个相同）。不同URL超过
+    URL_COUNTER_CAPACITY 个后请求次数为Space-Saving近似计数，不同域名超过 HOST_SET_LIMIT
+    个后为HyperLogLog估计。
+    """
+    
+    def __init__(self, top_n):
+        self.counts = Counter()
+        self.samples = {
+            "earliest": OrderedSample(top_n),  # 输出的前N个完整会话
+            "slowest": OrderedSample(3),
+            "client_errors": OrderedSample(3),
+            "server_errors": OrderedSample(3),
+            "plaintext_hosts": OrderedSample(5),
+            "sensitive_urls": OrderedSample(3),
+            "uncompressed": OrderedSample(3)
+        }
+        self.hosts = DistinctValues(HOST_SET_LIMIT)
+        self.insecure_cookie_hosts = DistinctValues(HOST_SET_LIMIT)
+        self.methods = {}  # 有序集合
+        self.status_codes = {}
+        self.client_errors = Counter()  # 4xx状态码 -> 次数
+        self.response_times = DDSketch()
+        self.urls = SpaceSaving(URL_COUNTER_CAPACITY)
+    
+    def add(self, session):
+        counts = self.counts
+        samples = self.samples
+        ts = session.get('request_timestamp', 0)
+        host = session.get('host', '')
+        url = session.get('url', '')
+        status_code = session.get('status_code', 0)
+        response_time = session.get('response_time', 0)
         
-        if not http_packets:
-            continue
-            
-        # 第三步：重建HTTP会话
-        current_session = None
+        counts["total"] += 1
+        samples["earliest"].add(ts, session)
+        if host:
+            self.hosts.add(host)
+        if session.get('method'):
+            self.methods[session['method']] = None
+        if status_code:
+            self.status_codes[status_code] = None
+        if response_time:
+            self.response_times.add(response_time)
         
-        for pkt_info in http_packets:
-            try:
-                payload_str = pkt_info['payload'].decode('utf-8', errors='ignore')
-                
-                # 检测HTTP请求
-                if payload_str.startswith(('GET ', 'POST ', 'PUT ', 'DELETE ', 'HEAD ', 'OPTIONS ', 'PATCH ')):
-                    # 解析HTTP请求
-                    request_data = parse_http_request(payload_str, pkt_info)
-                    if request_data:
-                        current_session = request_data
-                        current_session['flow_key'] = str(flow_key)
-                        current_session['request_timestamp'] = pkt_info['timestamp']
-                        
-                # 检测HTTP响应
-                elif payload_str.startswith('HTTP/') and current_session:
-                    # 解析HTTP响应
-                    response_data = parse_http_response(payload_str, pkt_info)
-                    if response_data:
-                        current_session.update(response_data)
-                        current_session['response_timestamp'] = pkt_info['timestamp']
-                        current_session['response_time'] = (
-                            pkt_info['timestamp'] - current_session['request_timestamp']
-                        ) * 1000  # 转换为毫秒
-                        
-                        # 会话完成，添加到结果
-                        http_sessions.append(current_session)
-                        current_session = None
-                        
-            except Exception as e:
-                continue
-    
-    # 按时间排序并限制返回数量
-    http_sessions.sort(key=lambda x: x.get('request_timestamp', 0))
-    
-    return {
-        "total_sessions": len(http_sessions),
-        "sessions": http_sessions[:50],  # 返回前50个会话，避免数据过大
-        "summary": {
-            "unique_hosts": len(set(s.get('host', '') for s in http_sessions if s.get('host'))),
-            "methods": list(set(s.get('method', '') for s in http_sessions if s.get('method'))),
-            "status_codes": list(set(s.get('status_code', 0) for s in http_sessions if s.get('status_code')))
+        if response_time > SLOW_RESPONSE_MS:
+            counts["slow"] += 1
+            counts["slow_time"] += response_time
+            samples["slowest"].add((-response_time, ts), url[:50])
+        if url:
+            self.urls.add(url)
+        
+        if 400 <= status_code < 500:
+            self.client_errors[status_code] += 1
+            samples["client_errors"].add(ts, url[:50])
+        elif status_code >= 500:
+            counts["server_errors"] += 1
+            samples["server_errors"].add(ts, url[:50])
+        elif 300 <= status_code < 400:
+            counts["redirects"] += 1
+        
+        if session.get('dst_port') == 80:
+            counts["plaintext"] += 1
+            samples["plaintext_hosts"].add(ts, host)
+        if any(keyword in url.lower() for keyword in SENSITIVE_URL_KEYWORDS):
+            counts["sensitive"] += 1
+            samples["sensitive_urls"].add(ts, url[:50])
+        
+        headers = session.get('response_headers', {})
+        set_cookie = headers.get('set-cookie', '')
+        if set_cookie and 'secure' not in set_cookie.lower():
+            self.insecure_cookie_hosts.add(host)
+        cache_control = headers.get('cache-control', '').lower()
+        if 'no-cache' in cache_control or not cache_control:
+            counts["no_cache"] += 1
+        content_length = session.get('content_length_response')
+        if (content_length and content_length.isdigit() and int(content_length) > LARGE_RESPONSE_BYTES
+                and 'gzip' not in headers.get('content-encoding', '')):
+            counts["uncompressed"] += 1
+            samples["uncompressed"].add(ts, url[:50])
+        if any(ext in url for ext in ['.js', '.css']):
+            counts["js_css"] += 1
+    
+    def merge(self, other):
+        self.counts.update(other.counts)
+        for name, sample in other.samples.items():
+            self.samples[name].merge(sample)
+        self.hosts.merge(other.hosts)
+        self.insecure_cookie_hosts.merge(other.insecure_cookie_hosts)
+        self.methods.update(other.methods)
+        self.status_codes.update(other.status_codes)
+        self.client_errors.update(other.client_errors)
+        self.response_times.merge(other.response_times)
+        self.urls.merge(other.urls)
+    
+    def dump_state(self):
+        return {
+            "counts": dict(self.counts),
+            "samples": {name: sample.dump_state() for name, sample in self.samples.items()},
+            "hosts": self.hosts.dump_state(),
+            "insecure_cookie_hosts": self.insecure_cookie_hosts.dump_state(),
+            "methods": list(self.methods),
+            "status_codes": list(self.status_codes),
+            "client_errors": list(self.client_errors.items()),
+            "response_times": self.response_times.dump_state(),
+            "urls": self.urls.dump_state()
         }
-    }
+    
+    def load_state(self, state):
+        self.counts = Counter(state["counts"])
+        for name, sample in state["samples"].items():
+            self.samples[name].load_state(sample)
+        self.hosts.load_state(state["hosts"])
+        self.insecure_cookie_hosts.load_state(state["insecure_cookie_hosts"])
+        self.methods = dict.fromkeys(state["methods"])
+        self.status_codes = dict.fromkeys(state["status_codes"])
+        self.client_errors = Counter(dict(state["client_errors"]))
+        self.response_times.load_state(state["response_times"])
+        self.urls.load_state(state["urls"])
+
+def flow_key_from_state(flow_key):
+    """JSON中的流键（嵌套列表）还原为 ((IP, 端口), (IP, 端口))"""
+    return tuple(tuple(endpoint) for endpoint in flow_key)
+
+def analyze_http_sessions(packets):
+    """HTTP会话流重建 - 杀手级功能"""
+    return run_section("http_sessions", packets)
 
 def parse_http_request(payload_str, pkt_info):
     """解析HTTP请求"""
@@ -659,46 +2085,192 @@ def parse_http_response(payload_str, pkt_info):
     except Exception:
         return None
 
-def detect_anomalies(packets):
-    """增强异常检测"""
-    anomalies = []
+class AnomalyAccumulator:
+    """异常检测累加器（按IP/端口的统计从共享流表聚合，逐包只统计包大小）
+    
+    每个源IP的不同目的端口数由 DistinctPorts 精确统计（集合→8KB位图），端口扫描源的
+    内存不随端口数增长。
+    """
+    
+    def __init__(self, flows, options=None):
+        self.flows = flows
+        self.options = options or SECTION_OPTIONS["anomalies"]
+        self.total_packets = 0
+        self.packet_sizes = Counter()  # 包大小直方图（IPv4）
+    
+    def feed(self, rec):
+        self.total_packets += 1
+        if rec.ip_version == 4:
+            # 收集包大小
+            self.packet_sizes[rec.length] += 1
     
-    if not packets:
-        return anomalies
+    def merge(self, other):
+        self.total_packets += other.total_packets
+        self.packet_sizes.update(other.packet_sizes)
     
-    # 收集统计数据
-    total_packets = len(packets)
-    ip_connections = defaultdict(set)  # 每个IP连接的端口数
-    port_scan_ips = defaultdict(set)   # 扫描端口的IP
-    failed_connections = defaultdict(int)  # 失败连接计数
-    packet_sizes = []
-    
-    for pkt in packets:
-        if IP in pkt:
-            src_ip = pkt[IP].src
-            dst_ip = pkt[IP].dst
-            
-            # 收集包大小
-            packet_sizes.append(len(pkt))
+    def dump_state(self):
+        return {
+            "total_packets": self.total_packets,
+            "packet_sizes": encode_counter(self.packet_sizes)
+        }
+    
+    def load_state(self, state):
+        self.total_packets = state["total_packets"]
+        self.packet_sizes = decode_counter(state["packet_sizes"])
+    
+    def result(self):
+        # 每个源IP连接的端口：超过集合上限后改用位图，位图数量不设上限，端口数保持精确
+        ip_connections = DistinctPorts(max(PORT_SET_LIMIT, self.options["port_scan_ports"]), math.inf)
+        ip_packet_count = Counter()
+        port_counts = Counter()
+        failed_count = 0  # 失败连接计数
+        icmp_count = 0
+        
+        for key, flow in self.flows.flows.items():
+            proto = key & 0xFF
+            if flow.ip_version == 4:
+                src_id = key >> 72
+                ip_packet_count[src_id] += flow.packets
+                if proto == 6 or proto == 17:
+                    ip_connections.add(src_id, (key >> 8) & 0xFFFF)
+                if proto == 6:
+                    # 检测TCP RST（可能的失败连接）
+                    failed_count += flow.rst
             
-            if TCP in pkt:
-                dst_port = pkt[TCP].dport
-                ip_connections[src_ip].add(dst_port)
-                
-                # 检测TCP RST或FIN（可能的失败连接）
-                flags = pkt[TCP].flags
-                if flags & 0x04:  # RST flag
-                    failed_connections[f"{src_ip}->{dst_ip}:{dst_port}"] += 1
-                    
-            elif UDP in pkt:
-                dst_port = pkt[UDP].dport
-                ip_connections[src_ip].add(dst_port)
+            if proto == 6 or proto == 17:
+                port_counts[(key >> 8) & 0xFFFF] += flow.packets
+            elif proto == 1:
+                icmp_count += flow.packets
+        
+        addresses = self.flows.addresses
+        packet_sizes = self.packet_sizes
+        return build_anomalies(
+            self.total_packets, icmp_count,
+            ((addresses[ip], count) for ip, count in ip_connections.counts()),
+            source_packet_stats(Counter({addresses[ip]: count for ip, count in ip_packet_count.items()})),
+            port_counts,
+            sum(packet_sizes.values()),
+            sum(size * count for size, count in packet_sizes.items()),
+            lambda threshold: sum(count for size, count in packet_sizes.items() if size > threshold),
+            failed_count, self.options)
+
+class SketchAnomalyAccumulator:
+    """异常检测的近似模式（options.anomalies.approximate）：不依赖流表，内存有界
+    
+    每个源IP的不同目的端口数由 DistinctPorts 统计（集合→位图→HyperLogLog），
+    是否超过端口扫描阈值的判断与精确模式相同；DDoS检测中包数最多的源IP来自
+    Space-Saving摘要（按计数下界判断），源IP数由HyperLogLog估计。其余统计逐包精确累加。
+    """
+    
+    def __init__(self, options=None):
+        options = options or SECTION_OPTIONS["anomalies"]
+        self.options = options
+        self.total_packets = 0
+        self.icmp_count = 0
+        self.failed_count = 0
+        self.ipv4_packets = 0
+        self.packet_sizes = Counter()  # 包大小直方图（IPv4）
+        self.port_counts = Counter()
+        self.sources = SpaceSaving(options["sketch_counters"])
+        self.source_ips = HyperLogLog(options["hll_precision"])
+        self.source_ports = DistinctPorts(max(PORT_SET_LIMIT, options["port_scan_ports"]),
+                                          options["port_bitmaps"])
+    
+    def feed(self, rec):
+        self.total_packets += 1
+        ip_version = rec.ip_version
+        if not ip_version:
+            return
+        proto = rec.proto
+        if proto == 6 or proto == 17:
+            self.port_counts[rec.dport] += 1
+        elif proto == 1:
+            self.icmp_count += 1
+        if ip_version != 4:
+            return
+        
+        src = rec.src
+        self.ipv4_packets += 1
+        self.packet_sizes[rec.length] += 1
+        self.sources.add(src)
+        self.source_ips.add(src)
+        if proto == 6 or proto == 17:
+            self.source_ports.add(src, rec.dport)
+            if proto == 6 and rec.flags & 0x04:
+                # TCP RST（可能的失败连接）
+                self.failed_count += 1
+    
+    def merge(self, other):
+        self.total_packets += other.total_packets
+        self.icmp_count += other.icmp_count
+        self.failed_count += other.failed_count
+        self.ipv4_packets += other.ipv4_packets
+        self.packet_sizes.update(other.packet_sizes)
+        self.port_counts.update(other.port_counts)
+        self.sources.merge(other.sources)
+        self.source_ips.merge(other.source_ips)
+        self.source_ports.merge(other.source_ports)
+    
+    def dump_state(self):
+        return {
+            "counts": [self.total_packets, self.icmp_count, self.failed_count, self.ipv4_packets],
+            "packet_sizes": encode_counter(self.packet_sizes),
+            "port_counts": encode_counter(self.port_counts),
+            "sources": self.sources.dump_state(),
+            "source_ips": self.source_ips.dump_state(),
+            "source_ports": self.source_ports.dump_state()
+        }
+    
+    def load_state(self, state):
+        self.total_packets, self.icmp_count, self.failed_count, self.ipv4_packets = state["counts"]
+        self.packet_sizes = decode_counter(state["packet_sizes"])
+        self.port_counts = decode_counter(state["port_counts"])
+        self.sources.load_state(state["sources"])
+        self.source_ips.load_state(state["source_ips"])
+        self.source_ports.load_state(state["source_ports"])
+    
+    def result(self):
+        top_ip = None
+        source_count = 0
+        if self.ipv4_packets:
+            # 取计数的下界（计数减去最大高估量），近似误差不会造成DDoS误报
+            ip, count, error = self.sources.top(1)[0]
+            top_ip = (ip, count - error)
+            source_count = max(1, round(self.source_ips.estimate()))
+        packet_sizes = self.packet_sizes
+        return build_anomalies(
+            self.total_packets, self.icmp_count, self.source_ports.counts(),
+            (top_ip, source_count, self.ipv4_packets),
+            self.port_counts,
+            sum(packet_sizes.values()),
+            sum(size * count for size, count in packet_sizes.items()),
+            lambda threshold: sum(count for size, count in packet_sizes.items() if size > threshold),
+            self.failed_count, self.options)
+
+def source_packet_stats(ip_packet_count):
+    """DDoS检测所需的每源IP包数统计：(包数最多的 (源IP, 包数), 源IP数, IPv4包总数)"""
+    if not ip_packet_count:
+        return None, 0, 0
+    return ip_packet_count.most_common(1)[0], len(ip_packet_count), sum(ip_packet_count.values())
+
+def build_anomalies(total_packets, icmp_count, source_port_counts, source_packets, port_counts,
+                    size_count, size_sum, count_larger_than, failed_count, thresholds=None):
+    """由聚合值生成异常检测结果
+    
+    source_port_counts 为 (源IP, 不同目的端口数) 序列，source_packets 见 source_packet_stats，
+    port_counts 为按首次出现顺序插入的Counter，count_larger_than(阈值) 返回大于阈值的IPv4包数。
+    thresholds 为异常检测段的选项，默认见 SECTION_OPTIONS。
+    """
+    anomalies = []
+    
+    if not total_packets:
+        return anomalies
+    thresholds = thresholds or SECTION_OPTIONS["anomalies"]
     
     # 1. 检测大量ICMP流量
-    icmp_count = sum(1 for pkt in packets if ICMP in pkt)
     icmp_percentage = (icmp_count / total_packets) * 100
     
-    if icmp_percentage > 10:
+    if icmp_percentage > thresholds["icmp_percentage"]:
         anomalies.append({
             "type": "high_icmp_traffic",
             "severity": "medium",
@@ -710,25 +2282,25 @@ def detect_anomalies(packets):
         })
     
     # 2. 检测端口扫描
-    for ip, ports in ip_connections.items():
-        if len(ports) > 50:  # 连接超过50个不同端口
+    for ip, port_count in source_port_counts:
+        if port_count > thresholds["port_scan_ports"]:  # 连接的不同端口过多（默认50个）
             anomalies.append({
                 "type": "port_scan_detected",
                 "severity": "high",
-                "description": f"检测到端口扫描: {ip} 连接了 {len(ports)} 个端口",
+                "description": f"检测到端口扫描: {ip} 连接了 {port_count} 个端口",
                 "details": {
                     "source_ip": ip,
-                    "port_count": len(ports)
+                    "port_count": port_count
                 }
             })
     
     # 3. 检测DDoS攻击特征
-    ip_packet_count = Counter(pkt[IP].src for pkt in packets if IP in pkt)
-    max_packets_per_ip = max(ip_packet_count.values()) if ip_packet_count else 0
-    avg_packets_per_ip = sum(ip_packet_count.values()) / len(ip_packet_count) if ip_packet_count else 0
+    top_ip, source_count, ipv4_packets = source_packets
+    max_packets_per_ip = top_ip[1] if top_ip else 0
+    avg_packets_per_ip = ipv4_packets / source_count if source_count else 0
     
-    if max_packets_per_ip > avg_packets_per_ip * 10 and max_packets_per_ip > 100:
-        top_ip = ip_packet_count.most_common(1)[0]
+    if (max_packets_per_ip > avg_packets_per_ip * thresholds["ddos_ratio"]
+            and max_packets_per_ip > thresholds["ddos_min_packets"]):
         anomalies.append({
             "type": "potential_ddos",
             "severity": "high",
@@ -740,17 +2312,10 @@ def detect_anomalies(packets):
             }
         })
     
-    # 4. 检测异常端口使用
-    port_counts = Counter()
-    for pkt in packets:
-        if TCP in pkt:
-            port_counts[pkt[TCP].dport] += 1
-        elif UDP in pkt:
-            port_counts[pkt[UDP].dport] += 1
-    
-    # 检测非标准端口的大量流量
+    # 4. 检测异常端口使用（非标准端口的大量流量）
     unusual_ports = [port for port, count in port_counts.items() 
-                    if port > 10000 and count > total_packets * 0.05]
+                    if port > thresholds["unusual_port_min"]
+                    and count > total_packets * thresholds["unusual_port_share"]]
     
     for port in unusual_ports:
         anomalies.append({
@@ -764,37 +2329,63 @@ def detect_anomalies(packets):
         })
     
     # 5. 检测包大小异常
-    if packet_sizes:
-        avg_size = sum(packet_sizes) / len(packet_sizes)
-        large_packets = [size for size in packet_sizes if size > avg_size * 5]
+    if size_count:
+        avg_size = size_sum / size_count
+        large_packets = count_larger_than(avg_size * thresholds["large_packet_ratio"])
         
-        if len(large_packets) > total_packets * 0.1:  # 超过10%的包异常大
+        if large_packets > total_packets * thresholds["large_packet_share"]:  # 默认超过10%的包异常大
             anomalies.append({
                 "type": "unusual_packet_sizes",
                 "severity": "low",
-                "description": f"检测到异常大的数据包: {len(large_packets)} 个包大小异常",
+                "description": f"检测到异常大的数据包: {large_packets} 个包大小异常",
                 "details": {
-                    "large_packet_count": len(large_packets),
+                    "large_packet_count": large_packets,
                     "avg_size": int(avg_size)
                 }
             })
     
     # 6. 检测大量失败连接
-    total_failed = sum(failed_connections.values())
-    if total_failed > total_packets * 0.2:  # 超过20%的连接失败
+    if failed_count > total_packets * thresholds["failure_share"]:  # 默认超过20%的连接失败
         anomalies.append({
             "type": "high_connection_failures",
             "severity": "medium",
-            "description": f"大量连接失败: {total_failed} 个失败连接",
+            "description": f"大量连接失败: {failed_count} 个失败连接",
             "details": {
-                "failed_count": total_failed
+                "failed_count": failed_count
             }
         })
     
     return anomalies
 
+def detect_anomalies(packets):
+    """增强异常检测"""
+    return run_section("anomalies", packets)
+
 def analyze_smart_insights(packets):
     """智能诊断规则引擎 - 让非专家也能理解网络问题"""
+    return run_section("smart_insights", packets)
+
+class SmartInsightsSection:
+    """智能诊断：不接收数据包，基于HTTP会话段全部会话的摘要（而不是输出的前50个）"""
+    feed = None
+    
+    def __init__(self, http_sessions):
+        self.http_sessions = http_sessions
+    
+    def merge(self, other):
+        pass
+    
+    def dump_state(self):
+        return {}
+    
+    def load_state(self, state):
+        pass
+    
+    def result(self):
+        return build_smart_insights(self.http_sessions.finished())
+
+def build_smart_insights(digest):
+    """基于HTTP会话摘要（HttpSessionDigest）生成智能诊断结果"""
     insights = {
         "performance_issues": [],
         "security_concerns": [],
@@ -804,11 +2395,7 @@ def analyze_smart_insights(packets):
     }
     
     try:
-        # 首先获取HTTP会话数据用于分析
-        http_sessions_data = analyze_http_sessions(packets)
-        sessions = http_sessions_data.get("sessions", [])
-        
-        if not sessions:
+        if not digest.counts["total"]:
             insights["overall_health"] = "warning"
             insights["performance_issues"].append({
                 "type": "no_http_traffic",
@@ -820,16 +2407,16 @@ def analyze_smart_insights(packets):
             return insights
         
         # 性能问题分析
-        insights["performance_issues"] = analyze_performance_issues(sessions)
+        insights["performance_issues"] = analyze_performance_issues(digest)
         
         # 错误模式分析  
-        insights["error_patterns"] = analyze_error_patterns(sessions)
+        insights["error_patterns"] = analyze_error_patterns(digest)
         
         # 安全问题分析
-        insights["security_concerns"] = analyze_security_concerns(sessions)
+        insights["security_concerns"] = analyze_security_concerns(digest)
         
         # 优化建议分析
-        insights["optimization_suggestions"] = analyze_optimization_suggestions(sessions)
+        insights["optimization_suggestions"] = analyze_optimization_suggestions(digest)
         
         # 综合健康状态评估
         insights["overall_health"] = calculate_overall_health(insights)
@@ -846,31 +2433,31 @@ def analyze_smart_insights(packets):
             "error": f"智能分析出错: {str(e)}"
         }
 
-def analyze_performance_issues(sessions):
+def analyze_performance_issues(digest):
     """分析性能问题"""
     issues = []
+    counts = digest.counts
     
     # 1. 慢查询API检测
-    slow_requests = [s for s in sessions if s.get('response_time', 0) > 2000]  # >2秒
-    if slow_requests:
-        avg_slow_time = sum(s.get('response_time', 0) for s in slow_requests) / len(slow_requests)
+    if counts["slow"]:
+        avg_slow_time = counts["slow_time"] / counts["slow"]
         issues.append({
             "type": "slow_api_requests",
             "title": "发现慢查询API",
-            "description": f"有 {len(slow_requests)} 个API请求响应时间超过2秒，平均 {avg_slow_time:.0f}ms",
-            "severity": "high" if len(slow_requests) > 5 else "medium",
+            "description": f"有 {counts['slow']} 个API请求响应时间超过2秒，平均 {avg_slow_time:.0f}ms",
+            "severity": "high" if counts["slow"] > 5 else "medium",
             "suggestion": "检查服务器性能、数据库查询或网络延迟问题",
             "details": {
-                "slow_count": len(slow_requests),
+                "slow_count": counts["slow"],
                 "avg_response_time": avg_slow_time,
-                "slowest_urls": [s.get('url', '')[:50] for s in sorted(slow_requests, key=lambda x: x.get('response_time', 0), reverse=True)[:3]]
+                "slowest_urls": digest.samples["slowest"].values
             }
         })
     
     # 2. 高延迟模式检测
-    response_times = [s.get('response_time', 0) for s in sessions if s.get('response_time')]
-    if response_times:
-        avg_response_time = sum(response_times) / len(response_times)
+    response_times = digest.response_times
+    if response_times.count:
+        avg_response_time = response_times.sum / response_times.count
         if avg_response_time > 1000:  # 平均响应时间>1秒
             issues.append({
                 "type": "high_average_latency",
@@ -880,18 +2467,17 @@ def analyze_performance_issues(sessions):
                 "suggestion": "检查网络连接质量、CDN配置或服务器地理位置",
                 "details": {
                     "avg_response_time": avg_response_time,
-                    "total_requests": len(response_times)
+                    "percentiles": response_times.percentiles(),
+                    "total_requests": response_times.count
                 }
             })
     
-    # 3. 重复请求检测
-    url_counts = {}
-    for session in sessions:
-        url = session.get('url', '')
-        if url:
-            url_counts[url] = url_counts.get(url, 0) + 1
-    
-    repeated_urls = [(url, count) for url, count in url_counts.items() if count > 3]
+    # 3. 重复请求检测：不同URL超过摘要容量后按计数下界（计数减最大高估量）判断，不会误报
+    repeated_urls = [
+        (url, count - error) for url, count, error in digest.urls.top(len(digest.urls.counts))
+        if count - error > 3
+    ]
+    repeated_urls.sort(key=lambda item: item[1], reverse=True)
     if repeated_urls:
         issues.append({
             "type": "repeated_requests",
@@ -900,191 +2486,158 @@ def analyze_performance_issues(sessions):
             "severity": "medium",
             "suggestion": "实施HTTP缓存策略或优化前端资源加载逻辑",
             "details": {
-                "repeated_urls": [(url[:50], count) for url, count in sorted(repeated_urls, key=lambda x: x[1], reverse=True)[:5]]
+                "repeated_urls": [(url[:50], count) for url, count in repeated_urls[:5]]
             }
         })
     
     return issues
 
-def analyze_error_patterns(sessions):
+def analyze_error_patterns(digest):
     """分析错误模式"""
     patterns = []
+    counts = digest.counts
+    total = counts["total"]
     
     # 1. 4xx客户端错误分析
-    client_errors = [s for s in sessions if 400 <= s.get('status_code', 0) < 500]
-    if client_errors:
-        error_counts = {}
-        for session in client_errors:
-            code = session.get('status_code')
-            error_counts[code] = error_counts.get(code, 0) + 1
-        
+    if digest.client_errors:
+        error_counts = digest.client_errors
+        client_errors = sum(error_counts.values())
         patterns.append({
             "type": "client_errors",
             "title": "客户端错误频发",
-            "description": f"发现 {len(client_errors)} 个4xx错误，主要为: {', '.join(f'{code}({count}次)' for code, count in sorted(error_counts.items()))}",
-            "severity": "high" if len(client_errors) > 10 else "medium",
+            "description": f"发现 {client_errors} 个4xx错误，主要为: {', '.join(f'{code}({count}次)' for code, count in sorted(error_counts.items()))}",
+            "severity": "high" if client_errors > 10 else "medium",
             "suggestion": "检查前端代码、API调用路径或权限配置",
             "details": {
-                "error_count": len(client_errors),
-                "error_breakdown": error_counts,
-                "sample_urls": [s.get('url', '')[:50] for s in client_errors[:3]]
+                "error_count": client_errors,
+                "error_breakdown": dict(error_counts),
+                "sample_urls": digest.samples["client_errors"].values
             }
         })
     
     # 2. 5xx服务器错误分析
-    server_errors = [s for s in sessions if s.get('status_code', 0) >= 500]
-    if server_errors:
+    if counts["server_errors"]:
         patterns.append({
             "type": "server_errors",
             "title": "服务器错误警告",
-            "description": f"发现 {len(server_errors)} 个5xx错误，服务器可能存在问题",
+            "description": f"发现 {counts['server_errors']} 个5xx错误，服务器可能存在问题",
             "severity": "critical",
             "suggestion": "立即检查服务器日志、数据库连接或系统资源",
             "details": {
-                "error_count": len(server_errors),
-                "sample_urls": [s.get('url', '')[:50] for s in server_errors[:3]]
+                "error_count": counts["server_errors"],
+                "sample_urls": digest.samples["server_errors"].values
             }
         })
     
     # 3. 重定向链分析
-    redirects = [s for s in sessions if 300 <= s.get('status_code', 0) < 400]
-    if len(redirects) > len(sessions) * 0.2:  # 超过20%的请求是重定向
+    redirects = counts["redirects"]
+    if redirects > total * 0.2:  # 超过20%的请求是重定向
         patterns.append({
             "type": "excessive_redirects",
             "title": "重定向过多",
-            "description": f"有 {len(redirects)} 个重定向响应({len(redirects)/len(sessions)*100:.1f}%)，可能影响性能",
+            "description": f"有 {redirects} 个重定向响应({redirects/total*100:.1f}%)，可能影响性能",
             "severity": "medium",
             "suggestion": "优化URL结构，减少不必要的重定向",
             "details": {
-                "redirect_count": len(redirects),
-                "redirect_percentage": len(redirects)/len(sessions)*100
+                "redirect_count": redirects,
+                "redirect_percentage": redirects/total*100
             }
         })
     
     return patterns
 
-def analyze_security_concerns(sessions):
+def analyze_security_concerns(digest):
     """分析安全问题"""
     concerns = []
+    counts = digest.counts
     
     # 1. HTTP明文传输检测
-    http_sessions = [s for s in sessions if s.get('dst_port') == 80]
-    if http_sessions:
+    if counts["plaintext"]:
         concerns.append({
             "type": "http_plaintext",
             "title": "发现HTTP明文传输",
-            "description": f"有 {len(http_sessions)} 个HTTP请求使用明文传输，存在安全风险",
+            "description": f"有 {counts['plaintext']} 个HTTP请求使用明文传输，存在安全风险",
             "severity": "medium",
             "suggestion": "升级到HTTPS加密传输，保护用户数据安全",
             "details": {
-                "http_count": len(http_sessions),
-                "sample_hosts": list(set([s.get('host', '')[:30] for s in http_sessions[:5] if s.get('host')]))
+                "http_count": counts["plaintext"],
+                "sample_hosts": list(dict.fromkeys(
+                    host[:30] for host in digest.samples["plaintext_hosts"].values if host))
             }
         })
     
-    # 2. 敏感信息检测
-    sensitive_patterns = []
-    for session in sessions:
-        url = session.get('url', '')
-        # 检测URL中的潜在敏感信息
-        if any(keyword in url.lower() for keyword in ['password', 'key', 'token', 'secret', 'auth']):
-            sensitive_patterns.append(url[:50])
-    
-    if sensitive_patterns:
+    # 2. 敏感信息检测（URL中的潜在敏感信息）
+    if counts["sensitive"]:
         concerns.append({
             "type": "sensitive_data_in_url",
             "title": "URL中可能包含敏感信息",
-            "description": f"在 {len(sensitive_patterns)} 个URL中发现可能的敏感信息",
+            "description": f"在 {counts['sensitive']} 个URL中发现可能的敏感信息",
             "severity": "high",
             "suggestion": "避免在URL中传递密码、密钥等敏感信息，使用POST请求体或HTTP头部",
             "details": {
-                "sensitive_urls": sensitive_patterns[:3]
+                "sensitive_urls": digest.samples["sensitive_urls"].values
             }
         })
     
     # 3. Cookie安全检测
-    insecure_cookies = []
-    for session in sessions:
-        headers = session.get('response_headers', {})
-        set_cookie = headers.get('set-cookie', '')
-        if set_cookie and 'secure' not in set_cookie.lower():
-            insecure_cookies.append(session.get('host', ''))
-    
-    if insecure_cookies:
-        unique_hosts = list(set(insecure_cookies))
+    insecure_hosts = digest.insecure_cookie_hosts
+    if insecure_hosts.count():
         concerns.append({
             "type": "insecure_cookies",
             "title": "Cookie缺少安全标志",
-            "description": f"{len(unique_hosts)} 个域名的Cookie未设置Secure标志",
+            "description": f"{insecure_hosts.count()} 个域名的Cookie未设置Secure标志",
             "severity": "medium",
             "suggestion": "为Cookie添加Secure和HttpOnly标志，提高安全性",
             "details": {
-                "affected_hosts": unique_hosts[:5]
+                "affected_hosts": insecure_hosts.sample(5)
             }
         })
     
     return concerns
 
-def analyze_optimization_suggestions(sessions):
+def analyze_optimization_suggestions(digest):
     """分析优化建议"""
     suggestions = []
+    counts = digest.counts
     
     # 1. 缓存优化建议
-    no_cache_sessions = []
-    for session in sessions:
-        headers = session.get('response_headers', {})
-        cache_control = headers.get('cache-control', '').lower()
-        if 'no-cache' in cache_control or not cache_control:
-            no_cache_sessions.append(session)
-    
-    if len(no_cache_sessions) > len(sessions) * 0.3:  # 超过30%无缓存
+    if counts["no_cache"] > counts["total"] * 0.3:  # 超过30%无缓存
         suggestions.append({
             "type": "cache_optimization",
             "title": "缺少HTTP缓存策略",
-            "description": f"{len(no_cache_sessions)} 个响应未设置缓存策略，影响性能",
+            "description": f"{counts['no_cache']} 个响应未设置缓存策略，影响性能",
             "severity": "medium",
             "suggestion": "为静态资源设置适当的Cache-Control头部，减少重复请求",
             "details": {
-                "no_cache_count": len(no_cache_sessions),
-                "percentage": len(no_cache_sessions)/len(sessions)*100
+                "no_cache_count": counts["no_cache"],
+                "percentage": counts["no_cache"]/counts["total"]*100
             }
         })
     
-    # 2. 压缩优化建议
-    large_responses = [s for s in sessions if s.get('content_length_response') and 
-                      s.get('content_length_response').isdigit() and 
-                      int(s.get('content_length_response')) > 100000]  # >100KB
-    
-    uncompressed_large = []
-    for session in large_responses:
-        headers = session.get('response_headers', {})
-        if 'gzip' not in headers.get('content-encoding', ''):
-            uncompressed_large.append(session)
-    
-    if uncompressed_large:
+    # 2. 压缩优化建议（>100KB且未启用gzip的响应）
+    if counts["uncompressed"]:
         suggestions.append({
             "type": "compression_optimization",
             "title": "大文件未启用压缩",
-            "description": f"{len(uncompressed_large)} 个大文件响应未启用gzip压缩",
+            "description": f"{counts['uncompressed']} 个大文件响应未启用gzip压缩",
             "severity": "medium",
             "suggestion": "为大文件启用gzip压缩，可减少50-70%的传输大小",
             "details": {
-                "uncompressed_count": len(uncompressed_large),
-                "sample_urls": [s.get('url', '')[:50] for s in uncompressed_large[:3]]
+                "uncompressed_count": counts["uncompressed"],
+                "sample_urls": digest.samples["uncompressed"].values
             }
         })
     
     # 3. 资源合并建议
-    js_css_requests = [s for s in sessions if any(ext in s.get('url', '') for ext in ['.js', '.css'])]
-    if len(js_css_requests) > 10:
+    if counts["js_css"] > 10:
         suggestions.append({
             "type": "resource_bundling",
             "title": "静态资源请求过多",
-            "description": f"发现 {len(js_css_requests)} 个JS/CSS请求，建议合并减少请求数",
+            "description": f"发现 {counts['js_css']} 个JS/CSS请求，建议合并减少请求数",
             "severity": "low",
             "suggestion": "使用Webpack等工具合并静态资源，减少HTTP请求数量",
             "details": {
-                "js_css_count": len(js_css_requests)
+                "js_css_count": counts["js_css"]
             }
         })
     
@@ -1117,17 +2670,169 @@ def calculate_overall_health(insights):
     else:
         return "good"
 
+# 分析段注册表：名称 -> (构造函数, 依赖的分析段, 自身需要的解析深度)
+# 构造函数的参数为依赖的分析段实例；有选项的分析段另外传入 options
+ANALYZERS = {
+    "flows": (FlowTable, (), DISSECT_HEADERS),
+    "summary": (SummaryAccumulator, (), DISSECT_FRAME),
+    "protocols": (ProtocolAccumulator, (), DISSECT_PAYLOAD),
+    "network": (NetworkAccumulator, ("flows",), DISSECT_FRAME),
+    "transport": (TransportAccumulator, ("flows",), DISSECT_HEADERS),
+    "temporal": (TemporalAccumulator, (), DISSECT_HEADERS),  # 新增：时间线分析
+    "connections": (ConnectionAccumulator, ("flows",), DISSECT_FRAME),
+    "http_sessions": (HttpSessionAccumulator, (), DISSECT_PAYLOAD),  # 新增HTTP会话分析
+    "anomalies": (AnomalyAccumulator, ("flows",), DISSECT_HEADERS),
+    "smart_insights": (SmartInsightsSection, ("http_sessions",), DISSECT_FRAME)  # 新增智能诊断引擎
+}
+
+# 分析段选项的默认值，可由配置中的 options.<分析段> 覆盖
+SECTION_OPTIONS = {
+    # approximate 为true时用 sketch_counters 个Space-Saving计数器（和Count-Min草图）近似统计Top-K
+    "network": {
+        "top_n": 5,
+        "approximate": False,
+        "sketch_counters": 1024,
+        "count_min_width": 4096,
+        "count_min_depth": 4,
+        "hll_precision": 14
+    },
+    "transport": {"top_n": 10, "approximate": False, "sketch_counters": 1024},
+    "temporal": {
+        "max_buckets": 100,
+        "min_bucket_seconds": 5.0,
+        "spike_ratio": 2,
+        "high_spike_ratio": 5,
+        "quiet_ratio": 0.2,
+        "quiet_min_buckets": 3,
+        # 流量事件检测：online 为固定宽度时间桶上的EWMA基线检测，global 为旧的全局平均值规则
+        # （spike_ratio/high_spike_ratio 只用于 global）
+        "event_detector": "online",
+        "event_bucket_seconds": 5.0,
+        "ewma_alpha": 0.1,
+        "spike_sensitivity": 4,  # 超过基线多少倍平均绝对偏差算突增
+        "high_spike_sensitivity": 8,
+        "warmup_buckets": 5,
+        # pyramid 为true时结果中附带多分辨率时间序列金字塔，可用 timeseries.py 按窗口查询
+        "pyramid": False,
+        "pyramid_max_buckets": 20000
+    },
+    "connections": {"top_n": 10},
+    "http_sessions": {"top_n": 50},
+    "anomalies": {
+        "icmp_percentage": 10,
+        "port_scan_ports": 50,
+        "ddos_ratio": 10,
+        "ddos_min_packets": 100,
+        "unusual_port_min": 10000,
+        "unusual_port_share": 0.05,
+        "large_packet_ratio": 5,
+        "large_packet_share": 0.1,
+        "failure_share": 0.2,
+        # approximate 为true时不依赖流表：每源IP端口数用集合→位图（至多 port_bitmaps 个）→HyperLogLog
+        "approximate": False,
+        "sketch_counters": 1024,
+        "port_bitmaps": 1024,
+        "hll_precision": 14
+    }
+}
+
+# 结果JSON中的分析段及顺序
+RESULT_SECTIONS = ("summary", "protocols", "network", "transport", "temporal",
+                   "connections", "http_sessions", "anomalies", "smart_insights")
+
+def batch_config(config):
+    """批量模式多进程时每个文件单进程扫描，并行度由批量进程池控制"""
+    return dict(config, workers=1)
+
+def batch_summary(result):
+    """单个文件结果中跨文件汇总用到的部分"""
+    summary = result.get("summary") or {}
+    return {
+        "packets": summary.get("totalPackets", 0),
+        "bytes": summary.get("totalBytes", 0),
+        "duration": summary.get("duration", 0),
+        "protocols": [(protocol["name"], protocol["packets"]) for protocol in result.get("protocols") or []],
+        "anomalies": [anomaly.get("type") for anomaly in result.get("anomalies") or []]
+    }
+
+def aggregate_batch(summaries):
+    """跨文件汇总：包数、字节数、时长求和，协议包数和异常类型按文件合并"""
+    total_packets = sum(summary["packets"] for summary in summaries)
+    protocol_counts = Counter()
+    anomaly_counts = Counter()
+    for summary in summaries:
+        for name, packets in summary["protocols"]:
+            protocol_counts[name] += packets
+        anomaly_counts.update(summary["anomalies"])
+
+    return {
+        "totalPackets": total_packets,
+        "totalBytes": sum(summary["bytes"] for summary in summaries),
+        "totalDuration": sum(summary["duration"] for summary in summaries),
+        "protocols": [
+            {
+                "name": name,
+                "packets": packets,
+                "percentage": (packets / total_packets * 100) if total_packets > 0 else 0
+            }
+            for name, packets in protocol_counts.most_common()
+        ],
+        "anomalies": [
+            {"type": anomaly_type, "count": count}
+            for anomaly_type, count in anomaly_counts.most_common()
+        ]
+    }
+
+def emit_event(event):
+    """流式输出一行JSON事件，立即刷新以便调用方实时读取"""
+    print(json.dumps(event, ensure_ascii=False), flush=True)
+
 def main():
-    if len(sys.argv) != 3:
+    # 用法：
+    #   analyze_pcap.py <pcap文件> <配置JSON>
+    #   analyze_pcap.py --partial <pcap文件> <配置JSON> <中间结果文件>
+    #   analyze_pcap.py --merge <中间结果文件>...
+    #   analyze_pcap.py --startup-profile [scapy|fast]
+    #   analyze_pcap.py --stream <pcap文件> <配置JSON>   逐行输出JSON事件（进度、流量事件、各分析段结果）
+    #   analyze_pcap.py --batch <清单JSON文件>          批量分析，逐行输出每个文件的结果（见 batch.py）
+    args = sys.argv[1:]
+    if not (len(args) == 2 and not args[0].startswith("--")
+            or len(args) == 4 and args[0] == "--partial"
+            or len(args) == 3 and args[0] == "--stream"
+            or len(args) == 2 and args[0] == "--batch"
+            or len(args) >= 2 and args[0] == "--merge"
+            or len(args) <= 2 and args[:1] == ["--startup-profile"]):
         print(json.dumps({"error": {"message": "参数错误"}}))
         sys.exit(1)
     
-    file_path = sys.argv[1]
-    config_json = sys.argv[2]
+    if args[0] == "--stream":
+        try:
+            stream_pcap(args[1], json.loads(args[2]), emit_event)
+            emit_event({"type": "done"})
+        except Exception as e:
+            emit_event({"type": "error", "error": {"message": str(e)}})
+            sys.exit(1)
+        return
+    
+    if args[0] == "--batch":
+        try:
+            run_batch(args[1], analyze_pcap, emit_event, batch_config, batch_summary, aggregate_batch)
+            emit_event({"type": "done"})
+        except Exception as e:
+            emit_event({"type": "error", "error": {"message": str(e)}})
+            sys.exit(1)
+        return
     
     try:
-        config = json.loads(config_json)
-        results = analyze_pcap(file_path, config)
+        if args[0] == "--merge":
+            results = merge_partials(args[1:])
+        elif args[0] == "--startup-profile":
+            results = startup_profile(args[1] if len(args) > 1 else "scapy")
+        elif args[0] == "--partial":
+            results = analyze_pcap_partial(args[1], json.loads(args[2]), args[3])
+        else:
+            config = json.loads(args[1])
+            results = analyze_pcap(args[0], config)
         print(json.dumps(results, ensure_ascii=False))
     except Exception as e:
         print(json.dumps({"error": {"message": str(e)}}))
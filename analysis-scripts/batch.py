@@ -0,0 +1,128 @@
+"""
+批量分析 - 一次调用分析清单中的多个文件
+
+清单为JSON文件（- 为标准输入）：
+  {"workers": 4, "aggregate": true, "files": [{"id": "a", "file": "/path/a.pcap", "config": {...}}, ...]}
+也可以直接是文件项的数组。workers 为整数或 "auto"（CPU核数，默认）。
+
+文件按大小从大到小提交到有界进程池，耗时最长的任务最先开始；每个文件完成就输出一行事件：
+  {"type": "file", "index": 0, "id": "a", "file": "...", "result": {...}}
+  {"type": "file", "index": 1, "id": "b", "file": "...", "error": {"message": "..."}}
+单个文件失败不影响其他文件。aggregate 为true时最后输出跨文件汇总（按清单顺序合并）：
+  {"type": "aggregate", "result": {"files": 2, "succeeded": 1, "failed": 1, ...}}
+"""
+
+import os
+import sys
+import json
+
+def load_manifest(path):
+    """读取清单，返回 (文件项列表, 进程数配置, 是否汇总)"""
+    try:
+        if path == "-":
+            manifest = json.load(sys.stdin)
+        else:
+            with open(path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+    except (OSError, ValueError):
+        raise Exception(f"无法读取批量清单: {path}")
+
+    if isinstance(manifest, list):
+        manifest = {"files": manifest}
+    if not isinstance(manifest, dict) or not isinstance(manifest.get("files"), list):
+        raise Exception("无效的批量清单")
+    return manifest["files"], manifest.get("workers", "auto"), bool(manifest.get("aggregate"))
+
+def pool_size(workers, jobs):
+    """workers 配置：整数或 "auto"（CPU核数），不超过文件数"""
+    if workers == "auto":
+        workers = os.cpu_count() or 1
+    try:
+        workers = max(1, int(workers))
+    except (TypeError, ValueError):
+        raise Exception(f"无效的workers配置: {workers}")
+    return max(1, min(workers, jobs))
+
+def file_size(path):
+    try:
+        return os.path.getsize(path)
+    except (OSError, TypeError, ValueError):
+        return 0
+
+def check_item(item):
+    """校验文件项，返回 (文件路径, 配置)"""
+    if not isinstance(item, dict):
+        raise Exception("文件项必须是JSON对象")
+    if not item.get("file"):
+        raise Exception("文件项缺少file")
+    config = item.get("config") or {}
+    if not isinstance(config, dict):
+        raise Exception("无效的config")
+    return item["file"], config
+
+def run_batch(manifest_path, analyze, emit, prepare_config=None, summarize=None, aggregate=None):
+    """按清单批量分析：analyze(文件, 配置) 在进程池中执行（须可pickle），每个文件完成即调用 emit 输出事件。
+
+    prepare_config 在提交前调整每个文件的配置（多进程时用于关闭文件内的并行）；summarize 从单个结果中
+    取出汇总需要的部分，aggregate 把按清单顺序排列的这些部分合并为跨文件汇总。"""
+    items, workers, with_aggregate = load_manifest(manifest_path)
+    workers = pool_size(workers, len(items))
+    summaries = {}
+    failed = 0
+
+    def report(index, result=None, error=None):
+        nonlocal failed
+        item = items[index]
+        event = {
+            "type": "file",
+            "index": index,
+            "id": item.get("id") if isinstance(item, dict) else None,
+            "file": item.get("file") if isinstance(item, dict) else None
+        }
+        if error is None:
+            event["result"] = result
+            if with_aggregate and summarize is not None:
+                summaries[index] = summarize(result)
+        else:
+            event["error"] = {"message": str(error)}
+            failed += 1
+        emit(event)
+
+    jobs = []
+    for index, item in enumerate(items):
+        try:
+            file_path, config = check_item(item)
+        except Exception as e:
+            report(index, error=e)
+            continue
+        if prepare_config is not None and workers > 1:
+            config = prepare_config(config)
+        jobs.append((index, file_path, config))
+    # 大文件先开始，避免最长的任务最后才启动拖长总耗时
+    jobs.sort(key=lambda job: file_size(job[1]), reverse=True)
+
+    if workers == 1:
+        for index, file_path, config in jobs:
+            try:
+                result = analyze(file_path, config)
+            except Exception as e:
+                report(index, error=e)
+                continue
+            report(index, result)
+    else:
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(analyze, file_path, config): index for index, file_path, config in jobs}
+            for future in as_completed(futures):
+                try:
+                    result = future.result()
+                except Exception as e:
+                    report(futures[future], error=e)
+                    continue
+                report(futures[future], result)
+
+    if with_aggregate:
+        result = {"files": len(items), "succeeded": len(items) - failed, "failed": failed}
+        if aggregate is not None:
+            result.update(aggregate([summaries[index] for index in sorted(summaries)]))
+        emit({"type": "aggregate", "result": result})
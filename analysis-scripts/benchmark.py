@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+基准测试 - 用合成流量测量各分析段的吞吐量和内存
+
+按配置生成（并缓存）可复现的PCAP和HAR文件（见 synthetic_traffic.py）。每个文件先完整分析
+一次（all），再逐个分析段单独分析（sections 只含该段，依赖的分析段照常计算）。每次分析都在
+独立的子进程中运行，记录耗时、每秒处理的包数/请求数和子进程的峰值RSS。
+
+指定基线文件时与基线逐项比较：耗时或峰值内存超过基线的 (1 + tolerance) 倍记为回退，
+低于基线的 1 / (1 + tolerance) 记为改进；有回退时退出码为1。
+
+用法：
+  benchmark.py [配置JSON]
+
+配置（均可省略）：
+  preset          规模预设：quick（默认）、standard、full，见 PRESETS
+  pcap_packets    PCAP的包数列表，覆盖预设（空列表为不测PCAP）
+  har_entries     HAR的请求数列表，覆盖预设（空列表为不测HAR）
+  sections        只单独测这些分析段（完整分析总是测）
+  pcap_config     每次分析PCAP时附加的配置，如 {"engine": "fast"}
+  har_config      每次分析HAR时附加的配置
+  seed            生成文件的种子
+  repeat          每项重复次数，取最快的一次
+  work_dir        生成文件的缓存目录
+  baseline        与之比较的基线结果文件
+  save_baseline   把本次结果保存为基线文件
+  tolerance       回退判定的容差，默认0.1即10%
+"""
+
+import os
+import sys
+import json
+import time
+import platform
+import tempfile
+import subprocess
+
+from synthetic_traffic import GENERATOR_VERSION, DEFAULT_SEED, GENERATORS
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 规模预设：PCAP包数和HAR请求数
+PRESETS = {
+    "quick": {"pcap": [10000], "har": [1000]},
+    "standard": {"pcap": [10000, 100000, 1000000], "har": [1000, 10000, 100000]},
+    "full": {"pcap": [10000, 100000, 1000000, 10000000], "har": [1000, 10000, 100000, 1000000]}
+}
+
+# 文件类型 -> (分析脚本, 文件扩展名)
+TARGETS = {
+    "pcap": ("analyze_pcap.py", "pcap"),
+    "har": ("analyze_har.py", "har")
+}
+
+DEFAULT_TOLERANCE = 0.1
+
+def benchmark(config):
+    """运行基准测试，返回结果（含与基线的比较）"""
+    preset = config.get("preset", "quick")
+    if preset not in PRESETS:
+        raise Exception(f"未知的preset: {preset}")
+    sizes = {
+        "pcap": config.get("pcap_packets", PRESETS[preset]["pcap"]),
+        "har": config.get("har_entries", PRESETS[preset]["har"])
+    }
+    seed = int(config.get("seed", DEFAULT_SEED))
+    repeat = max(1, int(config.get("repeat", 1)))
+    work_dir = config.get("work_dir") or os.path.join(tempfile.gettempdir(), "netinsight-benchmark")
+    os.makedirs(work_dir, exist_ok=True)
+
+    cases = []
+    for kind, counts in sizes.items():
+        sections = section_names(kind, config.get("sections"))
+        base_config = config.get(f"{kind}_config") or {}
+        for count in counts:
+            file_path = synthetic_file(work_dir, kind, int(count), seed)
+            cases.append({
+                "name": f"{kind}-{count}",
+                "type": kind,
+                "count": int(count),
+                "bytes": os.path.getsize(file_path),
+                "config": base_config,
+                "sections": [
+                    measure(kind, file_path, int(count), section, base_config, repeat)
+                    for section in ("all",) + sections
+                ]
+            })
+
+    results = {
+        "environment": {
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "generator": GENERATOR_VERSION,
+            "seed": seed
+        },
+        "cases": cases
+    }
+    if config.get("save_baseline"):
+        with open(config["save_baseline"], 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    if config.get("baseline"):
+        results["comparison"] = compare(results, load_baseline(config["baseline"]),
+                                        float(config.get("tolerance", DEFAULT_TOLERANCE)))
+        results["comparison"]["baseline"] = config["baseline"]
+    return results
+
+def section_names(kind, only):
+    """要单独测的分析段（按结果JSON中的顺序）"""
+    if kind == "pcap":
+        from analyze_pcap import requested_sections
+    else:
+        from analyze_har import requested_sections
+    sections = requested_sections({})
+    if only is None:
+        return sections
+    return tuple(name for name in sections if name in only)
+
+def synthetic_file(work_dir, kind, count, seed):
+    """生成（或复用已生成的）合成文件；文件名包含生成算法版本，算法改动后重新生成"""
+    path = os.path.join(work_dir, f"{kind}-{count}-s{seed}-g{GENERATOR_VERSION}.{TARGETS[kind][1]}")
+    if not os.path.exists(path):
+        partial = path + ".tmp"
+        GENERATORS[kind](partial, count, seed)
+        os.replace(partial, path)
+    return path
+
+def measure(kind, file_path, count, section, base_config, repeat):
+    """分析段的耗时、吞吐量和峰值内存（重复时取最快的一次，峰值内存取最大值）"""
+    config = dict(base_config) if section == "all" else dict(base_config, sections=[section])
+    seconds = None
+    peak_rss = 0
+    for _ in range(repeat):
+        elapsed, rss = run_analysis(kind, file_path, config)
+        seconds = elapsed if seconds is None else min(seconds, elapsed)
+        peak_rss = max(peak_rss, rss)
+    return {
+        "section": section,
+        "seconds": seconds,
+        "perSecond": count / seconds if seconds > 0 else 0,
+        "peakRssMB": peak_rss / (1024 * 1024)
+    }
+
+def run_analysis(kind, file_path, config):
+    """在子进程中分析一次，返回 (耗时秒数, 峰值RSS字节数)"""
+    script = os.path.join(SCRIPT_DIR, TARGETS[kind][0])
+    with tempfile.TemporaryFile() as output:
+        start = time.perf_counter()
+        process = subprocess.Popen([sys.executable, script, file_path, json.dumps(config)],
+                                   stdout=output, stderr=subprocess.DEVNULL)
+        # wait4 返回的是这个子进程自己的资源用量
+        _, status, usage = os.wait4(process.pid, 0)
+        elapsed = time.perf_counter() - start
+        process.returncode = os.waitstatus_to_exitcode(status)
+        output.seek(0)
+        try:
+            result = json.load(output)
+        except ValueError:
+            result = {"error": {"message": f"退出码 {process.returncode}"}}
+    if process.returncode != 0 or "error" in result:
+        message = (result.get("error") or {}).get("message")
+        raise Exception(f"分析失败 {os.path.basename(file_path)} {config}: {message}")
+    # Linux 上 ru_maxrss 的单位为KB，macOS 上为字节
+    rss = usage.ru_maxrss if sys.platform == "darwin" else usage.ru_maxrss * 1024
+    return elapsed, rss
+
+def load_baseline(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        raise Exception(f"无法读取基线文件: {path}")
+
+def case_key(case, section):
+    return case["name"], json.dumps(case.get("config") or {}, sort_keys=True), section
+
+def compare(results, baseline, tolerance):
+    """逐项（规模 × 分析段 × 指标）与基线比较，只比较两边都有且附加配置相同的项"""
+    previous = {
+        case_key(case, item["section"]): item
+        for case in baseline.get("cases", [])
+        for item in case.get("sections", [])
+    }
+    regressions = []
+    improvements = []
+    compared = 0
+    for case in results["cases"]:
+        for item in case["sections"]:
+            old = previous.get(case_key(case, item["section"]))
+            if old is None:
+                continue
+            compared += 1
+            for metric in ("seconds", "peakRssMB"):
+                if not old.get(metric):
+                    continue
+                ratio = item[metric] / old[metric]
+                change = {
+                    "case": case["name"],
+                    "section": item["section"],
+                    "metric": metric,
+                    "baseline": old[metric],
+                    "current": item[metric],
+                    "ratio": ratio
+                }
+                if ratio > 1 + tolerance:
+                    regressions.append(change)
+                elif ratio < 1 / (1 + tolerance):
+                    improvements.append(change)
+
+    return {
+        "tolerance": tolerance,
+        "compared": compared,
+        "regressions": regressions,
+        "improvements": improvements
+    }
+
+def main():
+    if len(sys.argv) > 2:
+        print(json.dumps({"error": {"message": "参数错误"}}))
+        sys.exit(1)
+
+    try:
+        config = json.loads(sys.argv[1]) if len(sys.argv) == 2 else {}
+        results = benchmark(config)
+        print(json.dumps(results, ensure_ascii=False))
+    except Exception as e:
+        print(json.dumps({"error": {"message": str(e)}}))
+        sys.exit(1)
+
+    if results.get("comparison", {}).get("regressions"):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
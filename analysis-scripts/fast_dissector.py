@@ -0,0 +1,645 @@
+"""
+PCAP快速解析器 - 不依赖Scapy
+
+直接用struct从字节中解析pcap/pcapng记录头和L2-L4头部（Ethernet/VLAN/PPPoE/
+Linux SLL/Loopback/Raw IP、IPv4/IPv6、TCP/UDP/ICMP/ARP），生成与Scapy路径相同的
+PacketRecord。只覆盖统计分析所需的字段，应用层只识别DNS；ICMP差错报文引用的IPv4包
+与Scapy一样解析出其中的载荷和DNS，Scapy应用层解析失败后残留的Raw字节不会作为payload返回。
+
+抓包文件默认通过mmap只读映射，帧数据是映射上的memoryview切片，头部字段直接从
+页缓存解析；只有带载荷的包才复制一份载荷bytes。不需要载荷的分析可以关闭载荷
+提取，只需要时间戳和长度的分析可以完全跳过帧解析（iter_frame_records）。
+
+追加写入中的抓包可以用 record_span 得到已写完的记录区间，下次从区间结束处继续读取。
+"""
+
+import mmap
+import struct
+from socket import inet_ntoa, inet_ntop, AF_INET6
+
+class PacketRecord:
+    """单个数据包的解析结果：每个包只解析一次，由所有分析器共享"""
+    __slots__ = ('ts', 'length', 'ip_version', 'is_arp', 'src', 'dst', 'proto',
+                 'sport', 'dport', 'flags', 'seq', 'is_dns', 'payload')
+
+# 链路层类型（LINKTYPE_*）
+LINKTYPE_NULL = 0
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LOOP = 108
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+LINKTYPE_IPV6 = 229
+LINKTYPE_LINUX_SLL2 = 276
+_RAW_IP_LINKTYPES = (LINKTYPE_RAW, 12, 14)
+
+ETH_P_IP = 0x0800
+ETH_P_ARP = 0x0806
+ETH_P_IPV6 = 0x86DD
+ETH_P_PPPOE_SESSION = 0x8864
+_VLAN_ETHERTYPES = (0x8100, 0x88A8, 0x9100)
+
+# Scapy默认能识别的以太网类型和IP协议号，其余的载荷作为Raw层
+SCAPY_ETHERTYPES = frozenset([
+    0x0001, 0x007A, 0x0800, 0x0806, 0x86DD, 0x8021, 0x8053, 0x8100, 0x8863, 0x8864,
+    0x8870, 0x888E, 0x88A4, 0x88A8, 0x88D9, 0x88E7, 0xA0ED
+])
+SCAPY_IP_PROTOS = frozenset([1, 2, 4, 6, 17, 41, 47, 50, 51, 112, 132])
+SCAPY_IPV6_NEXT_HEADERS = frozenset([4, 6, 17, 41, 47, 50, 51, 58, 112, 132])
+
+# Loopback头部中的地址族（BSD各系统的AF_INET6取值不同）
+_LOOPBACK_IPV6_FAMILIES = (10, 24, 28, 30)
+
+# Scapy默认会按端口解析成应用层协议（因而没有Raw层）的层模块及其 (TCP端口, UDP端口)。
+# 快速解析器对这些端口不返回载荷；scapy引擎按需导入同样的模块（见 analyze_pcap.load_scapy），
+# 两种引擎由同一张表决定哪些载荷不是Raw
+SCAPY_APP_LAYERS = {
+    "scapy.layers.dcerpc": ((135,), ()),
+    "scapy.layers.kerberos": ((88, 464), (88, 464)),
+    "scapy.layers.ldap": ((389, 3268), (389,)),
+    "scapy.layers.netbios": ((139, 445), (137, 138)),
+    "scapy.layers.pptp": ((1723,), ()),
+    "scapy.layers.skinny": ((2000,), ()),
+    "scapy.layers.dhcp": ((), (67, 68)),
+    "scapy.layers.dhcp6": ((), (546, 547)),
+    "scapy.layers.hsrp": ((), (1985, 2029)),
+    "scapy.layers.ipsec": ((), (4500,)),
+    "scapy.layers.isakmp": ((), (500,)),
+    "scapy.layers.l2": ((), (4754,)),
+    "scapy.layers.l2tp": ((), (1701,)),
+    "scapy.layers.llmnr": ((), (5355,)),
+    "scapy.layers.mgcp": ((), (2727,)),
+    "scapy.layers.mobileip": ((), (434,)),
+    "scapy.layers.netflow": ((), (2055, 2056, 6343, 9995, 9996)),
+    "scapy.layers.ntp": ((), (123,)),
+    "scapy.layers.radius": ((), (1812, 1813, 3799)),
+    "scapy.layers.rip": ((), (520,)),
+    "scapy.layers.snmp": ((), (161, 162)),
+    "scapy.layers.tftp": ((), (69,)),
+    "scapy.layers.vxlan": ((), (4789, 4790, 6633))
+}
+SCAPY_TCP_APP_PORTS = frozenset(port for tcp_ports, _ in SCAPY_APP_LAYERS.values() for port in tcp_ports)
+SCAPY_UDP_APP_PORTS = frozenset(port for _, udp_ports in SCAPY_APP_LAYERS.values() for port in udp_ports)
+DNS_UDP_PORTS = (53, 5353)
+ICMP_ERROR_TYPES = (3, 4, 5, 11, 12)
+
+_PCAP_MAGICS = {
+    b'\xd4\xc3\xb2\xa1': ('<', 1000000),
+    b'\xa1\xb2\xc3\xd4': ('>', 1000000),
+    b'\x4d\x3c\xb2\xa1': ('<', 1000000000),
+    b'\xa1\xb2\x3c\x4d': ('>', 1000000000),
+}
+_PCAPNG_SHB = b'\x0a\x0d\x0d\x0a'
+
+_U16 = struct.Struct('!H')
+_TCP_HEADER = struct.Struct('!HHI')
+_UDP_HEADER = struct.Struct('!HHH')
+
+def iter_raw_records(f):
+    """从文件对象中逐条读取抓包记录，产出 (时间戳, 链路层类型, 帧数据)"""
+    magic = f.read(4)
+    if magic in _PCAP_MAGICS:
+        return _iter_pcap_records(f, magic)
+    if magic == _PCAPNG_SHB:
+        return _iter_pcapng_records(f)
+    raise Exception("不支持的抓包文件格式")
+
+def _iter_pcap_records(f, magic):
+    """经典pcap格式"""
+    endian, resolution = _PCAP_MAGICS[magic]
+    header = f.read(20)
+    if len(header) < 20:
+        return
+    linktype = struct.unpack(endian + 'HHiIII', header)[-1] & 0x0FFFFFFF
+    record_header = struct.Struct(endian + 'IIII')
+    read = f.read
+    while True:
+        hdr = read(16)
+        if len(hdr) < 16:
+            return
+        sec, frac, caplen, _ = record_header.unpack(hdr)
+        data = read(caplen)
+        if len(data) < caplen:
+            return
+        # 整数除法保证与Scapy的Decimal时间戳转换为float后完全一致
+        yield (sec * resolution + frac) / resolution, linktype, data
+
+def _iter_pcapng_records(f):
+    """pcapng格式：支持IDB/EPB/SPB/PB块，其余块跳过"""
+    read = f.read
+    endian = _read_pcapng_section_header(read)
+    interfaces = []
+    while endian:
+        head = read(8)
+        if len(head) < 8:
+            return
+        if head[:4] == _PCAPNG_SHB:
+            # 新的节：字节序和接口列表重新开始
+            f.seek(-4, 1)
+            endian = _read_pcapng_section_header(read)
+            interfaces = []
+            continue
+        block_type, block_len = struct.unpack(endian + 'II', head)
+        body = read(block_len - 12)
+        if len(read(4)) < 4:
+            return
+        record = _read_pcapng_block(block_type, body, endian, interfaces)
+        if record is not None:
+            yield record
+
+def _read_pcapng_block(block_type, body, endian, interfaces):
+    """处理一个pcapng块：IDB登记接口，数据包块返回 (时间戳, 链路层类型, 帧数据)"""
+    if block_type == 1:
+        linktype, snaplen = struct.unpack_from(endian + 'HxxI', body, 0)
+        interfaces.append((linktype, snaplen, _read_pcapng_tsresol(body[8:], endian)))
+    elif block_type == 6:
+        intid, ts_high, ts_low, caplen = struct.unpack_from(endian + 'IIII', body, 0)
+        if intid < len(interfaces):
+            linktype, _, tsresol = interfaces[intid]
+            return ((ts_high << 32) + ts_low) / tsresol, linktype, body[20:20 + caplen]
+    elif block_type == 3:
+        if interfaces:
+            linktype, snaplen, _ = interfaces[0]
+            wirelen = struct.unpack_from(endian + 'I', body, 0)[0]
+            caplen = min(wirelen, snaplen) if snaplen else wirelen
+            return 0.0, linktype, body[4:4 + caplen]
+    elif block_type == 2:
+        intid, _, ts_high, ts_low, caplen = struct.unpack_from(endian + 'HHIII', body, 0)
+        if intid < len(interfaces):
+            linktype, _, tsresol = interfaces[intid]
+            return ((ts_high << 32) + ts_low) / tsresol, linktype, body[20:20 + caplen]
+    return None
+
+def _read_pcapng_section_header(read):
+    """读取节头块（块类型之后的部分），返回该节的字节序"""
+    head = read(8)
+    if len(head) < 8:
+        return None
+    endian = '<' if head[4:8] == b'\x4d\x3c\x2b\x1a' else '>'
+    block_len = struct.unpack(endian + 'I', head[:4])[0]
+    read(block_len - 12)
+    return endian
+
+def _read_pcapng_tsresol(options, endian):
+    """从IDB选项中读取时间戳精度（if_tsresol），默认微秒"""
+    offset = 0
+    while len(options) - offset >= 4:
+        code, length = struct.unpack_from(endian + 'HH', options, offset)
+        if code == 0:
+            break
+        if code == 9 and length == 1:
+            value = options[offset + 4]
+            return (2 if value & 0x80 else 10) ** (value & 0x7F)
+        offset += 4 + length + (-length % 4)
+    return 1000000
+
+def iter_buffer_records(buf, shard=None):
+    """从内存缓冲区（mmap/bytes）中逐条读取抓包记录，帧数据为零拷贝的memoryview切片
+
+    shard 为 plan_shards 返回的分片时只读取该分片内的记录。
+    """
+    view = memoryview(buf)
+    magic = bytes(view[:4])
+    if magic in _PCAP_MAGICS:
+        start, end = shard[:2] if shard else (24, len(view))
+        return _iter_pcap_buffer(view, magic, start, end)
+    if magic == _PCAPNG_SHB:
+        if shard:
+            start, end, (endian, interfaces) = shard
+            return _iter_pcapng_buffer(view, start, end, endian, list(interfaces))
+        return _iter_pcapng_buffer(view, 0, len(view), '<', [])
+    raise Exception("不支持的抓包文件格式")
+
+def _iter_pcap_buffer(view, magic, offset, end):
+    endian, resolution = _PCAP_MAGICS[magic]
+    if len(view) < 24:
+        return
+    linktype = struct.unpack_from(endian + 'I', view, 20)[0] & 0x0FFFFFFF
+    unpack_header = struct.Struct(endian + 'IIII').unpack_from
+    while offset + 16 <= end:
+        sec, frac, caplen, _ = unpack_header(view, offset)
+        start = offset + 16
+        offset = start + caplen
+        if offset > end:
+            return
+        yield (sec * resolution + frac) / resolution, linktype, view[start:offset]
+
+def _iter_pcapng_buffer(view, offset, end, endian, interfaces):
+    while offset + 12 <= end:
+        if view[offset:offset + 4] == _PCAPNG_SHB:
+            # 节头块：字节序和接口列表重新开始
+            endian = _pcapng_section_endian(view, offset)
+            interfaces = []
+        block_type, block_len = struct.unpack_from(endian + 'II', view, offset)
+        if block_len < 12 or offset + block_len > end:
+            return
+        if block_type != 0x0A0D0D0A:
+            record = _read_pcapng_block(block_type, view[offset + 8:offset + block_len - 4], endian, interfaces)
+            if record is not None:
+                yield record
+        offset += block_len
+
+def _pcapng_section_endian(view, offset):
+    return '<' if view[offset + 8:offset + 12] == b'\x4d\x3c\x2b\x1a' else '>'
+
+def plan_shards(file_path, count):
+    """按记录边界把抓包文件切分为至多count个字节区间
+
+    返回 [(起始偏移, 结束偏移, 起始处的pcapng状态)]，pcapng状态为 (字节序, 接口列表)，
+    使每个分片都能独立读取。只扫描记录头，不解析帧数据。
+    """
+    with open(file_path, 'rb') as f:
+        try:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, OSError):
+            return []
+    try:
+        view = memoryview(mapped)
+        try:
+            magic = bytes(view[:4])
+            if magic in _PCAP_MAGICS:
+                offsets = _pcap_record_offsets(view, _PCAP_MAGICS[magic][0])
+            elif magic == _PCAPNG_SHB:
+                offsets = _pcapng_record_offsets(view)
+            else:
+                raise Exception("不支持的抓包文件格式")
+            return _split_offsets(offsets, len(view), count)
+        finally:
+            view.release()
+    finally:
+        mapped.close()
+
+def _pcap_record_offsets(view, endian):
+    """产出每条记录的 (偏移, None)"""
+    unpack_caplen = struct.Struct(endian + 'I').unpack_from
+    size = len(view)
+    offset = 24
+    while offset + 16 <= size:
+        yield offset, None
+        offset += 16 + unpack_caplen(view, offset + 8)[0]
+
+def _pcapng_record_offsets(view):
+    """产出每个块的 (偏移, 该块之前的 (字节序, 接口列表))"""
+    size = len(view)
+    offset = 0
+    endian = '<'
+    interfaces = ()
+    while offset + 12 <= size:
+        if view[offset:offset + 4] == _PCAPNG_SHB:
+            endian = _pcapng_section_endian(view, offset)
+            interfaces = ()
+        yield offset, (endian, interfaces)
+        block_type, block_len = struct.unpack_from(endian + 'II', view, offset)
+        if block_len < 12:
+            return
+        if block_type == 1:
+            added = []
+            _read_pcapng_block(1, view[offset + 8:offset + block_len - 4], endian, added)
+            interfaces += tuple(added)
+        offset += block_len
+
+def _split_offsets(offsets, size, count):
+    """在第一个不小于 size*k/count 的记录边界处切分"""
+    shards = []
+    step = size / count
+    cut = step
+    start = start_state = None
+    for offset, state in offsets:
+        if start is None:
+            start, start_state = offset, state
+        elif offset >= cut:
+            shards.append((start, offset, start_state))
+            start, start_state = offset, state
+            while cut <= offset:
+                cut += step
+    if start is not None:
+        shards.append((start, size, start_state))
+    return shards
+
+def record_span(file_path, start=None, state=None):
+    """从 start 起（None 为文件开头）到最后一条完整记录为止的字节区间，用于增量读取追加写入的抓包
+
+    state 为 start 处的pcapng状态。返回 (起始偏移, 结束偏移, 起始处状态, 结束处状态)，
+    前三项可作为分片传给 iter_mmap_records；结束偏移之后是尚未写完的记录。
+    """
+    with open(file_path, 'rb') as f:
+        try:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, OSError):
+            raise Exception("不支持的抓包文件格式")
+    try:
+        view = memoryview(mapped)
+        try:
+            magic = bytes(view[:4])
+            if magic in _PCAP_MAGICS:
+                start = 24 if start is None else start
+                return start, _pcap_span_end(view, _PCAP_MAGICS[magic][0], start), None, None
+            if magic == _PCAPNG_SHB:
+                start, state = (0, ('<', ())) if start is None else (start, state)
+                endian, interfaces = state
+                end, end_state = _pcapng_span_end(view, start, endian, tuple(map(tuple, interfaces)))
+                return start, end, (endian, interfaces), end_state
+            raise Exception("不支持的抓包文件格式")
+        finally:
+            view.release()
+    finally:
+        mapped.close()
+
+def _pcap_span_end(view, endian, offset):
+    unpack_caplen = struct.Struct(endian + 'I').unpack_from
+    size = len(view)
+    while offset + 16 <= size:
+        end = offset + 16 + unpack_caplen(view, offset + 8)[0]
+        if end > size:
+            break
+        offset = end
+    return offset
+
+def _pcapng_span_end(view, offset, endian, interfaces):
+    size = len(view)
+    while offset + 12 <= size:
+        block_endian, block_interfaces = endian, interfaces
+        if view[offset:offset + 4] == _PCAPNG_SHB:
+            block_endian, block_interfaces = _pcapng_section_endian(view, offset), ()
+        block_type, block_len = struct.unpack_from(block_endian + 'II', view, offset)
+        if block_len < 12 or offset + block_len > size:
+            break
+        if block_type == 1:
+            added = []
+            _read_pcapng_block(1, view[offset + 8:offset + block_len - 4], block_endian, added)
+            block_interfaces += tuple(added)
+        endian, interfaces = block_endian, block_interfaces
+        offset += block_len
+    return offset, (endian, interfaces)
+
+def iter_mmap_records(file_path, shard=None):
+    """内存映射读取抓包文件：记录直接从页缓存切片，多个分析进程可共享同一份文件缓存"""
+    with open(file_path, 'rb') as f:
+        try:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, OSError):
+            # 空文件或不支持映射的文件（管道等）退回普通读取
+            if shard is None:
+                yield from iter_raw_records(f)
+            return
+    if hasattr(mapped, 'madvise'):
+        mapped.madvise(mmap.MADV_SEQUENTIAL)
+    try:
+        yield from iter_buffer_records(mapped, shard)
+    finally:
+        try:
+            mapped.close()
+        except BufferError:
+            # 调用方仍持有帧切片，映射随最后一个切片释放
+            pass
+
+def frame_record(ts, length):
+    """只有时间戳和长度的PacketRecord（不解析帧内容）"""
+    rec = PacketRecord()
+    rec.ts = ts
+    rec.length = length
+    rec.ip_version = 0
+    rec.is_arp = False
+    rec.src = rec.dst = None
+    rec.proto = 0
+    rec.sport = rec.dport = 0
+    rec.flags = rec.seq = 0
+    rec.is_dns = False
+    rec.payload = None
+    return rec
+
+def dissect_frame(data, linktype, ts, payloads=True):
+    """解析一帧数据（bytes或memoryview），返回PacketRecord；payloads为False时不提取载荷"""
+    rec = frame_record(ts, len(data))
+
+    # 链路层：得到网络层类型和偏移
+    size = len(data)
+    if linktype == LINKTYPE_ETHERNET:
+        if size < 14:
+            return rec
+        ethertype = _U16.unpack_from(data, 12)[0]
+        offset = 14
+        while ethertype in _VLAN_ETHERTYPES and offset + 4 <= size:
+            ethertype = _U16.unpack_from(data, offset + 2)[0]
+            offset += 4
+        if ethertype == ETH_P_PPPOE_SESSION and offset + 8 <= size:
+            ppp_proto = _U16.unpack_from(data, offset + 6)[0]
+            ethertype = ETH_P_IP if ppp_proto == 0x0021 else ETH_P_IPV6 if ppp_proto == 0x0057 else 0
+            offset += 8
+    elif linktype == LINKTYPE_LINUX_SLL:
+        if size < 16:
+            return rec
+        ethertype = _U16.unpack_from(data, 14)[0]
+        offset = 16
+    elif linktype == LINKTYPE_LINUX_SLL2:
+        if size < 20:
+            return rec
+        ethertype = _U16.unpack_from(data, 0)[0]
+        offset = 20
+    elif linktype == LINKTYPE_NULL or linktype == LINKTYPE_LOOP:
+        if size < 4:
+            return rec
+        family = struct.unpack_from('<I' if linktype == LINKTYPE_NULL else '>I', data, 0)[0]
+        if family > 0xFFFF:
+            family = struct.unpack_from('>I' if linktype == LINKTYPE_NULL else '<I', data, 0)[0]
+        ethertype = ETH_P_IP if family == 2 else ETH_P_IPV6 if family in _LOOPBACK_IPV6_FAMILIES else 0
+        offset = 4
+    elif linktype in _RAW_IP_LINKTYPES:
+        if not size:
+            return rec
+        version = data[0] >> 4
+        ethertype = ETH_P_IP if version == 4 else ETH_P_IPV6 if version == 6 else 0
+        offset = 0
+    elif linktype == LINKTYPE_IPV4:
+        ethertype = ETH_P_IP
+        offset = 0
+    elif linktype == LINKTYPE_IPV6:
+        ethertype = ETH_P_IPV6
+        offset = 0
+    else:
+        return rec
+
+    _dissect_network(rec, data, offset, ethertype, False, payloads)
+    return rec
+
+def _dissect_network(rec, data, offset, ethertype, inner, payloads):
+    """网络层；inner为True表示隧道内层，只解析传输层而保留外层地址"""
+    if ethertype == ETH_P_IP:
+        _dissect_ipv4(rec, data, offset, inner, payloads)
+    elif ethertype == ETH_P_IPV6:
+        _dissect_ipv6(rec, data, offset, inner, payloads)
+    elif ethertype == ETH_P_ARP:
+        rec.is_arp = True
+    elif ethertype > 1500 and ethertype not in SCAPY_ETHERTYPES and not inner:
+        if payloads:
+            rec.payload = bytes(data[offset:]) or None
+
+def _dissect_ipv4(rec, data, offset, inner, payloads):
+    size = len(data)
+    if size - offset < 20:
+        return
+    header_len = max((data[offset] & 0x0F) << 2, 20)
+    total_len = _U16.unpack_from(data, offset + 2)[0]
+    frag_offset = _U16.unpack_from(data, offset + 6)[0] & 0x1FFF
+    proto = data[offset + 9]
+    if not inner:
+        rec.ip_version = 4
+        rec.src = inet_ntoa(data[offset + 12:offset + 16])
+        rec.dst = inet_ntoa(data[offset + 16:offset + 20])
+
+    # 与Scapy一致：按IP总长度截掉以太网填充
+    l4 = offset + header_len
+    end = offset + total_len if total_len >= header_len else size
+    if end > size:
+        end = size
+    if frag_offset:
+        # 非首个分片不解析传输层
+        if payloads:
+            rec.payload = bytes(data[l4:end]) or None
+        return
+    _dissect_ip_payload(rec, data, l4, end, proto, SCAPY_IP_PROTOS, payloads)
+
+def _dissect_ipv6(rec, data, offset, inner, payloads):
+    size = len(data)
+    if size - offset < 40:
+        return
+    payload_len = _U16.unpack_from(data, offset + 4)[0]
+    next_header = data[offset + 6]
+    if not inner:
+        rec.ip_version = 6
+        rec.src = inet_ntop(AF_INET6, data[offset + 8:offset + 24])
+        rec.dst = inet_ntop(AF_INET6, data[offset + 24:offset + 40])
+
+    pos = offset + 40
+    end = min(pos + payload_len, size)
+    # 跳过扩展头（逐跳选项、路由、目的选项、分片）
+    while True:
+        if next_header in (0, 43, 60):
+            if pos + 2 > end:
+                return
+            header_len = (data[pos + 1] + 1) << 3
+            next_header = data[pos]
+            pos += header_len
+        elif next_header == 44:
+            if pos + 8 > end:
+                return
+            frag_offset = _U16.unpack_from(data, pos + 2)[0] >> 3
+            next_header = data[pos]
+            pos += 8
+            if frag_offset:
+                if payloads:
+                    rec.payload = bytes(data[pos:end]) or None
+                return
+        else:
+            break
+    if next_header == 4:
+        # IPv4-in-IPv6：Scapy中 IP 层优先于 IPv6，地址取内层IPv4
+        _dissect_ipv4(rec, data, pos, inner, payloads)
+    elif next_header != 1:
+        _dissect_ip_payload(rec, data, pos, end, next_header, SCAPY_IPV6_NEXT_HEADERS, payloads)
+    elif payloads:
+        rec.payload = bytes(data[pos:end]) or None
+
+def _dissect_ip_payload(rec, data, l4, end, proto, known_protos, payloads):
+    """IP载荷：传输层、隧道（IPIP/6in4/GRE）或Scapy不认识的协议（作为Raw）"""
+    if proto == 6 or proto == 17 or proto == 1:
+        _dissect_transport(rec, data, l4, end, proto, payloads)
+    elif proto == 4:
+        _dissect_ipv4(rec, data, l4, True, payloads)
+    elif proto == 41:
+        _dissect_ipv6(rec, data, l4, True, payloads)
+    elif proto == 47:
+        if end - l4 < 4:
+            return
+        gre_flags, ethertype = struct.unpack_from('!HH', data, l4)
+        if gre_flags & 0x4000:
+            return
+        header_len = 4 + 4 * (bool(gre_flags & 0x8000) + bool(gre_flags & 0x2000) + bool(gre_flags & 0x1000))
+        _dissect_network(rec, data, l4 + header_len, ethertype, True, payloads)
+    elif proto not in known_protos:
+        if payloads:
+            rec.payload = bytes(data[l4:end]) or None
+
+def _dissect_transport(rec, data, l4, end, proto, payloads):
+    if proto == 6:
+        if end - l4 < 20:
+            # 头部不完整，Scapy会把剩余字节作为Raw
+            if payloads:
+                rec.payload = bytes(data[l4:end]) or None
+            return
+        sport, dport, seq = _TCP_HEADER.unpack_from(data, l4)
+        offset_byte = data[l4 + 12]
+        rec.proto = 6
+        rec.sport = sport
+        rec.dport = dport
+        rec.seq = seq
+        rec.flags = ((offset_byte & 0x01) << 8) | data[l4 + 13]
+        start = l4 + max((offset_byte >> 4) << 2, 20)
+        payload_len = end - start
+        if payload_len <= 0:
+            return
+        if sport == 53 or dport == 53:
+            if payload_len >= 14:
+                rec.is_dns = True
+                return
+        elif sport in SCAPY_TCP_APP_PORTS or dport in SCAPY_TCP_APP_PORTS:
+            return
+        if payloads:
+            rec.payload = bytes(data[start:end])
+    elif proto == 17:
+        if end - l4 < 8:
+            if payloads:
+                rec.payload = bytes(data[l4:end]) or None
+            return
+        sport, dport, udp_len = _UDP_HEADER.unpack_from(data, l4)
+        rec.proto = 17
+        rec.sport = sport
+        rec.dport = dport
+        # 与Scapy的UDP.extract_padding一致：按UDP长度字段截断
+        payload = data[l4 + 8:end][:udp_len - 8]
+        if not payload:
+            return
+        if sport in DNS_UDP_PORTS or dport in DNS_UDP_PORTS:
+            if len(payload) >= 12:
+                rec.is_dns = True
+                return
+        elif sport in SCAPY_UDP_APP_PORTS or dport in SCAPY_UDP_APP_PORTS:
+            return
+        if payloads:
+            rec.payload = bytes(payload)
+    elif proto == 1:
+        if end - l4 < 8:
+            if payloads:
+                rec.payload = bytes(data[l4:end]) or None
+            return
+        rec.proto = 1
+        if data[l4] in ICMP_ERROR_TYPES:
+            _dissect_quoted(rec, memoryview(data)[l4 + 8:end], payloads)
+        elif payloads:
+            rec.payload = bytes(data[l4 + 8:end]) or None
+
+def _dissect_quoted(rec, quote, payloads):
+    """ICMP差错报文引用的原始IP包：与Scapy的 IPerror/TCPerror/UDPerror 一致地解析，
+    只取其中的载荷和DNS标记（地址、端口等仍为外层ICMP包的）"""
+    if len(quote) < 20:
+        if payloads:
+            rec.payload = bytes(quote) or None
+        return
+    inner = frame_record(rec.ts, rec.length)
+    _dissect_ipv4(inner, quote, 0, True, payloads)
+    # TCPerror 可以只有TCP头部的前8个字节（差错报文通常只引用这么多），不留下Raw
+    if (inner.payload is not None and not inner.proto and len(inner.payload) == 8 and quote[9] == 6
+            and not _U16.unpack_from(quote, 6)[0] & 0x1FFF):
+        inner.payload = None
+    rec.is_dns = inner.is_dns
+    rec.payload = inner.payload
+
+def iter_fast_records(file_path, shard=None, payloads=True):
+    """逐包读取并快速解析抓包文件（基于内存映射，只复制有载荷的包的载荷）"""
+    for ts, linktype, data in iter_mmap_records(file_path, shard):
+        yield dissect_frame(data, linktype, ts, payloads)
+
+def iter_frame_records(file_path, shard=None):
+    """只读取记录头：每个包只有时间戳和长度"""
+    for ts, _, data in iter_mmap_records(file_path, shard):
+        yield frame_record(ts, len(data))
@@ -0,0 +1,120 @@
+"""
+共享流表 - 以整数打包五元组为键
+
+每个IP数据包只在流表中更新一次：源/目的地址先映射为整数编号，再与端口、协议
+打包成一个整数键，流记录用 __slots__ 保存包数、字节数、首末时间戳和TCP标志计数。
+网络层、连接、异常检测等分析段都从流表聚合，只有最终进入结果的前N项才格式化为字符串。
+
+流表按流首次出现的顺序保存，因此按源IP、端口等聚合得到的Counter与逐包累加的
+插入顺序一致（某个键第一次出现的包，必然是包含该键的最早一条流的第一个包）。
+"""
+
+class FlowRecord:
+    """单条流（有向五元组）的统计"""
+    __slots__ = ('ip_version', 'packets', 'bytes', 'first_ts', 'last_ts',
+                 'syn', 'ack', 'fin', 'rst')
+
+    def __init__(self, ip_version, ts):
+        self.ip_version = ip_version
+        self.packets = self.bytes = 0
+        self.first_ts = self.last_ts = ts
+        self.syn = self.ack = self.fin = self.rst = 0
+
+def pack_flow_key(src_id, dst_id, sport, dport, proto):
+    return (((src_id << 32 | dst_id) << 16 | sport) << 16 | dport) << 8 | proto
+
+def unpack_flow_key(key):
+    """返回 (源地址编号, 目的地址编号, 源端口, 目的端口, 协议)"""
+    return key >> 72, (key >> 40) & 0xFFFFFFFF, (key >> 24) & 0xFFFF, (key >> 8) & 0xFFFF, key & 0xFF
+
+class FlowTable:
+    """按有向五元组聚合IPv4/IPv6数据包的流表"""
+
+    def __init__(self):
+        self.flows = {}  # 整数键 -> FlowRecord，按首次出现顺序
+        self.address_ids = {}  # 地址字符串 -> 编号
+        self.addresses = []  # 编号 -> 地址字符串
+
+    def address_id(self, address):
+        address_id = self.address_ids.get(address)
+        if address_id is None:
+            address_id = self.address_ids[address] = len(self.addresses)
+            self.addresses.append(address)
+        return address_id
+
+    def feed(self, rec):
+        if not rec.ip_version:
+            return
+        address_ids = self.address_ids
+        src_id = address_ids.get(rec.src)
+        if src_id is None:
+            src_id = self.address_id(rec.src)
+        dst_id = address_ids.get(rec.dst)
+        if dst_id is None:
+            dst_id = self.address_id(rec.dst)
+
+        proto = rec.proto
+        key = (((src_id << 32 | dst_id) << 16 | rec.sport) << 16 | rec.dport) << 8 | proto
+        ts = rec.ts
+        flow = self.flows.get(key)
+        if flow is None:
+            flow = self.flows[key] = FlowRecord(rec.ip_version, ts)
+        elif ts < flow.first_ts:
+            flow.first_ts = ts
+        elif ts > flow.last_ts:
+            flow.last_ts = ts
+        flow.packets += 1
+        flow.bytes += rec.length
+
+        if proto == 6:
+            flags = rec.flags
+            if flags & 0x02:
+                flow.syn += 1
+            if flags & 0x10:
+                flow.ack += 1
+            if flags & 0x01:
+                flow.fin += 1
+            if flags & 0x04:
+                flow.rst += 1
+
+    def merge(self, other):
+        """合并另一张流表（文件中位于其后），地址编号按本表重新映射"""
+        id_map = [self.address_id(address) for address in other.addresses]
+        flows = self.flows
+        for key, flow in other.flows.items():
+            src_id, dst_id, sport, dport, proto = unpack_flow_key(key)
+            key = pack_flow_key(id_map[src_id], id_map[dst_id], sport, dport, proto)
+            mine = flows.get(key)
+            if mine is None:
+                flows[key] = flow
+                continue
+            mine.packets += flow.packets
+            mine.bytes += flow.bytes
+            mine.first_ts = min(mine.first_ts, flow.first_ts)
+            mine.last_ts = max(mine.last_ts, flow.last_ts)
+            mine.syn += flow.syn
+            mine.ack += flow.ack
+            mine.fin += flow.fin
+            mine.rst += flow.rst
+
+    def dump_state(self):
+        return {
+            "addresses": self.addresses,
+            "flows": [
+                [key] + [getattr(flow, name) for name in FlowRecord.__slots__]
+                for key, flow in self.flows.items()
+            ]
+        }
+
+    def load_state(self, state):
+        self.addresses = list(state["addresses"])
+        self.address_ids = {address: address_id for address_id, address in enumerate(self.addresses)}
+        self.flows = {}
+        for key, *values in state["flows"]:
+            flow = self.flows[key] = FlowRecord(values[0], values[3])
+            for name, value in zip(FlowRecord.__slots__, values):
+                setattr(flow, name, value)
+
+    def result(self):
+        # 流表只为其他分析段提供数据，不单独输出
+        return None
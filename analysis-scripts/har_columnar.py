@@ -0,0 +1,279 @@
+"""
+HAR列式请求表 - 基于NumPy的请求时间分段统计
+
+读取时把每个请求的开始时间、总耗时、各时间分段（timings）以及域名/页面编号追加到紧凑的
+array缓冲区，结束后转换为NumPy列。分段分位数、按域名分解、并发曲线和页面关键路径
+全部用向量化运算完成，不需要逐请求的Python循环。
+
+时间单位与HAR相同为毫秒；时间分段中的 -1（不适用）和非数值按缺失处理。
+"""
+
+import math
+from array import array
+
+import numpy as np
+
+from sketches import PERCENTILES
+
+# HAR 1.2 的时间分段，顺序即结果中的顺序
+PHASES = ("blocked", "dns", "connect", "ssl", "send", "wait", "receive")
+# ssl 时间包含在 connect 中（HAR 1.2 规范），计算占比和主要分段时不重复计入
+EXCLUSIVE_PHASES = tuple(phase for phase in PHASES if phase != "ssl")
+
+_MISSING = float('nan')
+
+def _numeric(value):
+    """非数值（缺失、字符串等）按 -1 处理"""
+    return value if value.__class__ in (int, float) else -1.0
+
+class HarColumns:
+    """列式请求表：开始时间（秒）、总耗时、各时间分段、域名编号、页面编号"""
+
+    def __init__(self):
+        self._start = array('d')
+        self._time = array('d')
+        self._phases = array('d')  # 每个请求一行，按 PHASES 的顺序
+        self._domain = array('I')
+        self._page = array('I')
+        self.domains = {}  # 域名 -> 编号（按首次出现顺序）
+        self.pages = {}    # pageref -> 编号（按首次出现顺序）
+        self._frozen = None
+
+    def feed(self, start, time, timings, domain, page):
+        self._start.append(_MISSING if start is None else start)
+        self._time.append(_numeric(time))
+        if isinstance(timings, dict):
+            get = timings.get
+            row = [get('blocked'), get('dns'), get('connect'), get('ssl'), get('send'), get('wait'), get('receive')]
+            try:
+                # fromlist 出错时不追加任何值
+                self._phases.fromlist(row)
+            except TypeError:
+                self._phases.fromlist([_numeric(value) for value in row])
+        else:
+            self._phases.fromlist([-1.0] * len(PHASES))
+        self._domain.append(self.domains.setdefault(domain, len(self.domains)))
+        self._page.append(self.pages.setdefault(page, len(self.pages)))
+
+    def __len__(self):
+        return len(self._time)
+
+    def frozen(self):
+        """返回NumPy列；负的时间（-1 表示不适用）转为NaN。之后不能再追加请求"""
+        if self._frozen is None:
+            phases = missing_as_nan(np.frombuffer(self._phases, dtype=np.float64).reshape(-1, len(PHASES)))
+            self._frozen = FrozenHarColumns(
+                start=np.frombuffer(self._start, dtype=np.float64),
+                time=missing_as_nan(np.frombuffer(self._time, dtype=np.float64)),
+                phases={phase: phases[:, column] for column, phase in enumerate(PHASES)},
+                domain=np.frombuffer(self._domain, dtype=np.dtype('I')),
+                page=np.frombuffer(self._page, dtype=np.dtype('I')),
+                domain_names=list(self.domains),
+                page_names=list(self.pages)
+            )
+        return self._frozen
+
+def missing_as_nan(values):
+    return np.where(values >= 0, values, np.nan)
+
+class FrozenHarColumns:
+    """只读的NumPy列集合"""
+    __slots__ = ('start', 'time', 'phases', 'domain', 'page', 'domain_names', 'page_names')
+
+    def __init__(self, **columns):
+        for name, column in columns.items():
+            setattr(self, name, column)
+
+    def __len__(self):
+        return len(self.time)
+
+def exact_percentiles(values):
+    """精确分位数（最近秩，与 sketches.histogram_percentiles 的定义相同），没有数据时各分位数为None"""
+    total = len(values)
+    if not total:
+        return {name: None for name, _ in PERCENTILES}
+    ranks = [max(1, math.ceil(q * total)) - 1 for _, q in PERCENTILES]
+    picked = np.partition(values, ranks)[ranks].tolist()
+    return {name: value for (name, _), value in zip(PERCENTILES, picked)}
+
+def phase_stats(cols):
+    """各时间分段的请求数、总时间、平均值、占比和分位数"""
+    totals = {phase: float(np.nansum(cols.phases[phase])) for phase in PHASES}
+    overall = sum(totals[phase] for phase in EXCLUSIVE_PHASES)
+    results = []
+    for phase in PHASES:
+        values = cols.phases[phase]
+        values = values[~np.isnan(values)]
+        count = len(values)
+        results.append({
+            "phase": phase,
+            "requests": count,
+            "totalTime": totals[phase],
+            "avgTime": totals[phase] / count if count else 0,
+            "percentage": totals[phase] / overall * 100 if overall > 0 and phase != "ssl" else None,
+            "percentiles": exact_percentiles(values)
+        })
+    return results
+
+def phase_means(cols, group, size):
+    """每组各时间分段的平均值（只计有该分段的请求，没有时为NaN），形状为 (分段数, 组数)"""
+    means = np.full((len(PHASES), size), np.nan)
+    for row, phase in enumerate(PHASES):
+        values = cols.phases[phase]
+        present = ~np.isnan(values)
+        counts = np.bincount(group[present], minlength=size)
+        sums = np.bincount(group[present], weights=values[present], minlength=size)
+        np.divide(sums, counts, out=means[row], where=counts > 0)
+    return means
+
+def dominant_phases(means):
+    """每列平均值最大的分段（不含 ssl），全为0或缺失时为None"""
+    exclusive = [PHASES.index(phase) for phase in EXCLUSIVE_PHASES]
+    values = np.nan_to_num(means[exclusive])
+    best = values.argmax(axis=0).tolist()
+    peak = values.max(axis=0).tolist()
+    return [EXCLUSIVE_PHASES[index] if value > 0 else None for index, value in zip(best, peak)]
+
+def domain_breakdown(cols, top_n):
+    """按总耗时排序的前 top_n 个域名：请求数、平均耗时、各分段平均值和主要分段"""
+    size = len(cols.domain_names)
+    requests = np.bincount(cols.domain, minlength=size)
+    timed = ~np.isnan(cols.time)
+    timed_counts = np.bincount(cols.domain[timed], minlength=size)
+    total_time = np.bincount(cols.domain[timed], weights=cols.time[timed], minlength=size)
+    # 总耗时相同时按首次出现顺序
+    order = np.argsort(-total_time, kind='stable')[:top_n]
+    means = phase_means(cols, cols.domain, size)[:, order]
+    dominant = dominant_phases(means)
+    means = means.tolist()
+    results = []
+    for column, domain in enumerate(order.tolist()):
+        count = int(timed_counts[domain])
+        results.append({
+            "domain": cols.domain_names[domain],
+            "requests": int(requests[domain]),
+            "totalTime": float(total_time[domain]),
+            "avgTime": float(total_time[domain]) / count if count else 0,
+            "phases": {phase: None if math.isnan(means[row][column]) else means[row][column]
+                       for row, phase in enumerate(PHASES)},
+            "dominantPhase": dominant[column]
+        })
+    return results
+
+def request_intervals(cols):
+    """有开始时间和总耗时的请求：返回其下标、相对最早请求的开始/结束时间（毫秒）和最早开始时间（秒）"""
+    index = np.flatnonzero(~np.isnan(cols.start) & ~np.isnan(cols.time))
+    if not len(index):
+        return index, np.empty(0), np.empty(0), None
+    start_seconds = cols.start[index]
+    origin = float(start_seconds.min())
+    starts = (start_seconds - origin) * 1000
+    return index, starts, starts + cols.time[index], origin
+
+def concurrency_steps(starts, ends):
+    """并发数阶梯：按时间排序的开始(+1)/结束(-1)事件及每个事件后的并发数（同一时刻先结束后开始）"""
+    times = np.concatenate((starts, ends))
+    deltas = np.concatenate((np.ones(len(starts), dtype=np.int64), np.full(len(ends), -1, dtype=np.int64)))
+    order = np.lexsort((deltas, times))
+    return times[order], np.cumsum(deltas[order])
+
+def concurrency_curve(times, active, points):
+    """并发曲线：把时间范围均分为 points 段，每段取段内（含段开始时）的最大并发数"""
+    span = float(times[-1])
+    points = max(1, min(points, len(times)))
+    width = span / points if span > 0 else 1.0
+    bucket = np.minimum((times / width).astype(np.int64), points - 1)
+    peak = np.zeros(points, dtype=np.int64)
+    np.maximum.at(peak, bucket, active)
+    # 段开始时的并发数为之前最后一个事件后的并发数
+    last = np.searchsorted(bucket, np.arange(points), side='left') - 1
+    carried = np.where(last >= 0, active[np.maximum(last, 0)], 0)
+    np.maximum(peak, carried, out=peak)
+    return [{"time": index * width, "active": value} for index, value in enumerate(peak.tolist())]
+
+def critical_path(starts, ends):
+    """关键路径：从最后结束的请求出发，每步回溯到在它开始前最后结束的请求。
+    前驱用 np.searchsorted 一次求出，返回按时间顺序的请求下标"""
+    by_end = np.argsort(ends, kind='stable')
+    predecessor = np.searchsorted(ends[by_end], starts, side='right') - 1
+    steps = []
+    current = int(by_end[-1])
+    while True:
+        steps.append(current)
+        position = int(predecessor[current])
+        if position < 0:
+            break
+        previous = int(by_end[position])
+        # 零耗时请求的结束时间等于开始时间，前驱可能是自己
+        if previous == current:
+            break
+        current = previous
+    steps.reverse()
+    return np.array(steps, dtype=np.int64)
+
+def page_timelines(cols, index, starts, ends, options):
+    """每个页面（pageref，按首次出现顺序）的请求数、加载时间、峰值并发和关键路径"""
+    pages = cols.page[index]
+    max_steps = options["critical_path_steps"]
+    results = []
+    for page in range(min(len(cols.page_names), options["max_pages"])):
+        members = np.flatnonzero(pages == page)
+        if not len(members):
+            continue
+        page_starts = starts[members]
+        page_ends = ends[members]
+        _, active = concurrency_steps(page_starts, page_ends)
+        chain = members[critical_path(page_starts, page_ends)]
+        duration = float(ends[chain[-1]] - starts[chain[0]])
+        length = len(chain)
+        if length > max_steps:
+            # 只列出耗时最长的步骤（保持时间顺序）
+            chain = chain[np.sort(np.argsort(starts[chain] - ends[chain], kind='stable')[:max_steps])]
+        entries = index[chain]
+        dominant = dominant_phases(np.array([cols.phases[phase][entries] for phase in PHASES]))
+        page_start = float(page_starts.min())
+        results.append({
+            "page": cols.page_names[page],
+            "requests": len(members),
+            "startTime": page_start,
+            "loadTime": float(page_ends.max()) - page_start,
+            "peakConcurrency": int(active.max()),
+            "criticalPath": {
+                "duration": duration,
+                "length": length,
+                "steps": [
+                    {
+                        "domain": cols.domain_names[domain],
+                        "startTime": start,
+                        "time": end - start,
+                        "dominantPhase": phase
+                    }
+                    for domain, start, end, phase in zip(cols.domain[entries].tolist(), starts[chain].tolist(),
+                                                         ends[chain].tolist(), dominant)
+                ]
+            }
+        })
+    return results
+
+def timing_stats(cols, options):
+    """时间分段分析：分段统计、按域名分解、并发曲线和页面关键路径（时间均为相对最早请求的毫秒数）"""
+    index, starts, ends, origin = request_intervals(cols)
+    if origin is None:
+        concurrency = {"peak": 0, "timeline": []}
+        pages = []
+    else:
+        times, active = concurrency_steps(starts, ends)
+        concurrency = {
+            "peak": int(active.max()),
+            "timeline": concurrency_curve(times, active, options["timeline_points"])
+        }
+        pages = page_timelines(cols, index, starts, ends, options)
+
+    return {
+        "requests": len(cols),
+        "startTime": origin,
+        "phases": phase_stats(cols),
+        "domains": domain_breakdown(cols, options["top_n"]),
+        "concurrency": concurrency,
+        "pages": pages
+    }
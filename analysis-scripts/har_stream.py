@@ -0,0 +1,250 @@
+"""
+HAR流式解析 - 逐个读取 log.entries 中的请求记录
+
+按块读取文件，只在需要的位置解码：顶层和 log 对象中只识别键，其他值直接跳过；
+每个请求记录复制为字节串后用 json.loads 解码。复制时跳过响应/请求体
+（content.text、postData.text）、头部和Cookie列表等分析用不到的字段：长字符串和
+跨块的字符串用 bytes.find 找到结尾后整段丢弃，不会生成字符串（块内的短字符串照常
+复制）。内存占用只与单个请求记录（不含跳过的字段）和读取块的大小有关，与文件大小无关。
+
+JSON的结构字符（引号、反斜杠、括号）都是ASCII，不会出现在UTF-8多字节字符中，
+因此可以直接在字节上扫描。
+"""
+
+import os
+import re
+import json
+
+CHUNK_BYTES = 1024 * 1024
+
+# 请求记录中跳过的字段（任意层级）：字符串值替换为 ""，数组/对象替换为空数组/对象
+SKIPPED_KEYS = ("text", "headers", "cookies", "queryString")
+
+_QUOTE = ord('"')
+_OPENERS = (ord('{'), ord('['))
+_BACKSLASH = ord('\\')
+_WHITESPACE = re.compile(rb'[ \t\r\n]*')
+_SCALAR = re.compile(rb'[^,}\] \t\r\n]*')
+# 除括号外的一段内容（其中的短字符串完整地包含在内），在括号或长字符串、跨块的字符串处停下；
+# 短字符串最多含 16 个转义，转义很多的正文（HTML、JSON）按长字符串处理
+_PLAIN = re.compile(rb'[^"{}\[\]]*(?:"[^"\\]{0,256}(?:\\.[^"\\]{0,256}){0,16}"[^"{}\[\]]*)*')
+_SKIPPED_TAIL = re.compile(
+    b'"(?:' + b'|'.join(key.encode() for key in SKIPPED_KEYS) + rb')"\s*:\s*$')
+_TAIL_BYTES = 64
+
+class _Reader:
+    """按块读取的字节流，pos 为当前位置"""
+
+    def __init__(self, f):
+        self.f = f
+        self.buf = b''
+        self.pos = 0
+
+    def more(self):
+        """读入下一块（保留未处理的部分）；文件结束时返回False"""
+        chunk = self.f.read(CHUNK_BYTES)
+        if not chunk:
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def need_more(self):
+        if not self.more():
+            raise Exception("HAR文件不完整")
+
+    def peek(self):
+        """跳过空白，返回下一个字节（文件结束时为None），不前进"""
+        while True:
+            self.pos = _WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.more():
+                return None
+
+    def expect(self, char):
+        if self.peek() != ord(char):
+            raise Exception("无效的HAR文件格式")
+        self.pos += 1
+
+    def string(self, keep=True):
+        """读取字符串（当前位置在开头的引号之后）；keep 为False时只跳过，返回None"""
+        parts = []
+        search = self.pos
+        while True:
+            buf = self.buf
+            end = buf.find(b'"', search)
+            if end == -1:
+                # 块末尾连续的反斜杠留到下一块，用于判断之后的引号是否被转义
+                end = len(buf)
+                while end > self.pos and buf[end - 1] == _BACKSLASH:
+                    end -= 1
+                if keep:
+                    parts.append(buf[self.pos:end])
+                self.pos = end
+                self.need_more()
+                search = self.pos
+                continue
+            # 引号前有奇数个反斜杠时是转义的引号
+            start = end
+            while start > self.pos and buf[start - 1] == _BACKSLASH:
+                start -= 1
+            if (end - start) % 2:
+                search = end + 1
+                continue
+            if keep:
+                parts.append(buf[self.pos:end])
+            self.pos = end + 1
+            return b''.join(parts) if keep else None
+
+    def members(self):
+        """逐个产出对象成员的键（当前位置在 { 之后），产出时位于值的开头，由调用方读取值"""
+        while True:
+            char = self.peek()
+            if char == ord('}'):
+                self.pos += 1
+                return
+            if char == ord(','):
+                self.pos += 1
+                continue
+            if char is None:
+                raise Exception("HAR文件不完整")
+            if char != _QUOTE:
+                raise Exception("无效的HAR文件格式")
+            self.pos += 1
+            key = self.string()
+            self.expect(':')
+            yield key
+
+    def skip_value(self):
+        char = self.peek()
+        if char == _QUOTE:
+            self.pos += 1
+            self.string(keep=False)
+        elif char in _OPENERS:
+            self.container(None)
+        elif char is None:
+            raise Exception("HAR文件不完整")
+        else:
+            # 数字、true、false、null
+            while True:
+                self.pos = _SCALAR.match(self.buf, self.pos).end()
+                if self.pos < len(self.buf) or not self.more():
+                    return
+
+    def container(self, out):
+        """读取对象或数组（当前位置在开头的括号）：out 为bytearray时复制到其中（跳过大字段），为None时丢弃"""
+        depth = 0
+        while True:
+            end = _PLAIN.match(self.buf, self.pos).end()
+            if out is not None:
+                out += self.buf[self.pos:end]
+            self.pos = end
+            if end == len(self.buf):
+                self.need_more()
+                continue
+
+            char = self.buf[end]
+            if char == _QUOTE:
+                # 跨块的字符串：跳过的字段边读边丢弃
+                self.pos += 1
+                if self.skipped(out):
+                    self.string(keep=False)
+                    out += b'""'
+                else:
+                    value = self.string(keep=out is not None)
+                    if out is not None:
+                        out += b'"' + value + b'"'
+            elif char in _OPENERS:
+                if self.skipped(out):
+                    self.container(None)
+                    out += b'{}' if char == _OPENERS[0] else b'[]'
+                    continue
+                self.pos += 1
+                depth += 1
+                if out is not None:
+                    out.append(char)
+            else:
+                self.pos += 1
+                depth -= 1
+                if out is not None:
+                    out.append(char)
+                if depth == 0:
+                    return
+
+    @staticmethod
+    def skipped(out):
+        """复制的内容是否以跳过字段的键结尾（接下来的值不复制）"""
+        return out is not None and _SKIPPED_TAIL.search(out, max(0, len(out) - _TAIL_BYTES)) is not None
+
+    def elements(self):
+        """逐个产出数组中的对象（当前位置在 [ 之后），解码为字典"""
+        while True:
+            char = self.peek()
+            if char == ord(']'):
+                self.pos += 1
+                return
+            if char == ord(','):
+                self.pos += 1
+                continue
+            if char is None:
+                raise Exception("HAR文件不完整")
+            if char != _OPENERS[0]:
+                raise Exception("无效的HAR文件格式")
+            out = bytearray()
+            self.container(out)
+            yield json.loads(out)
+
+def iter_entries(file_path):
+    """逐个产出 log.entries 中的请求记录（跳过 SKIPPED_KEYS 中的字段）"""
+    for entry, _ in iter_entry_positions(file_path):
+        yield entry
+
+def iter_entry_positions(file_path):
+    """逐个产出 (请求记录, 读完该记录后的文件位置)，用于输出扫描进度
+    
+    文件不是有效的JSON时，不超过 CHUNK_BYTES 的文件给出与 json.load 相同的错误信息；
+    较大的文件不整体解码，给出"HAR文件不完整"或"无效的HAR文件格式"。
+    """
+    try:
+        yield from _entry_positions(file_path)
+    except Exception:
+        message = _decode_error(file_path)
+        if message is None:
+            raise
+        raise Exception(message)
+
+def _decode_error(file_path):
+    """较小的文件整体用 json.load 解码时的错误信息；文件较大或可以解码时返回None"""
+    if os.path.getsize(file_path) > CHUNK_BYTES:
+        return None
+    try:
+        with open(file_path, 'r', encoding='utf-8-sig') as f:
+            json.load(f)
+    except ValueError as e:
+        return str(e)
+    return None
+
+def _entry_positions(file_path):
+    with open(file_path, 'rb') as f:
+        reader = _Reader(f)
+        if reader.peek() == 0xEF and reader.buf.startswith(b'\xef\xbb\xbf', reader.pos):
+            reader.pos += 3
+        reader.expect('{')
+        found = False
+        for key in reader.members():
+            if key == b'log' and reader.peek() == _OPENERS[0]:
+                reader.pos += 1
+                for log_key in reader.members():
+                    if log_key == b'entries' and reader.peek() == _OPENERS[1]:
+                        reader.pos += 1
+                        found = True
+                        for entry in reader.elements():
+                            # 缓冲区中尚未处理的部分不算已读
+                            yield entry, f.tell() - (len(reader.buf) - reader.pos)
+                    else:
+                        reader.skip_value()
+            else:
+                reader.skip_value()
+        if not found or reader.peek() is not None:
+            raise Exception("无效的HAR文件格式")
@@ -0,0 +1,531 @@
+"""
+HTTP流重组 - 基于TCP序列号
+
+TCP流的两个方向分别按序列号重组：重传和重叠的数据被裁剪，乱序段暂存到缺口补齐后
+再拼接。看到SYN时方向的数据从初始序列号+1开始；抓包从连接中途开始（没有SYN）时，
+在以HTTP起始行开头的数据段处对齐，对齐前收到的数据段先暂存，报文开头的数据段晚到
+时仍能拼接。重组后的字节流按HTTP报文边界切分（头部、Content-Length、chunked编码、
+直到连接关闭），每个完整的请求/响应通过回调交给调用方配对。
+
+内存有界：每个方向的缓冲（未解析数据+乱序段）、对齐前暂存的数据、全局缓冲和同时
+跟踪的流数都有上限，超过方向上限时跳过缺口，超过全局上限或流数上限时结束最久未
+活动的流；空闲超时或FIN/RST关闭的流会被结束并释放。报文体只保留前
+HTTP_BODY_PREVIEW 字节，其余数据读过即丢弃。
+
+重组状态可以导出为JSON（dump_state），恢复后继续接收数据包，结果与不中断时相同。
+"""
+
+from collections import OrderedDict, deque
+
+from pcap_partial import encode_bytes, decode_bytes
+
+HTTP_METHOD_PREFIXES_BYTES = (b'GET ', b'POST ', b'PUT ', b'DELETE ', b'HEAD ', b'OPTIONS ', b'PATCH ')
+HTTP_START_PREFIXES = HTTP_METHOD_PREFIXES_BYTES + (b'HTTP/',)
+
+HTTP_BODY_PREVIEW = 4096  # 每个报文保留的报文体字节数
+MAX_HEADER_BYTES = 64 * 1024  # 超过仍未结束的头部视为非HTTP数据
+MAX_DIRECTION_BUFFER = 1024 * 1024  # 每个方向的缓冲上限
+MAX_TOTAL_BUFFER = 64 * 1024 * 1024  # 所有流的缓冲上限
+MAX_PRESYNC_BUFFER = 64 * 1024  # 每个方向对齐前暂存的数据上限，超过时丢弃最早收到的数据段
+MAX_FLOWS = 65536  # 同时跟踪的流数上限
+FLOW_IDLE_TIMEOUT = 120.0  # 流空闲多少秒（抓包时间）后结束
+IDLE_CHECK_INTERVAL = 4096  # 每处理多少个数据段检查一次空闲流
+
+# 报文体的读取方式
+BODY_NONE, BODY_LENGTH, BODY_CHUNKED, BODY_CLOSE = range(4)
+# chunked编码的解析状态
+CHUNK_SIZE, CHUNK_DATA, CHUNK_DATA_END, CHUNK_TRAILER = range(4)
+
+def seq_diff(a, b):
+    """序列号差 a - b（处理32位回绕）"""
+    diff = (a - b) & 0xFFFFFFFF
+    return diff - 0x100000000 if diff >= 0x80000000 else diff
+
+def starts_http_message(data):
+    """数据是否以HTTP请求行或状态行开头"""
+    if data[0] < 0x80:
+        return data.startswith(HTTP_START_PREFIXES)
+    text = bytes(data[:16]).decode('utf-8', errors='ignore')
+    return text.startswith(tuple(prefix.decode() for prefix in HTTP_START_PREFIXES))
+
+class HalfStream:
+    """TCP流的一个方向：序列号重组状态和HTTP报文解析状态"""
+    __slots__ = ('info', 'isn', 'next_seq', 'buf', 'offset', 'marks', 'ooo', 'ooo_bytes',
+                 'synced', 'fin', 'head', 'head_ts', 'is_request', 'body', 'mode',
+                 'remaining', 'chunk_state')
+
+    def __init__(self, info):
+        self.info = info  # 该方向的 src_ip/dst_ip/src_port/dst_port
+        self.isn = None  # SYN中的初始序列号（没有看到SYN时为None）
+        self.next_seq = None  # 下一个按序字节的序列号（尚不知道流中位置时为None）
+        self.buf = bytearray()  # 已按序拼接、尚未解析的数据
+        self.offset = 0  # buf[0] 在流中的位置
+        self.marks = deque()  # (数据段结束位置, 时间戳)，用于确定报文开始时间
+        self.ooo = {}  # 乱序段（对齐前为暂存的数据段）：序列号 -> (数据, 时间戳)
+        self.ooo_bytes = 0
+        self.synced = False  # 是否已对齐到HTTP报文边界
+        self.fin = False
+        self.reset_message()
+
+    def reset_message(self):
+        self.head = None  # 当前报文的头部（正在读取报文体时不为None）
+        self.head_ts = 0
+        self.is_request = False
+        self.body = None
+        self.mode = BODY_NONE
+        self.remaining = 0
+        self.chunk_state = CHUNK_SIZE
+
+    def buffered(self):
+        return len(self.buf) + self.ooo_bytes
+
+    def dump_state(self):
+        return {
+            "info": self.info,
+            "isn": self.isn,
+            "next_seq": self.next_seq,
+            "buf": encode_bytes(self.buf),
+            "offset": self.offset,
+            "marks": list(self.marks),
+            "ooo": [[seq, encode_bytes(data), ts] for seq, (data, ts) in self.ooo.items()],
+            "ooo_bytes": self.ooo_bytes,
+            "synced": self.synced,
+            "fin": self.fin,
+            "head": None if self.head is None else encode_bytes(self.head),
+            "head_ts": self.head_ts,
+            "is_request": self.is_request,
+            "body": None if self.body is None else encode_bytes(self.body),
+            "mode": self.mode,
+            "remaining": self.remaining,
+            "chunk_state": self.chunk_state
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        half = cls(state["info"])
+        half.isn = state["isn"]
+        half.next_seq = state["next_seq"]
+        half.buf = bytearray(decode_bytes(state["buf"]))
+        half.offset = state["offset"]
+        half.marks = deque(tuple(mark) for mark in state["marks"])
+        half.ooo = {seq: (decode_bytes(data), ts) for seq, data, ts in state["ooo"]}
+        half.ooo_bytes = state["ooo_bytes"]
+        half.synced = state["synced"]
+        half.fin = state["fin"]
+        half.head = None if state["head"] is None else decode_bytes(state["head"])
+        half.head_ts = state["head_ts"]
+        half.is_request = state["is_request"]
+        half.body = None if state["body"] is None else bytearray(decode_bytes(state["body"]))
+        half.mode = state["mode"]
+        half.remaining = state["remaining"]
+        half.chunk_state = state["chunk_state"]
+        return half
+
+class HttpFlow:
+    """双向TCP流"""
+    __slots__ = ('key', 'halves', 'methods', 'last_ts')
+
+    def __init__(self, key):
+        self.key = key
+        self.halves = [None, None]
+        self.methods = deque()  # 尚未响应的请求方法，用于判断HEAD响应没有报文体
+        self.last_ts = 0
+
+class HttpReassembler:
+    """按序列号重组IPv4 TCP流并切分HTTP报文
+
+    on_message(流键, 方向信息, 是否请求, 报文文本, 开始时间戳) 在每个完整报文
+    （头部+报文体预览）解析出来时调用，1xx临时响应不回调；on_close(流键) 在连接
+    关闭（FIN/RST）或空闲超时时调用，抓包结束或因缓冲超限被淘汰的流不算关闭。
+    流键与原实现相同：按 (IP, 端口) 排序的二元组。
+    """
+
+    def __init__(self, on_message, on_close=None):
+        self.flows = OrderedDict()  # 流键 -> HttpFlow，按最近活动时间排序
+        self.buffered = 0
+        self.segments = 0
+        self.on_message = on_message
+        self.on_close = on_close
+
+    def feed(self, rec):
+        payload = rec.payload
+        flags = rec.flags
+        if not payload and not flags & 0x07:  # 没有载荷的包只关心SYN/FIN/RST
+            return
+
+        src = (rec.src, rec.sport)
+        dst = (rec.dst, rec.dport)
+        if src <= dst:
+            key, index = (src, dst), 0
+        else:
+            key, index = (dst, src), 1
+
+        flows = self.flows
+        flow = flows.get(key)
+        if flags & 0x02 and flow is not None and self._new_connection(flow, index, rec):
+            # SYN：同一四元组上的新连接，结束旧流
+            self.close(key)
+            flow = None
+        if flow is None:
+            if not payload and not flags & 0x02:
+                return
+            if len(flows) >= MAX_FLOWS:
+                self.close(next(iter(flows)), closed=False)
+            flow = flows[key] = HttpFlow(key)
+        else:
+            flows.move_to_end(key)
+        flow.last_ts = rec.ts
+
+        half = flow.halves[index]
+        if half is None:
+            half = flow.halves[index] = HalfStream({
+                'src_ip': rec.src,
+                'dst_ip': rec.dst,
+                'src_port': rec.sport,
+                'dst_port': rec.dport
+            })
+
+        seq = rec.seq
+        if flags & 0x02:
+            # SYN占一个序列号，数据从初始序列号+1开始
+            if half.isn is None:
+                self._anchor(flow, half, seq)
+            seq = (seq + 1) & 0xFFFFFFFF
+        if payload:
+            self._segment(flow, half, seq, payload, rec.ts)
+        if flags & 0x05:  # FIN/RST
+            half.fin = True
+            other = flow.halves[1 - index]
+            if flags & 0x04 or (other is not None and other.fin):
+                self.close(key)
+
+        self.segments += 1
+        if self.segments % IDLE_CHECK_INTERVAL == 0:
+            self._evict_idle(rec.ts)
+        while self.buffered > MAX_TOTAL_BUFFER and flows:
+            self.close(next(iter(flows)), closed=False)
+
+    def dump_state(self):
+        """未结束的流（含未拼完的报文和乱序段），恢复后可以继续接收后续数据包"""
+        return {
+            "buffered": self.buffered,
+            "segments": self.segments,
+            "flows": [
+                {
+                    "key": flow.key,
+                    "halves": [None if half is None else half.dump_state() for half in flow.halves],
+                    "methods": [encode_bytes(method) for method in flow.methods],
+                    "last_ts": flow.last_ts
+                }
+                for flow in self.flows.values()
+            ]
+        }
+
+    def load_state(self, state):
+        self.buffered = state["buffered"]
+        self.segments = state["segments"]
+        self.flows = OrderedDict()
+        for flow_state in state["flows"]:
+            key = tuple(tuple(endpoint) for endpoint in flow_state["key"])
+            flow = self.flows[key] = HttpFlow(key)
+            flow.halves = [None if half is None else HalfStream.from_state(half)
+                           for half in flow_state["halves"]]
+            flow.methods = deque(decode_bytes(method) for method in flow_state["methods"])
+            flow.last_ts = flow_state["last_ts"]
+
+    def finish(self):
+        """结束所有流（抓包结束）"""
+        while self.flows:
+            self.close(next(iter(self.flows)), closed=False)
+
+    def close(self, key, closed=True):
+        """结束一个流：补齐缺口后解析剩余数据，未读完的报文按已有内容输出"""
+        flow = self.flows.pop(key, None)
+        if flow is None:
+            return
+        for half in flow.halves:
+            if half is None:
+                continue
+            while half.synced and half.ooo:
+                self._skip_gap(flow, half)
+            if half.synced and half.head is not None:
+                self._emit(flow, half)
+            self.buffered -= half.buffered()
+        if closed and self.on_close is not None:
+            self.on_close(key)
+
+    def _evict_idle(self, now):
+        flows = self.flows
+        while flows:
+            key, flow = next(iter(flows.items()))
+            if now - flow.last_ts <= FLOW_IDLE_TIMEOUT:
+                break
+            self.close(key)
+
+    @staticmethod
+    def _new_connection(flow, index, rec):
+        """SYN是否在同一四元组上开始新连接（而不是当前连接的握手或其重传）"""
+        half = flow.halves[index]
+        if half is None:
+            # 纯SYN发起新连接；SYN/ACK是对当前连接SYN的应答
+            return not rec.flags & 0x10
+        if half.isn is None:
+            # 没有看到过SYN的方向：已经对齐过说明是旧连接，只有暂存数据时是本连接先到的数据段
+            return half.next_seq is not None
+        return half.isn != rec.seq
+
+    def _anchor(self, flow, half, isn):
+        """按SYN确定方向的起始位置，拼接对齐前暂存的数据段"""
+        half.isn = isn
+        half.next_seq = (isn + 1) & 0xFFFFFFFF
+        half.synced = True
+        if half.ooo:
+            self._drain(half)
+            self._parse(flow, half)
+
+    def _segment(self, flow, half, seq, payload, ts):
+        if not half.synced:
+            if starts_http_message(payload):
+                # 在HTTP起始行处（重新）对齐，之前暂存的后续数据段随后拼接
+                half.synced = True
+                half.next_seq = seq
+            elif half.next_seq is None:
+                # 还不知道流中的位置：暂存，报文开头的数据段可能晚到
+                self._store(half, seq, payload, ts)
+                while half.ooo_bytes > MAX_PRESYNC_BUFFER:
+                    self._drop(half, next(iter(half.ooo)))
+                return
+            else:
+                # 失去同步后只在HTTP起始行处重新对齐
+                return
+
+        diff = seq_diff(seq, half.next_seq)
+        if diff < 0:
+            # 重传或重叠：裁掉已收到的部分
+            if -diff >= len(payload):
+                return
+            payload = payload[-diff:]
+            diff = 0
+
+        if diff > 0:
+            # 乱序：暂存，缓冲超限时放弃缺口
+            self._store(half, seq, payload, ts)
+            if half.buffered() > MAX_DIRECTION_BUFFER:
+                self._skip_gap(flow, half)
+            return
+
+        self._append(half, payload, ts)
+        self._drain(half)
+        self._parse(flow, half)
+
+    def _store(self, half, seq, payload, ts):
+        """暂存乱序段，同一序列号保留较长的一份"""
+        previous = half.ooo.get(seq)
+        if previous is not None:
+            if len(previous[0]) >= len(payload):
+                return
+            half.ooo_bytes -= len(previous[0])
+            self.buffered -= len(previous[0])
+        half.ooo[seq] = (payload, ts)
+        half.ooo_bytes += len(payload)
+        self.buffered += len(payload)
+
+    def _drop(self, half, seq):
+        data, ts = half.ooo.pop(seq)
+        half.ooo_bytes -= len(data)
+        self.buffered -= len(data)
+        return data, ts
+
+    def _append(self, half, data, ts):
+        half.buf += data
+        half.next_seq = (half.next_seq + len(data)) & 0xFFFFFFFF
+        half.marks.append((half.offset + len(half.buf), ts))
+        self.buffered += len(data)
+
+    def _drain(self, half):
+        """拼接已经与已收数据衔接的乱序段"""
+        ooo = half.ooo
+        progressed = True
+        while ooo and progressed:
+            progressed = False
+            for seq in list(ooo):
+                diff = seq_diff(seq, half.next_seq)
+                if diff > 0:
+                    continue
+                data, ts = self._drop(half, seq)
+                if len(data) > -diff:
+                    self._append(half, data[-diff:], ts)
+                    progressed = True
+
+    def _skip_gap(self, flow, half):
+        """放弃缺失的数据：从最早的乱序段继续，若它不是HTTP报文开头则等待重新同步"""
+        if half.head is not None:
+            self._emit(flow, half)
+        self._discard_buffer(half)
+        seq = min(half.ooo, key=lambda s: seq_diff(s, half.next_seq))
+        data, ts = self._drop(half, seq)
+        if starts_http_message(data):
+            half.next_seq = seq
+            self._append(half, data, ts)
+            self._drain(half)
+            self._parse(flow, half)
+        else:
+            self._desync(half)
+
+    def _discard_buffer(self, half):
+        self.buffered -= len(half.buf)
+        half.offset += len(half.buf)
+        half.buf = bytearray()
+        half.marks.clear()
+        half.reset_message()
+
+    def _desync(self, half):
+        self._discard_buffer(half)
+        self.buffered -= half.ooo_bytes
+        half.ooo = {}
+        half.ooo_bytes = 0
+        half.synced = False
+
+    def _consume(self, half, size):
+        del half.buf[:size]
+        half.offset += size
+        self.buffered -= size
+        marks = half.marks
+        while marks and marks[0][0] <= half.offset:
+            marks.popleft()
+
+    def _take_body(self, half, size):
+        """读取size字节的报文体：只保留预览部分"""
+        body = half.body
+        if len(body) < HTTP_BODY_PREVIEW:
+            body += half.buf[:min(size, HTTP_BODY_PREVIEW - len(body))]
+        self._consume(half, size)
+
+    def _parse(self, flow, half):
+        """从已拼接的数据中切分尽可能多的完整报文"""
+        buf = half.buf
+        while half.synced:
+            if half.head is None:
+                if not buf:
+                    return
+                if not starts_http_message(buf):
+                    if len(buf) < 8 and any(prefix.startswith(bytes(buf)) for prefix in HTTP_START_PREFIXES):
+                        return
+                    self._desync(half)
+                    return
+                end = buf.find(b'\r\n\r\n')
+                if end < 0:
+                    if len(buf) > MAX_HEADER_BYTES:
+                        self._desync(half)
+                    return
+                half.head_ts = half.marks[0][1]
+                half.head = bytes(buf[:end])
+                half.body = bytearray()
+                self._consume(half, end + 4)
+                if not self._start_body(flow, half):
+                    continue
+
+            mode = half.mode
+            if mode == BODY_LENGTH:
+                size = min(half.remaining, len(buf))
+                self._take_body(half, size)
+                half.remaining -= size
+                if half.remaining:
+                    return
+            elif mode == BODY_CLOSE:
+                self._take_body(half, len(buf))
+                return
+            elif mode == BODY_CHUNKED:
+                if not self._read_chunks(half):
+                    return
+            self._emit(flow, half)
+
+    def _start_body(self, flow, half):
+        """根据报文头确定报文体读取方式；没有报文体时直接输出报文并返回False"""
+        lines = half.head.split(b'\r\n')
+        content_length = None
+        chunked = False
+        for line in lines[1:]:
+            name, _, value = line.partition(b':')
+            name = name.strip().lower()
+            if name == b'content-length':
+                try:
+                    content_length = int(value.strip())
+                except ValueError:
+                    pass
+            elif name == b'transfer-encoding' and b'chunked' in value.lower():
+                chunked = True
+
+        half.is_request = not lines[0].startswith(b'HTTP/')
+        if half.is_request:
+            flow.methods.append(lines[0].split(b' ', 1)[0])
+            no_body = not chunked and not content_length
+        else:
+            try:
+                status = int(lines[0].split(b' ')[1])
+            except (IndexError, ValueError):
+                status = 0
+            if 100 <= status < 200:
+                # 临时响应：不占用请求队列，也不回调
+                half.reset_message()
+                return False
+            method = flow.methods.popleft() if flow.methods else None
+            no_body = status in (204, 304) or method == b'HEAD' or (not chunked and content_length == 0)
+
+        if no_body:
+            self._emit(flow, half)
+            return False
+        if chunked:
+            half.mode = BODY_CHUNKED
+        elif content_length is not None:
+            half.mode = BODY_LENGTH
+            half.remaining = max(content_length, 0)
+        else:
+            half.mode = BODY_CLOSE
+        return True
+
+    def _read_chunks(self, half):
+        """读取chunked报文体，报文结束时返回True"""
+        buf = half.buf
+        while True:
+            state = half.chunk_state
+            if state == CHUNK_DATA:
+                size = min(half.remaining, len(buf))
+                self._take_body(half, size)
+                half.remaining -= size
+                if half.remaining:
+                    return False
+                half.chunk_state = CHUNK_DATA_END
+            elif state == CHUNK_DATA_END:
+                if len(buf) < 2:
+                    return False
+                self._consume(half, 2)
+                half.chunk_state = CHUNK_SIZE
+            else:
+                end = buf.find(b'\r\n')
+                if end < 0:
+                    if len(buf) > MAX_HEADER_BYTES:
+                        self._desync(half)
+                    return False
+                line = bytes(buf[:end])
+                self._consume(half, end + 2)
+                if state == CHUNK_TRAILER:
+                    if not line:
+                        return True
+                    continue
+                try:
+                    size = int(line.split(b';', 1)[0].strip() or b'0', 16)
+                except ValueError:
+                    self._desync(half)
+                    return False
+                if size == 0:
+                    half.chunk_state = CHUNK_TRAILER
+                else:
+                    half.remaining = size
+                    half.chunk_state = CHUNK_DATA
+
+    def _emit(self, flow, half):
+        text = (half.head + b'\r\n\r\n' + bytes(half.body)).decode('utf-8', errors='ignore')
+        is_request, ts = half.is_request, half.head_ts
+        half.reset_message()
+        self.on_message(flow.key, half.info, is_request, text, ts)
@@ -0,0 +1,220 @@
+"""
+PCAP列式数据包表 - 基于NumPy的向量化统计
+
+扫描时把每个包的头部字段追加到紧凑的array缓冲区，扫描结束后零拷贝转换为NumPy列。
+传输层、时间线和异常检测的聚合全部用向量化运算完成，返回的聚合值
+（包括Counter的插入顺序）与逐包累加完全一致，可直接交给 analyze_pcap 的 build_* 函数。
+"""
+
+import struct
+from array import array
+from collections import Counter
+from socket import inet_aton, inet_ntoa
+
+import numpy as np
+
+# 累加器中TCP标志的计数顺序
+TCP_FLAG_BITS = (("SYN", 0x02), ("ACK", 0x10), ("FIN", 0x01), ("RST", 0x04))
+
+class PacketColumns:
+    """列式数据包表：时间戳、长度、IP版本、整数IPv4地址、协议、端口、TCP标志"""
+
+    def __init__(self):
+        self._ts = array('d')
+        self._length = array('I')
+        self._ip_version = array('B')
+        self._src = array('I')
+        self._dst = array('I')
+        self._proto = array('B')
+        self._sport = array('H')
+        self._dport = array('H')
+        self._flags = array('H')
+        self._is_arp = array('B')
+        self._ipv4_ids = {}  # IPv4字符串 -> 整数，同一地址只转换一次
+        self._frozen = None
+
+    def _ipv4_to_int(self, ip):
+        value = self._ipv4_ids.get(ip)
+        if value is None:
+            value = self._ipv4_ids[ip] = struct.unpack('!I', inet_aton(ip))[0]
+        return value
+
+    def feed(self, rec):
+        self._ts.append(rec.ts)
+        self._length.append(rec.length)
+        self._ip_version.append(rec.ip_version)
+        if rec.ip_version == 4:
+            self._src.append(self._ipv4_to_int(rec.src))
+            self._dst.append(self._ipv4_to_int(rec.dst))
+        else:
+            self._src.append(0)
+            self._dst.append(0)
+        self._proto.append(rec.proto)
+        self._sport.append(rec.sport)
+        self._dport.append(rec.dport)
+        self._flags.append(rec.flags)
+        self._is_arp.append(rec.is_arp)
+
+    def merge(self, other):
+        """追加另一个分片（文件中位于其后）的列"""
+        for name in ('_ts', '_length', '_ip_version', '_src', '_dst', '_proto',
+                     '_sport', '_dport', '_flags', '_is_arp'):
+            getattr(self, name).extend(getattr(other, name))
+
+    def __len__(self):
+        return len(self._ts)
+
+    def frozen(self):
+        """返回NumPy列视图（零拷贝）；之后不能再追加数据包"""
+        if self._frozen is None:
+            self._frozen = FrozenColumns(
+                ts=np.frombuffer(self._ts, dtype=np.float64),
+                length=np.frombuffer(self._length, dtype=np.dtype('I')),
+                ip_version=np.frombuffer(self._ip_version, dtype=np.uint8),
+                src=np.frombuffer(self._src, dtype=np.dtype('I')),
+                dst=np.frombuffer(self._dst, dtype=np.dtype('I')),
+                proto=np.frombuffer(self._proto, dtype=np.uint8),
+                sport=np.frombuffer(self._sport, dtype=np.dtype('H')),
+                dport=np.frombuffer(self._dport, dtype=np.dtype('H')),
+                flags=np.frombuffer(self._flags, dtype=np.dtype('H')),
+                is_arp=np.frombuffer(self._is_arp, dtype=np.uint8).astype(bool)
+            )
+        return self._frozen
+
+class FrozenColumns:
+    """只读的NumPy列集合"""
+    __slots__ = ('ts', 'length', 'ip_version', 'src', 'dst', 'proto',
+                 'sport', 'dport', 'flags', 'is_arp')
+
+    def __init__(self, **columns):
+        for name, column in columns.items():
+            setattr(self, name, column)
+
+    def __len__(self):
+        return len(self.ts)
+
+def int_to_ipv4(value):
+    return inet_ntoa(struct.pack('!I', value))
+
+def ordered_counter(keys, key_func=None):
+    """按首次出现顺序构建Counter，与逐包 counter[key] += 1 得到的顺序一致"""
+    if not len(keys):
+        return Counter()
+    uniq, first, counts = np.unique(keys, return_index=True, return_counts=True)
+    order = np.argsort(first, kind='stable')
+    uniq = uniq[order].tolist()
+    if key_func is not None:
+        uniq = [key_func(key) for key in uniq]
+    return Counter(dict(zip(uniq, counts[order].tolist())))
+
+def transport_stats(cols):
+    """传输层统计：TCP标志用位掩码计数"""
+    proto = cols.proto
+    tcp = proto == 6
+    udp = proto == 17
+
+    # TCP标志：按首次出现的包（同一包内按SYN/ACK/FIN/RST）排序后插入
+    flags = cols.flags[tcp]
+    found = []
+    for order, (name, bit) in enumerate(TCP_FLAG_BITS):
+        hits = (flags & bit) != 0
+        count = int(hits.sum())
+        if count:
+            found.append((int(hits.argmax()), order, name, count))
+    tcp_flags = Counter({name: count for _, _, name, count in sorted(found)})
+
+    return {
+        "tcp_count": int(tcp.sum()),
+        "udp_count": int(udp.sum()),
+        "icmp_count": int((proto == 1).sum()),
+        "tcp_bytes": int(cols.length[tcp].sum(dtype=np.int64)),
+        "udp_bytes": int(cols.length[udp].sum(dtype=np.int64)),
+        "port_counts": ordered_counter(cols.dport[tcp | udp]),
+        "tcp_flags": tcp_flags
+    }
+
+def timeline_protocol_codes(cols):
+    """时间线协议编码：0 Other，1 TCP，2 UDP，3 ICMP（仅IPv4），4 ARP"""
+    ipv4 = cols.ip_version == 4
+    proto = cols.proto
+    codes = np.zeros(len(cols), dtype=np.int64)
+    codes[ipv4 & (proto == 6)] = 1
+    codes[ipv4 & (proto == 17)] = 2
+    codes[ipv4 & (proto == 1)] = 3
+    codes[cols.is_arp] = 4
+    return codes
+
+def temporal_buckets(cols, start_time, bucket_size, num_buckets, protocol_names):
+    """时间分桶（第一个桶从 start_time 开始）：用 np.bincount 统计每桶包数/字节数/各协议包数"""
+    index = np.minimum(((cols.ts - start_time) / bucket_size).astype(np.int64), num_buckets - 1)
+
+    time_buckets = np.bincount(index, minlength=num_buckets).tolist()
+    byte_buckets = np.bincount(index, weights=cols.length, minlength=num_buckets).astype(np.int64).tolist()
+
+    num_codes = len(protocol_names)
+    protocols = np.bincount(index * num_codes + timeline_protocol_codes(cols),
+                            minlength=num_buckets * num_codes).reshape(num_buckets, num_codes).tolist()
+    protocol_buckets = [
+        {name: count for name, count in zip(protocol_names, counts) if count}
+        for counts in protocols
+    ]
+    return time_buckets, byte_buckets, protocol_buckets
+
+def pyramid_levels(cols, steps_ms, num_codes):
+    """时间序列金字塔各级的列：1毫秒级用 np.unique 分组，较粗的级别由上一级 np.add.reduceat 合并"""
+    ms = np.floor(cols.ts * 1000).astype(np.int64)
+    index, inverse = np.unique(ms, return_inverse=True)
+    size = len(index)
+    packets = np.bincount(inverse, minlength=size)
+    byte_counts = np.bincount(inverse, weights=cols.length, minlength=size).astype(np.int64)
+    protocols = np.bincount(inverse * num_codes + timeline_protocol_codes(cols),
+                            minlength=size * num_codes).reshape(size, num_codes).T
+
+    levels = []
+    previous = steps_ms[0]
+    for step in steps_ms:
+        if step != previous:
+            index, starts = np.unique(index // (step // previous), return_index=True)
+            packets = np.add.reduceat(packets, starts)
+            byte_counts = np.add.reduceat(byte_counts, starts)
+            protocols = np.add.reduceat(protocols, starts, axis=1)
+            previous = step
+        levels.append((index.tolist(), packets.tolist(), byte_counts.tolist(), protocols.tolist()))
+    return levels
+
+def event_buckets(cols, bucket_ms):
+    """在线事件检测的时间桶（按绝对时间对齐）：返回非空桶的编号、包数和字节数列"""
+    index = np.floor(cols.ts * 1000).astype(np.int64) // bucket_ms
+    index, inverse = np.unique(index, return_inverse=True)
+    packets = np.bincount(inverse, minlength=len(index))
+    byte_counts = np.bincount(inverse, weights=cols.length, minlength=len(index)).astype(np.int64)
+    return index.tolist(), packets.tolist(), byte_counts.tolist()
+
+def anomaly_stats(cols):
+    """异常检测所需的聚合值：每IP计数、每IP不同目的端口数、包大小离群值"""
+    proto = cols.proto
+    ipv4 = cols.ip_version == 4
+    tcp_or_udp = (proto == 6) | (proto == 17)
+
+    # 每个源IP访问的不同目的端口数（按源IP首次出现顺序）
+    scan_mask = ipv4 & tcp_or_udp
+    scan_src = cols.src[scan_mask]
+    pairs = np.unique((scan_src.astype(np.uint64) << np.uint64(16)) | cols.dport[scan_mask].astype(np.uint64))
+    port_counts_by_src = dict(zip(*(part.tolist() for part in np.unique(pairs >> np.uint64(16), return_counts=True))))
+    source_port_counts = [
+        (int_to_ipv4(src), port_counts_by_src[src])
+        for src in ordered_counter(scan_src)
+    ]
+
+    sizes = cols.length[ipv4]
+    return {
+        "total_packets": len(cols),
+        "icmp_count": int((proto == 1).sum()),
+        "source_port_counts": source_port_counts,
+        "ip_packet_count": ordered_counter(cols.src[ipv4], int_to_ipv4),
+        "port_counts": ordered_counter(cols.dport[tcp_or_udp]),
+        "size_count": len(sizes),
+        "size_sum": int(sizes.sum(dtype=np.int64)),
+        "count_larger_than": lambda threshold: int((sizes > threshold).sum()),
+        "failed_count": int((ipv4 & (proto == 6) & ((cols.flags & 0x04) != 0)).sum())
+    }
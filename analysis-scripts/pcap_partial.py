@@ -0,0 +1,113 @@
+"""
+PCAP中间结果文件 - 可合并的累加器状态
+
+分析段的累加器状态（计数器、时间线逐包列、连接表、HTTP会话载荷等）以带版本号的
+gzip压缩JSON保存。不同机器上分别分析的抓包可以各自输出中间结果，最后用
+analyze_pcap.py --merge 合并为与整体分析一致的结果JSON。
+
+计数器保存为 [键, 计数] 列表以保留插入顺序（决定 most_common 的并列排序），
+数组保存为小端字节的base64，载荷保存为base64。
+
+检查点文件使用同样的状态格式，另外记录已扫描到的文件偏移和文件指纹：追加写入中的
+抓包下次只需从该偏移继续扫描新增的记录。
+"""
+
+import os
+import sys
+import gzip
+import hashlib
+import json
+import base64
+from array import array
+from collections import Counter
+
+PARTIAL_FORMAT = "netinsight-pcap-partial"
+PARTIAL_VERSION = 9
+CHECKPOINT_FORMAT = "netinsight-pcap-checkpoint"
+CHECKPOINT_VERSION = 1
+FINGERPRINT_BYTES = 64 * 1024
+
+def encode_counter(counter):
+    return [[key, count] for key, count in counter.items()]
+
+def decode_counter(pairs):
+    return Counter({key: count for key, count in pairs})
+
+def encode_bytes(data):
+    return base64.b64encode(data).decode('ascii')
+
+def decode_bytes(text):
+    return base64.b64decode(text)
+
+def encode_array(values):
+    if sys.byteorder == 'big':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return {"type": values.typecode, "data": encode_bytes(values.tobytes())}
+
+def decode_array(state):
+    values = array(state["type"])
+    values.frombytes(decode_bytes(state["data"]))
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values
+
+def write_partial(path, sections, source=None, config=None):
+    """写入中间结果文件，sections 为 分析段名 -> 累加器状态，config 为分析时的配置"""
+    document = {
+        "format": PARTIAL_FORMAT,
+        "version": PARTIAL_VERSION,
+        "source": source,
+        "config": config,
+        "sections": sections
+    }
+    with gzip.open(path, 'wt', encoding='utf-8') as f:
+        json.dump(document, f, ensure_ascii=False)
+
+def read_partial(path):
+    """读取并校验中间结果文件，返回 (分析段名 -> 累加器状态, 分析时的配置)"""
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            document = json.load(f)
+    except (OSError, ValueError):
+        raise Exception(f"无法读取中间结果文件: {path}")
+
+    if not isinstance(document, dict) or document.get("format") != PARTIAL_FORMAT:
+        raise Exception(f"不是PCAP中间结果文件: {path}")
+    if document.get("version") != PARTIAL_VERSION:
+        raise Exception(f"不支持的中间结果版本: {document.get('version')}")
+    return document["sections"], document.get("config") or {}
+
+def capture_fingerprint(file_path, end):
+    """抓包文件前 end 字节的指纹（开头和结尾各 FINGERPRINT_BYTES 字节的SHA-256），用于确认文件只是被追加"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        digest.update(f.read(min(end, FINGERPRINT_BYTES)))
+        tail = max(end - FINGERPRINT_BYTES, FINGERPRINT_BYTES)
+        if tail < end:
+            f.seek(tail)
+            digest.update(f.read(end - tail))
+    return digest.hexdigest()
+
+def write_checkpoint(path, checkpoint):
+    """写入检查点文件：先写临时文件再改名，中途失败时旧检查点保持完整"""
+    document = dict(checkpoint, format=CHECKPOINT_FORMAT, version=CHECKPOINT_VERSION)
+    temp_path = f"{path}.tmp"
+    # 每次增量分析都要重写检查点：一次性编码，低压缩级别
+    data = json.dumps(document, ensure_ascii=False).encode('utf-8')
+    with gzip.open(temp_path, 'wb', compresslevel=1) as f:
+        f.write(data)
+    os.replace(temp_path, path)
+
+def read_checkpoint(path):
+    """读取检查点文件；文件不存在、无法读取或格式版本不符时返回None（从头扫描）"""
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            document = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if (not isinstance(document, dict) or document.get("format") != CHECKPOINT_FORMAT
+            or document.get("version") != CHECKPOINT_VERSION):
+        return None
+    return document
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+分析结果缓存 - 按文件内容寻址的SQLite缓存
+
+缓存键由 (文件内容SHA-256, 规范化配置, 分析器版本) 决定：同一份抓包/HAR重复上传
+时直接返回保存的结果JSON。分析器版本包含分析代码各模块源文件的哈希，代码改动后
+旧结果自动失效，并在下次写入时清除。缓存总大小超过上限时按最近使用时间淘汰。
+
+文件哈希按 (路径, 大小, 修改时间) 记忆，未变化的文件不必重新读取。
+
+在分析配置中启用：
+  "cache": true                                   默认位置，默认上限512MB
+  "cache": {"path": "/data/cache.sqlite", "max_mb": 1024}
+
+用法：
+  result_cache.py stats [缓存文件]   查看缓存条目数和大小
+  result_cache.py clear [缓存文件]   清空缓存
+"""
+
+import os
+import sys
+import json
+import time
+import zlib
+import sqlite3
+import hashlib
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "netinsight", "results.sqlite")
+DEFAULT_MAX_MB = 512
+HASH_CHUNK_BYTES = 1024 * 1024
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    analyzer TEXT NOT NULL,
+    version TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    last_used REAL NOT NULL,
+    data BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_last_used ON results (last_used);
+CREATE TABLE IF NOT EXISTS file_hashes (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    digest TEXT NOT NULL
+);
+"""
+
+class ResultCache:
+    """SQLite结果缓存，多个进程可以共用同一个缓存文件"""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_MAX_MB * 1024 * 1024):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.db = sqlite3.connect(path, timeout=10)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript(_SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def file_digest(self, file_path):
+        """文件内容的SHA-256；大小和修改时间未变时使用记忆的结果"""
+        stat = os.stat(file_path)
+        path = os.path.abspath(file_path)
+        row = self.db.execute(
+            "SELECT digest FROM file_hashes WHERE path = ? AND size = ? AND mtime_ns = ?",
+            (path, stat.st_size, stat.st_mtime_ns)).fetchone()
+        if row:
+            return row[0]
+
+        digest = hash_file(file_path)
+        with self.db:
+            self.db.execute("INSERT OR REPLACE INTO file_hashes VALUES (?, ?, ?, ?)",
+                            (path, stat.st_size, stat.st_mtime_ns, digest))
+        return digest
+
+    def get(self, key):
+        row = self.db.execute("SELECT data FROM results WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        with self.db:
+            self.db.execute("UPDATE results SET last_used = ? WHERE key = ?", (time.time(), key))
+        return json.loads(zlib.decompress(row[0]).decode('utf-8'))
+
+    def put(self, key, analyzer, version, result):
+        data = zlib.compress(json.dumps(result, ensure_ascii=False).encode('utf-8'))
+        now = time.time()
+        with self.db:
+            # 分析代码已变化：同一分析器的旧版本结果全部失效
+            self.db.execute("DELETE FROM results WHERE analyzer = ? AND version != ?", (analyzer, version))
+            self.db.execute("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?)",
+                            (key, analyzer, version, len(data), now, now, data))
+            self.evict()
+
+    def evict(self):
+        """按最近使用时间淘汰，直到总大小不超过上限"""
+        total = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        expired = []
+        for key, size in self.db.execute("SELECT key, size FROM results ORDER BY last_used"):
+            if total <= self.max_bytes:
+                break
+            expired.append((key,))
+            total -= size
+        self.db.executemany("DELETE FROM results WHERE key = ?", expired)
+
+    def clear(self):
+        with self.db:
+            self.db.execute("DELETE FROM results")
+            self.db.execute("DELETE FROM file_hashes")
+
+    def stats(self):
+        count, size = self.db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM results").fetchone()
+        return {"entries": count, "bytes": size, "maxBytes": self.max_bytes}
+
+def hash_file(file_path):
+    """流式计算文件内容的SHA-256"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def analyzer_version(source_names):
+    """分析器版本：分析脚本目录下各源文件内容的哈希，代码改动后随之变化"""
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    digest = hashlib.sha256()
+    for name in source_names:
+        with open(os.path.join(script_dir, name), 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()[:16]
+
+def cache_settings(config):
+    """cache 配置：true 或 {"path", "max_mb"}；未启用时返回None"""
+    option = config.get("cache")
+    if not option:
+        return None
+    if option is True:
+        option = {}
+    if not isinstance(option, dict):
+        raise Exception(f"无效的cache配置: {option}")
+    return (option.get("path") or DEFAULT_CACHE_PATH,
+            int(float(option.get("max_mb", DEFAULT_MAX_MB)) * 1024 * 1024))
+
+def cached_analysis(analyzer, version, file_path, config, compute, neutral_keys=()):
+    """带缓存执行 compute()；neutral_keys 为不影响结果的配置项（并行度等），不参与缓存键"""
+    settings = cache_settings(config)
+    if settings is None:
+        return compute()
+
+    try:
+        cache = ResultCache(*settings)
+    except (OSError, sqlite3.Error):
+        # 缓存不可用时照常分析
+        return compute()
+    try:
+        normalized = {
+            name: value for name, value in config.items()
+            if name != "cache" and name not in neutral_keys
+        }
+        try:
+            key = hashlib.sha256("\n".join([
+                analyzer, version, cache.file_digest(file_path),
+                json.dumps(normalized, sort_keys=True, ensure_ascii=False)
+            ]).encode('utf-8')).hexdigest()
+            result = cache.get(key)
+        except sqlite3.Error:
+            return compute()
+        if result is not None:
+            return result
+
+        result = compute()
+        try:
+            cache.put(key, analyzer, version, result)
+        except sqlite3.Error:
+            pass
+        return result
+    finally:
+        cache.close()
+
+def main():
+    args = sys.argv[1:]
+    if not (1 <= len(args) <= 2 and args[0] in ("stats", "clear")):
+        print(json.dumps({"error": {"message": "参数错误"}}))
+        sys.exit(1)
+
+    try:
+        cache = ResultCache(args[1] if len(args) > 1 else DEFAULT_CACHE_PATH)
+        if args[0] == "clear":
+            cache.clear()
+        print(json.dumps(cache.stats(), ensure_ascii=False))
+        cache.close()
+    except Exception as e:
+        print(json.dumps({"error": {"message": str(e)}}))
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+扫描进度 - 流式分析（--stream）中的进度事件
+
+PCAP和HAR的流式分析用同样的节奏和字段输出进度：每隔 PROGRESS_CHECK_PACKETS 条记录
+检查一次时间，距上次输出超过 PROGRESS_INTERVAL 秒时输出一个进度事件：
+  {"type": "progress", "stage": 1, "stages": 1, "bytesRead": ..., "totalBytes": ...,
+   "packets": ..., "packetsPerSecond": ..., "etaSeconds": ...}
+packets 为已处理的记录数（PCAP为数据包，HAR为请求记录）。
+"""
+
+import time
+
+# 进度事件的最小间隔（秒），每隔多少条记录检查一次时间
+PROGRESS_INTERVAL = 0.5
+PROGRESS_CHECK_PACKETS = 4096
+
+class ScanProgress:
+    """扫描进度：每隔 PROGRESS_INTERVAL 秒输出一次已读字节、记录速率和预计剩余时间"""
+    
+    def __init__(self, emit, total_bytes, stage=1, stages=1):
+        self.emit = emit
+        self.total_bytes = total_bytes
+        self.stage = stage
+        self.stages = stages
+        self.packets = 0
+        self.bytes_read = 0
+        self.started = time.monotonic()
+        self.last_report = self.started
+    
+    def track(self, records):
+        """透传PCAP记录，每 PROGRESS_CHECK_PACKETS 个包检查一次是否该输出进度"""
+        packets = captured_bytes = 0
+        for rec in records:
+            packets += 1
+            captured_bytes += rec.length
+            if packets % PROGRESS_CHECK_PACKETS == 0:
+                # 按经典pcap每条记录16字节的记录头估算文件中的位置
+                self.update(packets, min(captured_bytes + packets * 16, self.total_bytes))
+            yield rec
+        self.update(packets, self.total_bytes, final=True)
+    
+    def track_positions(self, items):
+        """透传 (记录, 已读到的文件位置) 中的记录，检查节奏与 track 相同"""
+        count = 0
+        for item, position in items:
+            count += 1
+            if count % PROGRESS_CHECK_PACKETS == 0:
+                self.update(count, min(position, self.total_bytes))
+            yield item
+        self.update(count, self.total_bytes, final=True)
+    
+    def update(self, packets, bytes_read, final=False):
+        self.packets = packets
+        self.bytes_read = bytes_read
+        if not final and time.monotonic() - self.last_report >= PROGRESS_INTERVAL:
+            self.report()
+    
+    def report(self):
+        now = time.monotonic()
+        self.last_report = now
+        elapsed = now - self.started
+        byte_rate = self.bytes_read / elapsed if elapsed > 0 else 0
+        self.emit({
+            "type": "progress",
+            "stage": self.stage,
+            "stages": self.stages,
+            "bytesRead": self.bytes_read,
+            "totalBytes": self.total_bytes,
+            "packets": self.packets,
+            "packetsPerSecond": self.packets / elapsed if elapsed > 0 else 0,
+            "etaSeconds": (self.total_bytes - self.bytes_read) / byte_rate if byte_rate > 0 else None
+        })
@@ -0,0 +1,540 @@
+"""
+概要数据结构 - 内存有界的近似统计
+
+Space-Saving 跟踪出现最多的键（Top-K）：最多保存 capacity 个计数器，新键替换计数
+最小的计数器并继承其计数，因此每个计数都是上界，高估量不超过被替换时的最小计数
+（总量/capacity）。计数不小于该上界的键一定在摘要中。
+
+Count-Min 估计任意键的累计值（如每个IP的字节数）：depth 行、每行 width 个计数器，
+取各行中的最小值。估计值只会偏高，以 1-e^-depth 的概率高估不超过 e/width × 总量。
+
+HyperLogLog 估计不同键的数量：2^precision 个1字节寄存器，相对标准误差约
+1.04/sqrt(2^precision)，内存与键的数量无关。
+
+DistinctValues 统计不同值的数量并保留先出现的值作为样本：不超过 limit 个时精确，
+超过后改用HyperLogLog计数，样本不再增加。
+
+DistinctPorts 统计每个源IP访问过的不同端口数（端口扫描检测）：单个端口存为整数，
+少量端口用集合，超过 set_limit 后升级为65536位位图（8KB），位图数量达到上限后
+改用HyperLogLog（1KB），单个源IP的内存有上限，总内存可预估。
+
+DDSketch 估计分位数（响应时间等）：值按 gamma=(1+α)/(1-α) 的幂对数分桶，
+任意分位数的相对误差不超过 α，桶数只与值的范围有关，超过上限时合并最小的桶。
+取值有界的整数（如包长度）直接用直方图计算精确分位数（histogram_percentiles）。
+
+这些结构都可以合并（分片并行、中间结果合并），状态可以保存为JSON。哈希使用
+BLAKE2b，不受 PYTHONHASHSEED 影响，不同进程得到的草图可以直接合并。
+"""
+
+import math
+import heapq
+from hashlib import blake2b
+from array import array
+
+from pcap_partial import encode_array, decode_array, encode_bytes, decode_bytes
+
+PORT_SET_LIMIT = 64  # 超过这么多个不同端口后升级为位图
+PORT_BITMAP_BYTES = 65536 // 8
+PORT_HLL_PRECISION = 10
+# 报告的分位数：(结果中的名称, 分位)
+PERCENTILES = (("p50", 0.5), ("p90", 0.9), ("p99", 0.99), ("p99.9", 0.999))
+
+def hash64(key):
+    """键（字符串或整数）的64位哈希，与进程无关"""
+    data = key.encode('utf-8') if isinstance(key, str) else key.to_bytes(8, 'little')
+    return int.from_bytes(blake2b(data, digest_size=8).digest(), 'little')
+
+class SpaceSaving:
+    """Space-Saving Top-K 计数（键为字符串或整数，同一摘要中类型一致）"""
+
+    def __init__(self, capacity):
+        self.capacity = max(1, int(capacity))
+        self.counts = {}  # 键 -> 计数（上界）
+        self.errors = {}  # 键 -> 最大高估量
+        self.heap = []  # (计数, 键) 最小堆，计数可能已过时（只会偏小）
+        self.total = 0
+
+    def add(self, key, weight=1):
+        self.total += weight
+        counts = self.counts
+        count = counts.get(key)
+        if count is not None:
+            counts[key] = count + weight
+            return
+        if len(counts) < self.capacity:
+            counts[key] = weight
+            self.errors[key] = 0
+            heapq.heappush(self.heap, (weight, key))
+            return
+
+        # 替换当前计数最小的键：先把堆顶过时的计数更新为当前值
+        heap = self.heap
+        while True:
+            floor, victim = heap[0]
+            current = counts[victim]
+            if current == floor:
+                break
+            heapq.heapreplace(heap, (current, victim))
+        del counts[victim]
+        del self.errors[victim]
+        counts[key] = floor + weight
+        self.errors[key] = floor
+        heapq.heapreplace(heap, (floor + weight, key))
+
+    def floor(self):
+        """未被跟踪的键的计数上界：摘要已满时为最小计数，否则为0（计数精确）"""
+        if len(self.counts) < self.capacity:
+            return 0
+        return min(self.counts.values())
+
+    def top(self, n):
+        """计数最大的n个 (键, 计数, 最大高估量)，计数相同时按进入摘要的顺序"""
+        errors = self.errors
+        return [
+            (key, count, errors[key])
+            for key, count in heapq.nlargest(n, self.counts.items(), key=lambda item: item[1])
+        ]
+
+    def error_bound(self, n):
+        """前n项计数的最大高估量"""
+        return max([self.floor()] + [error for _, _, error in self.top(n)])
+
+    def merge(self, other):
+        """合并另一个摘要：一方没有跟踪的键按该方的最小计数补上，再保留计数最大的 capacity 个"""
+        floor, other_floor = self.floor(), other.floor()
+        merged = []
+        for key, count in self.counts.items():
+            other_count = other.counts.get(key)
+            if other_count is None:
+                merged.append((key, count + other_floor, self.errors[key] + other_floor))
+            else:
+                merged.append((key, count + other_count, self.errors[key] + other.errors[key]))
+        for key, count in other.counts.items():
+            if key not in self.counts:
+                merged.append((key, count + floor, other.errors[key] + floor))
+
+        kept = heapq.nlargest(self.capacity, merged, key=lambda item: item[1])
+        self.load_items(kept)
+        self.total += other.total
+
+    def load_items(self, items):
+        self.counts = {key: count for key, count, _ in items}
+        self.errors = {key: error for key, _, error in items}
+        self.heap = [(count, key) for key, count, _ in items]
+        heapq.heapify(self.heap)
+
+    def dump_state(self):
+        return {
+            "capacity": self.capacity,
+            "total": self.total,
+            "items": [[key, count, self.errors[key]] for key, count in self.counts.items()]
+        }
+
+    def load_state(self, state):
+        self.capacity = state["capacity"]
+        self.total = state["total"]
+        self.load_items([tuple(item) for item in state["items"]])
+
+class CountMinSketch:
+    """Count-Min 计数草图（键为字符串）"""
+
+    def __init__(self, width, depth):
+        self.width = max(1, int(width))
+        self.depth = max(1, int(depth))
+        self.table = array('Q', bytes(8 * self.width * self.depth))
+        self.total = 0
+
+    def cells(self, key):
+        """键在每一行中的计数器下标（双重哈希）"""
+        digest = hash64(key)
+        h1 = digest & 0xFFFFFFFF
+        h2 = digest >> 32 | 1
+        width = self.width
+        return [row * width + (h1 + row * h2) % width for row in range(self.depth)]
+
+    def add(self, key, weight=1):
+        self.add_hashed(hash64(key), weight)
+
+    def add_hashed(self, digest, weight=1):
+        """按 hash64(键) 累加，同一个键要加入多个草图时只需计算一次哈希"""
+        self.total += weight
+        h1 = digest & 0xFFFFFFFF
+        h2 = digest >> 32 | 1
+        width = self.width
+        table = self.table
+        for offset in range(0, width * self.depth, width):
+            table[offset + h1 % width] += weight
+            h1 += h2
+
+    def estimate(self, key):
+        table = self.table
+        return min(table[cell] for cell in self.cells(key))
+
+    def error_bound(self):
+        """以 confidence() 的概率成立的高估上界"""
+        return math.ceil(math.e / self.width * self.total)
+
+    def confidence(self):
+        return 1 - math.exp(-self.depth)
+
+    def merge(self, other):
+        if (other.width, other.depth) != (self.width, self.depth):
+            raise Exception("Count-Min草图的尺寸不同，无法合并")
+        table = self.table
+        for index, value in enumerate(other.table):
+            if value:
+                table[index] += value
+        self.total += other.total
+
+    def dump_state(self):
+        return {
+            "width": self.width,
+            "depth": self.depth,
+            "total": self.total,
+            "table": encode_array(self.table)
+        }
+
+    def load_state(self, state):
+        self.width = state["width"]
+        self.depth = state["depth"]
+        self.total = state["total"]
+        self.table = decode_array(state["table"])
+
+class HyperLogLog:
+    """HyperLogLog 基数估计（键为字符串或整数）"""
+
+    def __init__(self, precision=14):
+        self.precision = max(4, min(int(precision), 18))
+        self.registers = bytearray(1 << self.precision)
+
+    def add(self, key):
+        self.add_hashed(hash64(key))
+
+    def add_hashed(self, digest):
+        precision = self.precision
+        index = digest >> (64 - precision)
+        # 剩余位中第一个1的位置（从1开始）
+        rank = 65 - precision - (digest & ((1 << (64 - precision)) - 1)).bit_length()
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def estimate(self):
+        registers = self.registers
+        m = len(registers)
+        alpha = {16: 0.673, 32: 0.697, 64: 0.709}.get(m, 0.7213 / (1 + 1.079 / m))
+        inverse_sum = sum(registers.count(rank) * 2.0 ** -rank for rank in set(registers))
+        estimate = alpha * m * m / inverse_sum
+        zeros = registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # 小基数：线性计数更准确
+            estimate = m * math.log(m / zeros)
+        return estimate
+
+    def relative_error(self):
+        return 1.04 / math.sqrt(len(self.registers))
+
+    def merge(self, other):
+        if other.precision != self.precision:
+            raise Exception("HyperLogLog的精度不同，无法合并")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def dump_state(self):
+        return {"precision": self.precision, "registers": encode_bytes(self.registers)}
+
+    def load_state(self, state):
+        self.precision = state["precision"]
+        self.registers = bytearray(decode_bytes(state["registers"]))
+
+class DistinctValues:
+    """不同值的数量：不超过 limit 个时用有序集合（精确，按首次出现顺序），超过后升级为HyperLogLog
+    
+    升级后保留已有的 limit 个值作为样本；计数不低于 limit+1。
+    """
+
+    def __init__(self, limit, precision=12):
+        self.limit = limit
+        self.precision = precision
+        self.values = {}  # 值 -> None，按首次出现顺序
+        self.hll = None
+
+    def add(self, value):
+        if self.hll is not None:
+            self.hll.add(value)
+        elif value not in self.values:
+            self.values[value] = None
+            if len(self.values) > self.limit:
+                self.escalate()
+
+    def escalate(self):
+        self.hll = HyperLogLog(self.precision)
+        for value in self.values:
+            self.hll.add(value)
+        self.values = dict.fromkeys(list(self.values)[:self.limit])
+
+    def count(self):
+        if self.hll is None:
+            return len(self.values)
+        return max(self.limit + 1, round(self.hll.estimate()))
+
+    def sample(self, n):
+        """最先出现的n个值"""
+        return list(self.values)[:n]
+
+    def merge(self, other):
+        if other.hll is None and self.hll is None:
+            for value in other.values:
+                self.add(value)
+            return
+        # 任一方已升级：对方的样本补足本方样本，计数合并到HyperLogLog
+        if self.hll is None:
+            self.escalate()
+        values = self.values
+        for value in other.values:
+            if len(values) >= self.limit:
+                break
+            values.setdefault(value)
+        if other.hll is not None:
+            self.hll.merge(other.hll)
+        for value in other.values:
+            self.hll.add(value)
+
+    def dump_state(self):
+        return {
+            "values": list(self.values),
+            "hll": None if self.hll is None else self.hll.dump_state()
+        }
+
+    def load_state(self, state):
+        self.values = dict.fromkeys(state["values"])
+        if state["hll"] is None:
+            self.hll = None
+        else:
+            self.hll = HyperLogLog(self.precision)
+            self.hll.load_state(state["hll"])
+
+class DistinctPorts:
+    """每个键（源IP）访问过的不同端口数，按需升级表示方式
+    
+    一个端口存为整数；少量端口用集合（精确）；超过 set_limit 个后升级为位图（精确）；
+    位图已有 max_bitmaps 个时改用HyperLogLog。集合阶段是精确的，因此不同端口数是否
+    超过不大于 set_limit 的阈值总能精确判断；HyperLogLog的计数不低于 set_limit+1。
+    """
+
+    def __init__(self, set_limit=PORT_SET_LIMIT, max_bitmaps=1024):
+        self.set_limit = set_limit
+        self.max_bitmaps = max_bitmaps
+        self.keys = {}  # 键 -> 整数 | 集合 | 位图(bytearray) | HyperLogLog，按首次出现顺序
+        self.bitmaps = 0
+
+    def add(self, key, port):
+        keys = self.keys
+        value = keys.get(key)
+        if value is None:
+            keys[key] = port
+        elif value.__class__ is int:
+            if value != port:
+                keys[key] = {value, port}
+        elif value.__class__ is set:
+            value.add(port)
+            if len(value) > self.set_limit:
+                keys[key] = self.escalate(value)
+        elif value.__class__ is bytearray:
+            value[port >> 3] |= 1 << (port & 7)
+        else:
+            value.add(port)
+
+    def escalate(self, ports):
+        """集合升级为位图，位图数量已满时升级为HyperLogLog"""
+        if self.bitmaps < self.max_bitmaps:
+            self.bitmaps += 1
+            bitmap = bytearray(PORT_BITMAP_BYTES)
+            for port in ports:
+                bitmap[port >> 3] |= 1 << (port & 7)
+            return bitmap
+        sketch = HyperLogLog(PORT_HLL_PRECISION)
+        for port in ports:
+            sketch.add(port)
+        return sketch
+
+    def count(self, value):
+        if value.__class__ is int:
+            return 1
+        if value.__class__ is set:
+            return len(value)
+        if value.__class__ is bytearray:
+            return bin(int.from_bytes(value, 'little')).count('1')
+        return max(round(value.estimate()), self.set_limit + 1)
+
+    def counts(self):
+        """按键首次出现的顺序产出 (键, 不同端口数)"""
+        for key, value in self.keys.items():
+            yield key, self.count(value)
+
+    def merge(self, other):
+        keys = self.keys
+        for key, value in other.keys.items():
+            if isinstance(value, HyperLogLog):
+                mine = keys.get(key)
+                if not isinstance(mine, HyperLogLog):
+                    if mine.__class__ is bytearray:
+                        self.bitmaps -= 1
+                    sketch = HyperLogLog(PORT_HLL_PRECISION)
+                    for port in ports_of(mine):
+                        sketch.add(port)
+                    keys[key] = mine = sketch
+                mine.merge(value)
+            else:
+                for port in ports_of(value):
+                    self.add(key, port)
+
+    def dump_state(self):
+        items = []
+        for key, value in self.keys.items():
+            if value.__class__ is int:
+                items.append([key, "port", value])
+            elif value.__class__ is set:
+                items.append([key, "set", sorted(value)])
+            elif value.__class__ is bytearray:
+                items.append([key, "bitmap", encode_bytes(value)])
+            else:
+                items.append([key, "hll", value.dump_state()])
+        return {"set_limit": self.set_limit, "max_bitmaps": self.max_bitmaps, "items": items}
+
+    def load_state(self, state):
+        self.set_limit = state["set_limit"]
+        self.max_bitmaps = state["max_bitmaps"]
+        self.keys = {}
+        self.bitmaps = 0
+        for key, kind, data in state["items"]:
+            if kind == "port":
+                value = data
+            elif kind == "set":
+                value = set(data)
+            elif kind == "bitmap":
+                value = bytearray(decode_bytes(data))
+                self.bitmaps += 1
+            else:
+                value = HyperLogLog(PORT_HLL_PRECISION)
+                value.load_state(data)
+            self.keys[key] = value
+
+class DDSketch:
+    """DDSketch 分位数草图（非负值，负值按0计），同时精确记录数量、总和、最小值和最大值"""
+
+    def __init__(self, relative_accuracy=0.01, max_buckets=2048):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.max_buckets = max_buckets
+        self.buckets = {}  # 桶编号 -> 计数，桶i覆盖 (gamma^(i-1), gamma^i]
+        self.zeros = 0
+        self.count = 0
+        self.sum = 0
+        self.min = None
+        self.max = None
+
+    def add(self, value):
+        self.count += 1
+        self.sum += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+        if value <= 0:
+            self.zeros += 1
+            return
+        index = math.ceil(math.log(value) / self.log_gamma)
+        buckets = self.buckets
+        count = buckets.get(index)
+        if count is None:
+            buckets[index] = 1
+            if len(buckets) > self.max_buckets:
+                self.collapse()
+        else:
+            buckets[index] = count + 1
+
+    def collapse(self):
+        """桶数超过上限：最小的两个桶合并（只影响最低的分位数）"""
+        buckets = self.buckets
+        while len(buckets) > self.max_buckets:
+            lowest = min(buckets)
+            count = buckets.pop(lowest)
+            buckets[min(buckets)] += count
+
+    def quantile(self, q):
+        """第q分位数（最近秩），没有数据时为None"""
+        if not self.count:
+            return None
+        rank = max(1, math.ceil(q * self.count))
+        if rank <= self.zeros:
+            return max(self.min, 0)
+        seen = self.zeros
+        gamma = self.gamma
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen >= rank:
+                value = 2 * gamma ** index / (gamma + 1)
+                return min(max(value, self.min), self.max)
+        return self.max
+
+    def percentiles(self):
+        return {name: self.quantile(q) for name, q in PERCENTILES}
+
+    def merge(self, other):
+        if other.relative_accuracy != self.relative_accuracy:
+            raise Exception("DDSketch的精度不同，无法合并")
+        buckets = self.buckets
+        for index, count in other.buckets.items():
+            buckets[index] = buckets.get(index, 0) + count
+        self.zeros += other.zeros
+        self.count += other.count
+        self.sum += other.sum
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+            self.max = other.max if self.max is None else max(self.max, other.max)
+        if len(buckets) > self.max_buckets:
+            self.collapse()
+
+    def dump_state(self):
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "max_buckets": self.max_buckets,
+            "buckets": [[index, count] for index, count in self.buckets.items()],
+            "counts": [self.zeros, self.count, self.sum, self.min, self.max]
+        }
+
+    def load_state(self, state):
+        self.__init__(state["relative_accuracy"], state["max_buckets"])
+        self.buckets = {index: count for index, count in state["buckets"]}
+        self.zeros, self.count, self.sum, self.min, self.max = state["counts"]
+
+def histogram_percentiles(histogram):
+    """直方图（值 -> 次数）的精确分位数（最近秩），没有数据时各分位数为None"""
+    total = sum(histogram.values())
+    if not total:
+        return {name: None for name, _ in PERCENTILES}
+    values = sorted(histogram)
+    results = {}
+    position = 0
+    seen = histogram[values[0]]
+    for name, q in PERCENTILES:
+        rank = max(1, math.ceil(q * total))
+        while seen < rank:
+            position += 1
+            seen += histogram[values[position]]
+        results[name] = values[position]
+    return results
+
+def ports_of(value):
+    """整数、集合或位图中的全部端口（None 表示没有端口）"""
+    if value is None:
+        return ()
+    if value.__class__ is int:
+        return (value,)
+    if value.__class__ is set:
+        return value
+    return [
+        index * 8 + bit
+        for index, byte in enumerate(value) if byte
+        for bit in range(8) if byte >> bit & 1
+    ]
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+合成流量生成 - 生成可复现的PCAP和HAR测试文件（用于基准测试）
+
+相同的种子和规模总是生成逐字节相同的文件。PCAP为以太网链路的经典pcap格式，
+混合四类流量（按包数占比）：
+
+  HTTP     完整的TCP会话：三次握手、GET/POST请求、200/404响应、四次挥手
+  DNS      UDP 53 的A记录查询和应答
+  端口扫描 少数扫描源对同一主机连续端口发送SYN，目标回RST
+  DDoS     大量随机源IP对同一目标发送SYN洪泛
+
+HAR为1.2格式，请求分属若干页面，包含完整的时间分段（timings）和小的响应体。
+数据包直接用 struct 打包，不依赖Scapy。
+
+用法：
+  synthetic_traffic.py pcap <输出文件> <包数> [种子]
+  synthetic_traffic.py har <输出文件> <请求数> [种子]
+"""
+
+import os
+import sys
+import json
+import random
+import struct
+from datetime import datetime, timezone
+
+# 生成算法的版本，改动生成逻辑时递增（基准测试按它区分缓存的文件）
+GENERATOR_VERSION = 1
+
+DEFAULT_SEED = 1
+
+# 各类流量的包数占比
+TRAFFIC_MIX = (("http", 0.5), ("dns", 0.25), ("scan", 0.1), ("ddos", 0.15))
+
+START_TIME = 1700000000.0
+WRITE_BATCH = 10000
+
+_PCAP_HEADER = struct.pack('<IHHiIII', 0xA1B2C3D4, 2, 4, 0, 0, 65535, 1)
+_ETH_IPV4 = b'\x00\x11\x22\x33\x44\x55\x66\x77\x88\x99\xaa\xbb\x08\x00'
+
+TCP_FIN = 0x01
+TCP_SYN = 0x02
+TCP_RST = 0x04
+TCP_PSH = 0x08
+TCP_ACK = 0x10
+
+HTTP_HOSTS = tuple(f"www.site{index}.com" for index in range(20))
+HTTP_PATHS = ("/", "/index.html", "/api/items", "/api/login", "/static/app.js", "/img/logo.png")
+DNS_NAMES = tuple(f"svc{index}.example.net" for index in range(50))
+
+def ipv4(value):
+    return struct.pack('!I', value)
+
+def ip_packet(src, dst, proto, payload, ident):
+    header = struct.pack('!BBHHHBBH4s4s', 0x45, 0, 20 + len(payload), ident & 0xFFFF, 0, 64, proto, 0, src, dst)
+    return _ETH_IPV4 + header + payload
+
+def tcp_packet(src, dst, sport, dport, seq, ack, flags, payload=b'', ident=0):
+    segment = struct.pack('!HHIIBBHHH', sport, dport, seq & 0xFFFFFFFF, ack & 0xFFFFFFFF, 0x50, flags, 65535, 0, 0)
+    return ip_packet(src, dst, 6, segment + payload, ident)
+
+def udp_packet(src, dst, sport, dport, payload, ident=0):
+    return ip_packet(src, dst, 17, struct.pack('!HHHH', sport, dport, 8 + len(payload), 0) + payload, ident)
+
+def dns_question(name):
+    labels = b''.join(bytes([len(label)]) + label.encode() for label in name.split('.'))
+    return labels + b'\x00' + struct.pack('!HH', 1, 1)
+
+class PcapGenerator:
+    """按种子生成数据包序列，每个包为 (时间戳, 帧字节)"""
+
+    def __init__(self, seed):
+        self.rand = random.Random(seed)
+        self.ts = START_TIME
+        self.ident = 0
+        self.scan_port = 1
+
+    def tick(self, mean):
+        self.ts += self.rand.expovariate(1 / mean)
+        self.ident += 1
+        return self.ts
+
+    def http_session(self):
+        rand = self.rand
+        client = ipv4(0x0A000000 | rand.randrange(1, 4096))
+        server = ipv4(0x5DB8D800 | rand.randrange(1, 64))
+        sport = rand.randrange(1024, 65535)
+        host = rand.choice(HTTP_HOSTS)
+        method = "POST" if rand.random() < 0.2 else "GET"
+        status = b"404 Not Found" if rand.random() < 0.05 else b"200 OK"
+        request = (f"{method} {rand.choice(HTTP_PATHS)}?id={rand.randrange(100000)} HTTP/1.1\r\n"
+                   f"Host: {host}\r\nUser-Agent: netinsight-bench\r\nAccept: */*\r\n\r\n").encode()
+        body = b"x" * rand.randrange(100, 1200)
+        response = (b"HTTP/1.1 " + status + b"\r\nContent-Type: text/html\r\nContent-Length: "
+                    + str(len(body)).encode() + b"\r\n\r\n" + body)
+        cseq = rand.getrandbits(32)
+        sseq = rand.getrandbits(32)
+        rtt = rand.uniform(0.005, 0.08)
+        packets = [
+            (client, server, sport, 80, cseq, 0, TCP_SYN, b''),
+            (server, client, 80, sport, sseq, cseq + 1, TCP_SYN | TCP_ACK, b''),
+            (client, server, sport, 80, cseq + 1, sseq + 1, TCP_ACK, b''),
+            (client, server, sport, 80, cseq + 1, sseq + 1, TCP_PSH | TCP_ACK, request),
+            (server, client, 80, sport, sseq + 1, cseq + 1 + len(request), TCP_PSH | TCP_ACK, response),
+            (client, server, sport, 80, cseq + 1 + len(request), sseq + 1 + len(response), TCP_ACK, b''),
+            (client, server, sport, 80, cseq + 1 + len(request), sseq + 1 + len(response), TCP_FIN | TCP_ACK, b''),
+            (server, client, 80, sport, sseq + 1 + len(response), cseq + 2 + len(request), TCP_FIN | TCP_ACK, b''),
+            (client, server, sport, 80, cseq + 2 + len(request), sseq + 2 + len(response), TCP_ACK, b'')
+        ]
+        for src, dst, sp, dp, seq, ack, flags, payload in packets:
+            yield self.tick(rtt / 2), tcp_packet(src, dst, sp, dp, seq, ack, flags, payload, self.ident)
+
+    def dns_exchange(self):
+        rand = self.rand
+        client = ipv4(0x0A000000 | rand.randrange(1, 4096))
+        resolver = ipv4(0x08080808)
+        sport = rand.randrange(1024, 65535)
+        query_id = rand.randrange(65536)
+        question = dns_question(rand.choice(DNS_NAMES))
+        query = struct.pack('!HHHHHH', query_id, 0x0100, 1, 0, 0, 0) + question
+        answer = (struct.pack('!HHHHHH', query_id, 0x8180, 1, 1, 0, 0) + question
+                  + struct.pack('!HHHIH', 0xC00C, 1, 1, 60, 4) + ipv4(0x5DB8D800 | rand.randrange(1, 64)))
+        yield self.tick(0.01), udp_packet(client, resolver, sport, 53, query, self.ident)
+        yield self.tick(0.002), udp_packet(resolver, client, 53, sport, answer, self.ident)
+
+    def port_scan(self):
+        rand = self.rand
+        scanner = ipv4(0x06060600 | rand.randrange(1, 8))
+        target = ipv4(0x0A000000 | rand.randrange(1, 16))
+        sport = rand.randrange(1024, 65535)
+        for _ in range(25):
+            port = self.scan_port
+            self.scan_port = self.scan_port % 65535 + 1
+            seq = rand.getrandbits(32)
+            yield self.tick(0.0005), tcp_packet(scanner, target, sport, port, seq, 0, TCP_SYN, b'', self.ident)
+            yield self.tick(0.0002), tcp_packet(target, scanner, port, sport, 0, seq + 1, TCP_RST | TCP_ACK, b'', self.ident)
+
+    def syn_flood(self):
+        rand = self.rand
+        victim = ipv4(0x0A0000FE)
+        for _ in range(100):
+            source = ipv4(rand.getrandbits(32) | 0x01000000)
+            yield self.tick(0.0001), tcp_packet(source, victim, rand.randrange(1024, 65535), 80,
+                                                rand.getrandbits(32), 0, TCP_SYN, b'', self.ident)
+
+    def packets(self, count):
+        """按 TRAFFIC_MIX 的比例混合生成 count 个包"""
+        generators = {"http": self.http_session, "dns": self.dns_exchange,
+                      "scan": self.port_scan, "ddos": self.syn_flood}
+        # 各类流量每次产生的包数不同，按包数占比折算为选择权重
+        sizes = {"http": 9, "dns": 2, "scan": 50, "ddos": 100}
+        kinds = [kind for kind, _ in TRAFFIC_MIX]
+        weights = [share / sizes[kind] for kind, share in TRAFFIC_MIX]
+        produced = 0
+        while produced < count:
+            kind = self.rand.choices(kinds, weights)[0]
+            for packet in generators[kind]():
+                yield packet
+                produced += 1
+                if produced == count:
+                    return
+
+def write_pcap(path, count, seed=DEFAULT_SEED):
+    """生成 count 个包的pcap文件，返回文件字节数"""
+    size = len(_PCAP_HEADER)
+    with open(path, 'wb') as f:
+        f.write(_PCAP_HEADER)
+        batch = []
+        for ts, frame in PcapGenerator(seed).packets(count):
+            seconds, micros = divmod(int(round(ts * 1000000)), 1000000)
+            batch.append(struct.pack('<IIII', seconds, micros, len(frame), len(frame)))
+            batch.append(frame)
+            size += 16 + len(frame)
+            if len(batch) >= WRITE_BATCH:
+                f.write(b''.join(batch))
+                batch = []
+        f.write(b''.join(batch))
+    return size
+
+HAR_METHODS = (("GET", 0.75), ("POST", 0.15), ("PUT", 0.05), ("DELETE", 0.05))
+HAR_STATUSES = ((200, 0.8), (304, 0.08), (404, 0.06), (500, 0.04), (302, 0.02))
+
+def iso_timestamp(ts):
+    return datetime.fromtimestamp(ts, timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] + 'Z'
+
+def har_entry(rand, index, ts, page):
+    """单个请求记录：各时间分段之和即总耗时"""
+    host = rand.choice(HTTP_HOSTS)
+    method = rand.choices([m for m, _ in HAR_METHODS], [w for _, w in HAR_METHODS])[0]
+    status = rand.choices([s for s, _ in HAR_STATUSES], [w for _, w in HAR_STATUSES])[0]
+    new_connection = rand.random() < 0.3
+    timings = {
+        "blocked": round(rand.uniform(0, 20), 3),
+        "dns": round(rand.uniform(1, 40), 3) if new_connection else -1,
+        "connect": round(rand.uniform(10, 120), 3) if new_connection else -1,
+        "ssl": -1,
+        "send": round(rand.uniform(0, 2), 3),
+        "wait": round(rand.lognormvariate(4.5, 0.8), 3),
+        "receive": round(rand.uniform(0, 200), 3)
+    }
+    if new_connection:
+        timings["ssl"] = round(timings["connect"] * 0.6, 3)
+    total = round(sum(value for phase, value in timings.items() if phase != "ssl" and value > 0), 3)
+    body_size = rand.randrange(200, 50000) if status != 304 else 0
+    return {
+        "pageref": f"page_{page}",
+        "startedDateTime": iso_timestamp(ts),
+        "time": total,
+        "request": {
+            "method": method,
+            "url": f"https://{host}{rand.choice(HTTP_PATHS)}?id={index}",
+            "httpVersion": "HTTP/2",
+            "headers": [{"name": "user-agent", "value": "netinsight-bench"}, {"name": "accept", "value": "*/*"}],
+            "queryString": [{"name": "id", "value": str(index)}],
+            "cookies": [],
+            "headersSize": -1,
+            "bodySize": rand.randrange(0, 2000) if method != "GET" else 0
+        },
+        "response": {
+            "status": status,
+            "statusText": "",
+            "httpVersion": "HTTP/2",
+            "headers": [{"name": "content-type", "value": "text/html"}],
+            "cookies": [],
+            "content": {"size": body_size, "mimeType": "text/html", "text": "x" * 64},
+            "redirectURL": "",
+            "headersSize": -1,
+            "bodySize": body_size
+        },
+        "cache": {},
+        "timings": timings
+    }
+
+def write_har(path, count, seed=DEFAULT_SEED, page_size=100):
+    """生成 count 个请求的HAR文件（每 page_size 个请求一个页面），返回文件字节数"""
+    rand = random.Random(seed)
+    pages = max(1, (count + page_size - 1) // page_size)
+    with open(path, 'w', encoding='utf-8') as f:
+        write = f.write
+        page_list = [{"startedDateTime": iso_timestamp(START_TIME + page * 30), "id": f"page_{page}",
+                      "title": f"Page {page}", "pageTimings": {}} for page in range(pages)]
+        write('{"log": {"version": "1.2", "creator": {"name": "netinsight-bench", "version": "1"}, "pages": '
+              + json.dumps(page_list) + ', "entries": [')
+        batch = []
+        ts = START_TIME
+        for index in range(count):
+            page = index // page_size
+            ts = max(ts, START_TIME + page * 30) + rand.expovariate(20)
+            batch.append((',' if index else '') + json.dumps(har_entry(rand, index, ts, page)))
+            if len(batch) >= WRITE_BATCH:
+                write(''.join(batch))
+                batch = []
+        write(''.join(batch) + ']}}')
+    return os.path.getsize(path)
+
+GENERATORS = {
+    "pcap": write_pcap,
+    "har": write_har
+}
+
+def main():
+    args = sys.argv[1:]
+    if not (3 <= len(args) <= 4 and args[0] in GENERATORS):
+        print(json.dumps({"error": {"message": "参数错误"}}))
+        sys.exit(1)
+
+    try:
+        seed = int(args[3]) if len(args) > 3 else DEFAULT_SEED
+        size = GENERATORS[args[0]](args[1], int(args[2]), seed)
+        print(json.dumps({"file": args[1], "count": int(args[2]), "seed": seed, "bytes": size}))
+    except Exception as e:
+        print(json.dumps({"error": {"message": str(e)}}))
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 分析脚本是扁平的模块，测试直接从脚本目录导入
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
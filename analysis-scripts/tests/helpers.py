@@ -0,0 +1,58 @@
+"""
+测试用的数据包构造工具：以太网帧、PacketRecord 和经典pcap文件
+"""
+
+import struct
+from socket import inet_aton
+
+from fast_dissector import dissect_frame, LINKTYPE_ETHERNET
+from synthetic_traffic import tcp_packet, udp_packet, TCP_SYN, TCP_ACK, TCP_PSH, TCP_FIN, TCP_RST
+
+DATA = TCP_PSH | TCP_ACK
+
+def tcp(src, sport, dst, dport, seq, flags=DATA, payload=b'', ack=0):
+    """IPv4 TCP以太网帧，地址为点分十进制字符串"""
+    return tcp_packet(inet_aton(src), inet_aton(dst), sport, dport, seq, ack, flags, payload)
+
+def udp(src, sport, dst, dport, payload):
+    return udp_packet(inet_aton(src), inet_aton(dst), sport, dport, payload)
+
+def records(frames, start=1700000000.0, step=0.01):
+    """按顺序解析帧，时间戳从 start 起每帧递增 step"""
+    return [dissect_frame(frame, LINKTYPE_ETHERNET, start + index * step) for index, frame in enumerate(frames)]
+
+def write_capture(path, frames, start=1700000000.0, step=0.01):
+    """写入以太网链路的经典pcap文件（微秒时间戳）"""
+    with open(path, 'wb') as f:
+        f.write(struct.pack('<IHHiIII', 0xA1B2C3D4, 2, 4, 0, 0, 65535, LINKTYPE_ETHERNET))
+        for index, frame in enumerate(frames):
+            seconds, micros = divmod(round((start + index * step) * 1000000), 1000000)
+            f.write(struct.pack('<IIII', seconds, micros, len(frame), len(frame)))
+            f.write(frame)
+    return path
+
+def http_connection(client, sport, server, request_segments, response_segments, cseq=1000, sseq=5000):
+    """一条完整的HTTP连接：握手、各请求/响应数据段、挥手
+
+    request_segments/response_segments 为按序的数据段列表，返回 (握手帧, 请求帧, 响应帧, 挥手帧)，
+    调用方可以重新排列后拼接。"""
+    handshake = [
+        tcp(client, sport, server, 80, cseq, TCP_SYN),
+        tcp(server, 80, client, sport, sseq, TCP_SYN | TCP_ACK, ack=cseq + 1),
+        tcp(client, sport, server, 80, cseq + 1, TCP_ACK, ack=sseq + 1)
+    ]
+    requests = []
+    seq = cseq + 1
+    for data in request_segments:
+        requests.append(tcp(client, sport, server, 80, seq, payload=data))
+        seq += len(data)
+    responses = []
+    ack_seq = sseq + 1
+    for data in response_segments:
+        responses.append(tcp(server, 80, client, sport, ack_seq, payload=data))
+        ack_seq += len(data)
+    teardown = [
+        tcp(client, sport, server, 80, seq, TCP_FIN | TCP_ACK),
+        tcp(server, 80, client, sport, ack_seq, TCP_FIN | TCP_ACK)
+    ]
+    return handshake, requests, responses, teardown
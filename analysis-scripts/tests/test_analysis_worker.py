@@ -0,0 +1,78 @@
+import io
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import pytest
+
+from analysis_worker import serve_lines
+from analyze_pcap import analyze_pcap
+from synthetic_traffic import write_pcap, write_har
+
+WORKER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "analysis_worker.py")
+
+@pytest.fixture
+def files(tmp_path):
+    pcap, har = str(tmp_path / "a.pcap"), str(tmp_path / "a.har")
+    write_pcap(pcap, 500, seed=1)
+    write_har(har, 50, seed=1)
+    return pcap, har
+
+def jobs(pcap, har):
+    config = {"engine": "fast", "sections": ["summary", "transport"]}
+    return [
+        {"id": 1, "type": "pcap", "file": pcap, "config": config},
+        "not json",
+        {"id": 3, "type": "zip", "file": pcap},
+        {"id": 4, "type": "har", "file": har, "config": {"sections": ["summary"]}},
+        {"id": 5, "type": "pcap"},
+        {"id": 6, "type": "pcap", "file": har},
+        [1, 2]
+    ]
+
+def check_responses(responses, pcap):
+    assert [response.get("id") for response in responses] == [1, None, 3, 4, 5, 6, None]
+    assert responses[0]["result"] == json.loads(json.dumps(
+        analyze_pcap(pcap, {"engine": "fast", "sections": ["summary", "transport"]})))
+    assert responses[1]["error"]["message"] == "无效的任务JSON"
+    assert responses[2]["error"]["message"] == "不支持的任务类型: zip"
+    assert responses[3]["result"]["summary"]["totalRequests"] == 50
+    assert responses[4]["error"]["message"] == "任务缺少file"
+    assert responses[5]["error"]["message"].startswith("分析失败")
+    assert responses[6]["error"]["message"] == "任务必须是JSON对象"
+
+def encode(job):
+    return job if isinstance(job, str) else json.dumps(job)
+
+def test_jobs_answered_in_order_and_failures_isolated(files):
+    output = io.StringIO()
+    serve_lines(io.StringIO("\n".join(encode(job) for job in jobs(*files)) + "\n\n"), output)
+    check_responses([json.loads(line) for line in output.getvalue().splitlines()], files[0])
+
+def test_stdin_worker_process(files):
+    run = subprocess.run([sys.executable, WORKER], input="\n".join(encode(job) for job in jobs(*files)) + "\n",
+                         capture_output=True, text=True, timeout=120)
+    assert run.returncode == 0
+    check_responses([json.loads(line) for line in run.stdout.splitlines()], files[0])
+
+def test_socket_worker_process(files, tmp_path):
+    path = str(tmp_path / "worker.sock")
+    process = subprocess.Popen([sys.executable, WORKER, "--socket", path])
+    try:
+        deadline = time.time() + 60
+        while not os.path.exists(path):
+            assert time.time() < deadline and process.poll() is None
+            time.sleep(0.05)
+        with socket.socket(socket.AF_UNIX) as client:
+            client.connect(path)
+            client.sendall(("\n".join(encode(job) for job in jobs(*files)) + "\n").encode())
+            client.shutdown(socket.SHUT_WR)
+            data = b''.join(iter(lambda: client.recv(65536), b''))
+        check_responses([json.loads(line) for line in data.decode().splitlines()], files[0])
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+    assert not os.path.exists(path)
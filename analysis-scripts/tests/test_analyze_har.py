@@ -0,0 +1,110 @@
+import json
+import math
+import sys
+from datetime import datetime
+from urllib.parse import urlparse
+
+import pytest
+
+from analyze_har import requested_sections, scan_har, run_section, url_host, parse_timestamp, ANALYZERS
+from sketches import PERCENTILES
+from synthetic_traffic import write_har
+
+@pytest.fixture
+def without_numpy(monkeypatch):
+    # sys.modules 中为None的模块导入时抛出ImportError
+    monkeypatch.setitem(sys.modules, "numpy", None)
+    monkeypatch.delitem(sys.modules, "har_columnar", raising=False)
+
+def test_default_sections_include_timings_with_numpy():
+    pytest.importorskip("numpy")
+    assert requested_sections({}) == tuple(ANALYZERS)
+
+def test_default_sections_skip_timings_without_numpy(tmp_path, without_numpy):
+    path = str(tmp_path / "t.har")
+    write_har(path, 20, seed=1)
+    assert "timings" not in requested_sections({})
+    result = scan_har(path, {})
+    assert "timings" not in result
+    assert result["summary"]["totalRequests"] == 20
+
+def test_explicit_timings_without_numpy_is_an_error(tmp_path, without_numpy):
+    path = str(tmp_path / "t.har")
+    write_har(path, 20, seed=1)
+    with pytest.raises(Exception, match="numpy"):
+        scan_har(path, {"sections": ["timings"]})
+
+def test_response_time_percentiles_within_sketch_accuracy(tmp_path):
+    path = str(tmp_path / "t.har")
+    write_har(path, 3000, seed=2)
+    with open(path, encoding='utf-8') as f:
+        times = sorted(entry["time"] for entry in json.load(f)["log"]["entries"] if entry["time"] > 0)
+    performance = scan_har(path, {"sections": ["performance"]})["performance"]
+    assert performance["minResponseTime"] == times[0] and performance["maxResponseTime"] == times[-1]
+    for name, q in PERCENTILES:
+        expected = times[max(1, math.ceil(q * len(times))) - 1]
+        assert abs(performance["responseTimePercentiles"][name] - expected) <= 0.01 * expected
+
+@pytest.mark.parametrize("url", [
+    "https://example.com/a/b?c=d",
+    "http://user:pw@example.com:8080/x",
+    "https://[::1]:443/path",
+    "http://example.com",
+    "http://example.com?q=/a/b",
+    "http://example.com#frag/a/b",
+    "ws://host/",
+    "//host/path/x",
+    "example.com/a/b",
+    "data:image/png;base64,AAAA/BBBB/CCCC",
+    "HTTPS://Example.COM:99/",
+])
+def test_cached_host_matches_urlparse(url):
+    hosts = {}
+    assert url_host(hosts, url) == urlparse(url).netloc
+    # 第二次取自缓存
+    assert url_host(hosts, url) == urlparse(url).netloc
+
+def test_host_cache_is_bounded(monkeypatch):
+    monkeypatch.setattr("analyze_har.HOST_CACHE_SIZE", 10)
+    hosts = {}
+    for i in range(25):
+        assert url_host(hosts, f"https://h{i}.example/a/b") == f"h{i}.example"
+    assert len(hosts) <= 10
+    url_host(hosts, "data:" + "x" * 1000)
+    assert len(hosts) <= 10
+
+@pytest.mark.parametrize("value", [
+    "2024-03-01T12:34:56.789Z",
+    "2024-03-01T12:34:56Z",
+    "2024-03-01T12:34:56.1+05:30",
+    "2024-03-01T12:34:56.123456-08:00",
+    "1969-12-31T23:59:59.999999Z",
+    "2024-02-29T00:00:00Z",
+    "2023-02-29T00:00:00Z",
+    "2024-03-01T24:00:00Z",
+    "2024-03-01T12:60:00Z",
+    "2024-03-01T12:00:60Z",
+    "2024-03-01T12:00:00+24:00",
+    "2024-03-01T12:00:00",
+    "2024-03-01 12:00:00+00:00",
+    "not a date",
+    "",
+])
+def test_fast_timestamp_matches_fromisoformat(value):
+    try:
+        expected = datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+    except ValueError:
+        expected = None
+    assert parse_timestamp(value) == expected
+    assert parse_timestamp(value) == expected
+
+def test_single_pass_matches_each_section_alone(tmp_path):
+    path = str(tmp_path / "t.har")
+    write_har(path, 500, seed=3)
+    with open(path, encoding='utf-8') as f:
+        entries = json.load(f)["log"]["entries"]
+    sections = [name for name in ANALYZERS if name != "timings"]
+    result = scan_har(path, {"sections": sections})
+    assert list(result) == sections
+    for name in sections:
+        assert result[name] == run_section(name, entries)
@@ -0,0 +1,92 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+import analyze_har
+import analyze_pcap
+from batch import run_batch, pool_size
+from synthetic_traffic import write_pcap, write_har
+
+SCRIPTS = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CONFIG = {"engine": "fast", "sections": ["summary", "protocols", "anomalies"]}
+
+def manifest(tmp_path, files, **extra):
+    path = tmp_path / "batch.json"
+    path.write_text(json.dumps(dict(extra, files=files)))
+    return str(path)
+
+@pytest.fixture
+def captures(tmp_path):
+    paths = []
+    for i, count in enumerate((300, 1200, 600)):
+        path = str(tmp_path / f"{i}.pcap")
+        write_pcap(path, count, seed=i)
+        paths.append(path)
+    return paths
+
+def pcap_batch(path):
+    events = []
+    run_batch(path, analyze_pcap.analyze_pcap, events.append, analyze_pcap.batch_config,
+              analyze_pcap.batch_summary, analyze_pcap.aggregate_batch)
+    return events
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_each_file_matches_a_single_analysis(tmp_path, captures, workers):
+    files = [{"id": str(i), "file": path, "config": CONFIG} for i, path in enumerate(captures)]
+    files.insert(1, {"id": "missing", "file": str(tmp_path / "none.pcap")})
+    files.append("not an object")
+    events = pcap_batch(manifest(tmp_path, files, workers=workers, aggregate=True))
+
+    by_index = {event["index"]: event for event in events if event["type"] == "file"}
+    assert sorted(by_index) == list(range(len(files)))
+    # 单个文件失败不影响其他文件
+    assert "error" in by_index[1] and by_index[4]["error"]["message"] == "文件项必须是JSON对象"
+    results = [by_index[i]["result"] for i in (0, 2, 3)]
+    for path, result in zip(captures, results):
+        assert result == analyze_pcap.analyze_pcap(path, CONFIG)
+
+    aggregate = events[-1]
+    assert aggregate["type"] == "aggregate"
+    assert aggregate["result"]["files"] == 5 and aggregate["result"]["failed"] == 2
+    assert aggregate["result"]["totalPackets"] == 300 + 1200 + 600
+    assert aggregate["result"] == dict(
+        analyze_pcap.aggregate_batch([analyze_pcap.batch_summary(result) for result in results]),
+        files=5, succeeded=3, failed=2)
+
+def test_largest_files_start_first(tmp_path, captures):
+    order = []
+    def analyze(path, config):
+        order.append(path)
+        return {}
+    run_batch(manifest(tmp_path, [{"file": path} for path in captures], workers=1), analyze, lambda event: None)
+    assert order == [captures[1], captures[2], captures[0]]
+
+def test_har_batch_from_stdin(tmp_path):
+    paths = []
+    for i in range(2):
+        path = str(tmp_path / f"{i}.har")
+        write_har(path, 40 + i * 10, seed=i)
+        paths.append(path)
+    files = [{"id": i, "file": path, "config": {"sections": ["summary", "methods"]}} for i, path in enumerate(paths)]
+    output = subprocess.run([sys.executable, os.path.join(SCRIPTS, "analyze_har.py"), "--batch", "-"],
+                            input=json.dumps({"workers": 2, "aggregate": True, "files": files}),
+                            capture_output=True, text=True, check=True).stdout
+    events = [json.loads(line) for line in output.splitlines()]
+    assert [event["type"] for event in events[-2:]] == ["aggregate", "done"]
+    assert events[-2]["result"]["totalRequests"] == 90
+    for event in events[:-2]:
+        assert event["result"] == analyze_har.analyze_har(paths[event["index"]], files[event["index"]]["config"])
+
+def test_invalid_manifest_and_workers(tmp_path):
+    bad = tmp_path / "bad.json"
+    bad.write_text('{"files": 3}')
+    with pytest.raises(Exception, match="无效的批量清单"):
+        run_batch(str(bad), None, None)
+    with pytest.raises(Exception, match="无法读取批量清单"):
+        run_batch(str(tmp_path / "none.json"), None, None)
+    with pytest.raises(Exception, match="无效的workers配置"):
+        pool_size("many", 3)
+    assert pool_size(8, 3) == 3 and pool_size(0, 3) == 1
@@ -0,0 +1,60 @@
+import json
+
+import pytest
+
+from analyze_pcap import analyze_pcap
+from benchmark import benchmark, compare, synthetic_file
+from synthetic_traffic import write_pcap, write_har
+
+@pytest.mark.parametrize("write", [write_pcap, write_har])
+def test_generated_files_are_reproducible(tmp_path, write):
+    first, second, other = (str(tmp_path / name) for name in ("a", "b", "c"))
+    assert write(first, 700, seed=5) == write(second, 700, seed=5)
+    write(other, 700, seed=6)
+    data = open(first, 'rb').read()
+    assert data == open(second, 'rb').read() != open(other, 'rb').read()
+
+def test_generated_traffic_has_the_requested_size_and_mix(tmp_path):
+    pcap, har = str(tmp_path / "t.pcap"), str(tmp_path / "t.har")
+    write_pcap(pcap, 5000, seed=1)
+    write_har(har, 250, seed=1)
+    result = analyze_pcap(pcap, {"engine": "fast", "sections": ["summary", "protocols"]})
+    assert result["summary"]["totalPackets"] == 5000
+    assert {"TCP", "UDP", "HTTP", "DNS"} <= {protocol["name"] for protocol in result["protocols"]}
+    with open(har, encoding='utf-8') as f:
+        log = json.load(f)["log"]
+    assert len(log["entries"]) == 250 and len(log["pages"]) == 3
+
+def test_synthetic_files_are_cached_by_name(tmp_path):
+    path = synthetic_file(str(tmp_path), "pcap", 100, 3)
+    mtime = (tmp_path / path).stat().st_mtime_ns
+    assert synthetic_file(str(tmp_path), "pcap", 100, 3) == path
+    assert (tmp_path / path).stat().st_mtime_ns == mtime
+    assert synthetic_file(str(tmp_path), "pcap", 100, 4) != path
+
+def case(seconds, rss, config=None):
+    return {"cases": [{"name": "pcap-10", "config": config or {},
+                       "sections": [{"section": "all", "seconds": seconds, "peakRssMB": rss}]}]}
+
+def test_compare_applies_tolerance_per_metric():
+    comparison = compare(case(1.2, 50), case(1.0, 60), 0.1)
+    assert comparison["compared"] == 1
+    assert [(change["metric"], round(change["ratio"], 2)) for change in comparison["regressions"]] == [("seconds", 1.2)]
+    assert [change["metric"] for change in comparison["improvements"]] == ["peakRssMB"]
+    assert compare(case(1.05, 60), case(1.0, 60), 0.1)["regressions"] == []
+    # 附加配置不同的项不比较
+    assert compare(case(9, 60, {"engine": "fast"}), case(1.0, 60), 0.1)["compared"] == 0
+
+def test_small_benchmark_run_against_its_own_baseline(tmp_path):
+    baseline = str(tmp_path / "baseline.json")
+    config = {"pcap_packets": [200], "har_entries": [50], "sections": ["summary"],
+              "pcap_config": {"engine": "fast"}, "work_dir": str(tmp_path), "save_baseline": baseline}
+    results = benchmark(config)
+    assert [case["name"] for case in results["cases"]] == ["pcap-200", "har-50"]
+    for item in results["cases"]:
+        assert [section["section"] for section in item["sections"]] == ["all", "summary"]
+        assert all(section["seconds"] > 0 and section["peakRssMB"] > 0 for section in item["sections"])
+    again = benchmark(dict(config, save_baseline=None, baseline=baseline, tolerance=100))
+    assert again["comparison"]["compared"] == 4 and again["comparison"]["regressions"] == []
+    with pytest.raises(Exception, match="未知的preset"):
+        benchmark({"preset": "huge"})
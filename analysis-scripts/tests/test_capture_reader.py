@@ -0,0 +1,81 @@
+import struct
+
+import pytest
+
+from fast_dissector import iter_mmap_records, iter_raw_records, record_span
+from helpers import tcp, udp, write_capture
+
+FRAMES = [tcp("10.0.0.1", 1000 + index, "10.0.0.2", 80, index, payload=b"x" * index) for index in range(20)]
+
+def stream_records(path):
+    with open(path, 'rb') as f:
+        return [(ts, linktype, bytes(data)) for ts, linktype, data in iter_raw_records(f)]
+
+def mmap_records(path, shard=None):
+    return [(ts, linktype, bytes(data)) for ts, linktype, data in iter_mmap_records(str(path), shard)]
+
+def write_pcap_ns(path, frames, endian='>'):
+    """纳秒精度、指定字节序的经典pcap"""
+    with open(path, 'wb') as f:
+        f.write(struct.pack(endian + 'IHHiIII', 0xA1B23C4D, 2, 4, 0, 0, 65535, 1))
+        for index, frame in enumerate(frames):
+            f.write(struct.pack(endian + 'IIII', 1700000000 + index, 123456789, len(frame), len(frame)) + frame)
+    return path
+
+def pcapng_block(endian, block_type, body):
+    body += bytes(-len(body) % 4)
+    length = len(body) + 12
+    return struct.pack(endian + 'II', block_type, length) + body + struct.pack(endian + 'I', length)
+
+def write_pcapng(path, frames):
+    """两个节（小端/大端），第二个节的接口时间戳精度为纳秒，并含一个简单数据包块"""
+    data = b''
+    for section, endian in enumerate(('<', '>')):
+        data += pcapng_block(endian, 0x0A0D0D0A, struct.pack(endian + 'IHHq', 0x1A2B3C4D, 1, 0, -1))
+        options = b'' if endian == '<' else struct.pack(endian + 'HH', 9, 1) + b'\x09\x00\x00\x00' + bytes(4)
+        data += pcapng_block(endian, 1, struct.pack(endian + 'HHI', 1, 0, 0) + options)
+        resolution = 10 ** 6 if endian == '<' else 10 ** 9
+        for index, frame in enumerate(frames):
+            ts = (1700000000 + section * 100 + index) * resolution + 7
+            data += pcapng_block(endian, 6, struct.pack(endian + 'IIIII', 0, ts >> 32, ts & 0xFFFFFFFF,
+                                                       len(frame), len(frame)) + frame)
+        data += pcapng_block(endian, 3, struct.pack(endian + 'I', len(frames[0])) + frames[0])
+    path.write_bytes(data)
+    return path
+
+@pytest.mark.parametrize("writer", [
+    lambda path: write_capture(path, FRAMES),
+    lambda path: write_pcap_ns(path, FRAMES),
+    lambda path: write_pcapng(path, FRAMES)
+])
+def test_mmap_reader_matches_stream_reader(tmp_path, writer):
+    path = writer(tmp_path / "capture")
+    records = mmap_records(path)
+    assert records == stream_records(path)
+    assert [data for _, _, data in records[:len(FRAMES)]] == FRAMES
+
+def test_mmap_frames_are_zero_copy_views(tmp_path):
+    path = write_capture(tmp_path / "c.pcap", FRAMES)
+    assert all(isinstance(data, memoryview) for _, _, data in iter_mmap_records(str(path)))
+
+def test_nanosecond_timestamps(tmp_path):
+    path = write_pcap_ns(tmp_path / "ns.pcap", FRAMES[:2], endian='<')
+    assert [ts for ts, _, _ in mmap_records(path)] == [1700000000.123456789, 1700000001.123456789]
+
+def test_truncated_tail_is_not_read(tmp_path):
+    data = write_capture(tmp_path / "full.pcap", FRAMES).read_bytes()
+    path = tmp_path / "cut.pcap"
+    path.write_bytes(data[:-5])
+    assert len(mmap_records(path)) == len(stream_records(path)) == len(FRAMES) - 1
+    start, end, _, _ = record_span(str(path))
+    assert (start, end) == (24, len(data) - 16 - len(FRAMES[-1]))
+    assert len(mmap_records(path, (start, end))) == len(FRAMES) - 1
+
+def test_empty_and_unknown_files_are_rejected(tmp_path):
+    empty = tmp_path / "empty.pcap"
+    empty.write_bytes(b'')
+    unknown = tmp_path / "x.pcap"
+    unknown.write_bytes(udp("10.0.0.1", 1, "10.0.0.2", 2, b"not a capture"))
+    for path in (empty, unknown):
+        with pytest.raises(Exception, match="不支持的抓包文件格式"):
+            mmap_records(path)
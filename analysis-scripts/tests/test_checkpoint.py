@@ -0,0 +1,70 @@
+import json
+
+from analyze_pcap import scan_pcap, build_smart_insights, HttpSessionAccumulator, HttpSessionDigest, OrderedSample
+from helpers import records, write_capture, http_connection
+
+SECTIONS = ["summary", "temporal", "http_sessions", "smart_insights"]
+
+def exchange(index):
+    status = (200, 404, 500, 302)[index % 4]
+    path = f"/api/token?id={index % 7}" if index % 5 == 0 else f"/static/app{index % 3}.js"
+    request = f"GET {path} HTTP/1.1\r\nHost: h{index % 6}.example\r\n\r\n".encode()
+    response = f"HTTP/1.1 {status} X\r\nSet-Cookie: a=b\r\nContent-Length: 0\r\n\r\n".encode()
+    return http_connection("10.0.0.1", 20000 + index, "10.0.0.2", [request], [response])
+
+def capture_frames(connections=60):
+    frames = []
+    for index in range(connections):
+        handshake, requests, responses, teardown = exchange(index)
+        frames += handshake + requests + responses + teardown
+    return frames
+
+def test_resume_from_growing_capture_matches_full_scan(tmp_path):
+    full = write_capture(tmp_path / "full.pcap", capture_frames())
+    data = full.read_bytes()
+    growing = tmp_path / "growing.pcap"
+    checkpoint = tmp_path / "checkpoint.json"
+    config = {"engine": "fast", "sections": SECTIONS, "checkpoint": str(checkpoint)}
+    for size in (len(data) // 5, len(data) // 2, len(data) * 4 // 5, len(data)):
+        growing.write_bytes(data[:size])
+        result = scan_pcap(str(growing), config)
+    assert result == scan_pcap(str(full), {"engine": "fast", "sections": SECTIONS})
+    assert result["http_sessions"]["total_sessions"] == 60
+
+def test_checkpoint_keeps_bounded_session_state():
+    accumulator = HttpSessionAccumulator({"top_n": 5})
+    for rec in records(capture_frames(200)):
+        accumulator.feed(rec)
+    state = json.loads(json.dumps(accumulator.dump_state()))
+    assert "sessions" not in state
+    assert state["digest"]["counts"]["total"] == 200
+    assert len(state["digest"]["samples"]["earliest"]["values"]) == 5
+    # 连接都已挥手关闭，没有未结束的流
+    assert state["reassembler"]["flows"] == []
+
+def test_digest_merge_matches_single_digest():
+    accumulator = HttpSessionAccumulator()
+    for rec in records(capture_frames()):
+        accumulator.feed(rec)
+    sessions = accumulator.finished().samples["earliest"].values
+    single = HttpSessionDigest(50)
+    left, right = HttpSessionDigest(50), HttpSessionDigest(50)
+    for index, session in enumerate(sessions):
+        single.add(session)
+        (left if index < 25 else right).add(session)
+    left.merge(right)
+    restored = HttpSessionDigest(50)
+    restored.load_state(json.loads(json.dumps(left.dump_state())))
+    assert build_smart_insights(restored) == build_smart_insights(single)
+    assert restored.samples["earliest"].values == single.samples["earliest"].values
+    assert restored.hosts.sample(10) == single.hosts.sample(10)
+
+def test_ordered_sample_keeps_earliest_in_insertion_order_on_ties():
+    sample = OrderedSample(3)
+    for key, value in [(5, "a"), (1, "b"), (5, "c"), (1, "d"), (9, "e")]:
+        sample.add(key, value)
+    assert sample.values == ["b", "d", "a"]
+    other = OrderedSample(3)
+    other.add(1, "f")
+    sample.merge(other)
+    assert sample.values == ["b", "d", "f"]
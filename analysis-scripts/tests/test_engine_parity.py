@@ -0,0 +1,48 @@
+import json
+
+import pytest
+
+from analyze_pcap import scan_pcap
+from synthetic_traffic import write_pcap
+from helpers import tcp, udp, write_capture, http_connection
+
+pytest.importorskip("scapy")
+
+HTTP_LIKE = b"GET / HTTP/1.1\r\nHost: x\r\n\r\n"
+
+def analyze(path, engine):
+    result = scan_pcap(str(path), {"engine": engine, "vectorized": False})
+    return json.loads(json.dumps(result))
+
+def protocol_packets(result, name):
+    return sum(item["packets"] for item in result["protocols"] if item["name"] == name)
+
+def test_app_layer_ports_are_not_http(tmp_path):
+    # 这些端口在Scapy中按端口解析为NTP、NetBIOS、IKE、SMB等应用层协议，两种引擎都不当作HTTP
+    frames = [
+        udp("10.0.0.1", 40000, "10.0.0.2", 123, HTTP_LIKE),
+        udp("10.0.0.1", 40001, "10.0.0.2", 137, HTTP_LIKE),
+        udp("10.0.0.1", 40002, "10.0.0.2", 500, HTTP_LIKE),
+        tcp("10.0.0.1", 40003, "10.0.0.2", 445, 1, payload=HTTP_LIKE),
+        tcp("10.0.0.1", 40004, "10.0.0.2", 139, 1, payload=HTTP_LIKE),
+        tcp("10.0.0.1", 40005, "10.0.0.2", 8000, 1, payload=HTTP_LIKE)
+    ]
+    path = write_capture(tmp_path / "ports.pcap", frames)
+    scapy_result = analyze(path, "scapy")
+    assert protocol_packets(scapy_result, "HTTP") == 1
+    assert scapy_result == analyze(path, "fast")
+
+def test_http_connection(tmp_path):
+    handshake, requests, responses, teardown = http_connection(
+        "10.0.0.1", 40000, "10.0.0.2",
+        [b"GET /a HTTP/1.1\r\nHost: x.com\r\n\r\n"],
+        [b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok"])
+    path = write_capture(tmp_path / "http.pcap", handshake + requests[::-1] + responses + teardown)
+    scapy_result = analyze(path, "scapy")
+    assert scapy_result["http_sessions"]["total_sessions"] == 1
+    assert scapy_result == analyze(path, "fast")
+
+def test_synthetic_mix(tmp_path):
+    path = tmp_path / "mix.pcap"
+    write_pcap(str(path), 3000, seed=3)
+    assert analyze(path, "scapy") == analyze(path, "fast")
@@ -0,0 +1,51 @@
+import pytest
+
+import analyze_pcap
+from fast_dissector import PacketRecord, dissect_frame, LINKTYPE_ETHERNET, LINKTYPE_RAW, LINKTYPE_LINUX_SLL
+from helpers import tcp
+
+scapy_all = pytest.importorskip("scapy.all")
+
+def fields(rec):
+    return {name: getattr(rec, name) for name in PacketRecord.__slots__}
+
+def scapy_record(data, linktype, ts=1700000000.5):
+    analyze_pcap.load_scapy()
+    return analyze_pcap.dissect_packet(analyze_pcap.scapy_frame(data, linktype, ts))
+
+def frames():
+    s = scapy_all
+    inner = s.IP(src="10.0.0.9", dst="10.0.0.1") / s.TCP(sport=5555, dport=80)
+    return [
+        bytes(s.Ether() / s.Dot1Q(vlan=7) / s.IP(src="10.0.0.1", dst="10.0.0.2") / s.TCP(sport=1, dport=80, flags="S", seq=42)),
+        bytes(s.Ether() / s.IPv6(src="fe80::1", dst="ff02::fb") / s.UDP(sport=5353, dport=5353) / s.DNS(qd=s.DNSQR(qname="a.local"))),
+        bytes(s.Ether() / s.IP(src="10.0.0.1", dst="10.0.0.9") / s.ICMP(type=3, code=1) / inner / b"GET / HTTP/1.1\r\n"),
+        bytes(s.Ether() / s.ARP(psrc="10.0.0.1", pdst="10.0.0.2")),
+        bytes(s.Ether() / s.IP(src="10.0.0.1", dst="10.0.0.2", flags="MF", frag=0) / s.UDP(sport=9, dport=9) / (b"x" * 64)),
+        bytes(s.Ether() / s.PPPoE() / s.PPP() / s.IP(src="10.0.0.3", dst="10.0.0.4") / s.UDP(sport=53000, dport=53) / s.DNS(qd=s.DNSQR(qname="b.example"))),
+        bytes(s.Ether() / s.IPv6(src="2001:db8::1", dst="2001:db8::2") / s.IPv6ExtHdrHopByHop() / s.TCP(sport=2, dport=443, flags="PA") / b"hello"),
+        tcp("10.0.0.1", 40000, "10.0.0.2", 8080, 7, payload=b"POST /x HTTP/1.1\r\n\r\n")[:40],
+        # ICMP差错报文：引用的DNS查询、只引用8字节的TCP头部、引用应用层端口
+        bytes(s.Ether() / s.IP(src="10.0.0.2", dst="10.0.0.1") / s.ICMP(type=3, code=3)
+              / s.IP(src="10.0.0.1", dst="10.0.0.2") / s.UDP(sport=5353, dport=53) / s.DNS(qd=s.DNSQR(qname="c.example"))),
+        bytes(s.Ether() / s.IP(src="10.0.0.2", dst="10.0.0.1") / s.ICMP(type=11) / bytes(inner)[:28]),
+        bytes(s.Ether() / s.IP(src="10.0.0.2", dst="10.0.0.1") / s.ICMP(type=3)
+              / s.IP(src="10.0.0.1", dst="10.0.0.2") / s.UDP(sport=4000, dport=500) / b"GET / HTTP/1.1\r\n")
+    ]
+
+@pytest.mark.parametrize("index", range(11))
+def test_ethernet_frames_match_scapy(index):
+    data = frames()[index]
+    assert fields(dissect_frame(data, LINKTYPE_ETHERNET, 1700000000.5)) == fields(scapy_record(data, LINKTYPE_ETHERNET))
+
+def test_other_link_types_match_scapy():
+    s = scapy_all
+    packet = s.IP(src="192.168.1.1", dst="192.168.1.2") / s.TCP(sport=3, dport=80, flags="PA") / b"GET / HTTP/1.0\r\n\r\n"
+    sll = bytes(s.CookedLinux(proto=0x0800) / packet)
+    for data, linktype in ((bytes(packet), LINKTYPE_RAW), (sll, LINKTYPE_LINUX_SLL)):
+        assert fields(dissect_frame(data, linktype, 1700000000.5)) == fields(scapy_record(data, linktype))
+
+def test_payloads_can_be_skipped():
+    data = frames()[6]
+    rec = dissect_frame(memoryview(data), LINKTYPE_ETHERNET, 0.0, payloads=False)
+    assert rec.payload is None and (rec.ip_version, rec.proto, rec.dport) == (6, 6, 443)
@@ -0,0 +1,65 @@
+import json
+
+import pytest
+
+from flow_table import FlowTable, FlowRecord, pack_flow_key, unpack_flow_key
+from helpers import records, tcp, udp
+from synthetic_traffic import TCP_SYN, TCP_ACK, TCP_RST
+
+def sample_records():
+    frames = [
+        tcp("10.0.0.1", 1000, "10.0.0.2", 80, 1, TCP_SYN),
+        tcp("10.0.0.2", 80, "10.0.0.1", 1000, 1, TCP_SYN | TCP_ACK),
+        tcp("10.0.0.1", 1000, "10.0.0.2", 80, 2, TCP_ACK, payload=b"abc"),
+        udp("10.0.0.3", 53, "10.0.0.1", 5000, b"x" * 20),
+        tcp("10.0.0.1", 1000, "10.0.0.2", 80, 5, TCP_RST),
+        udp("10.0.0.3", 53, "10.0.0.1", 5000, b"y"),
+        tcp("10.0.0.4", 65535, "10.0.0.2", 65535, 9, TCP_SYN)
+    ]
+    return records(frames)
+
+def snapshot(table):
+    """与地址编号无关的流表内容"""
+    addresses = table.addresses
+    return [
+        (addresses[src], addresses[dst], sport, dport, proto) + tuple(getattr(flow, name) for name in FlowRecord.__slots__)
+        for (src, dst, sport, dport, proto), flow in ((unpack_flow_key(key), flow) for key, flow in table.flows.items())
+    ]
+
+def test_flow_key_round_trip():
+    for fields in [(0, 0, 0, 0, 0), (1, 2, 80, 443, 6), (2 ** 32 - 1, 2 ** 32 - 1, 65535, 65535, 255)]:
+        assert unpack_flow_key(pack_flow_key(*fields)) == fields
+
+def test_records_aggregate_per_directed_flow():
+    table = FlowTable()
+    for rec in sample_records():
+        table.feed(rec)
+    rows = snapshot(table)
+    assert [row[:5] for row in rows] == [
+        ("10.0.0.1", "10.0.0.2", 1000, 80, 6),
+        ("10.0.0.2", "10.0.0.1", 80, 1000, 6),
+        ("10.0.0.3", "10.0.0.1", 53, 5000, 17),
+        ("10.0.0.4", "10.0.0.2", 65535, 65535, 6)
+    ]
+    client = table.flows[next(iter(table.flows))]
+    assert (client.packets, client.syn, client.ack, client.rst) == (3, 1, 1, 1)
+    assert client.last_ts - client.first_ts == pytest.approx(0.04)
+    assert not hasattr(client, "__dict__")
+
+def test_merge_remaps_addresses_like_single_pass():
+    recs = sample_records()
+    single, first, second = FlowTable(), FlowTable(), FlowTable()
+    for index, rec in enumerate(recs):
+        single.feed(rec)
+        (first if index < 3 else second).feed(rec)
+    restored = FlowTable()
+    restored.load_state(json.loads(json.dumps(second.dump_state())))
+    first.merge(restored)
+    assert snapshot(first) == snapshot(single)
+    assert first.addresses == single.addresses
+
+def test_non_ip_records_are_ignored():
+    table = FlowTable()
+    arp = records([b"\xff" * 6 + b"\x02" * 6 + b"\x08\x06" + bytes(28)])[0]
+    table.feed(arp)
+    assert table.flows == {} and table.addresses == []
@@ -0,0 +1,113 @@
+import json
+import os
+
+import pytest
+
+import har_stream
+import scan_progress
+from analyze_har import stream_har
+from har_stream import iter_entries, iter_entry_positions
+from synthetic_traffic import write_har
+
+def test_entry_positions_advance_to_end_of_file(tmp_path):
+    path = str(tmp_path / "t.har")
+    write_har(path, 50, seed=1)
+    positions = [position for _, position in iter_entry_positions(path)]
+    assert len(positions) == 50
+    assert positions == sorted(positions)
+    assert positions[-1] <= os.path.getsize(path)
+    assert [entry for entry, _ in iter_entry_positions(path)] == list(iter_entries(path))
+
+def test_stream_emits_progress_like_pcap_stream(tmp_path, monkeypatch):
+    monkeypatch.setattr(scan_progress, "PROGRESS_INTERVAL", 0)
+    path = str(tmp_path / "t.har")
+    write_har(path, 9000, seed=1)
+    events = []
+    stream_har(path, {"sections": ["summary"]}, events.append)
+    progress = [event for event in events if event["type"] == "progress"]
+    assert [event["packets"] for event in progress] == [4096, 8192, 9000]
+    assert progress[0]["bytesRead"] < progress[1]["bytesRead"] < progress[-1]["bytesRead"]
+    assert progress[-1]["bytesRead"] == progress[-1]["totalBytes"] == os.path.getsize(path)
+    assert set(progress[0]) == {"type", "stage", "stages", "bytesRead", "totalBytes", "packets",
+                                "packetsPerSecond", "etaSeconds"}
+    assert events[-1]["type"] == "section"
+
+def without_skipped(value):
+    """json.load 的结果中按 SKIPPED_KEYS 的规则清空被跳过的字段"""
+    if isinstance(value, dict):
+        return {
+            key: (type(item)() if key in har_stream.SKIPPED_KEYS else without_skipped(item))
+            for key, item in value.items()
+        }
+    if isinstance(value, list):
+        return [without_skipped(item) for item in value]
+    return value
+
+def tricky_har():
+    body = "x\\\"]}{" * 40000 + "中文"
+    entries = [
+        {
+            "startedDateTime": "2024-01-01T00:00:00.000Z",
+            "time": 12.5,
+            "request": {"method": "POST", "url": "https://a.example/p?q=\"]}",
+                        "headers": [{"name": "Cookie", "value": "a=b"}], "queryString": [{"name": "q", "value": "1"}],
+                        "postData": {"mimeType": "text/plain", "text": body}},
+            "response": {"status": 200, "headers": [], "cookies": [{"name": "c"}],
+                         "content": {"size": len(body), "mimeType": "text/html", "text": body}},
+            "timings": {"wait": 10, "receive": -1}
+        },
+        {"startedDateTime": "2024-01-01T00:00:01.000Z", "time": 0, "request": {"method": "GET", "url": "é\\"},
+         "response": {"status": 404, "content": {"text": "short"}}, "nested": [[{"text": {"a": [1]}}], None, True]}
+    ]
+    return {"log": {"version": "1.2", "pages": [{"id": "p", "title": "[{\"x"}], "creator": {"name": "t"},
+                    "entries": entries, "comment": "entries after"}, "extra": {"entries": [1]}}
+
+def check_entries(path, document):
+    """块内的短字符串可能原样保留，其余字段与 json.load 的结果相同，正文一定被跳过"""
+    entries = list(iter_entries(path))
+    assert without_skipped(entries) == without_skipped(document["log"]["entries"])
+    assert entries[0]["request"]["postData"]["text"] == entries[0]["response"]["content"]["text"] == ""
+    assert entries[0]["request"]["headers"] == entries[0]["request"]["queryString"] == []
+
+def test_entries_match_json_load_without_skipped_fields(tmp_path, monkeypatch):
+    monkeypatch.setattr(har_stream, "CHUNK_BYTES", 4096)
+    document = tricky_har()
+    path = tmp_path / "t.har"
+    path.write_text(json.dumps(document, indent=1, ensure_ascii=False), encoding='utf-8')
+    check_entries(str(path), document)
+
+def test_byte_order_mark_and_compact_layout(tmp_path):
+    document = tricky_har()
+    path = tmp_path / "t.har"
+    path.write_bytes(b'\xef\xbb\xbf' + json.dumps(document, separators=(',', ':')).encode())
+    check_entries(str(path), document)
+
+@pytest.mark.parametrize("content, message", [
+    (b'', "Expecting value: line 1 column 1 (char 0)"),
+    (b'not json', "Expecting value: line 1 column 1 (char 0)"),
+    (b'{"log": {"entries": [{"a": 1}, ', "Expecting value: line 1 column 32 (char 31)"),
+    (b'{"log": {"entries": [{"a": 1}]}} x', "Extra data: line 1 column 34 (char 33)"),
+    (b'[]', "无效的HAR文件格式"),
+    (b'{"log": {"pages": []}}', "无效的HAR文件格式"),
+])
+def test_invalid_files_fail_like_json_load(tmp_path, content, message):
+    path = tmp_path / "t.har"
+    path.write_bytes(content)
+    with pytest.raises(Exception) as error:
+        list(iter_entries(str(path)))
+    assert str(error.value) == message
+
+def test_large_truncated_or_non_object_files_are_rejected(tmp_path, monkeypatch):
+    # 超过一块的文件不整体解码，给出流式解析的错误信息
+    monkeypatch.setattr(har_stream, "CHUNK_BYTES", 64)
+    entries = ', '.join('{"time": %d}' % i for i in range(20))
+    cases = [
+        ('{"log": {"entries": [' + entries, "HAR文件不完整"),
+        ('[' + entries + ']', "无效的HAR文件格式"),
+        ('{"log": {"entries": [' + entries + ']}} trailing', "无效的HAR文件格式"),
+    ]
+    for content, message in cases:
+        path = tmp_path / "t.har"
+        path.write_text(content)
+        with pytest.raises(Exception, match=message):
+            list(iter_entries(str(path)))
@@ -0,0 +1,107 @@
+import json
+
+from analyze_pcap import HttpSessionAccumulator
+from helpers import tcp, records, http_connection, TCP_SYN
+
+CLIENT = "10.0.0.1"
+SERVER = "10.0.0.2"
+
+REQUEST_A = b"GET /a HTTP/1.1\r\nHost: x.com\r\n\r\n"
+REQUEST_B = b"GET /b HTTP/1.1\r\nHost: x.com\r\n\r\n"
+RESPONSE_A = b"HTTP/1.1 200 OK\r\nContent-Length: 5\r\n\r\nhello"
+RESPONSE_B = b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\n\r\n"
+
+def sessions(frames):
+    # 乱序时报文的开始时间取其第一个字节所在数据段的到达时间，会话顺序可能与请求顺序不同
+    accumulator = HttpSessionAccumulator()
+    for rec in records(frames):
+        accumulator.feed(rec)
+    return sorted((s["method"], s["url"], s["status_code"]) for s in accumulator.finished().samples["earliest"].values)
+
+def two_exchanges():
+    """两个流水线请求，请求和响应的头部都被拆在两个数据段中"""
+    return http_connection(CLIENT, 40000, SERVER,
+                           [REQUEST_A[:10], REQUEST_A[10:] + REQUEST_B],
+                           [RESPONSE_A[:12], RESPONSE_A[12:] + RESPONSE_B])
+
+EXPECTED = [("GET", "/a", 200), ("GET", "/b", 404)]
+
+def test_in_order_segments():
+    handshake, requests, responses, teardown = two_exchanges()
+    assert sessions(handshake + requests + responses + teardown) == EXPECTED
+
+def test_swapped_first_segments():
+    handshake, requests, responses, teardown = two_exchanges()
+    frames = handshake + requests[::-1] + responses[::-1] + teardown
+    assert sessions(frames) == EXPECTED
+
+def test_reordered_start_without_handshake():
+    # 抓包从连接中途开始：报文开头的数据段晚于后续数据段到达
+    _, requests, responses, _ = two_exchanges()
+    assert sessions(requests[::-1] + responses[::-1]) == EXPECTED
+
+def test_retransmission_and_overlap():
+    handshake, requests, responses, teardown = two_exchanges()
+    # 重传第一个请求段，再发一个与两段都重叠的段
+    overlap = tcp(CLIENT, 40000, SERVER, 80, 1001 + 5, payload=REQUEST_A[5:20])
+    frames = handshake + [requests[0], requests[0], overlap, requests[1]] + responses + teardown
+    assert sessions(frames) == EXPECTED
+
+def test_new_connection_on_same_ports():
+    first = http_connection(CLIENT, 40000, SERVER, [REQUEST_A], [RESPONSE_A])
+    second = http_connection(CLIENT, 40000, SERVER, [REQUEST_B], [RESPONSE_B], cseq=90000, sseq=70000)
+    handshake, requests, responses, _ = first
+    frames = handshake + requests + responses + sum(second, [])
+    assert sessions(frames) == EXPECTED
+
+def test_syn_retransmission_keeps_data():
+    handshake, requests, responses, teardown = two_exchanges()
+    frames = handshake + [handshake[1]] + requests + [handshake[0]] + responses + teardown
+    assert sessions(frames) == EXPECTED
+
+def test_non_http_flow_is_ignored():
+    frames = [
+        tcp(CLIENT, 40001, SERVER, 443, 1, TCP_SYN),
+        tcp(CLIENT, 40001, SERVER, 443, 2, payload=b"\x16\x03\x01" + b"x" * 100),
+        tcp(CLIENT, 40001, SERVER, 443, 105, payload=b"GET inside TLS"),
+    ]
+    assert sessions(frames) == []
+
+def test_checkpoint_resume_matches_single_pass():
+    handshake, requests, responses, teardown = two_exchanges()
+    frames = handshake + requests[::-1] + responses[::-1] + teardown
+    recs = records(frames)
+    for split in range(len(recs) + 1):
+        first = HttpSessionAccumulator()
+        for rec in recs[:split]:
+            first.feed(rec)
+        resumed = HttpSessionAccumulator()
+        resumed.load_state(json.loads(json.dumps(first.dump_state())))
+        for rec in recs[split:]:
+            resumed.feed(rec)
+        assert sorted((s["url"], s["status_code"]) for s in resumed.finished().samples["earliest"].values) == [("/a", 200), ("/b", 404)]
+
+def test_pipelined_requests_across_three_shards():
+    request_c = b"GET /c HTTP/1.1\r\nHost: x.com\r\n\r\n"
+    response_c = b"HTTP/1.1 500 Internal Server Error\r\nContent-Length: 0\r\n\r\n"
+    handshake, requests, responses, teardown = http_connection(
+        CLIENT, 40000, SERVER, [REQUEST_A, REQUEST_B, request_c], [RESPONSE_A, RESPONSE_B, response_c])
+    recs = records(handshake + requests + responses + teardown)
+    # keep-alive流上的流水线请求跨越分片边界：第一个分片结束时还有两个请求等待响应，
+    # 第二个分片又有新的请求
+    shards = [recs[:5], recs[5:7], recs[7:]]
+    accumulators = []
+    for shard in shards:
+        accumulator = HttpSessionAccumulator()
+        for rec in shard:
+            accumulator.feed(rec)
+        accumulators.append(accumulator)
+    merged = accumulators[0]
+    for accumulator in accumulators[1:]:
+        merged.merge(accumulator)
+    single = HttpSessionAccumulator()
+    for rec in recs:
+        single.feed(rec)
+    assert merged.result() == single.result()
+    assert sorted((s["url"], s["status_code"]) for s in merged.result()["sessions"]) == [
+        ("/a", 200), ("/b", 404), ("/c", 500)]
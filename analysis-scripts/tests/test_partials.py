@@ -0,0 +1,54 @@
+import pytest
+
+from analyze_pcap import analyze_pcap_partial, merge_partials, scan_pcap
+from helpers import write_capture, http_connection, tcp, udp
+
+SECTIONS = ["summary", "network", "transport", "temporal", "http_sessions", "anomalies"]
+
+def capture_frames(connections=40):
+    frames = []
+    for index in range(connections):
+        request = f"GET /item/{index % 5} HTTP/1.1\r\nHost: shop.example\r\n\r\n".encode()
+        response = b"HTTP/1.1 200 OK\r\nContent-Length: 0\r\n\r\n"
+        handshake, requests, responses, teardown = http_connection(
+            f"10.0.0.{index % 9 + 1}", 30000 + index, "10.0.1.1", [request], [response])
+        frames += handshake + requests + responses + teardown
+        frames.append(udp("10.0.0.1", 5353, "10.0.2.2", 9000 + index, b"x" * index))
+        frames.append(tcp("10.0.3.3", 40000, "10.0.1.1", 1000 + index, 1, 0x02))
+    return frames
+
+def split_capture(tmp_path, frames, parts):
+    """按时间顺序把抓包切成 parts 个文件，时间戳与整个抓包中的一致"""
+    size = -(-len(frames) // parts)
+    return [
+        write_capture(tmp_path / f"part{index}.pcap", frames[index * size:(index + 1) * size],
+                      start=1700000000.0 + index * size * 0.01)
+        for index in range(parts)
+    ]
+
+def test_merged_partials_match_full_scan(tmp_path):
+    frames = capture_frames()
+    config = {"engine": "fast", "sections": SECTIONS}
+    paths = []
+    for index, capture in enumerate(split_capture(tmp_path, frames, 3)):
+        path = str(tmp_path / f"part{index}.partial")
+        analyze_pcap_partial(str(capture), config, path)
+        paths.append(path)
+    full = write_capture(tmp_path / "full.pcap", frames)
+    assert merge_partials(paths) == scan_pcap(str(full), config)
+
+def test_neutral_settings_may_differ_between_partials(tmp_path):
+    first, second = split_capture(tmp_path, capture_frames(10), 2)
+    analyze_pcap_partial(str(first), {"engine": "fast", "workers": 1}, str(tmp_path / "a.partial"))
+    analyze_pcap_partial(str(second), {"engine": "fast", "workers": 4, "vectorized": True},
+                         str(tmp_path / "b.partial"))
+    result = merge_partials([str(tmp_path / "a.partial"), str(tmp_path / "b.partial")])
+    assert result["summary"]["totalPackets"] == 90
+
+def test_partials_with_different_settings_are_rejected(tmp_path):
+    first, second = split_capture(tmp_path, capture_frames(10), 2)
+    analyze_pcap_partial(str(first), {"engine": "fast", "sections": SECTIONS}, str(tmp_path / "a.partial"))
+    analyze_pcap_partial(str(second), {"engine": "fast", "sections": SECTIONS, "top_n": 3},
+                         str(tmp_path / "b.partial"))
+    with pytest.raises(Exception, match="分析配置与第一个文件不一致: b.partial"):
+        merge_partials([str(tmp_path / "a.partial"), str(tmp_path / "b.partial")])
@@ -0,0 +1,72 @@
+import json
+import os
+
+from result_cache import ResultCache, cached_analysis
+from analyze_pcap import analyze_pcap
+from synthetic_traffic import write_pcap
+
+def counting(result):
+    calls = []
+    def compute():
+        calls.append(1)
+        return dict(result, run=len(calls))
+    return compute, calls
+
+def test_repeat_analysis_is_served_from_cache(tmp_path):
+    capture = tmp_path / "a.pcap"
+    capture.write_bytes(b"capture one")
+    config = {"cache": {"path": str(tmp_path / "cache.sqlite")}, "sections": ["summary"], "workers": 1}
+    compute, calls = counting({"ok": True})
+    first = cached_analysis("pcap", "v1", str(capture), config, compute, ("workers",))
+    # 并行度不影响结果，不参与缓存键
+    again = cached_analysis("pcap", "v1", str(capture), dict(config, workers=8), compute, ("workers",))
+    assert first == again == {"ok": True, "run": 1} and len(calls) == 1
+    cached_analysis("pcap", "v1", str(capture), dict(config, sections=["temporal"]), compute, ("workers",))
+    assert len(calls) == 2
+
+def test_content_and_version_changes_invalidate(tmp_path):
+    capture = tmp_path / "a.pcap"
+    capture.write_bytes(b"capture one")
+    path = str(tmp_path / "cache.sqlite")
+    config = {"cache": {"path": path}}
+    compute, calls = counting({})
+    cached_analysis("pcap", "v1", str(capture), config, compute)
+    capture.write_bytes(b"capture two!")
+    os.utime(capture, ns=(1, 1))
+    cached_analysis("pcap", "v1", str(capture), config, compute)
+    cached_analysis("pcap", "v2", str(capture), config, compute)
+    assert len(calls) == 3
+    # 写入新版本的结果时清除旧版本
+    cache = ResultCache(path)
+    assert cache.stats()["entries"] == 1
+    cache.close()
+
+def test_least_recently_used_results_are_evicted(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache.sqlite"), max_bytes=600)
+    payload = {"data": os.urandom(200).hex()}
+    for key in ("a", "b", "c"):
+        cache.put(key, "pcap", "v1", payload)
+        if key == "b":
+            cache.get("a")
+    assert cache.get("a") == payload and cache.get("c") == payload
+    assert cache.get("b") is None
+    cache.close()
+
+def test_unusable_cache_falls_back_to_analysis(tmp_path):
+    capture = tmp_path / "a.pcap"
+    capture.write_bytes(b"x")
+    blocker = tmp_path / "file"
+    blocker.write_bytes(b"")
+    compute, calls = counting({"ok": True})
+    result = cached_analysis("pcap", "v1", str(capture), {"cache": {"path": str(blocker / "cache.sqlite")}}, compute)
+    assert result == {"ok": True, "run": 1}
+
+def test_cached_pcap_result_matches_fresh_analysis(tmp_path):
+    capture = str(tmp_path / "mix.pcap")
+    write_pcap(capture, 500, seed=1)
+    config = {"engine": "fast", "cache": {"path": str(tmp_path / "cache.sqlite")}}
+    # 缓存保存的是JSON输出，按输出形式比较（整数字典键会变成字符串）
+    output = lambda cfg: json.dumps(analyze_pcap(capture, cfg), sort_keys=True)
+    fresh = output({"engine": "fast"})
+    assert output(config) == fresh
+    assert output(config) == fresh
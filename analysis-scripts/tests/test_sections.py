@@ -0,0 +1,68 @@
+import sys
+
+import pytest
+
+import analyze_pcap
+from analyze_pcap import create_accumulators, scan_pcap, HttpSessionAccumulator
+from synthetic_traffic import write_pcap
+
+@pytest.fixture
+def capture(tmp_path):
+    path = tmp_path / "mix.pcap"
+    write_pcap(str(path), 2000, seed=6)
+    return str(path)
+
+def test_dependencies_are_created_once_and_first():
+    accumulators = create_accumulators({"sections": ["network", "anomalies", "http_sessions", "smart_insights"],
+                                        "vectorized": False})
+    names = list(accumulators)
+    assert names.index("flows") < names.index("network") < names.index("anomalies")
+    assert names.index("http_sessions") < names.index("smart_insights")
+    assert accumulators["network"].flows is accumulators["anomalies"].flows is accumulators["flows"]
+    assert accumulators["smart_insights"].http_sessions is accumulators["http_sessions"]
+
+def test_insights_reuse_the_http_session_scan(capture, monkeypatch):
+    feeds = []
+    original = HttpSessionAccumulator.feed
+    def counting_feed(self, rec):
+        feeds.append(rec)
+        original(self, rec)
+    monkeypatch.setattr(HttpSessionAccumulator, "feed", counting_feed)
+    result = scan_pcap(capture, {"engine": "fast", "sections": ["http_sessions", "smart_insights"]})
+    assert len(feeds) == 2000
+    assert result["http_sessions"]["total_sessions"] > 0
+
+def test_finished_digest_is_computed_once(capture):
+    accumulators = create_accumulators({"sections": ["http_sessions", "smart_insights"]})
+    analyze_pcap.run_accumulators(analyze_pcap.iter_records(capture, {"engine": "fast"}), accumulators.values())
+    digest = accumulators["http_sessions"].finished()
+    assert accumulators["http_sessions"].finished() is digest
+    first = accumulators["smart_insights"].result()
+    assert accumulators["http_sessions"].result()["total_sessions"] == digest.counts["total"]
+    assert accumulators["smart_insights"].result() == first
+
+def test_only_requested_sections_are_built_and_output(capture):
+    config = {"engine": "fast", "sections": ["anomalies", "summary", "temporal"], "vectorized": False}
+    assert set(create_accumulators(config)) == {"summary", "flows", "anomalies", "temporal"}
+    result = scan_pcap(capture, config)
+    assert list(result) == ["summary", "temporal", "anomalies"]
+    assert result == {name: value for name, value in scan_pcap(capture, {"engine": "fast", "vectorized": False}).items()
+                      if name in result}
+
+def test_frame_only_sections_do_not_dissect(capture, monkeypatch):
+    # 只需要时间戳和长度时不解析帧内容，scapy引擎也不导入Scapy
+    monkeypatch.setitem(sys.modules, "scapy", None)
+    monkeypatch.setattr(analyze_pcap, "dissect_packet", None)
+    result = scan_pcap(capture, {"engine": "scapy", "sections": ["summary"]})
+    assert result["summary"]["totalPackets"] == 2000
+
+@pytest.mark.parametrize("config, message", [
+    ({"sections": ["summary", "nope"]}, "未知的分析段: nope"),
+    ({"sections": []}, "无效的sections配置"),
+    ({"sections": "summary"}, "无效的sections配置"),
+    ({"options": {"summary": {"top_n": 3}}}, "分析段没有可配置的选项: summary"),
+    ({"options": {"network": {"top": 3}}}, "未知的分析段选项: network.top")
+])
+def test_invalid_section_config(capture, config, message):
+    with pytest.raises(Exception, match=message):
+        scan_pcap(capture, dict(config, engine="fast"))
@@ -0,0 +1,194 @@
+import json
+import math
+from collections import Counter
+
+import pytest
+
+from sketches import (
+    SpaceSaving, CountMinSketch, HyperLogLog, DistinctValues, DistinctPorts, DDSketch, PORT_SET_LIMIT,
+    PERCENTILES, histogram_percentiles
+)
+from analyze_pcap import scan_pcap
+from helpers import write_capture, tcp
+from synthetic_traffic import TCP_SYN
+
+def roundtrip(sketch, factory):
+    """经过JSON保存再恢复的同类草图"""
+    restored = factory()
+    restored.load_state(json.loads(json.dumps(sketch.dump_state())))
+    return restored
+
+def test_hyperloglog_estimate_and_merge():
+    left, right = HyperLogLog(12), HyperLogLog(12)
+    for index in range(30000):
+        (left if index % 2 else right).add(f"10.0.{index >> 8}.{index & 0xFF}")
+        left.add(index % 100)
+    left.merge(roundtrip(right, HyperLogLog))
+    assert abs(left.estimate() - 30100) / 30100 < 4 * left.relative_error()
+
+def test_distinct_values_exact_until_limit():
+    values = DistinctValues(4)
+    for value in ["a", "b", "a", "c", "b"]:
+        values.add(value)
+    assert values.count() == 3 and values.hll is None
+    for index in range(1000):
+        values.add(f"v{index}")
+    assert values.hll is not None
+    assert values.sample(5) == ["a", "b", "c", "v0"]
+    assert abs(values.count() - 1003) < 100
+
+def test_distinct_values_merge_escalates():
+    small, large = DistinctValues(10), DistinctValues(10)
+    small.add("x")
+    for index in range(50):
+        large.add(index)
+    small.merge(roundtrip(large, lambda: DistinctValues(10)))
+    assert small.sample(3) == ["x", 0, 1]
+    assert small.count() >= 11
+
+def test_distinct_ports_representations():
+    ports = DistinctPorts(set_limit=8, max_bitmaps=1)
+    ports.add("single", 80)
+    ports.add("single", 80)
+    for port in range(5):
+        ports.add("few", port)
+    for port in range(5000):
+        ports.add("bitmap", port)
+        ports.add("sketch", port)
+    assert isinstance(ports.keys["bitmap"], bytearray)
+    assert isinstance(ports.keys["sketch"], HyperLogLog)
+    counts = dict(roundtrip(ports, DistinctPorts).counts())
+    assert counts["single"] == 1 and counts["few"] == 5 and counts["bitmap"] == 5000
+    assert abs(counts["sketch"] - 5000) < 500
+
+def test_distinct_ports_merge_into_sketch():
+    left, right = DistinctPorts(set_limit=4, max_bitmaps=0), DistinctPorts(set_limit=4, max_bitmaps=0)
+    for port in range(3):
+        left.add("src", port)
+    for port in range(100, 400):
+        right.add("src", port)
+    left.merge(right)
+    assert isinstance(left.keys["src"], HyperLogLog)
+    assert abs(dict(left.counts())["src"] - 303) < 40
+
+def test_exact_port_scan_counts_stay_exact(tmp_path):
+    """精确模式下端口超过集合上限的源IP改用位图，报告的端口数仍是精确值"""
+    frames = [tcp("10.9.9.9", 40000, "10.0.0.1", port, 1, TCP_SYN) for port in range(1, 3001)]
+    frames += [tcp("10.8.8.8", 40000, "10.0.0.1", port, 1, TCP_SYN) for port in range(1, 41)]
+    capture = write_capture(tmp_path / "scan.pcap", frames)
+    for approximate in (False, True):
+        result = scan_pcap(str(capture), {"engine": "fast", "sections": ["anomalies"],
+                                          "options": {"anomalies": {"approximate": approximate}}})
+        scans = [item["details"] for item in result["anomalies"] if item["type"] == "port_scan_detected"]
+        assert scans == [{"source_ip": "10.9.9.9", "port_count": 3000}]
+    assert PORT_SET_LIMIT < 3000
+
+def test_exact_unique_ip_counts_are_bounded(tmp_path, monkeypatch):
+    """精确模式下不同IP数不超过集合上限时精确，超过后为HyperLogLog估计"""
+    frames = [tcp(f"10.{i >> 8}.{i & 0xFF}.1", 40000, "10.0.0.1", 80, 1, TCP_SYN) for i in range(3000)]
+    capture = str(write_capture(tmp_path / "sources.pcap", frames))
+    config = {"engine": "fast", "sections": ["network"]}
+    network = scan_pcap(capture, config)["network"]
+    assert (network["uniqueSourceIPs"], network["uniqueDestinationIPs"]) == (3000, 1)
+    monkeypatch.setattr("analyze_pcap.IP_SET_LIMIT", 500)
+    network = scan_pcap(capture, config)["network"]
+    assert network["uniqueDestinationIPs"] == 1
+    assert abs(network["uniqueSourceIPs"] - 3000) < 0.03 * 3000
+
+def zipf_stream(keys=2000, length=40000):
+    """少数键占大部分计数的键序列"""
+    weights = [1.0 / (rank + 1) for rank in range(keys)]
+    scale = length / sum(weights)
+    stream = []
+    for rank, weight in enumerate(weights):
+        stream += [f"k{rank}"] * max(1, round(weight * scale))
+    return stream[::7] + stream[1::7] + stream[2::7] + stream[3::7] + stream[4::7] + stream[5::7] + stream[6::7]
+
+def test_space_saving_bounds_hold_past_capacity():
+    stream = zipf_stream()
+    exact = {}
+    for key in stream:
+        exact[key] = exact.get(key, 0) + 1
+    summary = SpaceSaving(64)
+    for key in stream:
+        summary.add(key)
+    assert len(summary.counts) == 64 and summary.total == len(stream)
+    for key, count, error in summary.top(10):
+        assert count - error <= exact[key] <= count
+    # 真实计数超过最小计数的键一定在摘要中
+    assert all(key in summary.counts for key, count in exact.items() if count > summary.floor())
+    assert [key for key, _, _ in summary.top(3)] == ["k0", "k1", "k2"]
+
+def test_space_saving_merge_matches_bounds():
+    stream = zipf_stream()
+    left, right = SpaceSaving(64), SpaceSaving(64)
+    for index, key in enumerate(stream):
+        (left if index % 3 else right).add(key)
+    left.merge(roundtrip(right, lambda: SpaceSaving(1)))
+    exact = {}
+    for key in stream:
+        exact[key] = exact.get(key, 0) + 1
+    assert left.total == len(stream)
+    for key, count, error in left.top(10):
+        assert count - error <= exact[key] <= count
+
+def test_count_min_never_underestimates():
+    sketch, other = CountMinSketch(256, 4), CountMinSketch(256, 4)
+    exact = {}
+    for index in range(20000):
+        key = f"10.0.{index % 300}.{index % 7}"
+        exact[key] = exact.get(key, 0) + index % 5 + 1
+        (sketch if index % 2 else other).add(key, index % 5 + 1)
+    sketch.merge(roundtrip(other, lambda: CountMinSketch(1, 1)))
+    overshoot = [sketch.estimate(key) - count for key, count in exact.items()]
+    assert min(overshoot) >= 0
+    assert sum(value <= sketch.error_bound() for value in overshoot) >= 0.9 * len(overshoot)
+
+def test_approximate_network_matches_exact_below_capacity(tmp_path):
+    frames = []
+    for index in range(300):
+        source = f"10.1.0.{index % 13 + 1}"
+        frames.append(tcp(source, 1024 + index, f"10.2.0.{index % 5 + 1}", 80 + index % 3, 1))
+    capture = write_capture(tmp_path / "talkers.pcap", frames)
+    exact = scan_pcap(str(capture), {"engine": "fast", "sections": ["network", "transport"]})
+    approximate = scan_pcap(str(capture), {"engine": "fast", "sections": ["network", "transport"], "options": {
+        "network": {"approximate": True}, "transport": {"approximate": True}}})
+    for name in ("topSources", "topDestinations", "topCommunications"):
+        assert [(item.get("ip") or item["pair"], item["packets"]) for item in approximate["network"][name]] == \
+               [(item.get("ip") or item["pair"], item["packets"]) for item in exact["network"][name]]
+        assert all(item["packetsError"] == 0 for item in approximate["network"][name])
+    assert approximate["network"]["uniqueSourceIPs"] == exact["network"]["uniqueSourceIPs"] == 13
+    assert [(item["port"], item["packets"]) for item in approximate["transport"]["topPorts"]] == \
+           [(item["port"], item["packets"]) for item in exact["transport"]["topPorts"]]
+
+def nearest_rank(values, q):
+    ordered = sorted(values)
+    return ordered[max(1, math.ceil(q * len(ordered))) - 1]
+
+def test_ddsketch_quantiles_within_relative_accuracy():
+    values = [0] * 50 + [(index * 7919 % 10007) * 0.37 + 0.5 for index in range(20000)]
+    sketch, other = DDSketch(0.01), DDSketch(0.01)
+    for index, value in enumerate(values):
+        (sketch if index % 2 else other).add(value)
+    sketch.merge(roundtrip(other, DDSketch))
+    assert (sketch.count, sketch.min, sketch.max) == (len(values), 0, max(values))
+    assert sketch.sum == pytest.approx(sum(values))
+    for name, q in PERCENTILES:
+        expected = nearest_rank(values, q)
+        assert abs(sketch.percentiles()[name] - expected) <= 0.01 * expected
+    assert sketch.quantile(0.001) == 0
+    assert DDSketch().quantile(0.5) is None
+
+def test_ddsketch_bucket_limit_only_affects_low_quantiles():
+    sketch = DDSketch(0.01, max_buckets=64)
+    values = [1.02 ** index for index in range(2000)]
+    for value in values:
+        sketch.add(value)
+    assert len(sketch.buckets) <= 64
+    expected = nearest_rank(values, 0.99)
+    assert abs(sketch.quantile(0.99) - expected) <= 0.01 * expected
+
+def test_histogram_percentiles_exact():
+    histogram = Counter({60: 900, 1500: 90, 9000: 10})
+    assert histogram_percentiles(histogram) == {"p50": 60, "p90": 60, "p99": 1500, "p99.9": 9000}
+    assert histogram_percentiles(Counter()) == {name: None for name, _ in PERCENTILES}
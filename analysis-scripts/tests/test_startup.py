@@ -0,0 +1,28 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+SCRIPT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def loaded_modules(code):
+    """在新的解释器中执行 code，返回之后已导入的模块名"""
+    run = subprocess.run([sys.executable, "-c", code + "; import sys, json; print(json.dumps(sorted(sys.modules)))"],
+                         cwd=SCRIPT_DIR, capture_output=True, text=True, timeout=120, check=True)
+    return set(json.loads(run.stdout.splitlines()[-1]))
+
+def test_importing_the_scripts_loads_no_heavy_dependencies():
+    modules = loaded_modules("import analyze_pcap, analyze_har, analysis_worker")
+    assert not {"scapy", "numpy", "pcap_columnar", "har_columnar"} & modules
+
+def test_fast_engine_does_not_import_scapy():
+    modules = loaded_modules("import analyze_pcap; analyze_pcap.prepare_engine('fast')")
+    assert "scapy" not in modules
+
+def test_scapy_engine_imports_only_the_layers_it_needs():
+    pytest.importorskip("scapy")
+    modules = loaded_modules("import analyze_pcap; analyze_pcap.prepare_engine('scapy')")
+    assert {"scapy.layers.inet", "scapy.layers.dns", "scapy.layers.ntp"} <= modules
+    assert "scapy.all" not in modules
@@ -0,0 +1,284 @@
+import json
+import random
+from collections import defaultdict
+from datetime import datetime
+
+import pytest
+
+import analyze_pcap
+from analyze_pcap import TemporalAccumulator, SECTION_OPTIONS, columnar_temporal, scan_pcap
+from timeseries import OnlineTrafficEvents
+from helpers import tcp, udp, records, write_capture
+
+def options(**overrides):
+    return dict(SECTION_OPTIONS["temporal"], **overrides)
+
+def traffic(count=3000, seed=1):
+    """几分钟的TCP/UDP流量，中间有一段突增和一段安静期"""
+    rng = random.Random(seed)
+    frames = [
+        tcp("10.0.0.1", 40000, "10.0.0.2", 80, 1, payload=b"x" * rng.randrange(100)) if i % 3
+        else udp("10.0.0.3", 5000, "10.0.0.4", 5001, b"y" * rng.randrange(1000))
+        for i in range(count)
+    ]
+    result = records(frames)
+    ts = 1700000000.123
+    for i, rec in enumerate(result):
+        ts += 0.005 if 1500 <= i < 1800 else 0.3 if 2200 <= i < 2300 else 0.05
+        rec.ts = ts
+    return result
+
+def accumulate(recs, opts):
+    accumulator = TemporalAccumulator(opts)
+    for rec in recs:
+        accumulator.feed(rec)
+    return accumulator
+
+@pytest.fixture
+def small_timeline(monkeypatch):
+    # 超过100个包即把精确时间线转为网格
+    monkeypatch.setattr(analyze_pcap, "TIMELINE_EXACT_PACKETS", 100)
+
+def test_state_does_not_grow_with_packets(small_timeline):
+    accumulator = accumulate(traffic(), options())
+    base = accumulator.levels[accumulator.step]
+    assert accumulator.step == 1000
+    assert sum(bucket[0] for bucket in base.values()) == 3000
+    assert len(base) < 300
+    assert accumulator.times is None
+    assert sum(bucket[0] for bucket in accumulator.grid.values()) == 3000
+    assert len(accumulator.grid) <= analyze_pcap.TIMELINE_GRID_BUCKETS
+
+def test_grid_matches_exact_timeline(monkeypatch):
+    # 时长不超过 max_buckets * min_bucket_seconds 时网格的桶边界与输出桶边界重合
+    recs = traffic()
+    exact = accumulate(recs, options()).result()
+    monkeypatch.setattr(analyze_pcap, "TIMELINE_EXACT_PACKETS", 100)
+    monkeypatch.setattr(analyze_pcap, "TIMELINE_GRID_BUCKETS", 1000)
+    accumulator = accumulate(recs, options())
+    assert accumulator.resolution == 1000
+    assert accumulator.result() == exact
+@pytest.mark.parametrize("exact_packets", [None, 100, 5000])
+@pytest.mark.parametrize("pyramid", [False, True])
+def test_merged_shards_match_single_pass(pyramid, exact_packets, monkeypatch):
+    if exact_packets:
+        monkeypatch.setattr(analyze_pcap, "TIMELINE_EXACT_PACKETS", exact_packets)
+    opts = options(pyramid=pyramid, pyramid_max_buckets=500)
+    recs = traffic()
+    whole = accumulate(recs, opts).result()
+    merged = accumulate(recs[:1000], opts)
+    for shard in (recs[1000:1700], recs[1700:]):
+        accumulator = TemporalAccumulator(opts)
+        accumulator.anchor(recs[0].ts)
+        for rec in shard:
+            accumulator.feed(rec)
+        merged.merge(accumulator)
+    assert merged.result() == whole
+    assert any(event["type"] == "traffic_spike" for event in whole["trafficEvents"])
+    if pyramid:
+        # 细级别超过桶数上限，不保存
+        assert merged.levels[1] is None
+        assert whole["pyramid"]["levels"][0]["resolution"] > 0.001
+
+@pytest.mark.parametrize("exact_packets", [None, 100])
+def test_checkpoint_state_round_trip(exact_packets, monkeypatch):
+    if exact_packets:
+        monkeypatch.setattr(analyze_pcap, "TIMELINE_EXACT_PACKETS", exact_packets)
+    opts = options(pyramid=True, pyramid_max_buckets=500)
+    recs = traffic()
+    resumed = TemporalAccumulator(opts)
+    resumed.load_state(json.loads(json.dumps(accumulate(recs[:1200], opts).dump_state())))
+    for rec in recs[1200:]:
+        resumed.feed(rec)
+    assert resumed.result() == accumulate(recs, opts).result()
+
+def test_buckets_start_at_first_packet():
+    recs = traffic()
+    result = accumulate(recs, options()).result()
+    assert result["bucketSize"] == 5.0
+    assert result["timeDistribution"][0]["timestamp"] == recs[0].ts
+    for index, bucket in enumerate(result["timeDistribution"]):
+        assert bucket["timestamp"] == recs[0].ts + index * 5.0
+
+def test_live_events_match_final_events():
+    opts = options()
+    recs = traffic()
+    live = OnlineTrafficEvents(opts)
+    for rec in recs:
+        live.feed(rec.ts, rec.length)
+    assert live.finish() == accumulate(recs, opts).result()["trafficEvents"]
+
+def test_columnar_matches_accumulator():
+    pytest.importorskip("numpy")
+    from pcap_columnar import PacketColumns
+    opts = options(pyramid=True)
+    recs = traffic()
+    columns = PacketColumns()
+    for rec in recs:
+        columns.feed(rec)
+    assert columnar_temporal(columns.frozen(), opts) == accumulate(recs, opts).result()
+
+def baseline_temporal(packets):
+    """改为流式扫描之前的时间线算法（一次性读入全部包），只保留时间桶部分"""
+    from scapy.all import IP, TCP, UDP, ICMP, ARP
+    timestamps = [float(pkt.time) for pkt in packets]
+    start_time = min(timestamps)
+    end_time = max(timestamps)
+    duration = end_time - start_time
+    if duration > 0:
+        bucket_size = max(5.0, duration / 100)
+        num_buckets = int(duration / bucket_size) + 1
+    else:
+        bucket_size = 5.0
+        num_buckets = 1
+    time_buckets = [0] * num_buckets
+    byte_buckets = [0] * num_buckets
+    protocol_buckets = [defaultdict(int) for _ in range(num_buckets)]
+    for pkt in packets:
+        bucket_index = min(int((float(pkt.time) - start_time) / bucket_size), num_buckets - 1)
+        time_buckets[bucket_index] += 1
+        byte_buckets[bucket_index] += len(pkt)
+        protocol = "Other"
+        if IP in pkt:
+            if TCP in pkt:
+                protocol = "TCP"
+            elif UDP in pkt:
+                protocol = "UDP"
+            elif ICMP in pkt:
+                protocol = "ICMP"
+        elif ARP in pkt:
+            protocol = "ARP"
+        protocol_buckets[bucket_index][protocol] += 1
+    
+    timeline_data = []
+    max_traffic = 0
+    peak_time_index = 0
+    for i in range(num_buckets):
+        if byte_buckets[i] > max_traffic:
+            max_traffic = byte_buckets[i]
+            peak_time_index = i
+        timeline_data.append({
+            "timestamp": start_time + (i * bucket_size),
+            "packets": time_buckets[i],
+            "bytes": byte_buckets[i],
+            "rate": byte_buckets[i] / bucket_size,
+            "protocols": dict(protocol_buckets[i])
+        })
+    return {
+        "startTime": datetime.fromtimestamp(start_time).isoformat(),
+        "endTime": datetime.fromtimestamp(end_time).isoformat(),
+        "duration": duration,
+        "bucketSize": bucket_size,
+        "timeDistribution": timeline_data,
+        "trafficTimeline": [
+            {"timestamp": data["timestamp"], "bytes": data["bytes"], "packets": data["packets"], "rate": data["rate"]}
+            for data in timeline_data
+        ],
+        "protocolTimeline": {
+            protocol: [
+                {"timestamp": data["timestamp"], "packets": protocol_buckets[i].get(protocol, 0)}
+                for i, data in enumerate(timeline_data)
+            ]
+            for protocol in ["TCP", "UDP", "ICMP", "ARP"]
+        },
+        "peakTrafficTime": datetime.fromtimestamp(start_time + (peak_time_index * bucket_size)).isoformat(),
+        "peakTrafficRate": max_traffic / bucket_size
+    }
+
+def baseline_events(timeline_data, bucket_size):
+    """改为在线检测之前的流量事件规则：每个时间桶与全局平均值比较"""
+    if len(timeline_data) < 3:
+        return []
+    events = []
+    avg_rate = sum(data["rate"] for data in timeline_data) / len(timeline_data)
+    for data in timeline_data:
+        if data["rate"] > avg_rate * 2 and avg_rate > 0:
+            events.append({
+                "type": "traffic_spike",
+                "timestamp": data["timestamp"],
+                "severity": "high" if data["rate"] > avg_rate * 5 else "medium",
+                "description": f"流量突增：{data['rate']:.1f} bytes/sec（平均值的{data['rate']/avg_rate:.1f}倍）",
+                "details": {"rate": data["rate"], "average_rate": avg_rate, "packets": data["packets"]}
+            })
+    quiet_start = None
+    for i, data in enumerate(timeline_data):
+        if data["rate"] < avg_rate * 0.2:
+            if quiet_start is None:
+                quiet_start = i
+        else:
+            if quiet_start is not None and (i - quiet_start) >= 3:
+                events.append({
+                    "type": "quiet_period",
+                    "timestamp": timeline_data[quiet_start]["timestamp"],
+                    "severity": "low",
+                    "description": f"网络安静期：持续{(i - quiet_start) * bucket_size:.1f}秒",
+                    "details": {
+                        "duration": (i - quiet_start) * bucket_size,
+                        "avg_rate_during_period": sum(timeline_data[j]["rate"] for j in range(quiet_start, i)) / (i - quiet_start)
+                    }
+                })
+            quiet_start = None
+    return events
+
+def baseline_capture(path, step):
+    rng = random.Random(3)
+    frames = [
+        tcp("10.0.0.1", 40000, "10.0.0.2", 80, 1, payload=b"x" * rng.randrange(100)) if i % 3
+        else udp("10.0.0.3", 5000, "10.0.0.4", 5001, b"y" * rng.randrange(1000))
+        for i in range(1500)
+    ]
+    return write_capture(path, frames, start=1700000000.123457, step=step)
+
+@pytest.mark.parametrize("step", [0.0371, 0.5173])
+@pytest.mark.parametrize("config", [
+    {"vectorized": False},
+    {"engine": "fast", "vectorized": False},
+    {"engine": "fast", "vectorized": False, "workers": 3},
+    {"engine": "fast", "vectorized": True},
+])
+def test_timeline_matches_baseline(tmp_path, monkeypatch, step, config):
+    # 时长约55秒（5秒桶）和约775秒（桶宽为时长的1/100）
+    from scapy.all import rdpcap
+    monkeypatch.setattr(analyze_pcap, "MIN_SHARD_BYTES", 32 * 1024)
+    if config.get("vectorized"):
+        pytest.importorskip("numpy")
+    path = str(baseline_capture(tmp_path / "c.pcap", step))
+    temporal = scan_pcap(path, dict(config, sections=["temporal"]))["temporal"]
+    temporal.pop("trafficEvents")
+    assert temporal == baseline_temporal(rdpcap(path))
+
+def test_sharded_grid_matches_baseline(tmp_path, monkeypatch):
+    # 超过精确时间线的包数上限后，各分片的网格以同一起点对齐，短抓包的结果仍然精确
+    from scapy.all import rdpcap
+    monkeypatch.setattr(analyze_pcap, "MIN_SHARD_BYTES", 32 * 1024)
+    monkeypatch.setattr(analyze_pcap, "TIMELINE_EXACT_PACKETS", 100)
+    path = str(baseline_capture(tmp_path / "c.pcap", 0.0371))
+    temporal = scan_pcap(path, {"engine": "fast", "vectorized": False, "workers": 3, "sections": ["temporal"]})["temporal"]
+    temporal.pop("trafficEvents")
+    assert temporal == baseline_temporal(rdpcap(path))
+
+def bursty_capture(path):
+    """约775秒：第300~330个包为大包（突增），第900~1000个包不带载荷（安静期）"""
+    frames = [
+        tcp("10.0.0.1", 40000, "10.0.0.2", 80, 1, payload=b"x" * (1400 if 300 <= i < 330 else 0 if 900 <= i < 1000 else 300))
+        for i in range(1500)
+    ]
+    return write_capture(path, frames, start=1700000000.123457, step=0.5173)
+
+@pytest.mark.parametrize("config", [
+    {"engine": "fast", "vectorized": False},
+    {"engine": "fast", "vectorized": False, "workers": 3},
+    {"engine": "fast", "vectorized": True},
+])
+def test_global_detector_matches_baseline(tmp_path, monkeypatch, config):
+    from scapy.all import rdpcap
+    monkeypatch.setattr(analyze_pcap, "MIN_SHARD_BYTES", 32 * 1024)
+    if config.get("vectorized"):
+        pytest.importorskip("numpy")
+    path = str(bursty_capture(tmp_path / "c.pcap"))
+    config = dict(config, sections=["temporal"], options={"temporal": {"event_detector": "global"}})
+    temporal = scan_pcap(path, config)["temporal"]
+    expected = baseline_temporal(rdpcap(path))
+    expected["trafficEvents"] = baseline_events(expected["timeDistribution"], expected["bucketSize"])
+    assert temporal == expected
+    assert {event["type"] for event in temporal["trafficEvents"]} == {"traffic_spike", "quiet_period"}
@@ -0,0 +1,94 @@
+import pytest
+
+from analyze_pcap import TemporalAccumulator, SECTION_OPTIONS
+from timeseries import OnlineTrafficEvents, query_pyramid, lttb
+from test_temporal import traffic
+
+def pyramid_of(recs, **overrides):
+    accumulator = TemporalAccumulator(dict(SECTION_OPTIONS["temporal"], pyramid=True, **overrides))
+    for rec in recs:
+        accumulator.feed(rec)
+    return accumulator.result()["pyramid"]
+
+def test_any_window_and_resolution_matches_the_packets():
+    recs = traffic()
+    pyramid = pyramid_of(recs)
+    start, end = recs[1000].ts, recs[2000].ts
+    for resolution in (0.01, 1, 60):
+        series = query_pyramid(pyramid, start, end, resolution, max_points=None)
+        assert series["resolution"] >= resolution and not series["downsampled"]
+        inside = [rec for rec in recs if series["start"] <= rec.ts < series["end"]]
+        assert sum(point["packets"] for point in series["points"]) == len(inside)
+        assert sum(point["bytes"] for point in series["points"]) == sum(rec.length for rec in inside)
+        # 空桶补0，序列稠密
+        stamps = [point["timestamp"] for point in series["points"]]
+        assert len(stamps) == round((series["end"] - series["start"]) / series["resolution"])
+
+def test_default_query_picks_finest_level_under_max_points():
+    pyramid = pyramid_of(traffic())
+    series = query_pyramid(pyramid, max_points=200)
+    duration = pyramid["endTime"] - pyramid["startTime"]
+    assert duration / series["resolution"] < 200 <= duration / (series["resolution"] / 10)
+    with pytest.raises(Exception, match="结束时间早于起始时间"):
+        query_pyramid(pyramid, 10, 5)
+
+def test_downsampled_query_keeps_peaks():
+    pyramid = pyramid_of(traffic())
+    full = query_pyramid(pyramid, resolution=0.1, max_points=None)
+    small = query_pyramid(pyramid, resolution=0.1, max_points=50)
+    assert small["downsampled"] and len(small["points"]) == 50
+    # 降采样只挑选原有的点，突增段的峰值仍然可见
+    assert all(point in full["points"] for point in small["points"])
+    assert max(point["bytes"] for point in small["points"]) > 0.9 * max(point["bytes"] for point in full["points"])
+    assert small["points"][0] == full["points"][0] and small["points"][-1] == full["points"][-1]
+
+def test_lttb_selects_endpoints_and_spike():
+    values = [1] * 1000
+    values[437] = 100
+    selected = lttb(values, 20)
+    assert len(selected) == 20 and selected == sorted(selected)
+    assert selected[0] == 0 and selected[-1] == 999 and 437 in selected
+    assert lttb(values[:10], 20) == list(range(10))
+
+def detector(emit=None):
+    return OnlineTrafficEvents(dict(SECTION_OPTIONS["temporal"], event_bucket_seconds=1), emit)
+
+def test_spike_is_emitted_when_its_bucket_closes():
+    emitted = []
+    events = detector(emitted.append)
+    for index in range(100, 130):
+        events.feed_bucket(index, 10, 1000 + index % 3 * 50)
+    events.feed_bucket(130, 100, 20000)
+    assert emitted == []
+    events.feed_bucket(131, 10, 1000)
+    assert [event["type"] for event in emitted] == ["traffic_spike"]
+    assert emitted[0]["timestamp"] == 130 and emitted[0]["severity"] == "high"
+    # 突增截断后更新基线，之后的正常流量不算突增
+    for index in range(132, 160):
+        events.feed_bucket(index, 10, 1000 + index % 3 * 50)
+    assert events.finish() == emitted and len(emitted) == 1
+
+def test_empty_buckets_form_a_quiet_period():
+    skipped = detector()
+    explicit = detector()
+    for index in range(30):
+        skipped.feed_bucket(index, 10, 1000)
+        explicit.feed_bucket(index, 10, 1000)
+    # 空桶跳过不逐个处理，结果与逐个加入0字节桶相同
+    for index in range(30, 42):
+        explicit.feed_bucket(index, 0, 0)
+    for index in range(42, 50):
+        skipped.feed_bucket(index, 10, 1000)
+        explicit.feed_bucket(index, 10, 1000)
+    quiet = skipped.finish()
+    assert quiet == explicit.finish()
+    assert [event["type"] for event in quiet] == ["quiet_period"]
+    assert quiet[0]["timestamp"] == 30 and quiet[0]["details"]["duration"] == 12
+
+def test_short_dip_is_not_reported_and_bad_width_is_rejected():
+    events = detector()
+    for index in range(30):
+        events.feed_bucket(index, 10, 0 if index in (20, 21) else 1000)
+    assert events.finish() == []
+    with pytest.raises(Exception, match="无效的event_bucket_seconds配置"):
+        OnlineTrafficEvents(dict(SECTION_OPTIONS["temporal"], event_bucket_seconds=0))
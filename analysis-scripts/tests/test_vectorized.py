@@ -0,0 +1,34 @@
+import json
+
+import pytest
+
+from analyze_pcap import scan_pcap, analyzer_registry
+from synthetic_traffic import write_pcap
+from helpers import write_capture
+
+pytest.importorskip("numpy")
+
+SECTIONS = ["summary", "transport", "temporal", "anomalies", "smart_insights"]
+
+def analyze(path, **config):
+    result = scan_pcap(str(path), dict({"engine": "fast", "sections": SECTIONS}, **config))
+    return json.loads(json.dumps(result))
+
+def test_vectorized_sections_replace_packet_accumulators():
+    registry = analyzer_registry({"vectorized": True})
+    assert "packet_columns" in registry
+    assert "packet_columns" not in analyzer_registry({"vectorized": False})
+
+@pytest.mark.parametrize("options", [
+    {},
+    {"anomalies": {"port_scan_ports": 5, "icmp_percentage": 1}, "temporal": {"max_buckets": 7}, "transport": {"top_n": 3}}
+])
+def test_vectorized_matches_per_packet(tmp_path, options):
+    path = tmp_path / "mix.pcap"
+    write_pcap(str(path), 6000, seed=5)
+    assert analyze(path, vectorized=True, options=options) == analyze(path, vectorized=False, options=options)
+
+def test_vectorized_handles_capture_without_ip(tmp_path):
+    arp = b"\xff" * 6 + b"\x02" * 6 + b"\x08\x06" + bytes(28)
+    path = write_capture(tmp_path / "arp.pcap", [arp] * 10)
+    assert analyze(path, vectorized=True) == analyze(path, vectorized=False)
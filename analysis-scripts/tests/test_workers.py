@@ -0,0 +1,61 @@
+import json
+
+import pytest
+
+import analyze_pcap
+from analyze_pcap import scan_pcap
+from fast_dissector import plan_shards, iter_mmap_records
+from synthetic_traffic import write_pcap
+from helpers import write_capture, http_connection
+
+def analyze(path, **config):
+    return json.loads(json.dumps(scan_pcap(str(path), dict({"engine": "fast"}, **config))))
+
+@pytest.fixture
+def small_shards(monkeypatch):
+    monkeypatch.setattr(analyze_pcap, "MIN_SHARD_BYTES", 64 * 1024)
+
+def test_shards_cover_every_record_once(tmp_path):
+    path = tmp_path / "mix.pcap"
+    write_pcap(str(path), 5000, seed=2)
+    shards = plan_shards(str(path), 4)
+    assert len(shards) == 4
+    assert all(left[1] == right[0] for left, right in zip(shards, shards[1:]))
+    records = [bytes(data) for shard in shards for _, _, data in iter_mmap_records(str(path), shard)]
+    assert records == [bytes(data) for _, _, data in iter_mmap_records(str(path))]
+
+def test_sharded_scan_matches_single_process(tmp_path, small_shards):
+    path = tmp_path / "mix.pcap"
+    write_pcap(str(path), 20000, seed=4)
+    assert analyze(path, workers=3, vectorized=False) == analyze(path, workers=1, vectorized=False)
+
+def test_sharded_sketches_stay_within_error_bounds(tmp_path, small_shards):
+    # 概要结构合并后的计数与单进程不一定相同，但仍满足报告的误差范围
+    path = tmp_path / "mix.pcap"
+    write_pcap(str(path), 20000, seed=4)
+    network = analyze(path, workers=3, sections=["network"], options={"network": {"approximate": True}})["network"]
+    exact = analyze(path, sections=["network"], options={"network": {"top_n": 100000}})["network"]
+    for name in ("topSources", "topDestinations", "topCommunications"):
+        counts = {item.get("ip") or item["pair"]: item["packets"] for item in exact[name]}
+        bound = network["approximation"]["packetsErrorBound"][name]
+        for item in network[name]:
+            true_count = counts[item.get("ip") or item["pair"]]
+            assert item["packets"] - item["packetsError"] <= true_count <= item["packets"]
+            assert item["packetsError"] <= bound
+
+def test_http_message_split_across_shards(tmp_path, small_shards):
+    # 一个很大的响应跨越多个分片，请求和响应的配对仍与单进程相同
+    body = b"x" * 1400
+    response = [b"HTTP/1.1 200 OK\r\nContent-Length: %d\r\n\r\n" % (len(body) * 150)] + [body] * 150
+    handshake, requests, responses, teardown = http_connection(
+        "10.0.0.1", 40000, "10.0.0.2", [b"GET /big HTTP/1.1\r\nHost: a.example\r\n\r\n"], response)
+    path = write_capture(tmp_path / "big.pcap", handshake + requests + responses + teardown)
+    sections = ["summary", "http_sessions", "smart_insights"]
+    result = analyze(path, workers=3, sections=sections)
+    assert result == analyze(path, workers=1, sections=sections)
+    assert result["http_sessions"]["total_sessions"] == 1
+
+def test_invalid_worker_count(tmp_path):
+    path = write_capture(tmp_path / "c.pcap", [])
+    with pytest.raises(Exception, match="无效的workers配置"):
+        analyze_pcap.collect_accumulators(str(path), {"workers": "many"})
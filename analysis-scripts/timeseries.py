@@ -0,0 +1,392 @@
+#!/usr/bin/env python3
+"""
+多分辨率时间序列金字塔 - 一次扫描，任意窗口和分辨率查询
+
+各级分辨率为 1ms、10ms、100ms、1s、10s、1min、10min、1h。桶按绝对时间对齐
+（桶编号 = floor(毫秒时间戳 / 分辨率)），只保存有数据的桶，每级为 桶编号/包数/字节数/
+各协议包数 几列数组。扫描时按包累加到细级别的桶中，较粗的级别由细级别逐级合并；
+非空桶数超过上限的细分辨率级别不保存。
+
+金字塔随分析结果保存（temporal.pyramid），之后查询任意时间窗口和分辨率都不必
+重新读取抓包文件。查询结果中的点数超过 max_points 时用LTTB
+（Largest-Triangle-Three-Buckets）降采样，保留曲线的峰谷形状。
+
+在线流量事件检测按固定宽度（同样按绝对时间对齐）的时间桶累加，时间桶关闭时与EWMA基线比较：
+偏离基线超过若干倍平均绝对偏差为流量突增，低于基线一定比例并持续多个桶为安静期。
+每条序列只保存几个数，流式分析时事件随扫描实时输出。
+
+用法：
+  timeseries.py <分析结果JSON文件> [查询JSON]
+  查询JSON: {"start": 起始时间戳, "end": 结束时间戳, "resolution": 秒, "maxPoints": 1000}
+"""
+
+import sys
+import json
+import math
+from bisect import bisect_left, bisect_right
+
+# 各级分辨率（毫秒），每一级都是上一级的整数倍
+PYRAMID_STEPS_MS = (1, 10, 100, 1000, 10000, 60000, 600000, 3600000)
+DEFAULT_MAX_POINTS = 1000
+MAX_QUERY_POINTS = 1000000  # 单次查询（降采样前）的最多时间点数
+MIN_DEVIATION_SHARE = 0.1  # 偏差下限（基线的比例），避免平稳流量的微小波动被放大
+
+def bucket_width_ms(seconds):
+    """桶宽（秒）换算为整毫秒数，至少1毫秒"""
+    return max(1, round(float(seconds) * 1000))
+
+class TrafficEventDetector:
+    """在线流量事件检测：状态为EWMA基线、EWMA平均绝对偏差和当前安静期
+    
+    突增和安静期中的时间桶不更新基线（突增按上限截断后更新），持续的安静期
+    不会被当作新的常态。
+    """
+
+    def __init__(self, bucket_size, options):
+        self.bucket_size = bucket_size
+        self.alpha = options["ewma_alpha"]
+        self.sensitivity = options["spike_sensitivity"]
+        self.high_sensitivity = options["high_spike_sensitivity"]
+        self.warmup = options["warmup_buckets"]
+        self.quiet_ratio = options["quiet_ratio"]
+        self.quiet_min_buckets = options["quiet_min_buckets"]
+        self.mean = 0.0
+        self.deviation = 0.0
+        self.seen = 0
+        self.quiet_start = None
+        self.quiet_buckets = 0
+        self.quiet_bytes = 0
+
+    def update(self, timestamp, byte_count, packets):
+        """处理一个关闭的时间桶，返回新确定的事件"""
+        events = []
+        rate = byte_count / self.bucket_size
+        mean = self.mean
+        value = rate
+        if self.seen >= self.warmup and mean > 0:
+            deviation = max(self.deviation, mean * MIN_DEVIATION_SHARE)
+            score = (rate - mean) / deviation
+            if rate < mean * self.quiet_ratio:
+                if self.quiet_start is None:
+                    self.quiet_start = timestamp
+                self.quiet_buckets += 1
+                self.quiet_bytes += byte_count
+                self.seen += 1
+                return events
+            events.extend(self.end_quiet())
+            if score > self.sensitivity:
+                events.append({
+                    "type": "traffic_spike",
+                    "timestamp": timestamp,
+                    "severity": "high" if score > self.high_sensitivity else "medium",
+                    "description": f"流量突增：{rate:.1f} bytes/sec（基线的{rate / mean:.1f}倍）",
+                    "details": {
+                        "rate": rate,
+                        "average_rate": mean,
+                        "packets": packets,
+                        "score": score
+                    }
+                })
+                value = mean + self.sensitivity * deviation
+
+        if self.seen == 0:
+            self.mean = value
+        else:
+            self.deviation += self.alpha * (abs(value - mean) - self.deviation)
+            self.mean += self.alpha * (value - mean)
+        self.seen += 1
+        return events
+
+    def skip(self, timestamp, count):
+        """连续 count 个空桶：进入安静期后直接计数，不必逐个处理"""
+        events = []
+        while count and self.quiet_start is None and self.mean > 0:
+            events.extend(self.update(timestamp, 0, 0))
+            timestamp += self.bucket_size
+            count -= 1
+        if self.quiet_start is not None:
+            self.quiet_buckets += count
+        elif count:
+            # 基线为0：空桶不改变基线
+            self.seen += count
+        return events
+
+    def end_quiet(self):
+        """结束当前安静期，持续足够多个桶时返回安静期事件"""
+        if self.quiet_start is None:
+            return []
+        events = []
+        if self.quiet_buckets >= self.quiet_min_buckets:
+            duration = self.quiet_buckets * self.bucket_size
+            events.append({
+                "type": "quiet_period",
+                "timestamp": self.quiet_start,
+                "severity": "low",
+                "description": f"网络安静期：持续{duration:.1f}秒",
+                "details": {
+                    "duration": duration,
+                    "avg_rate_during_period": self.quiet_bytes / duration
+                }
+            })
+        self.quiet_start = None
+        self.quiet_buckets = 0
+        self.quiet_bytes = 0
+        return events
+
+class OnlineTrafficEvents:
+    """按固定宽度、按绝对时间对齐的时间桶（桶编号 = floor(毫秒时间戳 / 桶宽)）累加，时间桶关闭时交给检测器
+    
+    逐包累加时时间戳早于当前桶的迟到包计入当前桶。emit 不为空时每个事件确定后立即输出。
+    """
+
+    def __init__(self, options, emit=None):
+        if float(options["event_bucket_seconds"]) <= 0:
+            raise Exception(f"无效的event_bucket_seconds配置: {options['event_bucket_seconds']}")
+        self.bucket_ms = bucket_width_ms(options["event_bucket_seconds"])
+        self.bucket_size = self.bucket_ms / 1000
+        self.detector = TrafficEventDetector(self.bucket_size, options)
+        self.emit = emit
+        self.events = []
+        self.index = None
+        self.packets = 0
+        self.bytes = 0
+
+    def feed(self, ts, length):
+        self.feed_bucket(math.floor(ts * 1000) // self.bucket_ms, 1, length)
+
+    def feed_bucket(self, index, packets, byte_count):
+        """加入一个时间桶的计数（已分好桶时按桶编号递增的顺序加入）"""
+        if self.index is None:
+            self.index = index
+        elif index > self.index:
+            self.close(index)
+        self.packets += packets
+        self.bytes += byte_count
+
+    def track(self, records):
+        """包装记录迭代器：逐包累加，迭代结束时关闭最后一个时间桶"""
+        for rec in records:
+            self.feed(rec.ts, rec.length)
+            yield rec
+        self.finish()
+
+    def close(self, next_index):
+        """关闭当前时间桶，之间的空桶一并处理"""
+        bucket_size = self.bucket_size
+        timestamp = self.index * bucket_size
+        self.publish(self.detector.update(timestamp, self.bytes, self.packets))
+        if next_index > self.index + 1:
+            self.publish(self.detector.skip(timestamp + bucket_size, next_index - self.index - 1))
+        self.index = next_index
+        self.packets = 0
+        self.bytes = 0
+
+    def finish(self):
+        """关闭最后一个时间桶和未结束的安静期，返回全部事件"""
+        if self.index is not None and self.packets:
+            self.close(self.index + 1)
+            self.publish(self.detector.end_quiet())
+        return self.events
+
+    def publish(self, events):
+        self.events.extend(events)
+        if self.emit is not None:
+            for event in events:
+                self.emit(event)
+
+def merge_buckets(target, source, width):
+    """把 桶编号->[包数, 字节数, 各协议包数...] 字典 source 累加到 target"""
+    for index, counts in source.items():
+        total = target.get(index)
+        if total is None:
+            target[index] = list(counts)
+        else:
+            for i in range(width):
+                total[i] += counts[i]
+
+def pyramid_levels(levels, num_codes):
+    """由扫描时累加的各级桶得到金字塔每一级的列（顺序同 PYRAMID_STEPS_MS）
+    
+    levels 为 分辨率毫秒数 -> 桶编号->计数 字典，其中最粗的一级必须存在；比它细、
+    不在 levels 中或为None（桶数超过上限已略去）的级别为None，比它粗的级别逐级合并得到。
+    """
+    base = max(levels)
+    result = []
+    buckets = None
+    previous = base
+    for step in PYRAMID_STEPS_MS:
+        if step < base:
+            fine = levels.get(step)
+            result.append(None if fine is None else level_columns(sorted(fine.items()), num_codes))
+            continue
+        if buckets is None:
+            buckets = sorted(levels[base].items())
+        else:
+            factor = step // previous
+            coarse = {}
+            for index, bucket in buckets:
+                # 桶编号有序，合并后仍然有序
+                total = coarse.get(index // factor)
+                if total is None:
+                    coarse[index // factor] = list(bucket)
+                else:
+                    for i, value in enumerate(bucket):
+                        total[i] += value
+            buckets = list(coarse.items())
+            previous = step
+        result.append(level_columns(buckets, num_codes))
+    return result
+
+def level_columns(buckets, num_codes):
+    """[(桶编号, [包数, 字节数, 各协议包数...])] 转为列"""
+    index = [key for key, _ in buckets]
+    packets = [bucket[0] for _, bucket in buckets]
+    byte_counts = [bucket[1] for _, bucket in buckets]
+    protocols = [[bucket[code + 2] for _, bucket in buckets] for code in range(num_codes)]
+    return index, packets, byte_counts, protocols
+
+def build_pyramid(levels, protocol_names, start_time, end_time, max_buckets):
+    """生成保存在结果中的金字塔：为None或非空桶数超过 max_buckets 的级别略去（最粗一级总是保留）"""
+    kept = []
+    for step, level in zip(PYRAMID_STEPS_MS, levels):
+        if level is None or (len(level[0]) > max_buckets and step != PYRAMID_STEPS_MS[-1]):
+            continue
+        index, packets, byte_counts, protocols = level
+        kept.append({
+            "resolution": step / 1000,
+            "index": index,
+            "packets": packets,
+            "bytes": byte_counts,
+            "protocols": {
+                name: counts for name, counts in zip(protocol_names, protocols) if any(counts)
+            }
+        })
+    return {
+        "startTime": start_time,
+        "endTime": end_time,
+        "levels": kept
+    }
+
+def choose_level(levels, start, end, resolution, max_points):
+    """指定分辨率时取不细于它的最细一级；否则取窗口内点数不超过 max_points 的最细一级"""
+    if resolution is not None:
+        for level in levels:
+            if level["resolution"] >= resolution:
+                return level
+        return levels[-1]
+    for level in levels:
+        if (end - start) / level["resolution"] < max_points:
+            return level
+    return levels[-1]
+
+def query_pyramid(pyramid, start=None, end=None, resolution=None, max_points=DEFAULT_MAX_POINTS):
+    """查询时间窗口 [start, end]（秒级时间戳）的时间序列，空桶补0，点数过多时LTTB降采样"""
+    levels = pyramid["levels"]
+    if not levels:
+        return {"resolution": None, "downsampled": False, "points": []}
+    start = pyramid["startTime"] if start is None else float(start)
+    end = pyramid["endTime"] if end is None else float(end)
+    if end < start:
+        raise Exception("查询的结束时间早于起始时间")
+    max_points = int(max_points) if max_points else None
+    level = choose_level(levels, start, end, resolution, max_points or MAX_QUERY_POINTS)
+
+    step = level["resolution"]
+    first = math.floor(start / step)
+    last = math.floor(end / step)
+    count = last - first + 1
+    if count > MAX_QUERY_POINTS:
+        raise Exception("查询的时间点过多，请缩小时间窗口或降低分辨率")
+
+    # 窗口内的非空桶填入稠密序列
+    index = level["index"]
+    lo = bisect_left(index, first)
+    hi = bisect_right(index, last)
+    packets = [0] * count
+    byte_counts = [0] * count
+    protocols = {name: [0] * count for name in level["protocols"]}
+    for i in range(lo, hi):
+        position = index[i] - first
+        packets[position] = level["packets"][i]
+        byte_counts[position] = level["bytes"][i]
+        for name, counts in level["protocols"].items():
+            protocols[name][position] = counts[i]
+
+    selected = range(count)
+    if max_points and count > max_points:
+        selected = lttb(byte_counts, max_points)
+
+    points = []
+    for position in selected:
+        points.append({
+            "timestamp": (first + position) * step,
+            "packets": packets[position],
+            "bytes": byte_counts[position],
+            "rate": byte_counts[position] / step,
+            "protocols": {
+                name: counts[position] for name, counts in protocols.items() if counts[position]
+            }
+        })
+    return {
+        "resolution": step,
+        "start": first * step,
+        "end": (last + 1) * step,
+        "downsampled": len(points) < count,
+        "points": points
+    }
+
+def lttb(values, threshold):
+    """Largest-Triangle-Three-Buckets降采样：等间距序列保留 threshold 个点的下标"""
+    n = len(values)
+    if threshold >= n:
+        return list(range(n))
+    if threshold < 3:
+        return [0, n - 1][:max(threshold, 1)]
+
+    every = (n - 2) / (threshold - 2)
+    selected = [0]
+    a = 0
+    for i in range(threshold - 2):
+        # 下一个分组的平均点作为三角形的第三个顶点
+        avg_start = int((i + 1) * every) + 1
+        avg_end = min(int((i + 2) * every) + 1, n)
+        avg_x = (avg_start + avg_end - 1) / 2
+        avg_y = sum(values[avg_start:avg_end]) / (avg_end - avg_start)
+
+        # 当前分组中与上一个选中点、下一组平均点构成面积最大三角形的点
+        ay = values[a]
+        best = -1.0
+        best_index = a
+        for j in range(int(i * every) + 1, int((i + 1) * every) + 1):
+            area = abs((a - avg_x) * (values[j] - ay) - (a - j) * (avg_y - ay))
+            if area > best:
+                best = area
+                best_index = j
+        selected.append(best_index)
+        a = best_index
+    selected.append(n - 1)
+    return selected
+
+def main():
+    args = sys.argv[1:]
+    if not 1 <= len(args) <= 2:
+        print(json.dumps({"error": {"message": "参数错误"}}))
+        sys.exit(1)
+
+    try:
+        with open(args[0], 'r', encoding='utf-8') as f:
+            result = json.load(f)
+        query = json.loads(args[1]) if len(args) > 1 else {}
+        # 接受完整的分析结果或其中的 temporal 段
+        pyramid = result.get("temporal", result).get("pyramid")
+        if pyramid is None:
+            raise Exception("分析结果中没有时间序列金字塔（需要启用 options.temporal.pyramid）")
+        print(json.dumps(query_pyramid(pyramid, query.get("start"), query.get("end"),
+                                       query.get("resolution"), query.get("maxPoints", DEFAULT_MAX_POINTS)),
+                         ensure_ascii=False))
+    except Exception as e:
+        print(json.dumps({"error": {"message": str(e)}}))
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()